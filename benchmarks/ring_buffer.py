@@ -0,0 +1,48 @@
+"""
+Microbenchmark: RingBuffer.put vs audio.roll
+
+Simulates the microphone callback: 50 ms blocks (20 Hz) of 16 kHz audio are
+pushed into 8 second and 5 minute buffers.
+
+Usage:
+    python benchmarks/ring_buffer.py
+"""
+
+import timeit
+
+import numpy as np
+
+from whisperlab.audio import RingBuffer, roll, SAMPLES_PER_SECOND
+
+BLOCK_SAMPLES = SAMPLES_PER_SECOND // 20  # One 50 ms callback
+CAPACITIES = {"8 s": 8 * SAMPLES_PER_SECOND, "5 min": 300 * SAMPLES_PER_SECOND}
+REPEATS = 5
+
+
+def bench(statement, number: int) -> float:
+    """Get the best time per call, in microseconds."""
+    return min(timeit.repeat(statement, number=number, repeat=REPEATS)) / number * 1e6
+
+
+def main():
+    block = np.random.default_rng(0).standard_normal(BLOCK_SAMPLES, np.float32)
+
+    print(f"{'capacity':>10} {'roll (us)':>12} {'ring (us)':>12} {'speedup':>9}")
+    for name, capacity in CAPACITIES.items():
+        number = 2_000 if capacity < SAMPLES_PER_SECOND * 60 else 100
+        state = {"buffer": np.zeros(capacity, np.float32)}
+
+        def roll_put():
+            state["buffer"] = roll(state["buffer"], block)
+
+        ring = RingBuffer(capacity)
+
+        roll_us = bench(roll_put, number)
+        ring_us = bench(lambda: ring.put(block), number)
+        print(
+            f"{name:>10} {roll_us:>12.1f} {ring_us:>12.1f} {roll_us / ring_us:>8.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
-import tomllib
+from importlib.metadata import PackageNotFoundError, version
 
 
-with open("pyproject.toml", "rb") as f:
-    VERSION = tomllib.load(f)["project"]["version"]
+try:
+    VERSION = version("whisperlab")
+except PackageNotFoundError:  # Imported from a source tree that isn't installed
+    VERSION = "0+unknown"
@@ -11,21 +11,59 @@ Usage Examples:
 whisperlab transcribe audio.wav
 whisperlab transcribe audio.wav --model english
 whisperlab transcribe audio.wav -m english
+whisperlab transcribe recordings/ "calls/**/*.mp3" --workers 4 -o results.jsonl
+whisperlab transcribe recordings/ --metrics metrics.prom
+whisperlab transcribe recordings/ --precision int8-dynamic
+whisperlab transcribe recordings/ --pool process -w 4 --cores 32 --pin
+whisperlab transcribe recordings/ --pool process -w 4 --calibrate
+whisperlab transcribe talk.mp3 --subtitles subtitles/ --subtitle-format vtt
+whisperlab transcribe archive/ --manifest archive.jsonl -o results.jsonl
+whisperlab transcribe archive/ --manifest archive.jsonl --shard 0 --shards 4
+whisperlab serve --port 8765
+whisperlab coordinate /mnt/spool archive/ -o results.jsonl
+whisperlab worker /mnt/spool
+whisperlab transcribe clip.wav --server http://127.0.0.1:8765
+whisperlab bench tests/data -o bench.json
+whisperlab bench tests/data --baseline bench.json
+whisperlab bench tests/data -m base --precision int8-dynamic --precision bf16
+whisperlab bench tests/data --conversion-hours 2
 """
 
+import json
 import logging
+from pathlib import Path
+import sys
 
 import click
 
 from whisperlab import VERSION
-from whisperlab.transcribe import (
-    transcribe as transcription_use_case,
-    TRANSCRIPTION_MODELS,
+from whisperlab.client import DEFAULT_SERVER, TranscriptionClient
+from whisperlab.defaults import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_BENCH_MODEL,
+    DEFAULT_LEASE_SECONDS,
+    DEFAULT_MAX_LONG_JOBS,
+    DEFAULT_MAX_WAIT_MS,
+    DEFAULT_POOL,
+    DEFAULT_PRECISION,
+    DEFAULT_QUEUE_SIZE,
+    DEFAULT_REPEATS,
+    DEFAULT_SUBTITLE_FORMAT,
+    DEFAULT_TOLERANCE,
     DEFAULT_TRANSCRIPTION_MODEL,
-    TranscribeTask,
+    DEFAULT_WORKERS,
+    POOLS,
+    PRECISIONS,
+    STANDIN_MODEL,
+    SUBTITLE_FORMATS,
+    TRANSCRIPTION_MODELS,
 )
 import whisperlab.logging
 
+# The commands import whisper and torch when they run, so that --help and
+# --version start quickly
+
+
 # Logging =====================================================================
 
 
@@ -35,6 +73,8 @@ log = whisperlab.logging.config_log()
 
 # Validators
 ExistingFile = click.Path(exists=True, dir_okay=False)
+OutputFile = click.File("w")
+InputFile = click.File("r")
 
 # CLI Commands ================================================================
 
@@ -48,7 +88,7 @@ def cli():
 
 # Transcribe Command
 @cli.command()
-@click.argument("audio_file", type=ExistingFile)
+@click.argument("audio_files", nargs=-1, required=True)
 @click.option(
     "-m",
     "--model",
@@ -56,16 +96,539 @@ def cli():
     default=DEFAULT_TRANSCRIPTION_MODEL,
     help="The transcription model to use",
 )
-def transcribe(audio_file: str, model: str):
+@click.option(
+    "--precision",
+    type=click.Choice(PRECISIONS),
+    default=DEFAULT_PRECISION,
+    help="The inference precision (int8-dynamic runs on the CPU only)",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=DEFAULT_WORKERS,
+    help="The number of files to transcribe at once",
+)
+@click.option(
+    "--pool",
+    type=click.Choice(POOLS),
+    default=DEFAULT_POOL,
+    help="Run workers as threads (one shared model) or processes",
+)
+@click.option(
+    "--cores",
+    type=click.IntRange(min=1),
+    default=None,
+    help="The cores the workers share. Defaults to all available cores.",
+)
+@click.option(
+    "--threads-per-worker",
+    type=click.IntRange(min=1),
+    default=None,
+    help="The torch and BLAS threads of each worker process. Defaults to an "
+    "even share of the cores.",
+)
+@click.option(
+    "--pin/--no-pin",
+    default=False,
+    help="Pin each worker process to its own cores",
+)
+@click.option(
+    "--calibrate/--no-calibrate",
+    default=False,
+    help="Transcribe the first file alone, to measure the parallel efficiency "
+    "of the workers against one",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=OutputFile,
+    default=None,
+    help="Write one JSON line per transcribed file",
+)
+@click.option(
+    "--cache/--no-cache",
+    default=False,
+    help="Reuse results for audio transcribed before with the same settings",
+)
+@click.option(
+    "--vad/--no-vad",
+    default=False,
+    help="Skip silences, transcribing only the detected speech",
+)
+@click.option(
+    "--subtitles",
+    type=click.Path(file_okay=False, writable=True),
+    default=None,
+    help="Align every word, and write each file's timings to this directory",
+)
+@click.option(
+    "--subtitle-format",
+    type=click.Choice(SUBTITLE_FORMATS),
+    default=DEFAULT_SUBTITLE_FORMAT,
+    help="The format of the subtitle files",
+)
+@click.option(
+    "--manifest",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="Record progress in this JSONL manifest, and skip or resume the "
+    "files it records",
+)
+@click.option(
+    "--shard",
+    type=click.IntRange(min=0),
+    default=0,
+    help="The shard of the manifest's files to transcribe on this host",
+)
+@click.option(
+    "--shards",
+    type=click.IntRange(min=1),
+    default=1,
+    help="The number of hosts sharing the manifest",
+)
+@click.option(
+    "--metrics",
+    type=OutputFile,
+    default=None,
+    help="Trace each stage, and write the metrics (Prometheus text, or JSON "
+    "for a .json file)",
+)
+@click.option(
+    "--server",
+    default=None,
+    help=f"Send the files to this transcription server, e.g. {DEFAULT_SERVER}. "
+    "It answers short clips with one greedily decoded segment.",
+)
+def transcribe(
+    audio_files: tuple[str],
+    model: str,
+    precision: str,
+    workers: int,
+    pool: str,
+    cores: int,
+    threads_per_worker: int,
+    pin: bool,
+    calibrate: bool,
+    output,
+    cache: bool,
+    vad: bool,
+    subtitles: str,
+    subtitle_format: str,
+    manifest: str,
+    shard: int,
+    shards: int,
+    metrics,
+    server: str,
+):
     """
-    Transcribe an audio file.
+    Transcribe audio files, directories or glob patterns.
 
     Args:
-        audio_file (str): The audio file to transcribe
+        audio_files (tuple[str]): The audio files, directories or globs
         model (str): The transcription model to use
+        precision (str): The inference precision
+        workers (int): The number of workers
+        pool (str): The kind of worker pool
+        cores (int): The cores the workers share
+        threads_per_worker (int): The threads of each worker process
+        pin (bool): Whether to pin workers to their cores
+        calibrate (bool): Whether to measure the throughput of one worker
+        output (TextIO): The JSONL results file
+        cache (bool): Whether to use the result cache
+        vad (bool): Whether to transcribe only the detected speech
+        subtitles (str): The directory of the subtitle files
+        subtitle_format (str): The format of the subtitle files
+        manifest (str): The manifest file
+        shard (int): The shard of this host
+        shards (int): The number of shards
+        metrics (TextIO): The metrics file
+        server (str): The transcription server address, if any
     """
-    transcription_task = TranscribeTask(audio_file=audio_file, model=model)
-    transcription_use_case(transcription_task)
+    import whisperlab.tracing
+    from whisperlab.bulk import expand_paths, transcribe_bulk
+    from whisperlab.manifest import Manifest
+    from whisperlab.resources import ResourceConfig
+
+    if metrics is not None:
+        whisperlab.tracing.enable()
+
+    # Use the server as a thin client
+    if server is not None:
+        if not TranscriptionClient(server).available():
+            raise click.BadParameter(f"No server at {server}", param_hint="--server")
+        log.info("Transcribing on the server at %s", server)
+
+    try:
+        paths = expand_paths(audio_files)
+    except FileNotFoundError as e:
+        raise click.BadParameter(str(e), param_hint="AUDIO_FILES")
+
+    resources = ResourceConfig(
+        workers=workers, threads_per_worker=threads_per_worker, pin=pin
+    )
+    if cores is not None:
+        resources = resources.model_copy(update={"cores": cores})
+
+    if subtitles is not None:
+        subtitles = Path(subtitles)
+        subtitles.mkdir(parents=True, exist_ok=True)
+
+    if shard >= shards:
+        raise click.BadParameter(f"Not in [0, {shards})", param_hint="--shard")
+    if manifest is not None:
+        manifest = Manifest(Path(manifest), shard=shard, shards=shards)
+    elif shards > 1:
+        raise click.BadParameter("Sharding needs a manifest", param_hint="--shards")
+
+    summary = transcribe_bulk(
+        paths,
+        model=model,
+        workers=workers,
+        pool=pool,
+        output=output,
+        cache=cache,
+        vad=vad,
+        server=server,
+        precision=precision,
+        resources=resources,
+        subtitles=subtitles,
+        subtitle_format=subtitle_format,
+        manifest=manifest,
+        calibrate=calibrate,
+    )
+    if metrics is not None:
+        format = "json" if metrics.name.endswith(".json") else "prometheus"
+        whisperlab.tracing.METRICS.write(metrics, format)
+    if summary.failed:
+        sys.exit(1)
+
+
+# Serve Command
+@cli.command()
+@click.option(
+    "-m",
+    "--model",
+    type=click.Choice([STANDIN_MODEL, *TRANSCRIPTION_MODELS]),
+    default=DEFAULT_TRANSCRIPTION_MODEL,
+    help="The default transcription model",
+)
+@click.option(
+    "--precision",
+    type=click.Choice(PRECISIONS),
+    default=DEFAULT_PRECISION,
+    help="The inference precision (int8-dynamic runs on the CPU only)",
+)
+@click.option("--host", default="127.0.0.1", help="The TCP host")
+@click.option(
+    "--port",
+    type=click.IntRange(min=0, max=65535),
+    default=None,
+    help="Serve over TCP on this port, instead of a Unix socket",
+)
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="The Unix socket path",
+)
+@click.option(
+    "--queue-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_QUEUE_SIZE,
+    help="Requests that can wait for the model before the server is busy",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_BATCH_SIZE,
+    help="Segments per batched forward pass",
+)
+@click.option(
+    "--max-wait-ms",
+    type=click.FloatRange(min=0),
+    default=DEFAULT_MAX_WAIT_MS,
+    help="How long a batch waits for more requests",
+)
+@click.option(
+    "--max-long-jobs",
+    type=click.IntRange(min=1),
+    default=DEFAULT_MAX_LONG_JOBS,
+    help="Long files that can be in flight before the server is busy",
+)
+@click.option(
+    "--preload/--no-preload",
+    default=True,
+    help="Load the model before accepting requests",
+)
+def serve(
+    model: str,
+    precision: str,
+    host: str,
+    port: int,
+    socket_path: str,
+    queue_size: int,
+    batch_size: int,
+    max_wait_ms: float,
+    max_long_jobs: int,
+    preload: bool,
+):
+    """
+    Serve transcriptions from a warm model, until interrupted.
+
+    Args:
+        model (str): The default transcription model
+        precision (str): The default inference precision
+        host (str): The TCP host
+        port (int): The TCP port
+        socket_path (str): The Unix socket path
+        queue_size (int): The request queue size
+        batch_size (int): Segments per batched forward pass
+        max_wait_ms (float): How long a batch waits for more requests
+        max_long_jobs (int): Long files in flight before the server is busy
+        preload (bool): Whether to load the model at startup
+    """
+    from whisperlab.server import serve as run_server
+
+    run_server(
+        model=model,
+        host=host,
+        port=port,
+        socket_path=socket_path,
+        queue_size=queue_size,
+        batch_size=batch_size,
+        max_wait_ms=max_wait_ms,
+        max_long_jobs=max_long_jobs,
+        warm=preload,
+        precision=precision,
+    )
+
+
+# Coordinate Command
+@cli.command()
+@click.argument("spool", type=click.Path(file_okay=False))
+@click.argument("audio_files", nargs=-1, required=True)
+@click.option(
+    "-m",
+    "--model",
+    type=click.Choice([STANDIN_MODEL, *TRANSCRIPTION_MODELS]),
+    default=DEFAULT_TRANSCRIPTION_MODEL,
+    help="The transcription model the workers use",
+)
+@click.option(
+    "--precision",
+    type=click.Choice(PRECISIONS),
+    default=DEFAULT_PRECISION,
+    help="The inference precision (int8-dynamic runs on the CPU only)",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=OutputFile,
+    default=None,
+    help="Write one JSON line per transcribed file",
+)
+@click.option(
+    "--lease",
+    type=click.FloatRange(min=0, min_open=True),
+    default=DEFAULT_LEASE_SECONDS,
+    help="Give a chunk to another worker after this many seconds without a "
+    "heartbeat",
+)
+@click.option(
+    "--stop-workers/--keep-workers",
+    default=True,
+    help="Stop the workers once every file is transcribed",
+)
+def coordinate(
+    spool: str,
+    audio_files: tuple[str],
+    model: str,
+    precision: str,
+    output,
+    lease: float,
+    stop_workers: bool,
+):
+    """
+    Split audio files into chunks for workers sharing a spool directory.
+
+    Args:
+        spool (str): The spool directory, shared with the workers
+        audio_files (tuple[str]): The audio files, directories or globs
+        model (str): The transcription model to use
+        precision (str): The inference precision
+        output (TextIO): The JSONL results file
+        lease (float): The seconds a chunk may go without a heartbeat
+        stop_workers (bool): Whether to stop the workers at the end
+    """
+    from whisperlab.bulk import expand_paths, make_record
+    from whisperlab.distributed import Coordinator
+    from whisperlab.time import time_ms
+
+    try:
+        paths = expand_paths(audio_files)
+    except FileNotFoundError as e:
+        raise click.BadParameter(str(e), param_hint="AUDIO_FILES")
+
+    start_time = time_ms()
+    coordinator = Coordinator(Path(spool), lease_seconds=lease)
+    for path in paths:
+        coordinator.submit(path, model, precision=precision)
+
+    failed = 0
+    try:
+        for audio_file, result in coordinator.results():
+            log.info("Transcription of %s:\n%s", audio_file, result["text"])
+            failed += result["error"] is not None
+            if output is not None:
+                record = make_record(
+                    audio_file, model, result, start_time, result["error"]
+                )
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+    finally:
+        if stop_workers:
+            coordinator.stop()
+    log.info(
+        "Transcribed %s files (%s failed), requeueing %s chunks",
+        len(paths),
+        failed,
+        coordinator.requeued,
+    )
+    if failed:
+        sys.exit(1)
+
+
+# Worker Command
+@cli.command()
+@click.argument("spool", type=click.Path(file_okay=False))
+def worker(spool: str):
+    """
+    Transcribe the chunks of a spool directory until the coordinator stops.
+
+    Args:
+        spool (str): The spool directory, shared with the coordinator
+    """
+    from whisperlab.distributed import SpoolWorker
+
+    SpoolWorker(Path(spool)).run()
+
+
+# Bench Command
+@cli.command()
+@click.argument("audio_files", nargs=-1)
+@click.option(
+    "-m",
+    "--model",
+    type=click.Choice([STANDIN_MODEL, *TRANSCRIPTION_MODELS]),
+    default=DEFAULT_BENCH_MODEL,
+    help="The model for the model stages (standin runs offline)",
+)
+@click.option(
+    "--precision",
+    "precisions",
+    type=click.Choice(PRECISIONS),
+    multiple=True,
+    help="Compare the speed and WER of this precision with fp32 (repeatable)",
+)
+@click.option(
+    "--conversion-hours",
+    type=click.FloatRange(min=0),
+    default=0,
+    help="Also time sample conversions over this many hours of audio",
+)
+@click.option(
+    "-r",
+    "--repeats",
+    type=click.IntRange(min=1),
+    default=DEFAULT_REPEATS,
+    help="Timed runs per stage",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=OutputFile,
+    default=None,
+    help="Write the results as JSON",
+)
+@click.option(
+    "--baseline",
+    type=InputFile,
+    default=None,
+    help="Fail if a stage is slower than in these stored JSON results",
+)
+@click.option(
+    "--tolerance",
+    type=click.FloatRange(min=0),
+    default=DEFAULT_TOLERANCE,
+    help="The allowed slowdown from the baseline, e.g. 0.25 for 25%",
+)
+def bench(
+    audio_files: tuple[str],
+    model: str,
+    precisions: tuple[str],
+    conversion_hours: float,
+    repeats: int,
+    output,
+    baseline,
+    tolerance: float,
+):
+    """
+    Time each stage of the transcription pipeline.
+
+    Args:
+        audio_files (tuple[str]): The audio files, directories or globs.
+            Defaults to tests/data.
+        model (str): The model for the model stages
+        precisions (tuple[str]): The precisions to compare with fp32
+        conversion_hours (float): The audio length to time conversions over
+        repeats (int): Timed runs per stage
+        output (TextIO): The JSON results file
+        baseline (TextIO): The JSON results to compare with
+        tolerance (float): The allowed relative slowdown
+    """
+    from whisperlab.bench import (
+        BenchmarkResults,
+        compare,
+        format_results,
+        run_benchmark,
+    )
+    from whisperlab.bulk import expand_paths
+
+    try:
+        paths = expand_paths(audio_files or ["tests/data"])
+    except FileNotFoundError as e:
+        raise click.BadParameter(str(e), param_hint="AUDIO_FILES")
+
+    results = run_benchmark(
+        paths,
+        model=model,
+        repeats=repeats,
+        precisions=precisions,
+        conversion_hours=conversion_hours,
+    )
+    if output is not None:
+        output.write(results.model_dump_json(indent=2))
+
+    stored = None
+    if baseline is not None:
+        stored = BenchmarkResults.model_validate_json(baseline.read())
+    click.echo(format_results(results, stored))
+
+    if stored is not None:
+        regressions = compare(results, stored, tolerance)
+        for regression in regressions:
+            log.error(
+                "Regression: %s %s took %.1f ms, %.2fx the baseline %.1f ms",
+                regression.file,
+                regression.stage,
+                regression.current_ms,
+                regression.slowdown,
+                regression.baseline_ms,
+            )
+        if regressions:
+            sys.exit(1)
 
 
 # Run the CLI =================================================================
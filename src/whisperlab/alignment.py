@@ -0,0 +1,537 @@
+"""
+Word Alignment Module
+
+This module times every word of a transcription from the model's
+cross-attention, in batched passes, and writes the timings as SRT, WebVTT
+or JSON.
+
+Whisper's word timestamps align each 30 second segment on its own: one
+decoder pass, one set of attention weights and a list of word dicts per
+segment. Here the segments of a whole file are aligned in batches instead:
+
+1. The result's segments are grouped into windows of up to 30 seconds.
+2. Each batch of windows runs one forward pass, keeping only the
+   cross-attention of the model's alignment heads.
+3. The weights are normalized and median filtered as one tensor.
+4. Each window's token-to-frame path is found by dynamic time warping.
+   This recursion is sequential, so it runs per window, compiled.
+
+The timings are kept as columns (WordTimings): one array each for the
+starts, ends, confidences and segments of the words, which the writers
+format without building a dict per word.
+
+Usage Examples:
+    >>> timings = align_words(model, samples, result)
+    >>> timings.start[:3], timings.words[:3]
+    >>> write_subtitles(timings, Path("talk.srt"), "srt")
+"""
+
+import json
+from pathlib import Path
+from typing import Optional, TextIO
+
+import numba
+import numpy as np
+import torch
+import whisper
+from whisper.model import disable_sdpa
+from whisper.timing import backtrace, median_filter
+from whisper.tokenizer import get_tokenizer, Tokenizer
+
+import whisperlab.logging
+from whisperlab.audio import SAMPLES_PER_SECOND
+from whisperlab.defaults import (  # noqa: F401
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_SUBTITLE_FORMAT,
+    SUBTITLE_FORMATS,
+)
+from whisperlab.mel import log_mel_batch, stack_segments
+from whisperlab.models import model_lock
+from whisperlab.tracing import span
+
+
+log = whisperlab.logging.config_log()
+
+# Constants ===================================================================
+
+WINDOW_SAMPLES = whisper.audio.N_SAMPLES  # 30 seconds, the model's context
+TOKENS_PER_SECOND = whisper.audio.TOKENS_PER_SECOND  # Attention frames
+
+MEDFILT_WIDTH = 7  # Frames of the median filter over the attention weights
+QK_SCALE = 1.0  # Scale of the attention logits
+
+# Punctuation merged into the next word, and into the previous word
+PREPEND_PUNCTUATIONS = "\"'“¿([{-"
+APPEND_PUNCTUATIONS = "\"'.。,，!！?？:：”)]}、"
+
+MAX_CUE_WORDS = 12  # Words per subtitle cue
+
+
+# Models ======================================================================
+
+
+class WordTimings:
+    """
+    Word timings, as columns.
+
+    Args:
+        words (list[str]): The words, with their leading spaces
+        start (np.ndarray): float32 start times, in seconds
+        end (np.ndarray): float32 end times, in seconds
+        confidence (np.ndarray): float32 mean probabilities of the words'
+            tokens
+        segment (np.ndarray): int32 index of each word's result segment
+    """
+
+    def __init__(
+        self,
+        words: list[str],
+        start: np.ndarray,
+        end: np.ndarray,
+        confidence: np.ndarray,
+        segment: np.ndarray,
+    ):
+        self.words = words
+        self.start = np.asarray(start, np.float32)
+        self.end = np.asarray(end, np.float32)
+        self.confidence = np.asarray(confidence, np.float32)
+        self.segment = np.asarray(segment, np.int32)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    @classmethod
+    def concatenate(cls, parts: list["WordTimings"]) -> "WordTimings":
+        """Join the timings of consecutive windows."""
+        return cls(
+            [word for part in parts for word in part.words],
+            np.concatenate([np.zeros(0), *(part.start for part in parts)]),
+            np.concatenate([np.zeros(0), *(part.end for part in parts)]),
+            np.concatenate([np.zeros(0), *(part.confidence for part in parts)]),
+            np.concatenate([np.zeros(0), *(part.segment for part in parts)]),
+        )
+
+    def to_dict(self) -> dict:
+        """Get the JSON-serializable columns. Times are rounded to ms."""
+        return {
+            "words": self.words,
+            "start": np.round(self.start, 3).tolist(),
+            "end": np.round(self.end, 3).tolist(),
+            "confidence": np.round(self.confidence, 3).tolist(),
+            "segment": self.segment.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, columns: dict) -> "WordTimings":
+        """Load the columns of to_dict()."""
+        return cls(
+            columns["words"],
+            columns["start"],
+            columns["end"],
+            columns["confidence"],
+            columns["segment"],
+        )
+
+
+# Helpers =====================================================================
+
+
+def alignment_windows(segments: list[dict]) -> list[tuple[float, list[int]]]:
+    """
+    Group consecutive segments into windows of up to 30 seconds.
+
+    Args:
+        segments (list[dict]): Result segments, with start and end times
+
+    Returns:
+        list[tuple[float, list[int]]]: The (start time, segment indices) of
+            each window
+    """
+    window_seconds = WINDOW_SAMPLES / SAMPLES_PER_SECOND
+    windows = []
+    for index, segment in enumerate(segments):
+        if not windows or segment["end"] - windows[-1][0] > window_seconds:
+            windows.append((segment["start"], []))
+        windows[-1][1].append(index)
+    return windows
+
+
+def merge_punctuations(words: list[str]) -> tuple[list[str], np.ndarray]:
+    """
+    Merge punctuation words into their neighbours, as whisper does.
+
+    Args:
+        words (list[str]): The words of a window
+
+    Returns:
+        tuple[list[str], np.ndarray]: The merged words, and the index of
+            each merged word in `words`, whose timing it keeps
+    """
+    words = list(words)
+    # Opening punctuation joins the following word
+    following = len(words) - 1
+    for i in range(len(words) - 2, -1, -1):
+        if words[i].startswith(" ") and words[i].strip() in PREPEND_PUNCTUATIONS:
+            words[following] = words[i] + words[following]
+            words[i] = ""
+        else:
+            following = i
+    # Closing punctuation joins the preceding word
+    previous = 0
+    for i in range(1, len(words)):
+        if not words[previous].endswith(" ") and words[i] in APPEND_PUNCTUATIONS:
+            words[previous] = words[previous] + words[i]
+            words[i] = ""
+        else:
+            previous = i
+    keep = np.flatnonzero([bool(word) for word in words])
+    return [words[i] for i in keep], keep
+
+
+def window_tokens(
+    tokenizer: Tokenizer, segments: list[dict], indices: list[int]
+) -> tuple[list[int], np.ndarray]:
+    """Tokenize a window's segments. Returns the tokens and segment ends."""
+    tokens = []
+    ends = []
+    for index in indices:
+        tokens += tokenizer.encode(segments[index]["text"])
+        ends.append(len(tokens))
+    return tokens, np.array(ends)
+
+
+# Alignment ===================================================================
+
+
+@numba.njit
+def dtw(x: np.ndarray) -> np.ndarray:
+    """
+    Find the cheapest monotonic path through a (tokens, frames) cost matrix.
+
+    This is whisper's CPU dtw, compiled without numba's parallel threading
+    layer: its threads do not survive a fork, which hangs process pools
+    started after an alignment.
+
+    Returns:
+        np.ndarray: The (2, steps) token and frame indices of the path
+    """
+    rows, columns = x.shape
+    cost = np.full((rows + 1, columns + 1), np.inf, np.float32)
+    trace = -np.ones((rows + 1, columns + 1), np.float32)
+    cost[0, 0] = 0
+    for j in range(1, columns + 1):
+        for i in range(1, rows + 1):
+            c0 = cost[i - 1, j - 1]
+            c1 = cost[i - 1, j]
+            c2 = cost[i, j - 1]
+            if c0 < c1 and c0 < c2:
+                c, t = c0, 0
+            elif c1 < c0 and c1 < c2:
+                c, t = c1, 1
+            else:
+                c, t = c2, 2
+            cost[i, j] = x[i - 1, j - 1] + c
+            trace[i, j] = t
+    return backtrace(trace)
+
+
+def attention_weights(
+    model, mel: torch.Tensor, tokens: torch.Tensor
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Run the decoder on a batch, keeping the alignment heads' attention.
+
+    Args:
+        model (whisper.model.Whisper): The model
+        mel (torch.Tensor): (N, n_mels, 3000) log-mel spectrograms
+        tokens (torch.Tensor): (N, tokens) token sequences
+
+    Returns:
+        tuple[torch.Tensor, torch.Tensor]: The (N, heads, tokens, 1500)
+            attention logits of the alignment heads, and the (N, tokens,
+            vocabulary) logits
+    """
+    heads = model.alignment_heads.to_dense().nonzero().tolist()
+    layer_heads = {}
+    for layer, head in heads:
+        layer_heads.setdefault(layer, []).append(head)
+
+    # Each hook keeps only its layer's alignment heads
+    qks = {}
+    hooks = [
+        model.decoder.blocks[layer].cross_attn.register_forward_hook(
+            lambda _, ins, outs, layer=layer, index=index: qks.__setitem__(
+                layer, outs[-1][:, index]
+            )
+        )
+        for layer, index in layer_heads.items()
+    ]
+    try:
+        with torch.no_grad(), disable_sdpa():
+            logits = model(mel, tokens)
+    finally:
+        for hook in hooks:
+            hook.remove()
+
+    weights = torch.cat([qks[layer] for layer in sorted(layer_heads)], dim=1)
+    return weights, logits
+
+
+def align_batch(
+    model,
+    tokenizer: Tokenizer,
+    audio: list[np.ndarray],
+    texts: list[list[int]],
+) -> list[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Align the tokens of a batch of windows of the same length.
+
+    Args:
+        model (whisper.model.Whisper): The model
+        tokenizer (Tokenizer): The tokenizer of the transcription
+        audio (list[np.ndarray]): The windows' samples, of equal lengths
+        texts (list[list[int]]): The text tokens of each window
+
+    Returns:
+        list[tuple[np.ndarray, np.ndarray, np.ndarray]]: For each window,
+            the start and end time of each text token, in seconds from the
+            window start, and its probability
+    """
+    prefix = [*tokenizer.sot_sequence, tokenizer.no_timestamps]
+    longest = max(len(text) for text in texts)
+    tokens = np.full((len(texts), len(prefix) + longest + 1), tokenizer.eot)
+    targets = np.zeros((len(texts), longest), np.int64)
+    for row, text in enumerate(texts):
+        tokens[row, : len(prefix) + len(text)] = prefix + text
+        targets[row, : len(text)] = text
+
+    with span("mel", segments=len(audio)):
+        mel = log_mel_batch(stack_segments(audio), model.dims.n_mels, model.device)
+    with span("inference"), model_lock(model):
+        weights, logits = attention_weights(
+            model, mel, torch.from_numpy(tokens).to(model.device)
+        )
+
+    # The probability of each text token, from the logits at the token before
+    logits = logits[:, len(prefix) - 1 : len(prefix) - 1 + longest, : tokenizer.eot]
+    targets = torch.from_numpy(targets).to(logits.device)
+    target_logits = logits.gather(-1, targets[..., None])[..., 0]
+    probabilities = (target_logits - logits.float().logsumexp(-1)).exp().cpu()
+
+    # Normalize each head's weights over the window's tokens, then smooth them
+    frames = len(audio[0]) // whisper.audio.HOP_LENGTH // 2
+    weights = (weights[..., :frames].float() * QK_SCALE).softmax(dim=-1)
+    lengths = torch.tensor(
+        [len(prefix) + len(text) + 1 for text in texts], device=weights.device
+    )
+    positions = torch.arange(tokens.shape[1], device=weights.device)
+    mask = (positions < lengths[:, None]).to(weights)
+    mask = mask[:, None, :, None]
+    count = lengths.to(weights)[:, None, None, None]
+    mean = (weights * mask).sum(dim=-2, keepdim=True) / count
+    std = ((((weights - mean) * mask) ** 2).sum(dim=-2, keepdim=True) / count).sqrt()
+    weights = median_filter((weights - mean) / std, MEDFILT_WIDTH)
+    matrix = weights.mean(dim=1)
+
+    aligned = []
+    for row, text in enumerate(texts):
+        # The no-timestamps token and the text tokens, as whisper aligns them
+        path = matrix[row, len(prefix) - 1 : len(prefix) + len(text)]
+        text_indices, time_indices = dtw(-path.double().cpu().numpy())
+        jumps = np.pad(np.diff(text_indices), (1, 0), constant_values=1).astype(bool)
+        jump_times = time_indices[jumps] / TOKENS_PER_SECOND
+        aligned.append(
+            (
+                jump_times[: len(text)],
+                jump_times[1 : len(text) + 1],
+                probabilities[row, : len(text)].numpy(),
+            )
+        )
+    return aligned
+
+
+def window_words(
+    tokenizer: Tokenizer,
+    tokens: list[int],
+    segment_ends: np.ndarray,
+    token_times: tuple[np.ndarray, np.ndarray, np.ndarray],
+) -> tuple[list[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Split a window's aligned tokens into timed words."""
+    words, word_tokens = tokenizer.split_to_word_tokens(tokens + [tokenizer.eot])
+    words, word_tokens = words[:-1], word_tokens[:-1]  # Without the eot
+    bounds = np.cumsum([0] + [len(item) for item in word_tokens])
+    starts, ends, probabilities = token_times
+
+    first, last = bounds[:-1], bounds[1:] - 1
+    confidence = np.add.reduceat(probabilities, first) / np.diff(bounds)
+    segment = np.searchsorted(segment_ends, first, side="right")
+
+    words, keep = merge_punctuations(words)
+    return (
+        words,
+        starts[first[keep]],
+        ends[last[keep]],
+        confidence[keep],
+        segment[keep],
+    )
+
+
+def align_words(
+    model,
+    samples: np.ndarray,
+    result: dict,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    language: Optional[str] = None,
+) -> WordTimings:
+    """
+    Time the words of a transcription, in batched passes.
+
+    Args:
+        model (whisper.model.Whisper): The model that transcribed the audio
+        samples (np.ndarray): The transcribed float32 16 kHz samples
+        result (dict): The transcription, with timed segments
+        batch_size (int): Windows per forward pass
+        language (str): The transcription language. Defaults to the
+            result's language.
+
+    Returns:
+        WordTimings: The timings of the words, in order
+    """
+    segments = result.get("segments", [])
+    tokenizer = get_tokenizer(
+        model.is_multilingual,
+        num_languages=model.num_languages,
+        language=language or result.get("language") or "en",
+        task="transcribe",
+    )
+
+    # Tokenize the windows, and drop the ones without text or audio
+    windows = []
+    for start_time, indices in alignment_windows(segments):
+        tokens, segment_ends = window_tokens(tokenizer, segments, indices)
+        start = int(start_time * SAMPLES_PER_SECOND)
+        audio = samples[start : start + WINDOW_SAMPLES]
+        if tokens and len(audio) >= 2 * whisper.audio.HOP_LENGTH:
+            windows.append((start_time, audio, tokens, indices, segment_ends))
+
+    # Windows of equal length share batches
+    groups = {}
+    for i, window in enumerate(windows):
+        groups.setdefault(len(window[1]), []).append(i)
+    aligned = [None] * len(windows)
+    for group in groups.values():
+        for batch_start in range(0, len(group), batch_size):
+            batch = group[batch_start : batch_start + batch_size]
+            batch_times = align_batch(
+                model,
+                tokenizer,
+                [windows[i][1] for i in batch],
+                [windows[i][2] for i in batch],
+            )
+            for i, token_times in zip(batch, batch_times):
+                aligned[i] = token_times
+
+    parts = []
+    for (start_time, _, tokens, indices, segment_ends), token_times in zip(
+        windows, aligned
+    ):
+        words, starts, ends, confidence, segment = window_words(
+            tokenizer, tokens, segment_ends, token_times
+        )
+        parts.append(
+            WordTimings(
+                words,
+                starts + start_time,
+                ends + start_time,
+                confidence,
+                np.asarray(indices)[segment],
+            )
+        )
+    timings = WordTimings.concatenate(parts)
+    log.debug("Aligned %s words in %s windows", len(timings), len(windows))
+    return timings
+
+
+# Writers =====================================================================
+
+
+def format_timestamps(seconds: np.ndarray, decimal: str = ",") -> list[str]:
+    """Format times as HH:MM:SS,mmm (or with a '.' decimal, for WebVTT)."""
+    ms = np.rint(np.asarray(seconds, np.float64) * 1000).astype(np.int64)
+    hours, ms = np.divmod(ms, 3_600_000)
+    minutes, ms = np.divmod(ms, 60_000)
+    secs, ms = np.divmod(ms, 1000)
+    return [
+        f"{h:02d}:{m:02d}:{s:02d}{decimal}{x:03d}"
+        for h, m, s, x in zip(
+            hours.tolist(), minutes.tolist(), secs.tolist(), ms.tolist()
+        )
+    ]
+
+
+def cue_bounds(timings: WordTimings, max_words: int = MAX_CUE_WORDS) -> np.ndarray:
+    """
+    Split the words into subtitle cues.
+
+    A cue holds up to `max_words` words of one segment.
+
+    Returns:
+        np.ndarray: The index of each cue's first word, and the word count
+    """
+    index = np.arange(len(timings))
+    new_segment = np.ones(len(timings), bool)
+    new_segment[1:] = timings.segment[1:] != timings.segment[:-1]
+    segment_start = np.maximum.accumulate(np.where(new_segment, index, 0))
+    starts = np.flatnonzero(new_segment | ((index - segment_start) % max_words == 0))
+    return np.append(starts, len(timings))
+
+
+def cues(timings: WordTimings, decimal: str) -> list[tuple[str, str, str]]:
+    """Get the (start, end, text) of each subtitle cue."""
+    bounds = cue_bounds(timings)
+    first, last = bounds[:-1], bounds[1:] - 1
+    starts = format_timestamps(timings.start[first], decimal)
+    ends = format_timestamps(timings.end[last], decimal)
+    texts = ["".join(timings.words[a:b]).strip() for a, b in zip(bounds, bounds[1:])]
+    return list(zip(starts, ends, texts))
+
+
+def write_srt(timings: WordTimings, file: TextIO):
+    """Write the timings as SubRip subtitles."""
+    for number, (start, end, text) in enumerate(cues(timings, ","), start=1):
+        file.write(f"{number}\n{start} --> {end}\n{text}\n\n")
+
+
+def write_vtt(timings: WordTimings, file: TextIO):
+    """Write the timings as WebVTT subtitles."""
+    file.write("WEBVTT\n\n")
+    for start, end, text in cues(timings, "."):
+        file.write(f"{start} --> {end}\n{text}\n\n")
+
+
+def write_json(timings: WordTimings, file: TextIO):
+    """Write the timings as JSON columns."""
+    json.dump(timings.to_dict(), file)
+
+
+WRITERS = {"srt": write_srt, "vtt": write_vtt, "json": write_json}
+
+
+def write_subtitles(
+    timings: WordTimings, path: Path, format: str = DEFAULT_SUBTITLE_FORMAT
+):
+    """
+    Write word timings to a file.
+
+    Args:
+        timings (WordTimings): The word timings
+        path (Path): The file to write
+        format (str): One of SUBTITLE_FORMATS
+
+    Raises:
+        ValueError: If the format is unknown
+    """
+    if format not in WRITERS:
+        raise ValueError(f"Unknown format: {format}. Choose from {SUBTITLE_FORMATS}")
+    with open(path, "w", encoding="utf-8") as file:
+        WRITERS[format](timings, file)
@@ -1,15 +1,57 @@
+import bisect
+import functools
+import hashlib
+import math
+import os
 from pathlib import Path
+import struct
+import subprocess
+import tempfile
+from typing import Callable, Iterable, Iterator, Optional
+import wave
 
 import numpy as np
-import pydub
 import whisper.audio
 
+from whisperlab.conversion import (  # noqa: F401
+    AudioOverflow,
+    DEFAULT_CHUNK_SAMPLES,
+    float_to_pcm,
+    in_range,
+    pack_int24,
+    pcm_to_float,
+    RAISE,
+)
+from whisperlab.tracing import span
 
 # Constants ===================================================================
 
 
 SAMPLES_PER_SECOND = 16_000  # Use whisper's 16 kHz framerate
 
+DEFAULT_BLOCK_SECONDS = 5  # Size of the blocks yielded by stream_audio
+
+DEFAULT_PCM_CACHE_BYTES = 4 * 1024**3  # 4 GiB of decoded audio (~18 hours)
+
+# Resampling filter: half-length in zero crossings of the lowpass sinc, the
+# cutoff as a fraction of the lower Nyquist rate, and the Kaiser window beta
+DEFAULT_ZERO_CROSSINGS = 32
+DEFAULT_ROLLOFF = 0.94
+DEFAULT_KAISER_BETA = 8.6
+
+# WAV (format code, bits per sample) that can be memory-mapped
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+WAV_DTYPES = {
+    (WAVE_FORMAT_PCM, 16): "<i2",
+    (WAVE_FORMAT_PCM, 32): "<i4",
+    (WAVE_FORMAT_IEEE_FLOAT, 32): "<f4",
+}
+
+# A speech detector maps samples to the (start, end) samples of speech
+SpeechDetector = Callable[[np.ndarray], list[tuple[int, int]]]
+
 
 # Exceptions ==================================================================
 
@@ -20,12 +62,6 @@ class EmptyFile(Exception):
     """
 
 
-class AudioOverflow(Exception):
-    """
-    Raised when an audio array contains samples outside [-1, 1]
-    """
-
-
 class EmptyArray(Exception):
     """
     Raised when an audio array is empty
@@ -38,6 +74,12 @@ class ArrayTypeError(Exception):
     """
 
 
+class DecodeError(Exception):
+    """
+    Raised when an audio file cannot be decoded
+    """
+
+
 # Validation ==================================================================
 
 
@@ -63,19 +105,25 @@ def ValidateAudioFile(audio_file: Path):
         raise EmptyFile(f"Audio file is empty: {audio_file}")
 
 
-def ValidateAudioArray(audio: np.ndarray, dtype=np.float32):
+def ValidateAudioArray(audio: np.ndarray, dtype=np.float32, check_range=True):
     """
     Validate that the audio array:
     - is not empty
     - is the correct type
     - does not contain samples outside [-1, 1]
 
+    The range check is a chunked min / max reduction, so no temporary
+    arrays are allocated.
+
     Args:
         audio (np.ndarray): The audio array to validate
+        dtype (np.dtype): The expected sample type
+        check_range (bool): Whether to check the sample range
 
     Raises:
         EmptyArray: If the audio array is empty
         ArrayTypeError: If the audio array is not the correct type
+        AudioOverflow: If a sample is outside [-1, 1], or NaN
     """
 
     # Verify that the audio array is not empty
@@ -86,32 +134,781 @@ def ValidateAudioArray(audio: np.ndarray, dtype=np.float32):
     if audio.dtype != dtype:
         raise ArrayTypeError(f"Audio array is not {dtype}: {audio}")
 
-    if np.any(np.abs(audio) > 1):
+    if check_range and not in_range(audio):
         raise AudioOverflow("Audio overflow")
 
 
+# Decoders ====================================================================
+
+
+def ffmpeg_blocks(
+    audio_file: Path, block_seconds: float = DEFAULT_BLOCK_SECONDS
+) -> Iterator[np.ndarray]:
+    """
+    Decode an audio file with ffmpeg, one block at a time.
+
+    Unlike whisper.load_audio, the decoded file is never held in memory at
+    once: ffmpeg's output is read from a pipe one block at a time.
+
+    Args:
+        audio_file (Path): The audio file to decode
+        block_seconds (float): The length of each block. The last block may
+            be shorter.
+
+    Yields:
+        np.ndarray: mono 16 kHz float32 samples in [-1, 1]
+
+    Raises:
+        DecodeError: If ffmpeg fails to decode the file
+    """
+    block_bytes = int(block_seconds * SAMPLES_PER_SECOND) * 2  # int16 samples
+
+    # fmt: off
+    command = [
+        "ffmpeg",
+        "-nostdin",
+        "-loglevel", "error",
+        "-threads", "0",
+        "-i", str(audio_file),
+        "-f", "s16le",
+        "-ac", "1",
+        "-acodec", "pcm_s16le",
+        "-ar", str(SAMPLES_PER_SECOND),
+        "-",
+    ]
+    # fmt: on
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while block := process.stdout.read(block_bytes):
+            yield pcm_to_float(np.frombuffer(block, np.int16))
+        if process.wait() != 0:
+            raise DecodeError(
+                f"Failed to decode {audio_file}: {process.stderr.read().decode()}"
+            )
+    finally:
+        # Stop ffmpeg if the consumer abandons the stream early
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def open_wav(audio_file: Path) -> Optional[np.memmap]:
+    """
+    Memory-map the samples of a 16 kHz PCM or float WAV file.
+
+    Nothing is read beyond the headers: samples are paged in as they are
+    used.
+
+    Args:
+        audio_file (Path): The audio file to map
+
+    Returns:
+        np.memmap: (frames, channels) samples, or None if the file is not
+            a WAV file this can map (e.g. another sample rate or codec)
+    """
+    with open(audio_file, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:] != b"WAVE":
+            return None
+
+        dtype = channels = None
+        while header := f.read(8):
+            if len(header) < 8:
+                return None
+            chunk_id, size = struct.unpack("<4sI", header)
+
+            if chunk_id == b"fmt ":
+                fmt = f.read(size + size % 2)
+                if len(fmt) < 16:
+                    return None
+                code, channels, rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+                if code == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                    code = struct.unpack("<H", fmt[24:26])[0]
+                dtype = WAV_DTYPES.get((code, bits))
+                if dtype is None or rate != SAMPLES_PER_SECOND:
+                    return None
+
+            elif chunk_id == b"data":
+                if dtype is None:
+                    return None
+                offset = f.tell()
+                available = audio_file.stat().st_size - offset
+                size = available if size == 0xFFFFFFFF else min(size, available)
+                frames = size // (np.dtype(dtype).itemsize * channels)
+                if frames == 0:
+                    return np.zeros((0, channels), dtype)
+                return np.memmap(
+                    audio_file, dtype, "r", offset, shape=(frames, channels)
+                )
+
+            else:
+                f.seek(size + size % 2, os.SEEK_CUR)
+
+    return None
+
+
+def array_blocks(
+    samples: np.ndarray, block_seconds: float = DEFAULT_BLOCK_SECONDS
+) -> Iterator[np.ndarray]:
+    """
+    Read mono 16 kHz float32 blocks from a (possibly mapped) sample array.
+
+    float32 mono blocks are views, so nothing is copied. Other arrays are
+    converted one block at a time.
+
+    Args:
+        samples (np.ndarray): (frames,) or (frames, channels) samples, as
+            float in [-1, 1] or as full-scale integers
+        block_seconds (float): The length of each block
+
+    Yields:
+        np.ndarray: mono 16 kHz float32 samples in [-1, 1]
+    """
+    block_samples = int(block_seconds * SAMPLES_PER_SECOND)
+    scale = None
+    if np.issubdtype(samples.dtype, np.integer):
+        scale = np.float32(1 / -np.iinfo(samples.dtype).min)
+
+    for start in range(0, len(samples), block_samples):
+        block = samples[start : start + block_samples]
+        if block.ndim == 2:
+            block = block.mean(axis=1, dtype=np.float32)
+        if scale is not None:
+            block = block * scale
+        yield np.asarray(block, np.float32)
+
+
+def buffer_samples(samples, sample_rate: int = SAMPLES_PER_SECOND) -> np.ndarray:
+    """
+    Get mono 16 kHz float32 samples from an in-memory array or buffer.
+
+    Mono 16 kHz float32 input is returned as is, as an array or a view of
+    the buffer, so nothing is copied or scanned. Other input is converted:
+    integers are scaled from full scale, channels are averaged, and other
+    rates are resampled.
+
+    Args:
+        samples (np.ndarray | buffer): (frames,) or (frames, channels)
+            samples: an array, or an object supporting the buffer protocol.
+            Untyped buffers (e.g. bytes) hold native float32 samples.
+        sample_rate (int): The sample rate
+
+    Returns:
+        np.ndarray: mono 16 kHz float32 samples
+    """
+    if not isinstance(samples, np.ndarray):
+        view = memoryview(samples)
+        if view.format in ("B", "b", "c"):
+            samples = np.frombuffer(view, np.float32)
+        else:
+            samples = np.asarray(view)
+    if np.issubdtype(samples.dtype, np.integer):
+        samples = pcm_to_float(samples)
+    if samples.ndim == 2:
+        samples = samples.mean(axis=1, dtype=np.float32)
+    return (
+        resample(samples, sample_rate) if sample_rate != SAMPLES_PER_SECOND else samples
+    )
+
+
+def file_fingerprint(audio_file: Path) -> str:
+    """Hash a file's resolved path, size and modification time."""
+    stat = audio_file.stat()
+    identity = f"{audio_file.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+class PCMCache:
+    """
+    An on-disk cache of decoded audio, stored as memory-mapped .npy files.
+
+    A file is decoded once. Later reads map the decoded samples instead of
+    running ffmpeg, and only the blocks being used are paged in.
+
+    Entries are keyed by the file's fingerprint, so an edited file is
+    decoded again. The cache is kept under a size cap by evicting the least
+    recently used entries.
+
+    Args:
+        directory (Path): Where the decoded audio is stored
+        max_bytes (int): The size cap for decoded audio
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = DEFAULT_PCM_CACHE_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def path(self, audio_file: Path) -> Path:
+        return self.directory / f"{file_fingerprint(audio_file)}.npy"
+
+    def load(self, audio_file: Path) -> Optional[np.ndarray]:
+        """
+        Map the decoded samples of a file.
+
+        Args:
+            audio_file (Path): The audio file
+
+        Returns:
+            np.ndarray: The read-only mapped samples, or None on a miss
+        """
+        path = self.path(audio_file)
+        try:
+            samples = np.load(path, mmap_mode="r")
+            os.utime(path)  # Mark as recently used
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        return samples
+
+    def store(
+        self, audio_file: Path, blocks: Iterable[np.ndarray]
+    ) -> Iterator[np.ndarray]:
+        """
+        Pass decoded blocks through, writing them to the cache.
+
+        The entry is only added once the stream is fully read. Blocks are
+        spooled to disk as they pass, so memory use stays at one block.
+
+        Args:
+            audio_file (Path): The decoded audio file
+            blocks (Iterable[np.ndarray]): Its float32 16 kHz blocks
+
+        Yields:
+            np.ndarray: The same blocks
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        descriptor, spool = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(descriptor, "wb") as f:
+                for block in blocks:
+                    f.write(np.asarray(block, np.float32).tobytes())
+                    yield block
+
+            # Rewrite the spooled samples with an .npy header, then publish it
+            count = os.path.getsize(spool) // np.dtype(np.float32).itemsize
+            descriptor, entry = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+            os.close(descriptor)
+            try:
+                output = np.lib.format.open_memmap(entry, "w+", np.float32, (count,))
+                if count:
+                    source = np.memmap(spool, np.float32, "r", shape=(count,))
+                    block_samples = DEFAULT_BLOCK_SECONDS * SAMPLES_PER_SECOND
+                    for start in range(0, count, block_samples):
+                        end = start + block_samples
+                        output[start:end] = source[start:end]
+                    del source
+                output.flush()
+                del output
+                os.replace(entry, self.path(audio_file))
+            except BaseException:
+                os.unlink(entry)
+                raise
+        finally:
+            os.unlink(spool)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until under the size cap."""
+        entries = []
+        for path in self.directory.glob("*.npy"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # Evicted by another process
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def stream_audio(
+    audio_file: Path,
+    block_seconds: float = DEFAULT_BLOCK_SECONDS,
+    cache: Optional[PCMCache] = None,
+) -> Iterator[np.ndarray]:
+    """
+    Decode an audio file as a stream of mono 16 kHz float32 blocks.
+
+    The full decoded file is never held in memory:
+    - 16 kHz WAV files are memory-mapped, without running ffmpeg.
+    - Files in the PCM cache are memory-mapped from the cache.
+    - Other files are decoded by ffmpeg one block at a time, and stored in
+      the PCM cache if one is given.
+
+    Args:
+        audio_file (Path): The audio file to decode
+        block_seconds (float): The length of each block. The last block may
+            be shorter.
+        cache (PCMCache): The decoded audio cache to use, if any
+
+    Yields:
+        np.ndarray: float32 samples in [-1, 1]
+
+    Raises:
+        DecodeError: If ffmpeg fails to decode the file
+    """
+    samples = open_wav(audio_file)
+    if samples is None and cache is not None:
+        samples = cache.load(audio_file)
+
+    if samples is not None:
+        yield from array_blocks(samples, block_seconds)
+    elif cache is not None:
+        yield from cache.store(audio_file, ffmpeg_blocks(audio_file, block_seconds))
+    else:
+        yield from ffmpeg_blocks(audio_file, block_seconds)
+
+
+def load_audio(audio_file: Path, cache: Optional[PCMCache] = None) -> np.ndarray:
+    """
+    Get all the samples of an audio file, mapped from disk where possible.
+
+    Args:
+        audio_file (Path): The audio file to load
+        cache (PCMCache): The decoded audio cache to use, if any
+
+    Returns:
+        np.ndarray: mono 16 kHz float32 samples in [-1, 1]
+    """
+    samples = open_wav(audio_file)
+    if samples is not None and samples.dtype == np.float32 and samples.shape[1] == 1:
+        return samples[:, 0]
+    if samples is None and cache is not None:
+        samples = cache.load(audio_file)
+        if samples is not None:
+            return samples
+    blocks = stream_audio(audio_file, cache=cache)
+    return np.concatenate([np.zeros(0, np.float32), *blocks])
+
+
+# Voice Activity Detection ====================================================
+
+
+def frame_energy_db(audio: np.ndarray, frame: int, hop: int) -> np.ndarray:
+    """
+    Get the mean power of each frame, in dB relative to full scale.
+
+    Frames are strided views of the audio, so no frame is copied.
+
+    Args:
+        audio (np.ndarray): float32 samples
+        frame (int): Samples per frame
+        hop (int): Samples between frame starts
+
+    Returns:
+        np.ndarray: One energy per frame
+    """
+    frames = np.lib.stride_tricks.sliding_window_view(audio, frame)[::hop]
+    power = np.einsum("ij,ij->i", frames, frames, dtype=np.float64) / frame
+    return 10 * np.log10(power + 1e-10)
+
+
+def frame_zero_crossing_rate(audio: np.ndarray, frame: int, hop: int) -> np.ndarray:
+    """
+    Get the fraction of sign changes in each frame.
+
+    Args:
+        audio (np.ndarray): float32 samples
+        frame (int): Samples per frame
+        hop (int): Samples between frame starts
+
+    Returns:
+        np.ndarray: One rate per frame, in [0, 1]
+    """
+    crossings = np.zeros(len(audio), np.int32)
+    np.cumsum(np.signbit(audio[1:]) != np.signbit(audio[:-1]), out=crossings[1:])
+    starts = np.arange(0, len(audio) - frame + 1, hop)
+    return (crossings[starts + frame - 1] - crossings[starts]) / frame
+
+
+def runs(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Get the (starts, ends) indices of the runs of True in a mask."""
+    edges = np.diff(mask.astype(np.int8), prepend=0, append=0)
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+class EnergyVAD:
+    """
+    A lightweight voice activity detector.
+
+    A frame is voiced when its energy is above an adaptive threshold and its
+    zero-crossing rate is below that of broadband noise. Voiced frames are
+    merged across short pauses, short bursts are dropped, and the speech
+    segments are padded so word onsets and tails are kept.
+
+    Detectors are pluggable: anything matching SpeechDetector can be used
+    instead, e.g. a neural VAD.
+
+    Args:
+        frame_ms (float): Analysis frame length
+        hop_ms (float): Time between frames
+        margin_db (float): Speech must be this far above the noise floor
+        min_threshold_db (float): The lowest energy threshold
+        max_threshold_db (float): The highest energy threshold, so loud,
+            continuous speech is not mistaken for the noise floor
+        max_zcr (float): The highest zero-crossing rate of voiced frames
+        min_speech_ms (float): Shorter bursts are dropped
+        min_silence_ms (float): Shorter pauses are bridged
+        padding_ms (float): Audio kept on both sides of each segment
+    """
+
+    def __init__(
+        self,
+        frame_ms: float = 30,
+        hop_ms: float = 10,
+        margin_db: float = 10,
+        min_threshold_db: float = -50,
+        max_threshold_db: float = -35,
+        max_zcr: float = 0.35,
+        min_speech_ms: float = 100,
+        min_silence_ms: float = 300,
+        padding_ms: float = 200,
+    ):
+        samples_per_ms = SAMPLES_PER_SECOND // 1000
+        self.frame = int(frame_ms * samples_per_ms)
+        self.hop = int(hop_ms * samples_per_ms)
+        self.margin_db = margin_db
+        self.min_threshold_db = min_threshold_db
+        self.max_threshold_db = max_threshold_db
+        self.max_zcr = max_zcr
+        self.min_speech = int(min_speech_ms / hop_ms)
+        self.min_silence = int(min_silence_ms / hop_ms)
+        self.padding = int(padding_ms * samples_per_ms)
+
+    def __call__(self, audio: np.ndarray) -> list[tuple[int, int]]:
+        """
+        Find the speech in an audio array.
+
+        Args:
+            audio (np.ndarray): float32 16 kHz samples
+
+        Returns:
+            list[tuple[int, int]]: The (start, end) samples of each speech
+                segment, padded, sorted and non-overlapping
+        """
+        if len(audio) < self.frame:
+            return []
+
+        # Classify frames
+        energy = frame_energy_db(audio, self.frame, self.hop)
+        zcr = frame_zero_crossing_rate(audio, self.frame, self.hop)
+        noise_floor = np.percentile(energy, 10)
+        threshold = np.clip(
+            noise_floor + self.margin_db,
+            self.min_threshold_db,
+            self.max_threshold_db,
+        )
+        voiced = (energy > threshold) & (zcr < self.max_zcr)
+
+        # Bridge short pauses, then drop short bursts
+        starts, ends = runs(voiced)
+        if not len(starts):
+            return []
+        bridged = starts[1:] - ends[:-1] < self.min_silence
+        starts = starts[np.concatenate([[True], ~bridged])]
+        ends = ends[np.concatenate([~bridged, [True]])]
+        long_enough = ends - starts >= self.min_speech
+        starts, ends = starts[long_enough], ends[long_enough]
+
+        # Convert to padded sample ranges, merging any that now overlap
+        segments = []
+        for start, end in zip(starts, ends):
+            start = max(0, start * self.hop - self.padding)
+            end = min(len(audio), (end - 1) * self.hop + self.frame + self.padding)
+            if segments and start <= segments[-1][1]:
+                segments[-1] = (segments[-1][0], end)
+            else:
+                segments.append((int(start), int(end)))
+        return segments
+
+
+class SpeechGate:
+    """
+    Pass only the speech in a stream of sample blocks.
+
+    The gate remembers where each voiced region came from, so times in the
+    voiced stream can be mapped back to the source stream.
+
+    Example:
+        >>> gate = SpeechGate(stream_audio(path), EnergyVAD())
+        >>> voiced = np.concatenate(list(gate))
+        >>> gate.to_source(1.5)  # Seconds into the file
+
+    Args:
+        blocks (Iterable[np.ndarray]): float32 16 kHz sample blocks
+        detector (SpeechDetector): Finds the speech in each block
+    """
+
+    def __init__(self, blocks: Iterable[np.ndarray], detector: SpeechDetector):
+        self.blocks = blocks
+        self.detector = detector
+        self.source_samples = 0  # Samples read from the source
+        self.voiced_samples = 0  # Samples passed through the gate
+        self._voiced_starts = []  # Voiced stream sample where each region starts
+        self._source_starts = []  # Source stream sample where each region starts
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for block in self.blocks:
+            with span("vad"):
+                speech = self.detector(block)
+            for start, end in speech:
+                source_start = self.source_samples + start
+                # Regions that touch across block edges stay one region
+                if not self._continues(source_start):
+                    self._voiced_starts.append(self.voiced_samples)
+                    self._source_starts.append(source_start)
+                self.voiced_samples += end - start
+                yield block[start:end]
+            self.source_samples += len(block)
+
+    def _continues(self, source_start: int) -> bool:
+        if not self._source_starts:
+            return False
+        region_end = self._source_starts[-1] + (
+            self.voiced_samples - self._voiced_starts[-1]
+        )
+        return region_end == source_start
+
+    @property
+    def source_seconds(self) -> float:
+        """The duration of the source audio read so far."""
+        return self.source_samples / SAMPLES_PER_SECOND
+
+    def to_source(self, seconds: float, end: bool = False) -> float:
+        """
+        Map a time in the voiced stream to a time in the source stream.
+
+        Args:
+            seconds (float): The voiced stream time
+            end (bool): Map a time on a region boundary to the end of the
+                earlier region, instead of the start of the later one
+
+        Returns:
+            float: The source stream time
+        """
+        sample = seconds * SAMPLES_PER_SECOND
+        if end:
+            region = bisect.bisect_left(self._voiced_starts, sample) - 1
+        else:
+            region = bisect.bisect_right(self._voiced_starts, sample) - 1
+        if not self._voiced_starts:
+            return seconds
+        region = max(region, 0)
+
+        # Times past the end of the voiced stream stay at its end
+        ends = self._voiced_starts[1:] + [self.voiced_samples]
+        length = ends[region] - self._voiced_starts[region]
+        offset = min(max(sample - self._voiced_starts[region], 0), length)
+        return (self._source_starts[region] + offset) / SAMPLES_PER_SECOND
+
+
 # Converters ==================================================================
 
 
-def float32_to_int16(audio: np.ndarray):
+def float32_to_int16(
+    audio: np.ndarray, policy: str = RAISE, out: Optional[np.ndarray] = None
+):
     """
     Convert a float32 array to int16
 
-    Maps the float32 range [-1, 1] to the int16 range [-32768, 32767]
-
-    May mangle samples outside [-1, 1 ].
+    Maps the float32 range [-1, 1] to the int16 range [-32768, 32767]: 1.0
+    saturates to 32767. See whisperlab.conversion.
 
     Args:
         audio (np.ndarray): The audio array to convert
+        policy (str): What to do with samples outside [-1, 1]: "raise",
+            "clip" or "saturate"
+        out (np.ndarray): A reusable int16 buffer for the result
 
     Returns:
         np.ndarray: The converted audio array
 
     Raises:
-        Exception: If the audio array contains samples outside [-1, 1]
+        EmptyArray: If the audio array is empty
+        ArrayTypeError: If the audio array is not float32
+        AudioOverflow: If the policy is "raise" and the audio array contains
+            samples outside [-1, 1]
+    """
+    ValidateAudioArray(audio, check_range=False)
+    return float_to_pcm(audio, "int16", policy, out)
+
+
+# Resampling ==================================================================
+
+
+@functools.lru_cache(maxsize=32)
+def polyphase_filters(
+    up: int,
+    down: int,
+    zero_crossings: int = DEFAULT_ZERO_CROSSINGS,
+    rolloff: float = DEFAULT_ROLLOFF,
+    beta: float = DEFAULT_KAISER_BETA,
+) -> tuple[np.ndarray, int]:
+    """
+    Design the polyphase filters of an up / down rational resampler.
+
+    The prototype is a Kaiser-windowed sinc lowpass at the upsampled rate,
+    cut off below the lower of the two Nyquist rates. It is split into `up`
+    phases, each reversed so an output sample is the dot product of its
+    phase with a window of the input. Filters are cached per rate pair.
+
+    Args:
+        up (int): The upsampling factor
+        down (int): The downsampling factor
+        zero_crossings (int): The filter's half-length, in zero crossings
+        rolloff (float): The cutoff, as a fraction of the lower Nyquist rate
+        beta (float): The Kaiser window's shape
+
+    Returns:
+        tuple[np.ndarray, int]: The read-only (up, taps) float32 phase
+            filters, and the filter's delay in upsampled samples
+    """
+    ratio = max(up, down)
+    cutoff = rolloff / ratio  # In cycles per upsampled sample, times 2
+    delay = math.ceil(zero_crossings * ratio / rolloff)
+    time = np.arange(-delay, delay + 1, dtype=np.float64)
+    prototype = up * cutoff * np.sinc(cutoff * time)
+    prototype *= np.kaiser(len(time), beta)
+
+    taps = math.ceil(len(prototype) / up)
+    prototype = np.pad(prototype, (0, taps * up - len(prototype)))
+    filters = prototype.reshape(taps, up).T[:, ::-1].astype(np.float32)
+    filters.flags.writeable = False
+    return filters, delay
+
+
+class Resampler:
     """
-    ValidateAudioArray(audio)
-    return (audio * 32_768).astype(np.int16)
+    A streaming polyphase resampler.
+
+    The filter's input history is kept between blocks, so resampling a
+    stream block by block gives the same samples as resampling it at once,
+    with no clicks at block edges. Each output sample is centered on its
+    input time: the filter has no delay, but holds back the last few
+    output samples until their input arrives, or flush() is called.
+
+    Example:
+        >>> resampler = Resampler(48_000)
+        >>> blocks = [resampler(block) for block in capture]
+        >>> blocks.append(resampler.flush())
+
+    Args:
+        source_rate (int): The input sample rate
+        target_rate (int): The output sample rate
+        zero_crossings (int): The filter's half-length, in zero crossings.
+            Longer filters have sharper cutoffs, and cost more.
+    """
+
+    def __init__(
+        self,
+        source_rate: int,
+        target_rate: int = SAMPLES_PER_SECOND,
+        zero_crossings: int = DEFAULT_ZERO_CROSSINGS,
+    ):
+        divisor = math.gcd(int(source_rate), int(target_rate))
+        self.source_rate = int(source_rate)
+        self.target_rate = int(target_rate)
+        self.up = self.target_rate // divisor
+        self.down = self.source_rate // divisor
+        self.filters, self.delay = polyphase_filters(self.up, self.down, zero_crossings)
+        self.taps = self.filters.shape[1]
+        self.reset()
+
+    def reset(self):
+        """Forget the stream, to start a new one."""
+        self._history = None  # Input samples still needed, from self._start
+        self._start = 1 - self.taps  # Starts with zeros before the stream
+        self._received = 0  # Input samples
+        self._produced = 0  # Output samples
+
+    def _center(self, output: int) -> int:
+        """Get the newest input sample used by an output sample."""
+        return (output * self.down + self.delay) // self.up
+
+    def __call__(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Resample the next block of a stream.
+
+        Args:
+            samples (np.ndarray): (samples,) or (samples, channels) input
+
+        Returns:
+            np.ndarray: The float32 output samples now complete
+        """
+        samples = np.asarray(samples, np.float32)
+        self._received += len(samples)
+        last = self._received - 1
+        # Outputs whose input windows end at or before the last input
+        end = (last * self.up + self.up - 1 - self.delay) // self.down + 1
+        return self._filter(samples, end)
+
+    def flush(self) -> np.ndarray:
+        """
+        Resample the end of the stream, as if followed by silence, and
+        start a new stream.
+
+        Returns:
+            np.ndarray: The remaining float32 output samples
+        """
+        if self._history is None:
+            return np.zeros(0, np.float32)
+        end = -(-self._received * self.up // self.down)  # Output length
+        padding = self._center(end - 1) + 1 - self._received
+        shape = (max(padding, 0), *self._history.shape[1:])
+        output = self._filter(np.zeros(shape, np.float32), end)
+        self.reset()
+        return output
+
+    def _filter(self, samples: np.ndarray, end: int) -> np.ndarray:
+        if self._history is None:
+            self._history = np.zeros((self.taps - 1, *samples.shape[1:]), np.float32)
+        signal = np.concatenate([self._history, samples])
+        first = self._produced
+        count = max(end - first, 0)
+        output = np.empty((count, *samples.shape[1:]), np.float32)
+
+        # Outputs `up` apart share a phase, and their windows are `down` apart
+        windows = np.lib.stride_tricks.sliding_window_view(signal, self.taps, axis=0)
+        for offset in range(min(self.up, count)):
+            step = (first + offset) * self.down + self.delay
+            phase = self.filters[step % self.up]
+            window = step // self.up - self.taps + 1 - self._start
+            rows = windows[window :: self.down][: len(range(offset, count, self.up))]
+            np.matmul(rows, phase, out=output[offset :: self.up])
+
+        # Keep the input the next outputs need
+        self._produced = first + count
+        keep = min(
+            self._center(self._produced) - self.taps + 1, self._start + len(signal)
+        )
+        self._history = signal[keep - self._start :].copy()
+        self._start = keep
+        return output
+
+
+def resample(
+    audio: np.ndarray, source_rate: int, target_rate: int = SAMPLES_PER_SECOND
+) -> np.ndarray:
+    """
+    Resample a whole array.
+
+    Args:
+        audio (np.ndarray): (samples,) or (samples, channels) input
+        source_rate (int): The input sample rate
+        target_rate (int): The output sample rate
+
+    Returns:
+        np.ndarray: The float32 resampled audio
+    """
+    if source_rate == target_rate:
+        return np.asarray(audio, np.float32)
+    resampler = Resampler(source_rate, target_rate)
+    return np.concatenate([resampler(audio), resampler.flush()])
 
 
 # Operators ===================================================================
@@ -154,11 +951,150 @@ def roll(buffer: np.ndarray, samples: np.ndarray):
 # Buffers =====================================================================
 
 
+class RingBuffer:
+    """
+    A preallocated, fixed-capacity ring buffer of audio samples.
+
+    Samples are stored twice, in a mirrored array of twice the capacity, so
+    the latest samples are always one contiguous slice: get(), get_last()
+    and read() copy them out in one pass, and put() only writes into the
+    preallocated array.
+
+    The write cursor counts every sample ever put. Readers remember the
+    cursor they last saw and pass it to read() to get only the new samples.
+
+    A multi-channel buffer stores (samples, channels) frames, interleaved as
+    they are captured: put() is one copy whatever the channel count, and
+    read() can copy out a single channel.
+
+    Thread safety: one producer may put() while many consumers read. The
+    producer claims the slots it is about to write, writes the samples, then
+    advances the cursor. Readers retry if their samples were claimed by the
+    producer while they were copying them, so they never see torn frames.
+
+    Example:
+        >>> ring = RingBuffer(3)
+        >>> ring.put(np.array([1, 2, 3, 4]))
+        >>> ring.get()
+        array([2., 3., 4.], dtype=float32)
+        >>> ring.read(cursor=2)
+        (array([3., 4.], dtype=float32), 4)
+
+    Args:
+        capacity (int): The number of samples (frames) kept
+        dtype (np.dtype): The sample type
+        channels (int): If given, the buffer holds (samples, channels) frames
+    """
+
+    def __init__(self, capacity: int, dtype=np.float32, channels: Optional[int] = None):
+        if capacity <= 0:
+            raise ValueError(f"Capacity must be positive: {capacity}")
+        if channels is not None and channels <= 0:
+            raise ValueError(f"Channels must be positive: {channels}")
+        self.capacity = capacity
+        self.channels = channels
+        shape = (2 * capacity,) if channels is None else (2 * capacity, channels)
+        self._data = np.zeros(shape, dtype)
+        self._cursor = 0  # Samples published to readers
+        self._claimed = 0  # Samples published or being written
+
+    @property
+    def cursor(self) -> int:
+        """The total number of samples ever put in the buffer."""
+        return self._cursor
+
+    def put(self, samples: np.ndarray):
+        """
+        Append samples, overwriting the oldest ones.
+
+        Args:
+            samples (np.ndarray): The new samples, or (samples, channels)
+                frames for a multi-channel buffer. If there are more samples
+                than the capacity, only the last ones are kept.
+        """
+        count = len(samples)
+        capacity = self.capacity
+        if count > capacity:
+            samples = samples[-capacity:]
+
+        # Claim the slots, then write the samples and their mirror image
+        self._claimed = self._cursor + count
+        start = (self._cursor + count - len(samples)) % capacity
+        end = start + len(samples)
+        self._data[start:end] = samples
+        if end <= capacity:
+            self._data[start + capacity : end + capacity] = samples
+        else:
+            split = capacity - start
+            self._data[start + capacity :] = samples[:split]
+            self._data[: end - capacity] = samples[split:]
+
+        # Publish the samples
+        self._cursor += count
+
+    def get(self) -> np.ndarray:
+        """
+        Get the buffer contents, oldest sample first.
+
+        Returns:
+            np.ndarray: A copy of the last `capacity` samples
+        """
+        return self.get_last(self.capacity)
+
+    def get_last(self, count: int) -> np.ndarray:
+        """
+        Get the latest samples, oldest first.
+
+        Args:
+            count (int): The number of samples, at most the capacity
+
+        Returns:
+            np.ndarray: A copy of the samples
+        """
+        if not 0 <= count <= self.capacity:
+            raise ValueError(f"Cannot get {count} samples from {self.capacity}")
+        while True:
+            end = self._cursor
+            samples = self._copy(self._data, end, count)
+            if self._claimed - end <= self.capacity - count:
+                return samples
+
+    def read(
+        self, cursor: int, channel: Optional[int] = None
+    ) -> tuple[np.ndarray, int]:
+        """
+        Copy the samples written since a cursor.
+
+        Args:
+            cursor (int): The cursor returned by the previous read, or 0
+            channel (int): The channel to copy from a multi-channel buffer.
+                None copies every channel.
+
+        Returns:
+            tuple[np.ndarray, int]: The new samples (at most the capacity),
+                and the cursor to pass to the next read
+        """
+        data = self._data if channel is None else self._data[:, channel]
+        while True:
+            end = self._cursor
+            count = min(end - cursor, self.capacity)
+            samples = self._copy(data, end, count)
+
+            # Retry if the producer wrapped around while we were copying
+            if self._claimed - end <= self.capacity - count:
+                return samples, end
+
+    def _copy(self, data: np.ndarray, end: int, count: int) -> np.ndarray:
+        """Copy the `count` samples before cursor `end`."""
+        stop = end % self.capacity + self.capacity
+        return data[stop - count : stop].copy()
+
+
 class WaveBuffer:
     """
     A model of the plot signal buffer.
 
-    The buffer is a numpy array of audio samples.
+    The buffer is a ring buffer of the latest audio samples.
 
     The buffer is updated by calling put() with a new audio array.
 
@@ -168,37 +1104,164 @@ class WaveBuffer:
     they are added to the buffer.
     """
 
-    buffer: np.ndarray
+    ring: RingBuffer
 
     def __init__(self, buffer_size: int):
-        self.buffer = np.zeros(buffer_size)
+        self.ring = RingBuffer(buffer_size)
 
     def get(self):
-        return self.buffer
+        return self.ring.get()
 
     def put(self, audio_samples):
-        """Convert the audio samples to a plot buffer."""
-        self.buffer = self.process(audio_samples)
+        """Add the processed audio samples to the buffer."""
+        self.ring.put(self.process(audio_samples))
 
     def process(self, audio_samples):
         return audio_samples
 
 
+# Channel Mixing ==============================================================
+
+# A channel mixer maps (samples, channels) frames to mono samples. The result
+# may be a view or a reused buffer: copy it before the next call.
+ChannelMixer = Callable[[np.ndarray], np.ndarray]
+
+MIX_STRATEGIES = ["channel", "downmix", "loudest"]
+
+DEFAULT_MIX = "downmix"
+
+
+class SelectChannel:
+    """
+    Pick one channel.
+
+    Args:
+        channel (int): The channel's index
+    """
+
+    def __init__(self, channel: int = 0):
+        self.channel = channel
+
+    def __call__(self, frames: np.ndarray) -> np.ndarray:
+        return frames[:, self.channel]
+
+
+class Downmix:
+    """
+    Average the channels, with one matrix-vector product into a reused
+    buffer.
+
+    Args:
+        weights (np.ndarray): The gain of each channel. Defaults to equal
+            gains summing to 1.
+    """
+
+    def __init__(self, weights: Optional[np.ndarray] = None):
+        self.weights = None if weights is None else np.asarray(weights, np.float32)
+        self._buffer = np.zeros(0, np.float32)
+
+    def __call__(self, frames: np.ndarray) -> np.ndarray:
+        channels = frames.shape[1]
+        if self.weights is None or len(self.weights) != channels:
+            self.weights = np.full(channels, 1 / channels, np.float32)
+        if len(self._buffer) < len(frames):
+            self._buffer = np.empty(len(frames), np.float32)
+        out = self._buffer[: len(frames)]
+        np.dot(np.asarray(frames, np.float32), self.weights, out=out)
+        return out
+
+
+class LoudestChannel:
+    """
+    Pick the channel with the most energy in each block.
+
+    The choice only moves to another channel when it is `margin_db` louder,
+    so it does not flap between speakers at similar levels.
+
+    Args:
+        margin_db (float): How much louder another channel must be
+    """
+
+    def __init__(self, margin_db: float = 3.0):
+        self.threshold = 10 ** (margin_db / 10)
+        self.channel = 0
+
+    def __call__(self, frames: np.ndarray) -> np.ndarray:
+        energy = np.einsum("ij,ij->j", frames, frames)
+        loudest = int(np.argmax(energy))
+        if (
+            self.channel >= len(energy)
+            or energy[loudest] > energy[self.channel] * self.threshold
+        ):
+            self.channel = loudest
+        return frames[:, self.channel]
+
+
+def make_mixer(strategy: str = DEFAULT_MIX, channel: int = 0) -> ChannelMixer:
+    """
+    Create a channel mixer.
+
+    Args:
+        strategy (str): "channel" picks one channel, "downmix" averages the
+            channels, "loudest" picks the loudest channel of each block
+        channel (int): The channel to pick, for the "channel" strategy
+
+    Returns:
+        ChannelMixer: The mixer
+
+    Raises:
+        ValueError: If the strategy is unknown
+    """
+    if strategy == "channel":
+        return SelectChannel(channel)
+    if strategy == "downmix":
+        return Downmix()
+    if strategy == "loudest":
+        return LoudestChannel()
+    raise ValueError(f"Unknown mix strategy: {strategy}. Choose from {MIX_STRATEGIES}")
+
+
 # Exporters ===================================================================
 
 
-def save_audio(audio: np.ndarray, path: Path):
+def save_audio(audio: np.ndarray, path: Path, bits: int = 16, policy: str = RAISE):
     """
-    Save an audio array to a file
+    Save an audio array to a 16, 24 or 32-bit WAV file
+
+    The audio is converted and written one chunk at a time, so the full
+    PCM copy of the audio is never held in memory. With the "raise" policy,
+    the whole array is range-checked first, so an overflow leaves no
+    truncated file.
 
     Args:
-        audio (np.ndarray): The audio array to save
+        audio (np.ndarray): The float32 audio array to save
         path (Path): The path to save the audio to
-    """
+        bits (int): The bits per sample
+        policy (str): What to do with samples outside [-1, 1]: "raise",
+            "clip" or "saturate"
 
-    pydub.AudioSegment(
-        float32_to_int16(audio).tobytes(),
-        frame_rate=SAMPLES_PER_SECOND,
-        sample_width=2,
-        channels=1,
-    ).export(path, format="wav")
+    Raises:
+        EmptyArray: If the audio array is empty
+        ArrayTypeError: If the audio array is not float32
+        AudioOverflow: If the policy is "raise" and the audio array contains
+            samples outside [-1, 1]
+        ValueError: If the bit depth is not supported
+    """
+    if bits not in (16, 24, 32):
+        raise ValueError(f"Cannot save {bits}-bit audio. Choose from 16, 24, 32")
+    ValidateAudioArray(audio, check_range=policy == RAISE)
+    format = f"int{bits}"
+    chunk = DEFAULT_CHUNK_SAMPLES
+    pcm = np.empty(min(len(audio), chunk), np.int16 if bits == 16 else "<i4")
+    packed = np.empty(3 * len(pcm), np.uint8) if bits == 24 else None
+
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(bits // 8)
+        f.setframerate(SAMPLES_PER_SECOND)
+        for start in range(0, len(audio), chunk):
+            block = audio[start : start + chunk]
+            samples = float_to_pcm(block, format, policy, out=pcm[: len(block)])
+            if packed is not None:
+                samples = pack_int24(samples, out=packed[: 3 * len(block)])
+            f.writeframes(samples.view(np.uint8))
@@ -0,0 +1,269 @@
+"""
+Batched Inference Module
+
+This module transcribes many short inputs together, so the Whisper encoder
+and decoder run on batches of 30 second segments instead of one segment at a
+time.
+
+Inputs are TranscribeTasks or in-memory float32 16 kHz sample arrays. Their
+log-mel spectrograms are computed as one stacked tensor, then encoded and
+greedily decoded in fixed-size batches. Inputs longer than 30 seconds are
+split into overlapping segments, and the segment texts are joined without
+the words repeated in the overlaps. With voice activity detection, only the
+speech of each input is batched, so silences cost no inference.
+
+Tasks with `cache` are served from, and added to, the result cache, under
+keys of their own: batched results have no segments. Batched results cannot
+be word-aligned, so tasks with `align` are rejected.
+
+Usage Examples:
+    >>> results = transcribe_batch([task_1, task_2, task_3], batch_size=8)
+    >>> task_1.result["text"] == results[0]["text"]
+    True
+"""
+
+from dataclasses import fields
+import json
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import whisper
+
+import whisperlab.logging
+from whisperlab.audio import EnergyVAD, load_audio, SpeechDetector
+from whisperlab.cache import PCM_CACHE, RESULT_CACHE
+from whisperlab.defaults import DEFAULT_BATCH_SIZE, DEFAULT_PRECISION
+from whisperlab.longform import chunk_audio, overlap_length
+from whisperlab.mel import log_mel_batch, stack_segments
+from whisperlab.models import get_model, model_lock
+from whisperlab.time import time_ms
+from whisperlab.tracing import span
+from whisperlab.transcribe import (
+    cache_settings,
+    DEFAULT_TRANSCRIPTION_MODEL,
+    EMPTY_RESULT,
+    EmptyFile,
+    TranscribeTask,
+)
+
+
+log = whisperlab.logging.config_log()
+
+# Constants ===================================================================
+
+SEGMENT_SAMPLES = whisper.audio.N_SAMPLES  # 30 seconds
+SEGMENT_OVERLAP_SECONDS = 2  # Audio shared by segments of a long input
+
+# The whisper arguments that apply to batched decoding
+DECODING_ARGS = {field.name for field in fields(whisper.DecodingOptions)}
+
+
+# Decoding ====================================================================
+
+
+def decode_segments(model, segments: list[np.ndarray], batch_size: int, **args):
+    """
+    Encode and greedily decode segments in fixed-size batches.
+
+    Args:
+        model (whisper.model.Whisper): The model to transcribe with
+        segments (list[np.ndarray]): Audio segments of up to 30 seconds
+        batch_size (int): The number of segments per forward pass
+        args: Decoding options, e.g. language or task
+
+    Returns:
+        list[whisper.DecodingResult]: One result per segment
+    """
+    options = whisper.DecodingOptions(
+        fp16=False,
+        without_timestamps=True,
+        **{key: value for key, value in args.items() if key in DECODING_ARGS},
+    )
+
+    results = []
+    for start in range(0, len(segments), batch_size):
+        with span("mel", segments=min(batch_size, len(segments) - start)):
+            batch = stack_segments(segments[start : start + batch_size])
+            mel = log_mel_batch(batch, model.dims.n_mels, model.device)
+        with span("inference"), model_lock(model):
+            results.extend(whisper.decode(model, mel, options))
+    return results
+
+
+def join_texts(texts: list[str]) -> str:
+    """Join overlapping segment texts, dropping the repeated words."""
+    words = []
+    for text in texts:
+        new_words = text.split()
+        words += new_words[overlap_length(words, new_words) :]
+    return " " + " ".join(words) if words else ""
+
+
+def voiced_samples(samples: np.ndarray, detector: SpeechDetector) -> np.ndarray:
+    """Concatenate the speech found in an input."""
+    regions = [samples[start:end] for start, end in detector(samples)]
+    return np.concatenate([np.zeros(0, np.float32), *regions])
+
+
+def load_samples(item: Union[TranscribeTask, np.ndarray]) -> np.ndarray:
+    """Get the 16 kHz float32 samples of a batch input."""
+    if isinstance(item, TranscribeTask):
+        if item.samples is not None:
+            return item.load_samples()
+        if EmptyFile(item.audio_file):
+            return np.zeros(0, np.float32)
+        return load_audio(item.audio_file, cache=PCM_CACHE if item.cache else None)
+    return np.asarray(item, dtype=np.float32)
+
+
+def cache_key(task: TranscribeTask) -> Optional[str]:
+    """Get the result cache key of a batched task, if it uses the cache."""
+    if not task.cache or task.audio_file is None or EmptyFile(task.audio_file):
+        return None
+    settings = {**cache_settings(task), "batched": True}
+    return RESULT_CACHE.key(task.audio_file, task.model, settings)
+
+
+# Use Case ====================================================================
+
+
+def transcribe_samples(
+    model,
+    inputs: list[np.ndarray],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    detector: Optional[SpeechDetector] = None,
+    **args,
+) -> list[dict]:
+    """
+    Transcribe in-memory sample arrays with batched inference.
+
+    Args:
+        model (whisper.model.Whisper): The model to transcribe with
+        inputs (list[np.ndarray]): float32 16 kHz sample arrays
+        batch_size (int): The number of segments per forward pass
+        detector (SpeechDetector): If given, only the speech it finds in
+            each input is transcribed
+        args: Decoding options, e.g. language or task
+
+    Returns:
+        list[dict]: One whisper-style result per input
+    """
+    # Split every input into segments, remembering which input each came from
+    segments = []
+    owners = []
+    for index, samples in enumerate(inputs):
+        if detector is not None:
+            samples = voiced_samples(samples, detector)
+        for chunk in chunk_audio([samples], overlap_seconds=SEGMENT_OVERLAP_SECONDS):
+            segments.append(chunk.samples)
+            owners.append(index)
+
+    decoded = decode_segments(model, segments, batch_size, **args)
+
+    # Reassemble the segments of each input, in order
+    parts_by_input = [[] for _ in inputs]
+    for result, owner in zip(decoded, owners):
+        parts_by_input[owner].append(result)
+
+    results = []
+    for samples, parts in zip(inputs, parts_by_input):
+        if not parts:
+            results.append({**EMPTY_RESULT, "duration": 0.0})
+            continue
+        results.append(
+            {
+                "text": join_texts([part.text for part in parts]),
+                "language": parts[0].language,
+                "avg_logprob": float(np.mean([part.avg_logprob for part in parts])),
+                "no_speech_prob": float(max(part.no_speech_prob for part in parts)),
+                "duration": len(samples) / whisper.audio.SAMPLE_RATE,
+            }
+        )
+    return results
+
+
+def transcribe_batch(
+    inputs: Sequence[Union[TranscribeTask, np.ndarray]],
+    model: str = DEFAULT_TRANSCRIPTION_MODEL,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    vad: bool = False,
+    precision: str = DEFAULT_PRECISION,
+    **args,
+) -> list[dict]:
+    """
+    Transcribe many tasks or sample arrays with batched inference.
+
+    Tasks are grouped by model and arguments, so each group shares batches.
+    Sample arrays use the `model`, `vad`, `precision` and `args` given here.
+    Tasks with `cache` reuse and store their results in the result cache.
+
+    Args:
+        inputs (Sequence): TranscribeTasks or float32 16 kHz sample arrays
+        model (str): The transcription model for sample arrays
+        batch_size (int): The number of segments per forward pass
+        vad (bool): Whether to transcribe only the speech in sample arrays
+        precision (str): The inference precision for sample arrays
+        args: Decoding options for sample arrays, e.g. language or task
+
+    Effects:
+        Completes each task with its result.
+
+    Returns:
+        list[dict]: One whisper-style result per input, in input order
+
+    Raises:
+        ValueError: If a task asks for word alignment, which needs the
+            segments of transcribe()
+    """
+    for item in inputs:
+        if isinstance(item, TranscribeTask) and item.align:
+            raise ValueError("Batched results cannot be aligned. Use transcribe().")
+
+    # Serve cached results
+    results = [None] * len(inputs)
+    cache_keys = {}  # Input index -> result cache key
+    for index, item in enumerate(inputs):
+        if isinstance(item, TranscribeTask) and (key := cache_key(item)) is not None:
+            results[index] = RESULT_CACHE.get(key)
+            if results[index] is not None:
+                item.complete(results[index])
+            else:
+                cache_keys[index] = key
+
+    # Group the other inputs that can share a batch
+    groups = {}
+    for index, item in enumerate(inputs):
+        if results[index] is not None:
+            continue
+        if isinstance(item, TranscribeTask):
+            args_json = json.dumps(item.args, sort_keys=True)
+            key = (item.model, item.precision, item.vad, args_json)
+        else:
+            key = (model, precision, vad, json.dumps(args, sort_keys=True))
+        groups.setdefault(key, []).append(index)
+
+    for (model_name, group_precision, group_vad, group_args), indices in groups.items():
+        start_time = time_ms()
+        samples = [load_samples(inputs[index]) for index in indices]
+        group_results = transcribe_samples(
+            get_model(model_name, dtype=group_precision),
+            samples,
+            batch_size,
+            detector=EnergyVAD() if group_vad else None,
+            **json.loads(group_args),
+        )
+        log.info(
+            "Transcribed a batch of %s inputs with %s in %s ms",
+            len(indices),
+            model_name,
+            time_ms() - start_time,
+        )
+
+        for index, result in zip(indices, group_results):
+            results[index] = result
+            if index in cache_keys:
+                RESULT_CACHE.put(cache_keys[index], result)
+            if isinstance(inputs[index], TranscribeTask):
+                inputs[index].complete(result)
+
+    return results
@@ -0,0 +1,663 @@
+"""
+Benchmark Module
+
+This module times each stage of the transcription pipeline over a set of
+audio files, and compares the timings with a stored baseline so slowdowns
+are caught before they ship.
+
+Stages:
+    audio_decode: Decode the file to 16 kHz float32 blocks (stream_audio)
+    resample: ffmpeg's resampling cost (16 kHz decode - native rate decode)
+    mel: Log-mel spectrograms of every 30 second segment
+    model_load: Load the model weights
+    encode: Run the audio encoder on every segment
+    text_decode: Greedily decode text from the encoded segments
+    total: Transcribe the file end to end, as `whisperlab transcribe` does
+
+Each stage runs `repeats` times after a warmup run, and is reported as
+p50 / p95 / mean milliseconds. The real-time factor (RTF) is the p50 total
+time over the audio duration: below 1 is faster than real time.
+
+The model stages default to the tiny "standin" model, so the suite runs
+offline in seconds. Its timings track the pipeline's own overheads, not
+the cost of a real model.
+
+Precisions:
+    Each precision (see whisperlab.models) transcribes every file, and is
+    compared with fp32 on speed (RTF) and word error rate (WER). A file's
+    reference transcript is the .txt file beside it, or else fp32's output.
+    The stand-in model's gibberish makes its WER meaningless: compare
+    precisions with a real model, e.g. `whisperlab bench -m base`.
+
+Conversions:
+    The sample validation and PCM conversions of whisperlab.conversion are
+    timed over a synthetic array of `conversion_hours` of audio, beside the
+    numpy one-liners they replace, as throughput in audio-hours per second.
+
+Usage Examples:
+    >>> results = run_benchmark(expand_paths(["tests/data"]))
+    >>> regressions = compare(results, json.load(open("baseline.json")))
+    >>> results = run_benchmark(files, precisions=["int8-dynamic", "bf16"])
+    >>> results = run_benchmark(files, conversion_hours=2)
+"""
+
+import platform
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel
+import torch
+import whisper
+
+import whisperlab.logging
+from whisperlab import VERSION
+from whisperlab.audio import SAMPLES_PER_SECOND, stream_audio
+from whisperlab.batch import log_mel_batch, stack_segments
+from whisperlab.conversion import float_to_pcm, in_range, pcm_to_float
+from whisperlab.defaults import (
+    DEFAULT_BENCH_MODEL,
+    DEFAULT_PRECISION,
+    DEFAULT_REPEATS,
+    DEFAULT_TOLERANCE,
+)
+from whisperlab.longform import chunk_audio, transcribe_stream
+from whisperlab.models import (
+    default_device,
+    DEFAULT_DTYPE,
+    load_whisper_model,
+    model_bytes,
+)
+from whisperlab.textmetrics import word_edits
+
+log = whisperlab.logging.config_log()
+
+# Constants ===================================================================
+
+STAGES = [
+    "audio_decode",
+    "resample",
+    "mel",
+    "model_load",
+    "encode",
+    "text_decode",
+    "total",
+]
+
+# A stage regresses when its p50 is DEFAULT_TOLERANCE slower than the
+# baseline, and by more than this, so sub-millisecond noise never fails a run
+MIN_REGRESSION_MS = 2.0
+
+# Bounded, deterministic decoding, so the random stand-in model cannot
+# babble for the whole context window
+BENCH_ARGS = {
+    "language": "en",
+    "temperature": 0.0,
+    "sample_len": 16,
+    "condition_on_previous_text": False,
+}
+
+
+# Models ======================================================================
+
+
+class StageTiming(BaseModel):
+    """
+    The timings of one stage
+
+    Args:
+        p50_ms (float): Median time
+        p95_ms (float): 95th percentile time
+        mean_ms (float): Mean time
+    """
+
+    p50_ms: float
+    p95_ms: float
+    mean_ms: float
+
+
+class FileBenchmark(BaseModel):
+    """
+    The benchmark of one audio file
+
+    Args:
+        audio_seconds (float): The duration of the audio
+        stages (dict[str, StageTiming]): The timings, by stage
+        rtf (float): The real-time factor of the total stage
+    """
+
+    audio_seconds: float
+    stages: dict[str, StageTiming]
+    rtf: float
+
+
+class PrecisionBenchmark(BaseModel):
+    """
+    The speed and accuracy of one inference precision
+
+    Args:
+        precision (str): The precision
+        load_ms (float): The time to load, and convert, the model
+        model_mb (float): The model's size in memory
+        rtf (float): The p50 transcription time over the audio duration
+        speedup (float): fp32's RTF over this precision's
+        wer (float): The word error rate against the reference transcripts
+    """
+
+    precision: str
+    load_ms: float
+    model_mb: float
+    rtf: float
+    speedup: float
+    wer: float
+
+
+class ConversionBenchmark(BaseModel):
+    """
+    The throughput of one sample conversion
+
+    Args:
+        conversion (str): The conversion
+        p50_ms (float): The median time over the whole array
+        hours_per_second (float): Audio hours converted per second
+    """
+
+    conversion: str
+    p50_ms: float
+    hours_per_second: float
+
+
+class BenchmarkResults(BaseModel):
+    """
+    A benchmark run
+
+    Args:
+        version (str): The whisperlab version
+        model (str): The model the model stages ran
+        device (str): The torch device
+        repeats (int): Timed runs per stage
+        files (dict[str, FileBenchmark]): The benchmarks, by file name
+        peak_rss_mb (float): The peak resident memory of the process
+        environment (dict): Python, numpy, torch and platform versions
+        precisions (list[PrecisionBenchmark]): The precision comparison,
+            fp32 first, if one was run
+        conversion_hours (float): The audio length of the conversion
+            benchmarks
+        conversions (list[ConversionBenchmark]): The conversion throughputs,
+            if they were run
+    """
+
+    version: str
+    model: str
+    device: str
+    repeats: int
+    files: dict[str, FileBenchmark]
+    peak_rss_mb: float
+    environment: dict
+    precisions: list[PrecisionBenchmark] = []
+    conversion_hours: float = 0
+    conversions: list[ConversionBenchmark] = []
+
+
+class Regression(BaseModel):
+    """
+    A stage that got slower than its baseline
+
+    Args:
+        file (str): The benchmarked file
+        stage (str): The stage
+        baseline_ms (float): The baseline p50
+        current_ms (float): The current p50
+    """
+
+    file: str
+    stage: str
+    baseline_ms: float
+    current_ms: float
+
+    @property
+    def slowdown(self) -> float:
+        return self.current_ms / self.baseline_ms if self.baseline_ms else np.inf
+
+
+# Timing ======================================================================
+
+
+def time_stage(run: Callable[[], object], repeats: int) -> StageTiming:
+    """
+    Time a stage after one untimed warmup run.
+
+    Args:
+        run (Callable): Runs the stage once
+        repeats (int): The number of timed runs
+
+    Returns:
+        StageTiming: The stage's percentiles
+    """
+    run()  # Warm up caches, allocators and lazy initialization
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - start) * 1000)
+    return StageTiming(
+        p50_ms=float(np.percentile(times, 50)),
+        p95_ms=float(np.percentile(times, 95)),
+        mean_ms=statistics.fmean(times),
+    )
+
+
+def ffmpeg_decode(audio_file: Path, rate: Optional[int] = None):
+    """Decode a file with ffmpeg, discarding the samples."""
+    resample = ["-ar", str(rate)] if rate else []
+    subprocess.run(
+        ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", str(audio_file)]
+        + ["-ac", "1", *resample, "-f", "null", "-"],
+        check=True,
+    )
+
+
+def words(text: str) -> list[str]:
+    """Split text into lowercase words, without punctuation."""
+    return re.findall(r"[\w']+", text.lower())
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    Compute the word error rate of a transcript.
+
+    Args:
+        reference (str): The correct transcript
+        hypothesis (str): The transcript to score
+
+    Returns:
+        float: (substitutions + deletions + insertions) / reference words
+    """
+    expected, actual = words(reference), words(hypothesis)
+    if not expected:
+        return float(bool(actual))
+
+    return word_edits(expected, actual) / len(expected)
+
+
+def reference_text(audio_file: Path) -> Optional[str]:
+    """Read the reference transcript beside an audio file, if there is one."""
+    path = audio_file.with_suffix(".txt")
+    return path.read_text() if path.exists() else None
+
+
+def peak_rss_mb() -> float:
+    """Get the peak resident memory of this process, in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "threads": torch.get_num_threads(),
+    }
+
+
+# Use Case ====================================================================
+
+
+def benchmark_file(
+    audio_file: Path, model_name: str, device: str, repeats: int
+) -> FileBenchmark:
+    """
+    Time every pipeline stage on one audio file.
+
+    Args:
+        audio_file (Path): The file to benchmark
+        model_name (str): The model for the model stages
+        device (str): The torch device
+        repeats (int): Timed runs per stage
+
+    Returns:
+        FileBenchmark: The stage timings
+    """
+    stages = {}
+
+    def decode():
+        return list(stream_audio(audio_file))
+
+    stages["audio_decode"] = time_stage(decode, repeats)
+    samples = np.concatenate([np.zeros(0, np.float32), *decode()])
+    audio_seconds = len(samples) / SAMPLES_PER_SECOND
+
+    native = time_stage(lambda: ffmpeg_decode(audio_file), repeats)
+    resampled = time_stage(
+        lambda: ffmpeg_decode(audio_file, SAMPLES_PER_SECOND), repeats
+    )
+    stages["resample"] = StageTiming(
+        **{
+            field: max(0.0, getattr(resampled, field) - getattr(native, field))
+            for field in StageTiming.model_fields
+        }
+    )
+
+    model = load_whisper_model(model_name, device, DEFAULT_DTYPE)
+    stages["model_load"] = time_stage(
+        lambda: load_whisper_model(model_name, device, DEFAULT_DTYPE), repeats
+    )
+
+    segments = stack_segments([chunk.samples for chunk in chunk_audio([samples])])
+    mel = log_mel_batch(segments, model.dims.n_mels, model.device)
+    stages["mel"] = time_stage(
+        lambda: log_mel_batch(segments, model.dims.n_mels, model.device), repeats
+    )
+
+    with torch.no_grad():
+        features = model.encoder(mel)
+        stages["encode"] = time_stage(lambda: model.encoder(mel), repeats)
+
+    options = whisper.DecodingOptions(
+        fp16=False,
+        without_timestamps=True,
+        language=BENCH_ARGS["language"],
+        temperature=BENCH_ARGS["temperature"],
+        sample_len=BENCH_ARGS["sample_len"],
+    )
+    stages["text_decode"] = time_stage(
+        lambda: whisper.decode(model, features, options), repeats
+    )
+
+    stages["total"] = time_stage(
+        lambda: transcribe_stream(model, stream_audio(audio_file), **BENCH_ARGS),
+        repeats,
+    )
+
+    rtf = stages["total"].p50_ms / 1000 / audio_seconds if audio_seconds else 0.0
+    stages = {stage: stages[stage] for stage in STAGES}
+    return FileBenchmark(audio_seconds=audio_seconds, stages=stages, rtf=rtf)
+
+
+def benchmark_precisions(
+    audio_files: list[Path],
+    model_name: str,
+    precisions: Sequence[str],
+    device: str,
+    repeats: int,
+) -> list[PrecisionBenchmark]:
+    """
+    Compare the speed and accuracy of inference precisions with fp32.
+
+    Args:
+        audio_files (list[Path]): The non-empty files to transcribe
+        model_name (str): The model to convert
+        precisions (Sequence[str]): The precisions to compare
+        device (str): The torch device
+        repeats (int): Timed runs per file
+
+    Returns:
+        list[PrecisionBenchmark]: fp32 first, then the other precisions.
+            Precisions the device cannot run are skipped.
+    """
+    audio = {
+        audio_file: np.concatenate([np.zeros(0, np.float32), *stream_audio(audio_file)])
+        for audio_file in audio_files
+    }
+    audio_seconds = sum(len(samples) for samples in audio.values())
+    audio_seconds /= SAMPLES_PER_SECOND
+    references = {audio_file: reference_text(audio_file) for audio_file in audio}
+
+    benchmarks = []
+    for precision in dict.fromkeys([DEFAULT_PRECISION, *precisions]):
+        start = time.perf_counter()
+        try:
+            model = load_whisper_model(model_name, device, precision)
+        except ValueError as e:
+            log.warning("Skipping %s: %s", precision, e)
+            continue
+        load_ms = (time.perf_counter() - start) * 1000
+
+        total_ms = 0.0
+        errors = []
+        for audio_file, samples in audio.items():
+
+            def run():
+                return transcribe_stream(model, [samples], **BENCH_ARGS)
+
+            text = run()["text"]
+            references[audio_file] = references[audio_file] or text  # fp32's
+            errors.append(word_error_rate(references[audio_file], text))
+            total_ms += time_stage(run, repeats).p50_ms
+
+        rtf = total_ms / 1000 / audio_seconds if audio_seconds else 0.0
+        fp32_rtf = benchmarks[0].rtf if benchmarks else rtf
+        benchmarks.append(
+            PrecisionBenchmark(
+                precision=precision,
+                load_ms=load_ms,
+                model_mb=model_bytes(model) / 1024**2,
+                rtf=rtf,
+                speedup=fp32_rtf / rtf if rtf else 1.0,
+                wer=float(np.mean(errors)) if errors else 0.0,
+            )
+        )
+        log.info("Benchmarked %s: %s", precision, benchmarks[-1])
+    return benchmarks
+
+
+def benchmark_conversions(hours: float, repeats: int) -> list[ConversionBenchmark]:
+    """
+    Time sample validation and conversion over a long array.
+
+    Args:
+        hours (float): The length of the synthetic audio
+        repeats (int): Timed runs per conversion
+
+    Returns:
+        list[ConversionBenchmark]: The throughput of each conversion
+    """
+    count = int(hours * 3600 * SAMPLES_PER_SECOND)
+    audio = np.random.default_rng(0).random(count, dtype=np.float32)
+    audio *= 1.98
+    audio -= 0.99
+    int16 = np.empty(count, np.int16)
+    int32 = np.empty(count, np.int32)
+    floats = np.empty(count, np.float32)
+
+    conversions = {
+        "validate": lambda: in_range(audio),
+        "validate (abs/any)": lambda: np.any(np.abs(audio) > 1),
+        "float32->int16": lambda: float_to_pcm(audio, "int16", out=int16),
+        "float32->int16 (astype)": lambda: (audio * 32_768).astype(np.int16),
+        "int16->float32": lambda: pcm_to_float(int16, out=floats),
+        "float32->int24": lambda: float_to_pcm(audio, "int24", out=int32),
+        "int24->float32": lambda: pcm_to_float(int32, 24, out=floats),
+        "float32->int32": lambda: float_to_pcm(audio, "int32", out=int32),
+    }
+    benchmarks = []
+    for conversion, run in conversions.items():
+        timing = time_stage(run, repeats)
+        benchmarks.append(
+            ConversionBenchmark(
+                conversion=conversion,
+                p50_ms=timing.p50_ms,
+                hours_per_second=hours / (timing.p50_ms / 1000),
+            )
+        )
+        log.info("Benchmarked %s: %s", conversion, benchmarks[-1])
+    return benchmarks
+
+
+def run_benchmark(
+    audio_files: list[Path],
+    model: str = DEFAULT_BENCH_MODEL,
+    repeats: int = DEFAULT_REPEATS,
+    device: Optional[str] = None,
+    precisions: Sequence[str] = (),
+    conversion_hours: float = 0,
+) -> BenchmarkResults:
+    """
+    Benchmark the pipeline over audio files.
+
+    Empty files are skipped.
+
+    Args:
+        audio_files (list[Path]): The files to benchmark
+        model (str): The model for the model stages
+        repeats (int): Timed runs per stage
+        device (str): The torch device. None picks whisper's default.
+        precisions (Sequence[str]): Precisions to compare with fp32. None
+            are compared if empty.
+        conversion_hours (float): The audio length to time sample
+            conversions over. Conversions are not timed if 0.
+
+    Effects:
+        Logs each file's stage timings.
+
+    Returns:
+        BenchmarkResults: The run's results
+    """
+    device = device or default_device()
+    files = {}
+    for audio_file in audio_files:
+        if audio_file.stat().st_size == 0:
+            log.info("Skipping empty file %s", audio_file)
+            continue
+        benchmark = benchmark_file(audio_file, model, device, repeats)
+        files[audio_file.name] = benchmark
+        log.info(
+            "Benchmarked %s (%.1f s, RTF %.3f): %s",
+            audio_file.name,
+            benchmark.audio_seconds,
+            benchmark.rtf,
+            ", ".join(
+                f"{stage} {timing.p50_ms:.1f} ms"
+                for stage, timing in benchmark.stages.items()
+            ),
+        )
+
+    precision_benchmarks = []
+    if precisions:
+        nonempty = [
+            audio_file for audio_file in audio_files if audio_file.name in files
+        ]
+        precision_benchmarks = benchmark_precisions(
+            nonempty, model, precisions, device, repeats
+        )
+
+    return BenchmarkResults(
+        version=VERSION,
+        model=model,
+        device=device,
+        repeats=repeats,
+        files=files,
+        peak_rss_mb=peak_rss_mb(),
+        environment=environment(),
+        precisions=precision_benchmarks,
+        conversion_hours=conversion_hours,
+        conversions=(
+            benchmark_conversions(conversion_hours, repeats) if conversion_hours else []
+        ),
+    )
+
+
+def compare(
+    results: BenchmarkResults,
+    baseline: BenchmarkResults,
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> list[Regression]:
+    """
+    Find the stages that are slower than in a baseline run.
+
+    Only files and stages present in both runs are compared.
+
+    Args:
+        results (BenchmarkResults): The current run
+        baseline (BenchmarkResults): The stored baseline run
+        tolerance (float): The allowed relative slowdown, e.g. 0.25 for 25%
+
+    Returns:
+        list[Regression]: The regressed stages
+    """
+    regressions = []
+    for name, current in results.files.items():
+        if name not in baseline.files:
+            continue
+        for stage, timing in current.stages.items():
+            if stage not in baseline.files[name].stages:
+                continue
+            before = baseline.files[name].stages[stage].p50_ms
+            after = timing.p50_ms
+            if after > before * (1 + tolerance) and after - before > MIN_REGRESSION_MS:
+                regressions.append(
+                    Regression(
+                        file=name, stage=stage, baseline_ms=before, current_ms=after
+                    )
+                )
+    return regressions
+
+
+def format_results(
+    results: BenchmarkResults, baseline: Optional[BenchmarkResults] = None
+) -> str:
+    """
+    Format the results as a table, with the change from a baseline if given.
+
+    Args:
+        results (BenchmarkResults): The run to format
+        baseline (BenchmarkResults): The run to compare with
+
+    Returns:
+        str: The table
+    """
+    lines = [
+        f"whisperlab {results.version} | model {results.model} on "
+        f"{results.device} | {results.repeats} repeats | "
+        f"peak RSS {results.peak_rss_mb:.0f} MiB",
+        f"{'file':<32} {'stage':<14} {'p50 ms':>10} {'p95 ms':>10} {'change':>8}",
+    ]
+    for name, benchmark in results.files.items():
+        before = baseline.files.get(name) if baseline else None
+        for stage, timing in benchmark.stages.items():
+            change = ""
+            if before and stage in before.stages and before.stages[stage].p50_ms:
+                ratio = timing.p50_ms / before.stages[stage].p50_ms
+                change = f"{100 * (ratio - 1):+.0f}%"
+            lines.append(
+                f"{name[:32]:<32} {stage:<14} {timing.p50_ms:>10.2f} "
+                f"{timing.p95_ms:>10.2f} {change:>8}"
+            )
+        lines.append(
+            f"{name[:32]:<32} {'RTF':<14} {benchmark.rtf:>10.4f} "
+            f"({benchmark.audio_seconds:.1f} s of audio)"
+        )
+
+    if results.precisions:
+        lines.append(
+            f"{'precision':<14} {'load ms':>10} {'model MiB':>10} {'RTF':>10} "
+            f"{'speedup':>8} {'WER':>8}"
+        )
+    for benchmark in results.precisions:
+        lines.append(
+            f"{benchmark.precision:<14} {benchmark.load_ms:>10.1f} "
+            f"{benchmark.model_mb:>10.1f} {benchmark.rtf:>10.4f} "
+            f"{benchmark.speedup:>7.2f}x {100 * benchmark.wer:>7.1f}%"
+        )
+
+    if results.conversions:
+        lines.append(
+            f"{'conversion':<24} {'p50 ms':>10} "
+            f"{'audio h/s':>10} ({results.conversion_hours:g} h of audio)"
+        )
+    for benchmark in results.conversions:
+        lines.append(
+            f"{benchmark.conversion:<24} {benchmark.p50_ms:>10.1f} "
+            f"{benchmark.hours_per_second:>10.1f}"
+        )
+    return "\n".join(lines)
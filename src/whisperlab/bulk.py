@@ -0,0 +1,575 @@
+"""
+Bulk Transcription Module
+
+This module transcribes many audio files in one process, so the interpreter,
+torch import and model load are paid once per worker instead of once per
+file.
+
+Files are given as paths, directories or glob patterns. They are transcribed
+by a pool of workers, and each result is written as one JSON line. With word
+alignment, each file's word timings can also be written as subtitles.
+
+Pools:
+    thread: Workers share one model. Decoding overlaps, inference is
+        serialized on the model (whisper models are not safe for concurrent
+        decoding).
+    process: Each worker process loads its own model once and runs
+        inference in parallel with the others. The cores are shared between
+        the workers by a ResourceConfig (see whisperlab.resources), so their
+        torch and BLAS threads do not oversubscribe the host.
+
+With a transcription server, the workers are client threads: the files are
+transcribed by the server's warm model, in micro-batches.
+
+Parallel efficiency compares a run's throughput with that of one worker
+running alone: N workers at 100% efficiency are N times as fast. A
+one-worker run is its own reference. A run with more workers can calibrate
+one by transcribing its first file alone, before the others start.
+
+With a manifest (see whisperlab.manifest), finished files are recorded as
+they complete, and long files after each of their chunks. A restarted run
+skips the finished files, and resumes long files from their last finished
+chunk. A sharded manifest splits the files between several hosts.
+"""
+
+from concurrent.futures import (
+    as_completed,
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from functools import partial
+import glob
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Optional, TextIO
+
+from pydantic import BaseModel
+
+import whisperlab.logging
+from whisperlab.alignment import (
+    DEFAULT_SUBTITLE_FORMAT,
+    WordTimings,
+    write_subtitles,
+)
+from whisperlab.client import DEFAULT_SERVER, ServerError, TranscriptionClient
+from whisperlab.defaults import (
+    DEFAULT_POOL,
+    DEFAULT_PRECISION,
+    DEFAULT_WORKERS,
+    POOLS,
+)
+from whisperlab.manifest import Manifest, save_checkpoint
+from whisperlab.resources import apply, ResourceConfig
+from whisperlab.time import time_ms
+from whisperlab.tracing import METRICS, TraceSummary
+from whisperlab.transcribe import (
+    DEFAULT_TRANSCRIPTION_MODEL,
+    EMPTY_RESULT,
+    transcribe,
+    TranscribeTask,
+)
+
+
+log = whisperlab.logging.config_log()
+
+# Constants ===================================================================
+
+AUDIO_EXTENSIONS = {
+    ".aac",
+    ".flac",
+    ".m4a",
+    ".mp3",
+    ".mp4",
+    ".ogg",
+    ".opus",
+    ".wav",
+    ".webm",
+}
+
+
+# Models ======================================================================
+
+
+class BulkSummary(BaseModel):
+    """
+    The outcome of a bulk run
+
+    Args:
+        files (int): The number of files processed
+        failed (int): The number of files that raised an error
+        skipped (int): The files the manifest records as done, which were
+            not transcribed again
+        resumed (int): The files resumed from a checkpoint in the manifest
+        audio_seconds (float): The total duration of the transcribed audio
+        wall_seconds (float): The wall time of the run
+        busy_seconds (float): The summed time workers spent on files
+        workers (int): The number of workers
+        cores (int): The number of cores the workers shared
+        threads_per_worker (int): The torch threads of each worker
+        reference_throughput (float): Audio seconds one worker transcribes
+            per busy second, running alone. None if it was not measured.
+    """
+
+    files: int = 0
+    failed: int = 0
+    skipped: int = 0
+    resumed: int = 0
+    audio_seconds: float = 0
+    wall_seconds: float = 0
+    busy_seconds: float = 0
+    workers: int = 1
+    cores: int = 1
+    threads_per_worker: int = 1
+    reference_throughput: Optional[float] = None
+
+    @property
+    def throughput(self) -> float:
+        """Audio seconds transcribed per wall second."""
+        return self.audio_seconds / self.wall_seconds if self.wall_seconds else 0.0
+
+    @property
+    def throughput_per_core(self) -> float:
+        """Audio seconds transcribed per wall second, per core."""
+        return self.throughput / self.cores
+
+    @property
+    def utilization(self) -> float:
+        """
+        The fraction of the workers' wall time they spent on files. Workers
+        that contend for cores stay busy, so this does not show contention.
+        """
+        capacity = self.workers * self.wall_seconds
+        return min(1.0, self.busy_seconds / capacity) if capacity else 0.0
+
+    @property
+    def speedup(self) -> Optional[float]:
+        """The throughput, relative to one worker running alone."""
+        if not self.reference_throughput:
+            return None
+        return self.throughput / self.reference_throughput
+
+    @property
+    def efficiency(self) -> Optional[float]:
+        """
+        The parallel efficiency: the speedup per worker. 1.0 when N workers
+        are N times as fast as one; falling efficiency as workers are added
+        means they contend for cores. None without a reference throughput.
+        """
+        speedup = self.speedup
+        return speedup / self.workers if speedup is not None else None
+
+
+# Path Expansion ==============================================================
+
+
+def is_glob(pattern: str) -> bool:
+    return any(char in pattern for char in "*?[")
+
+
+def expand_paths(patterns: Iterable[str]) -> list[Path]:
+    """
+    Expand paths, directories and glob patterns into audio files.
+
+    Directories are searched recursively for files with an audio extension.
+    Files named explicitly are kept whatever their extension.
+
+    Args:
+        patterns (Iterable[str]): The paths, directories and globs to expand
+
+    Returns:
+        list[Path]: The audio files, in order, without duplicates
+
+    Raises:
+        FileNotFoundError: If a path does not exist or a glob matches nothing
+    """
+    files = {}  # Ordered set
+
+    for pattern in patterns:
+        if is_glob(pattern):
+            matches = [Path(p) for p in sorted(glob.glob(pattern, recursive=True))]
+        else:
+            matches = [Path(pattern)]
+        matches = [path for path in matches if path.exists()]
+        if not matches:
+            raise FileNotFoundError(f"No audio files match: {pattern}")
+
+        for path in matches:
+            if path.is_dir():
+                for child in sorted(path.rglob("*")):
+                    if child.is_file() and child.suffix.lower() in AUDIO_EXTENSIONS:
+                        files[child] = None
+            elif path.is_file():
+                files[path] = None
+
+    return list(files)
+
+
+def subtitle_paths(audio_files: list[Path], subtitle_format: str) -> dict:
+    """
+    Name the subtitle file of every audio file.
+
+    Subtitles keep the audio files' paths relative to the directory they
+    all share, so files with the same name in different directories do not
+    overwrite each other. Files that would still share a name, e.g. talk.mp3
+    and talk.wav, get a numbered suffix, in order.
+
+    Args:
+        audio_files (list[Path]): The audio files
+        subtitle_format (str): The subtitle file extension
+
+    Returns:
+        dict: The relative subtitle path of each audio file
+    """
+    if not audio_files:
+        return {}
+    resolved = [path.resolve() for path in audio_files]
+    base = Path(os.path.commonpath([path.parent for path in resolved]))
+
+    paths = {}
+    taken = set()
+    for audio_file, path in zip(audio_files, resolved):
+        relative = path.relative_to(base)
+        name = relative.with_suffix(f".{subtitle_format}")
+        count = 1
+        while name in taken:
+            name = relative.with_name(f"{relative.stem}-{count}.{subtitle_format}")
+            count += 1
+        taken.add(name)
+        paths[audio_file] = name
+    return paths
+
+
+# Workers =====================================================================
+
+
+def make_record(
+    audio_file: Path,
+    model: str,
+    result: dict,
+    start_time: int,
+    error: Optional[str] = None,
+    metrics: Optional[dict] = None,
+) -> dict:
+    """Build the JSON-serializable record of one file's transcription."""
+    return {
+        "audio_file": str(audio_file),
+        "model": model,
+        "text": result["text"],
+        "language": result.get("language"),
+        "duration": result.get("duration", 0.0),
+        "segments": result.get("segments", []),
+        "words": result.get("words"),
+        "elapsed_ms": time_ms() - start_time,
+        "error": error,
+        "metrics": metrics,
+    }
+
+
+def transcribe_file(
+    audio_file: Path,
+    model: str,
+    args: dict,
+    cache: bool,
+    vad: bool = False,
+    precision: str = DEFAULT_PRECISION,
+    align: bool = False,
+    checkpoint: Optional[dict] = None,
+    ledger: Optional[Path] = None,
+) -> dict:
+    """
+    Transcribe one file, capturing errors in the result.
+
+    This runs inside pool workers; the model is loaded once per worker by
+    the model registry.
+
+    Args:
+        audio_file (Path): The audio file to transcribe
+        model (str): The transcription model to use
+        args (dict): Arguments to pass to whisper
+        cache (bool): Whether to use the result cache
+        vad (bool): Whether to transcribe only the detected speech
+        precision (str): The inference precision
+        align (bool): Whether to add word timings
+        checkpoint (dict): Resume the file from this checkpoint
+        ledger (Path): If given, a checkpoint of the file is appended to
+            this manifest ledger after each chunk
+
+    Returns:
+        dict: A JSON-serializable record of the transcription
+    """
+    start_time = time_ms()
+    on_checkpoint = None
+    if ledger is not None:
+        on_checkpoint = partial(save_checkpoint, ledger, audio_file)
+    try:
+        task = TranscribeTask(
+            audio_file=audio_file,
+            model=model,
+            args=args,
+            cache=cache,
+            vad=vad,
+            precision=precision,
+            align=align,
+            checkpoint=checkpoint,
+            on_checkpoint=on_checkpoint,
+        )
+        result = transcribe(task)
+    except Exception as e:
+        log.exception("Failed to transcribe %s", audio_file)
+        error = f"{type(e).__name__}: {e}"
+        return make_record(audio_file, model, EMPTY_RESULT, start_time, error)
+
+    metrics = task.metrics()
+    if metrics is not None:
+        metrics = metrics.model_dump()
+    return make_record(audio_file, model, result, start_time, metrics=metrics)
+
+
+def transcribe_remote(
+    audio_file: Path,
+    model: str,
+    args: dict,
+    cache: bool,
+    vad: bool = False,
+    precision: str = DEFAULT_PRECISION,
+    server: str = DEFAULT_SERVER,
+) -> dict:
+    """
+    Transcribe one file on a transcription server, capturing errors.
+
+    Args:
+        audio_file (Path): The audio file to transcribe
+        model (str): The transcription model to use
+        args (dict): Arguments to pass to whisper
+        cache (bool): Whether to use the server's result cache
+        vad (bool): Whether to transcribe only the detected speech
+        precision (str): The inference precision
+        server (str): The server address
+
+    Returns:
+        dict: A JSON-serializable record of the transcription
+    """
+    start_time = time_ms()
+    try:
+        result = TranscriptionClient(server).transcribe(
+            audio_file, model, args, vad=vad, cache=cache, precision=precision
+        )
+    except (OSError, ServerError) as e:
+        log.error("Failed to transcribe %s on %s: %s", audio_file, server, e)
+        error = f"{type(e).__name__}: {e}"
+        return make_record(audio_file, model, EMPTY_RESULT, start_time, error)
+    log.info("Transcription of %s:\n%s", audio_file, result["text"])
+    return make_record(audio_file, model, result, start_time)
+
+
+def make_pool(
+    pool: str, workers: int, resources: Optional[ResourceConfig] = None
+) -> Executor:
+    """
+    Create a thread or process pool.
+
+    Each process of a process pool configures its threads from `resources`.
+    """
+    if pool == "thread":
+        return ThreadPoolExecutor(max_workers=workers)
+    if pool == "process":
+        initializer = resources.pool_initializer() if resources is not None else {}
+        return ProcessPoolExecutor(max_workers=workers, **initializer)
+    raise ValueError(f"Unknown pool: {pool}. Choose from {POOLS}")
+
+
+# Use Case ====================================================================
+
+
+def transcribe_bulk(
+    audio_files: list[Path],
+    model: str = DEFAULT_TRANSCRIPTION_MODEL,
+    args: Optional[dict] = None,
+    workers: int = DEFAULT_WORKERS,
+    pool: str = DEFAULT_POOL,
+    output: Optional[TextIO] = None,
+    cache: bool = False,
+    vad: bool = False,
+    server: Optional[str] = None,
+    precision: str = DEFAULT_PRECISION,
+    resources: Optional[ResourceConfig] = None,
+    subtitles: Optional[Path] = None,
+    subtitle_format: str = DEFAULT_SUBTITLE_FORMAT,
+    manifest: Optional[Manifest] = None,
+    calibrate: bool = False,
+    reference_throughput: Optional[float] = None,
+) -> BulkSummary:
+    """
+    Transcribe many audio files with a pool of workers.
+
+    Args:
+        audio_files (list[Path]): The audio files to transcribe
+        model (str): The transcription model to use
+        args (dict): Arguments to pass to whisper
+        workers (int): The number of workers
+        pool (str): The kind of pool, "thread" or "process"
+        output (TextIO): Receives one JSON line per file, as files complete
+        cache (bool): Whether to use the result cache
+        vad (bool): Whether to transcribe only the detected speech
+        server (str): If given, the files are sent to this transcription
+            server by a pool of client threads
+        precision (str): The inference precision
+        resources (ResourceConfig): How the cores are shared between the
+            workers. Defaults to all available cores, split evenly.
+        subtitles (Path): If given, the words of each file are aligned, and
+            written to this directory (see subtitle_paths)
+        subtitle_format (str): One of SUBTITLE_FORMATS
+        manifest (Manifest): If given, only the files of its shard are
+            processed. The files it records as done are written to the
+            output from the manifest, without transcribing them again.
+        calibrate (bool): Whether to transcribe the first file alone, to
+            measure the reference throughput of the parallel efficiency
+        reference_throughput (float): The audio seconds per busy second of
+            an earlier one-worker run, instead of calibrating
+
+    Effects:
+        Logs a throughput, utilization and efficiency summary. Writes the
+        subtitle files. Records the progress of every file in the manifest.
+        Adds the metrics of traced files to the process-wide metrics. Sets
+        this process's torch threads, for a thread pool.
+
+    Returns:
+        BulkSummary: The run summary
+    """
+    if resources is None:
+        resources = ResourceConfig(workers=workers)
+    else:
+        resources = resources.model_copy(update={"workers": workers})
+
+    if subtitles is not None and server is not None:
+        log.warning("Word alignment runs locally, not on the server at %s", server)
+        server = None
+
+    if server is not None:
+        pool = "thread"  # Clients only wait on the server
+        worker = partial(transcribe_remote, server=server)
+    else:
+        worker = partial(transcribe_file, align=subtitles is not None)
+
+    if pool == "thread" and server is None:
+        # Thread workers share one model, whose inference is serialized, so
+        # the threads of that inference get every core
+        apply(resources)
+        threads = resources.cores
+    else:
+        threads = resources.threads
+
+    summary = BulkSummary(
+        workers=workers,
+        cores=resources.cores,
+        threads_per_worker=threads,
+        reference_throughput=reference_throughput,
+    )
+    if pool == "process" and resources.oversubscribed:
+        log.warning(
+            "%s workers with %s threads each oversubscribe %s cores",
+            workers,
+            resources.threads,
+            resources.cores,
+        )
+    start_time = time_ms()
+    if subtitles is not None:
+        names = subtitle_paths(audio_files, subtitle_format)
+
+    # Skip the files of other shards, and the files already done
+    resume = {}  # Audio file -> keyword arguments to resume it
+    if manifest is not None:
+        audio_files = [path for path in audio_files if manifest.owns(path)]
+        pending = []
+        for audio_file in audio_files:
+            record = manifest.record(audio_file)
+            if record is not None:
+                summary.skipped += 1
+                if output is not None:
+                    output.write(json.dumps(record) + "\n")
+                continue
+            pending.append(audio_file)
+            if server is None:
+                checkpoint = manifest.checkpoint(audio_file)
+                summary.resumed += checkpoint is not None
+                resume[audio_file] = {
+                    "checkpoint": checkpoint,
+                    "ledger": manifest.ledger,
+                }
+        audio_files = pending
+        if output is not None:
+            output.flush()
+        log.info(
+            "Skipping %s files done, resuming %s from checkpoints",
+            summary.skipped,
+            summary.resumed,
+        )
+
+    with make_pool(pool, workers, resources) as executor:
+
+        def submit(audio_file: Path):
+            kwargs = resume.get(audio_file, {})
+            return executor.submit(
+                worker, audio_file, model, args or {}, cache, vad, precision, **kwargs
+            )
+
+        futures = {}
+        if calibrate and workers > 1 and reference_throughput is None and audio_files:
+            # Time the first file on one worker, before the others start
+            first, *audio_files = audio_files
+            future = submit(first)
+            futures[future] = first
+            record = future.result()
+            if record["error"] is None and record["elapsed_ms"] > 0:
+                seconds = record["elapsed_ms"] / 1000
+                summary.reference_throughput = record["duration"] / seconds
+        futures.update({submit(audio_file): audio_file for audio_file in audio_files})
+        for future in as_completed(futures):
+            record = future.result()
+            if manifest is not None and record["error"] is None:
+                manifest.complete(futures[future], record)
+            summary.files += 1
+            summary.failed += record["error"] is not None
+            summary.audio_seconds += record["duration"]
+            summary.busy_seconds += record["elapsed_ms"] / 1000
+            if record["metrics"] is not None:
+                METRICS.observe(TraceSummary(**record["metrics"]))
+            if output is not None:
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+            if subtitles is not None and record["words"] is not None:
+                path = Path(subtitles) / names[futures[future]]
+                path.parent.mkdir(parents=True, exist_ok=True)
+                timings = WordTimings.from_dict(record["words"])
+                write_subtitles(timings, path, subtitle_format)
+
+    summary.wall_seconds = (time_ms() - start_time) / 1000
+    if workers == 1 and summary.reference_throughput is None and summary.busy_seconds:
+        summary.reference_throughput = summary.audio_seconds / summary.busy_seconds
+
+    log.info(
+        "Transcribed %s files (%s failed) with %s %s workers "
+        "(%s threads each, %s cores): "
+        "%.1f s of audio in %.1f s (%.2f audio-seconds per wall-second, "
+        "%.2f per core, %.0f%% worker utilization)",
+        summary.files,
+        summary.failed,
+        workers,
+        pool,
+        summary.threads_per_worker,
+        summary.cores,
+        summary.audio_seconds,
+        summary.wall_seconds,
+        summary.throughput,
+        summary.throughput_per_core,
+        summary.utilization * 100,
+    )
+    if summary.efficiency is not None:
+        log.info(
+            "%.2fx the throughput of one worker: %.0f%% parallel efficiency",
+            summary.speedup,
+            summary.efficiency * 100,
+        )
+    return summary
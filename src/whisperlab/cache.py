@@ -0,0 +1,300 @@
+"""
+Result Cache Module
+
+This module memoizes transcriptions on disk, so audio that was already
+transcribed with the same model and arguments is served without running
+the model.
+
+Results are content-addressed: the key is a hash of the decoded audio, the
+model name and the normalized whisper arguments. The same recording
+uploaded twice under different names hits the same entry.
+
+Decoding a file to hash it still costs an ffmpeg pass, so each file's
+(path, size, mtime) fingerprint is also mapped to its audio hash. A repeated
+file is then served from two small reads, without decoding it.
+
+Layout:
+    <directory>/results/<key[:2]>/<key>.json      Cached results
+    <directory>/audio/<fingerprint>               Audio hash of a file
+    <directory>/pcm/<fingerprint>.npy             Decoded audio of a file
+
+The first decode of a file (to hash it) also fills the decoded audio cache,
+so a cache miss is transcribed without decoding the file a second time.
+
+Writes are atomic (write to a temporary file, then rename). The results and
+audio hashes are kept under a size cap by evicting the least recently used
+entries. Each process tracks the size of its own writes, and scans the cache
+only when its count passes the cap, or every RESCAN_PUTS writes to see the
+writes of other processes.
+"""
+
+import hashlib
+from itertools import chain
+import json
+import os
+from pathlib import Path
+import tempfile
+import threading
+from typing import Optional
+
+from pydantic import BaseModel
+
+import whisperlab.logging
+from whisperlab.audio import file_fingerprint, PCMCache, stream_audio
+
+
+log = whisperlab.logging.config_log()
+
+# Constants ===================================================================
+
+CACHE_VERSION = 1  # Bump to invalidate results written by older versions
+
+DEFAULT_CACHE_DIR = Path(
+    os.environ.get(
+        "WHISPERLAB_CACHE_DIR",
+        Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "whisperlab",
+    )
+)
+
+DEFAULT_MAX_BYTES = 512 * 1024**2  # 512 MiB of results
+
+RESCAN_PUTS = 100  # Writes between scans of the cache size
+
+
+# Models ======================================================================
+
+
+class CacheStats(BaseModel):
+    """
+    Cache counters
+
+    Args:
+        hits (int): Lookups served from the cache
+        misses (int): Lookups that were not cached
+        evictions (int): Entries removed to stay within the size cap
+    """
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+# Helpers =====================================================================
+
+
+def atomic_write(path: Path, data: bytes):
+    """
+    Write a file so readers see either the old or the new contents.
+
+    Args:
+        path (Path): The file to write
+        data (bytes): The new contents
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def audio_digest(audio_file: Path, pcm_cache: Optional[PCMCache] = None) -> str:
+    """
+    Hash the decoded samples of an audio file.
+
+    Args:
+        audio_file (Path): The audio file to hash
+        pcm_cache (PCMCache): The decoded audio cache to use, if any
+
+    Returns:
+        str: The hex sha256 of the decoded 16 kHz float32 samples
+    """
+    digest = hashlib.sha256()
+    for block in stream_audio(audio_file, cache=pcm_cache):
+        digest.update(block.tobytes())
+    return digest.hexdigest()
+
+
+# Cache =======================================================================
+
+
+class ResultCache:
+    """
+    An on-disk, content-addressed cache of transcription results.
+
+    Args:
+        directory (Path): Where the cache lives
+        max_bytes (int): The size cap for cached results and audio hashes
+        pcm_cache (PCMCache): Stores the audio decoded for hashing, if given
+    """
+
+    def __init__(
+        self,
+        directory: Path = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        pcm_cache: Optional[PCMCache] = None,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.pcm_cache = pcm_cache
+        self._stats = CacheStats()
+        self._lock = threading.Lock()  # Guards the counters and eviction
+        self._bytes = None  # The size at the last scan, plus our writes since
+        self._writes = 0
+
+    # Keys --------------------------------------------------------------------
+
+    def audio_digest(self, audio_file: Path) -> str:
+        """
+        Get the hash of a file's decoded audio, decoding only on first sight.
+
+        Args:
+            audio_file (Path): The audio file
+
+        Returns:
+            str: The hex digest of the decoded audio
+        """
+        index = self.directory / "audio" / file_fingerprint(audio_file)
+        try:
+            digest = index.read_text()
+            os.utime(index)  # Mark as recently used
+            return digest
+        except FileNotFoundError:
+            digest = audio_digest(audio_file, self.pcm_cache)
+            atomic_write(index, digest.encode())
+            self._written(len(digest))
+            return digest
+
+    def key(self, audio_file: Path, model: str, args: dict) -> str:
+        """
+        Get the cache key of a transcription.
+
+        Args:
+            audio_file (Path): The transcribed audio file
+            model (str): The transcription model
+            args (dict): Arguments passed to whisper
+
+        Returns:
+            str: The hex cache key
+        """
+        identity = json.dumps(
+            {
+                "version": CACHE_VERSION,
+                "audio": self.audio_digest(audio_file),
+                "model": model,
+                "args": args,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.directory / "results" / key[:2] / f"{key}.json"
+
+    # Lookups -----------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Get a cached result.
+
+        Args:
+            key (str): The cache key
+
+        Returns:
+            dict: The cached result, or None on a miss
+        """
+        path = self.path(key)
+        try:
+            result = json.loads(path.read_bytes())
+            os.utime(path)  # Mark as recently used
+        except (FileNotFoundError, json.JSONDecodeError):
+            result = None
+
+        with self._lock:
+            if result is None:
+                self._stats.misses += 1
+            else:
+                self._stats.hits += 1
+            log.info(
+                "Result cache %s (hit rate %.0f%%: %s hits, %s misses)",
+                "miss" if result is None else "hit",
+                100 * self._stats.hit_rate,
+                self._stats.hits,
+                self._stats.misses,
+            )
+        return result
+
+    def put(self, key: str, result: dict):
+        """
+        Cache a result, then evict old results beyond the size cap.
+
+        Args:
+            key (str): The cache key
+            result (dict): The JSON-serializable result
+        """
+        data = json.dumps(result).encode()
+        atomic_write(self.path(key), data)
+        self._written(len(data))
+
+    def _written(self, size: int):
+        """Count a write, and evict when the cache may be over its cap."""
+        with self._lock:
+            self._writes += 1
+            if self._bytes is not None:
+                self._bytes += size
+            due = (
+                self._bytes is None
+                or self._bytes > self.max_bytes
+                or self._writes % RESCAN_PUTS == 0
+            )
+        if due:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used results and audio hashes until under
+        the size cap.
+        """
+        with self._lock:
+            entries = []
+            paths = chain(
+                (self.directory / "results").glob("*/*.json"),
+                (self.directory / "audio").glob("[!.]*"),  # Not temporary files
+            )
+            for path in paths:
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue  # Evicted by another process
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                self._stats.evictions += 1
+            self._bytes = total
+
+    def stats(self) -> CacheStats:
+        """Get a snapshot of the cache counters."""
+        with self._lock:
+            return self._stats.model_copy()
+
+
+# Process-wide Cache ==========================================================
+
+
+PCM_CACHE = PCMCache(DEFAULT_CACHE_DIR / "pcm")
+
+RESULT_CACHE = ResultCache(pcm_cache=PCM_CACHE)
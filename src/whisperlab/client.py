@@ -0,0 +1,249 @@
+"""
+Transcription Client Module
+
+This module talks to a running `whisperlab serve` server, so short clips
+are transcribed by its warm model instead of loading one per invocation.
+
+It only uses the standard library: a thin client never imports torch or
+whisper.
+
+Addresses:
+    unix:/run/user/1000/whisperlab.sock    A Unix socket (the default)
+    http://127.0.0.1:8765                  A TCP server
+
+Files are sent as paths to a server on this machine (a Unix socket or a
+loopback address), and uploaded to any other server.
+
+Usage Examples:
+    >>> client = TranscriptionClient()
+    >>> if client.available():
+    ...     result = client.transcribe("audio.wav", on_segment=print)
+"""
+
+import http.client
+import json
+import os
+from pathlib import Path
+import socket
+import tempfile
+from typing import Callable, Iterator, Optional
+from urllib.parse import urlencode, urlsplit
+
+
+# Constants ===================================================================
+
+DEFAULT_SOCKET = (
+    Path(os.environ.get("XDG_RUNTIME_DIR", tempfile.gettempdir())) / "whisperlab.sock"
+)
+
+DEFAULT_SERVER = os.environ.get("WHISPERLAB_SERVER", f"unix:{DEFAULT_SOCKET}")
+
+DEFAULT_PORT = 8765
+
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+CONNECT_TIMEOUT = 0.2  # Seconds to wait when checking for a server
+
+
+# Exceptions ==================================================================
+
+
+class ServerError(Exception):
+    """
+    Raised when the server rejects or fails a request
+    """
+
+
+class ServerBusy(ServerError):
+    """
+    Raised when the server's queue is full. Retry later.
+    """
+
+
+# Connections =================================================================
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """An HTTP connection over a Unix socket."""
+
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def parse_address(address: str) -> tuple[str, str, int]:
+    """
+    Parse a server address.
+
+    Args:
+        address (str): "unix:<path>", "http://<host>:<port>" or "<host>:<port>"
+
+    Returns:
+        tuple[str, str, int]: ("unix", path, 0) or ("tcp", host, port)
+    """
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:") :], 0
+    if "://" not in address:
+        address = f"http://{address}"
+    parts = urlsplit(address)
+    return "tcp", parts.hostname or "localhost", parts.port or DEFAULT_PORT
+
+
+# Client ======================================================================
+
+
+class TranscriptionClient:
+    """
+    A client for a whisperlab transcription server.
+
+    Args:
+        address (str): The server address
+        timeout (float): Seconds to wait for each read. None waits forever.
+    """
+
+    def __init__(self, address: str = DEFAULT_SERVER, timeout: Optional[float] = None):
+        self.address = address
+        self.kind, self.host, self.port = parse_address(address)
+        self.timeout = timeout
+
+    @property
+    def local(self) -> bool:
+        """Whether the server shares this machine's files."""
+        return self.kind == "unix" or self.host in LOCAL_HOSTS
+
+    def connect(self, timeout: Optional[float] = None) -> http.client.HTTPConnection:
+        timeout = timeout if timeout is not None else self.timeout
+        if self.kind == "unix":
+            return UnixHTTPConnection(self.host, timeout=timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def available(self) -> bool:
+        """Check whether the server is running."""
+        try:
+            return self.health(timeout=CONNECT_TIMEOUT)["status"] == "ok"
+        except (OSError, ServerError, ValueError):
+            return False
+
+    def health(self, timeout: Optional[float] = None) -> dict:
+        """Get the server status, queue depth and loaded models."""
+        connection = self.connect(timeout)
+        try:
+            connection.request("GET", "/health")
+            response = connection.getresponse()
+            return json.loads(response.read())
+        finally:
+            connection.close()
+
+    def events(
+        self,
+        audio_file: Path,
+        model: Optional[str] = None,
+        args: Optional[dict] = None,
+        vad: bool = False,
+        cache: bool = False,
+        precision: Optional[str] = None,
+    ) -> Iterator[dict]:
+        """
+        Transcribe a file, streaming the server's events.
+
+        Args:
+            audio_file (Path): The audio file
+            model (str): The transcription model. None uses the server's.
+            args (dict): Arguments to pass to whisper
+            vad (bool): Whether to transcribe only the detected speech
+            cache (bool): Whether to use the server's result cache
+            precision (str): The inference precision. None uses the server's.
+
+        Yields:
+            dict: "segment" events as they are transcribed, then a "result"
+                event with the full result
+
+        Raises:
+            ServerBusy: If the server's queue is full
+            ServerError: If the server rejects or fails the request
+        """
+        options = {"args": args or {}, "vad": vad, "cache": cache}
+        if model is not None:
+            options["model"] = model
+        if precision is not None:
+            options["precision"] = precision
+
+        connection = self.connect()
+        try:
+            if self.local:
+                body = json.dumps(
+                    {"audio_file": str(Path(audio_file).resolve()), **options}
+                )
+                connection.request(
+                    "POST",
+                    "/transcribe",
+                    body=body,
+                    headers={"Content-Type": "application/json"},
+                )
+            else:
+                query = urlencode({"options": json.dumps(options)})
+                with open(audio_file, "rb") as f:
+                    connection.request(
+                        "POST",
+                        f"/transcribe?{query}",
+                        body=f,
+                        headers={
+                            "Content-Type": "application/octet-stream",
+                            "Content-Length": os.fstat(f.fileno()).st_size,
+                        },
+                    )
+
+            response = connection.getresponse()
+            if response.status == 503:
+                raise ServerBusy(json.loads(response.read())["error"])
+            if response.status != 200:
+                raise ServerError(json.loads(response.read())["error"])
+
+            while line := response.readline():
+                event = json.loads(line)
+                if event["event"] == "error":
+                    raise ServerError(event["error"])
+                yield event
+        finally:
+            connection.close()
+
+    def transcribe(
+        self,
+        audio_file: Path,
+        model: Optional[str] = None,
+        args: Optional[dict] = None,
+        vad: bool = False,
+        cache: bool = False,
+        on_segment: Optional[Callable[[dict], None]] = None,
+        precision: Optional[str] = None,
+    ) -> dict:
+        """
+        Transcribe a file on the server.
+
+        Args:
+            audio_file (Path): The audio file
+            model (str): The transcription model. None uses the server's.
+            args (dict): Arguments to pass to whisper
+            vad (bool): Whether to transcribe only the detected speech
+            cache (bool): Whether to use the server's result cache
+            on_segment (Callable): Called with each segment as it arrives
+            precision (str): The inference precision. None uses the server's.
+
+        Returns:
+            dict: The whisper-style result
+
+        Raises:
+            ServerBusy: If the server's queue is full
+            ServerError: If the server rejects or fails the request
+        """
+        for event in self.events(audio_file, model, args, vad, cache, precision):
+            if event["event"] == "segment" and on_segment is not None:
+                on_segment(event["segment"])
+            elif event["event"] == "result":
+                return event["result"]
+        raise ServerError("The server closed the stream without a result")
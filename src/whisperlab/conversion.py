@@ -0,0 +1,257 @@
+"""
+Sample Conversion Module
+
+This module validates and converts audio samples between float32 in [-1, 1]
+and integer PCM, without full-size temporary arrays.
+
+Arrays are processed in cache-sized chunks: range checks are min / max
+reductions, and conversions run in-place ufuncs on one reusable scratch
+chunk, writing into the output buffer. Callers that convert many blocks,
+e.g. live audio, can pass the same output buffer every time.
+
+Formats:
+    int16: 16-bit PCM
+    int24: 24-bit PCM, held in int32 (see pack_int24 for the 3-byte layout)
+    int32: 32-bit PCM
+
+Full scale is 2 ** (bits - 1): -1.0 maps to the lowest integer, and 1.0
+saturates to the highest, so integer PCM round-trips exactly.
+
+Overflow Policies:
+    raise: Samples outside [-1, 1], or NaN, raise AudioOverflow
+    clip: Samples outside [-1, 1] are clipped to full scale. Samples must
+        be finite.
+    saturate: As clip, and NaN samples become silence, so any input
+        converts
+
+Usage Examples:
+    >>> pcm = float_to_pcm(samples, "int16", policy=CLIP)
+    >>> samples = pcm_to_float(pcm, out=samples)
+    >>> wav_bytes = pack_int24(float_to_pcm(samples, "int24"))
+"""
+
+from typing import Optional, Union
+
+import numpy as np
+
+
+# Constants ===================================================================
+
+# Samples per chunk: the scratch chunk stays in the CPU caches
+DEFAULT_CHUNK_SAMPLES = 65_536
+
+# PCM format: (container dtype, bits)
+PCM_FORMATS = {
+    "int16": (np.dtype(np.int16), 16),
+    "int24": (np.dtype("<i4"), 24),
+    "int32": (np.dtype("<i4"), 32),
+}
+
+RAISE = "raise"
+CLIP = "clip"
+SATURATE = "saturate"
+OVERFLOW_POLICIES = [RAISE, CLIP, SATURATE]
+
+
+# Exceptions ==================================================================
+
+
+class AudioOverflow(Exception):
+    """
+    Raised when an audio array contains samples outside [-1, 1]
+    """
+
+
+# Validation ==================================================================
+
+
+def sample_range(
+    audio: np.ndarray, chunk: int = DEFAULT_CHUNK_SAMPLES
+) -> tuple[float, float]:
+    """
+    Get the lowest and highest samples of an array.
+
+    Both reductions run chunk by chunk, so each chunk is read from memory
+    once, and nothing is allocated.
+
+    Args:
+        audio (np.ndarray): The samples
+        chunk (int): Samples per chunk
+
+    Returns:
+        tuple[float, float]: The (min, max) samples, NaN if any is NaN, or
+            (0, 0) for an empty array
+    """
+    audio = audio.reshape(-1)
+    low = high = 0.0
+    for start in range(0, len(audio), chunk):
+        block = audio[start : start + chunk]
+        block_low, block_high = float(block.min()), float(block.max())
+        if np.isnan(block_low):
+            return np.nan, np.nan
+        low = block_low if start == 0 else min(low, block_low)
+        high = block_high if start == 0 else max(high, block_high)
+    return low, high
+
+
+def in_range(
+    audio: np.ndarray, limit: float = 1.0, chunk: int = DEFAULT_CHUNK_SAMPLES
+) -> bool:
+    """
+    Check that every sample is in [-limit, limit]. NaN samples are not.
+
+    Args:
+        audio (np.ndarray): The samples
+        limit (float): The largest magnitude allowed
+        chunk (int): Samples per chunk
+
+    Returns:
+        bool: Whether every sample is in range
+    """
+    low, high = sample_range(audio, chunk)
+    return low >= -limit and high <= limit  # False for NaN
+
+
+# Converters ==================================================================
+
+
+def output_buffer(
+    out: Optional[np.ndarray], shape: tuple, dtype: np.dtype
+) -> np.ndarray:
+    """Allocate an output buffer, or check that a given one fits."""
+    if out is None:
+        return np.empty(shape, dtype)
+    if out.shape != shape or out.dtype != dtype or not out.flags.c_contiguous:
+        raise ValueError(
+            f"Output buffer must be a contiguous {dtype} array of shape {shape}, "
+            f"not {out.dtype} {out.shape}"
+        )
+    return out
+
+
+def float_to_pcm(
+    audio: np.ndarray,
+    format: str = "int16",
+    policy: str = RAISE,
+    out: Optional[np.ndarray] = None,
+    chunk: int = DEFAULT_CHUNK_SAMPLES,
+) -> np.ndarray:
+    """
+    Convert float samples in [-1, 1] to integer PCM.
+
+    Samples are rounded to the nearest integer.
+
+    Args:
+        audio (np.ndarray): The float samples, of any shape
+        format (str): The PCM format, "int16", "int24" or "int32"
+        policy (str): What to do with samples outside [-1, 1]: "raise",
+            "clip" or "saturate"
+        out (np.ndarray): A contiguous buffer for the result, of the
+            format's container type and the audio's shape. Allocated if
+            None.
+        chunk (int): Samples per chunk
+
+    Returns:
+        np.ndarray: The PCM samples (`out`, if given)
+
+    Raises:
+        AudioOverflow: If the policy is "raise" and a sample is outside
+            [-1, 1]. The chunks before it are already converted.
+        ValueError: If the format, policy or output buffer is invalid
+    """
+    if format not in PCM_FORMATS:
+        raise ValueError(f"Unknown PCM format: {format}. Choose from {PCM_FORMATS}")
+    if policy not in OVERFLOW_POLICIES:
+        raise ValueError(f"Unknown policy: {policy}. Choose from {OVERFLOW_POLICIES}")
+
+    dtype, bits = PCM_FORMATS[format]
+    out = output_buffer(out, audio.shape, dtype)
+    scale = 2.0 ** (bits - 1)
+    low, high = -scale, scale - 1
+
+    # float32 holds every 24-bit integer exactly; 32-bit needs float64
+    work_dtype = np.float32 if bits <= 24 else np.float64
+    samples, pcm = audio.reshape(-1), out.reshape(-1)
+    scratch = np.empty(min(chunk, len(samples)), work_dtype)
+
+    for start in range(0, len(samples), chunk):
+        block = samples[start : start + chunk]
+        if policy == RAISE and not in_range(block, chunk=chunk):
+            raise AudioOverflow(
+                f"Audio overflow: samples outside [-1, 1] after sample {start}"
+            )
+        work = scratch[: len(block)]
+        np.multiply(block, scale, out=work)
+        if policy == SATURATE:
+            np.nan_to_num(work, copy=False, nan=0.0)
+        np.rint(work, out=work)
+        np.clip(work, low, high, out=work)
+        np.copyto(pcm[start : start + len(block)], work, casting="unsafe")
+    return out
+
+
+def pcm_to_float(
+    pcm: np.ndarray, bits: Optional[int] = None, out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Convert integer PCM to float32 samples in [-1, 1).
+
+    Args:
+        pcm (np.ndarray): The PCM samples, of any shape
+        bits (int): The PCM bit depth, e.g. 24 for int24 samples in int32.
+            Defaults to the width of the integer type.
+        out (np.ndarray): A contiguous float32 buffer for the result, of
+            the samples' shape. Allocated if None.
+
+    Returns:
+        np.ndarray: The float32 samples (`out`, if given)
+    """
+    bits = bits or pcm.dtype.itemsize * 8
+    out = output_buffer(out, pcm.shape, np.dtype(np.float32))
+    np.multiply(pcm, 2.0 ** -(bits - 1), out=out, dtype=np.float32)
+    return out
+
+
+def pack_int24(pcm: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Pack int24 samples, held in int32, as 3-byte little-endian PCM.
+
+    Args:
+        pcm (np.ndarray): The int24 samples, as int32
+        out (np.ndarray): A uint8 buffer of 3 bytes per sample. Allocated
+            if None.
+
+    Returns:
+        np.ndarray: The packed bytes, as uint8 (`out`, if given)
+    """
+    pcm = np.ascontiguousarray(pcm, "<i4").reshape(-1)
+    out = output_buffer(out, (3 * len(pcm),), np.dtype(np.uint8))
+    out.reshape(-1, 3)[:] = pcm.view(np.uint8).reshape(-1, 4)[:, :3]
+    return out
+
+
+def unpack_int24(
+    data: Union[bytes, np.ndarray], out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Unpack 3-byte little-endian PCM into int24 samples, held in int32.
+
+    Args:
+        data (bytes | np.ndarray): The packed bytes. A trailing partial
+            sample is ignored.
+        out (np.ndarray): A little-endian int32 buffer of one item per
+            sample. Allocated if None.
+
+    Returns:
+        np.ndarray: The int24 samples (`out`, if given)
+    """
+    data = np.frombuffer(data, np.uint8) if not isinstance(data, np.ndarray) else data
+    count = len(data) // 3
+    out = output_buffer(out, (count,), np.dtype("<i4"))
+
+    # Write each sample to the top 3 bytes, then shift down, extending the sign
+    octets = out.view(np.uint8).reshape(-1, 4)
+    octets[:, 0] = 0
+    octets[:, 1:] = data[: 3 * count].reshape(-1, 3)
+    out >>= 8
+    return out
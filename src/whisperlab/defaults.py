@@ -0,0 +1,68 @@
+"""
+Defaults Module
+
+This module holds the defaults shown by the command line, so that
+`whisperlab --help` can list them without importing whisper or torch.
+
+The modules that use these defaults re-export them.
+"""
+
+# Models ======================================================================
+
+TRANSCRIPTION_MODELS = ["base", "tiny", "small"]
+
+DEFAULT_TRANSCRIPTION_MODEL = TRANSCRIPTION_MODELS[0]
+
+# Drafts the provisional text of speculative live transcription
+DEFAULT_DRAFT_MODEL = "tiny"
+
+# A tiny model with whisper's architecture and vocabulary
+STANDIN_MODEL = "standin"
+
+# Inference precisions: int8-dynamic runs on the CPU only, and bf16 falls
+# back to fp32 where the hardware lacks it
+PRECISIONS = ["fp32", "int8-dynamic", "bf16"]
+
+DEFAULT_PRECISION = PRECISIONS[0]
+
+
+# Bulk Transcription ==========================================================
+
+POOLS = ["thread", "process"]
+
+DEFAULT_POOL = POOLS[0]
+
+DEFAULT_WORKERS = 1
+
+DEFAULT_BATCH_SIZE = 8
+
+
+# Distributed Transcription ===================================================
+
+DEFAULT_LEASE_SECONDS = 30  # A chunk's worker is presumed dead after this
+
+
+# Alignment ===================================================================
+
+SUBTITLE_FORMATS = ["srt", "vtt", "json"]
+
+DEFAULT_SUBTITLE_FORMAT = SUBTITLE_FORMATS[0]
+
+
+# Server ======================================================================
+
+DEFAULT_QUEUE_SIZE = 64  # Requests waiting for the model before 503s
+
+DEFAULT_MAX_WAIT_MS = 10  # How long a batch waits for more requests
+
+DEFAULT_MAX_LONG_JOBS = 4  # Long files in flight before 503s
+
+
+# Benchmarks ==================================================================
+
+DEFAULT_BENCH_MODEL = STANDIN_MODEL
+
+DEFAULT_REPEATS = 5
+
+# A stage regresses when its p50 is this much slower than the baseline...
+DEFAULT_TOLERANCE = 0.25
@@ -0,0 +1,434 @@
+"""
+Distributed Transcription Module
+
+This module spreads the transcription of long audio files over many hosts,
+through a spool directory on a shared filesystem.
+
+A coordinator splits each file into overlapping 30 s chunks (see
+whisperlab.longform). Each chunk becomes a ChunkTask, whose batch is the
+file and whose sequence is the chunk's index. Workers on any host claim
+pending chunks, transcribe them and write their results back to the spool.
+The coordinator stitches each file's chunk results in sequence order as
+they arrive, and yields the file's result once its last chunk is stitched.
+
+Layout:
+    <spool>/pending/<batch>.<sequence>.json      Chunks waiting for a worker
+    <spool>/claimed/<batch>.<sequence>.json      Chunks being transcribed
+    <spool>/results/<batch>.<sequence>.json      Chunk results
+    <spool>/audio/<batch>.<sequence>.npy         Chunk samples
+    <spool>/stop                                 Tells the workers to exit
+
+A worker claims a chunk by renaming it from pending/ to claimed/. The rename
+is atomic, so exactly one worker wins each chunk. While it transcribes, the
+worker touches the claimed file every heartbeat. A claimed chunk whose
+lease expires, because its worker died or hung, is renamed back to pending/
+by the coordinator, and another worker takes it over. A late result from
+the first worker is harmless: both results are of the same chunk, and a
+result that arrives after its file is done is removed by its worker.
+
+Results and tasks are written atomically (see whisperlab.cache), so readers
+never see partial files. Leases compare file modification times with the
+coordinator's clock, so the hosts' clocks should be synchronized.
+
+Usage Examples:
+    >>> coordinator = Coordinator(Path("/mnt/spool"))
+    >>> coordinator.submit(Path("/mnt/archive/talk.mp3"))
+    >>> for audio_file, result in coordinator.results():
+    ...     print(audio_file, result["text"])
+
+    (on each worker host)
+    >>> SpoolWorker(Path("/mnt/spool")).run()
+"""
+
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Callable, Iterator, Optional
+from uuid import uuid4
+
+import numpy as np
+
+import whisperlab.logging
+from whisperlab.audio import stream_audio
+from whisperlab.cache import atomic_write
+from whisperlab.defaults import DEFAULT_LEASE_SECONDS, DEFAULT_PRECISION
+from whisperlab.longform import (
+    Chunk,
+    chunk_audio,
+    CHUNK_SECONDS,
+    OVERLAP_SECONDS,
+    Stitcher,
+)
+from whisperlab.models import get_model, model_lock
+from whisperlab.tasks import Task
+from whisperlab.transcribe import DEFAULT_TRANSCRIPTION_MODEL
+
+
+log = whisperlab.logging.config_log()
+
+# Constants ===================================================================
+
+HEARTBEAT_SECONDS = 5  # Time between a worker's lease renewals
+POLL_SECONDS = 0.2  # Time between spool scans
+
+
+# Models ======================================================================
+
+
+class ChunkTask(Task):
+    """
+    One chunk of an audio file, transcribed by a worker
+
+    The task's batch names the file, and its sequence is the chunk's index.
+
+    Args:
+        audio_file (str): The file the chunk was taken from
+        offset (int): The file sample where the chunk starts
+        length (int): The number of samples in the chunk
+        last (bool): Whether this is the file's last chunk
+        model (str): The transcription model to use
+        precision (str): The inference precision
+        args (dict): Arguments to pass to whisper
+    """
+
+    audio_file: str
+    offset: int
+    length: int
+    last: bool
+    model: str = DEFAULT_TRANSCRIPTION_MODEL
+    precision: str = DEFAULT_PRECISION
+    args: dict = {}
+
+    @property
+    def name(self) -> str:
+        """The task's file name in the spool, without suffix."""
+        return f"{self.batch}.{self.sequence:06d}"
+
+
+# Spool =======================================================================
+
+
+class Spool:
+    """
+    The directories of a spool, shared by a coordinator and its workers.
+
+    Args:
+        directory (Path): The spool directory, created if needed
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.pending = self.directory / "pending"
+        self.claimed = self.directory / "claimed"
+        self.results = self.directory / "results"
+        self.audio = self.directory / "audio"
+        self.stop = self.directory / "stop"
+        for path in [self.pending, self.claimed, self.results, self.audio]:
+            path.mkdir(parents=True, exist_ok=True)
+
+    def samples_path(self, name: str) -> Path:
+        return self.audio / f"{name}.npy"
+
+
+def transcribe_chunk(task: ChunkTask, samples: np.ndarray) -> dict:
+    """
+    Transcribe a chunk with a model from the model registry.
+
+    Args:
+        task (ChunkTask): The chunk
+        samples (np.ndarray): Its float32 16 kHz samples
+
+    Returns:
+        dict: The whisper result, with times relative to the chunk
+    """
+    model = get_model(task.model, dtype=task.precision)
+    with model_lock(model):
+        return model.transcribe(samples, fp16=False, **task.args)
+
+
+# Worker ======================================================================
+
+
+class SpoolWorker:
+    """
+    Transcribe the chunks of a spool until the coordinator stops it.
+
+    Args:
+        spool (Path): The spool directory
+        transcriber (Callable): Maps a ChunkTask and its samples to a
+            whisper result
+        heartbeat_seconds (float): Time between lease renewals. Well under
+            the coordinator's lease.
+        poll_seconds (float): Time between scans of an empty spool
+    """
+
+    def __init__(
+        self,
+        spool: Path,
+        transcriber: Callable[[ChunkTask, np.ndarray], dict] = transcribe_chunk,
+        heartbeat_seconds: float = HEARTBEAT_SECONDS,
+        poll_seconds: float = POLL_SECONDS,
+    ):
+        self.spool = Spool(spool)
+        self.transcriber = transcriber
+        self.heartbeat_seconds = heartbeat_seconds
+        self.poll_seconds = poll_seconds
+        self.chunks = 0  # Chunks transcribed
+
+    def claim(self) -> Optional[Path]:
+        """
+        Claim the first pending chunk, in name order, so that each file's
+        chunks are claimed in sequence order.
+
+        Returns:
+            Path: The claimed task file, or None if no chunk is pending
+        """
+        for path in sorted(self.spool.pending.glob("*.json")):
+            claimed = self.spool.claimed / path.name
+            try:
+                # Start the lease before the rename, as a chunk may have been
+                # pending for longer than a lease
+                os.utime(path)
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue  # Another worker won it
+            return claimed
+        return None
+
+    def process(self, claimed: Path):
+        """
+        Transcribe a claimed chunk, renewing its lease until the result is
+        written.
+
+        Args:
+            claimed (Path): The claimed task file
+        """
+        try:
+            task = ChunkTask.model_validate_json(claimed.read_text())
+            samples = np.load(self.spool.samples_path(task.name))
+        except FileNotFoundError:
+            # A chunk requeued since the claim, or whose file is done
+            log.info("Chunk %s is no longer ours", claimed.stem)
+            claimed.unlink(missing_ok=True)
+            return
+        done = threading.Event()
+
+        def heartbeat():
+            while not done.wait(self.heartbeat_seconds):
+                try:
+                    os.utime(claimed)
+                except FileNotFoundError:
+                    return  # The lease expired, and the chunk was requeued
+
+        renewer = threading.Thread(target=heartbeat, daemon=True)
+        renewer.start()
+        try:
+            output = {"result": self.transcriber(task, samples)}
+        except Exception as e:
+            log.exception("Failed to transcribe chunk %s", task.name)
+            output = {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            done.set()
+            renewer.join()
+        path = self.spool.results / f"{task.name}.json"
+        atomic_write(path, json.dumps(output).encode())
+        if not self.spool.samples_path(task.name).exists():
+            # A late duplicate: the coordinator removed the samples, then the
+            # results, of the done file, so no one else removes this one
+            path.unlink(missing_ok=True)
+
+        claimed.unlink(missing_ok=True)
+        self.chunks += 1
+        log.info("Transcribed chunk %s of %s", task.sequence, task.audio_file)
+
+    def run(self):
+        """
+        Claim and transcribe chunks until the spool's stop file appears.
+
+        Effects:
+            Logs the number of chunks transcribed.
+        """
+        log.info("Worker %s serving %s", os.getpid(), self.spool.directory)
+        while not self.spool.stop.exists():
+            claimed = self.claim()
+            if claimed is None:
+                time.sleep(self.poll_seconds)
+                continue
+            self.process(claimed)
+        log.info("Worker %s stopped after %s chunks", os.getpid(), self.chunks)
+
+
+# Coordinator =================================================================
+
+
+class Assembly:
+    """
+    The reassembly of one file from its chunk results.
+
+    Args:
+        audio_file (str): The file
+        tasks (list[ChunkTask]): Its chunks, in sequence order
+        overlap_seconds (float): The audio shared by consecutive chunks
+    """
+
+    def __init__(self, audio_file: str, tasks: list[ChunkTask], overlap_seconds):
+        self.audio_file = audio_file
+        self.tasks = tasks
+        self.stitcher = Stitcher(overlap_seconds)
+        self.stitched = 0  # Chunks stitched, in sequence order
+        self.error = None  # The first chunk error
+
+    @property
+    def done(self) -> bool:
+        return self.stitched == len(self.tasks)
+
+    def result(self) -> dict:
+        """The stitched whisper-style result, with the first chunk error."""
+        return {**self.stitcher.result(), "error": self.error}
+
+
+class Coordinator:
+    """
+    Split audio files into chunk tasks, and reassemble their results.
+
+    Args:
+        spool (Path): The spool directory
+        lease_seconds (float): How long a claimed chunk may go without a
+            heartbeat before it is given to another worker
+        chunk_seconds (float): The length of each chunk
+        overlap_seconds (float): The audio shared by consecutive chunks
+        poll_seconds (float): Time between scans for results
+        on_segments (Callable): Called with each file and the new segments
+            of each stitched chunk, in sequence order
+    """
+
+    def __init__(
+        self,
+        spool: Path,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        chunk_seconds: float = CHUNK_SECONDS,
+        overlap_seconds: float = OVERLAP_SECONDS,
+        poll_seconds: float = POLL_SECONDS,
+        on_segments: Optional[Callable[[str, list[dict]], None]] = None,
+    ):
+        self.spool = Spool(spool)
+        self.spool.stop.unlink(missing_ok=True)
+        self.lease_seconds = lease_seconds
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        self.poll_seconds = poll_seconds
+        self.on_segments = on_segments
+        self.requeued = 0  # Chunks whose lease expired
+
+        self._assemblies = {}  # Batch -> Assembly, until the file is done
+
+    def submit(
+        self,
+        audio_file: Path,
+        model: str = DEFAULT_TRANSCRIPTION_MODEL,
+        args: Optional[dict] = None,
+        precision: str = DEFAULT_PRECISION,
+    ) -> str:
+        """
+        Split a file into chunk tasks, and queue them for the workers.
+
+        Args:
+            audio_file (Path): The audio file to transcribe
+            model (str): The transcription model to use
+            args (dict): Arguments to pass to whisper
+            precision (str): The inference precision
+
+        Returns:
+            str: The batch of the file's chunks
+        """
+        batch = uuid4().hex
+        blocks = stream_audio(audio_file)
+        tasks = []
+        for chunk in chunk_audio(blocks, self.chunk_seconds, self.overlap_seconds):
+            task = ChunkTask(
+                batch=batch,
+                sequence=chunk.index,
+                audio_file=str(audio_file),
+                offset=chunk.offset,
+                length=len(chunk.samples),
+                last=chunk.last,
+                model=model,
+                precision=precision,
+                args=args or {},
+            )
+            # The samples first, so a pending task's samples are complete
+            np.save(self.spool.samples_path(task.name), chunk.samples)
+            path = self.spool.pending / f"{task.name}.json"
+            atomic_write(path, task.model_dump_json().encode())
+            tasks.append(task)
+
+        self._assemblies[batch] = Assembly(str(audio_file), tasks, self.overlap_seconds)
+        log.info("Queued %s chunks of %s as batch %s", len(tasks), audio_file, batch)
+        return batch
+
+    def requeue_expired(self):
+        """Give the chunks of dead or hung workers back to the queue."""
+        now = time.time()
+        for path in self.spool.claimed.glob("*.json"):
+            try:
+                if now - path.stat().st_mtime <= self.lease_seconds:
+                    continue
+                os.rename(path, self.spool.pending / path.name)
+            except FileNotFoundError:
+                continue  # Finished meanwhile
+            self.requeued += 1
+            log.warning("Lease of chunk %s expired: requeued", path.stem)
+
+    def _stitch(self, assembly: Assembly):
+        """Stitch a file's next chunk results, as long as they arrived."""
+        while not assembly.done:
+            task = assembly.tasks[assembly.stitched]
+            path = self.spool.results / f"{task.name}.json"
+            if not path.exists():
+                return
+            output = json.loads(path.read_text())
+            assembly.error = assembly.error or output.get("error")
+
+            samples = np.load(self.spool.samples_path(task.name), mmap_mode="r")
+            chunk = Chunk(task.sequence, task.offset, samples, task.last)
+            added = assembly.stitcher.add(chunk, output.get("result", {}))
+            assembly.stitched += 1
+            if self.on_segments is not None and added:
+                self.on_segments(assembly.audio_file, added)
+
+    def _clean(self, assembly: Assembly):
+        """
+        Remove the spool files of a done file, and its requeued chunks.
+
+        The samples go first: a worker that writes a late duplicate result
+        then finds them gone, and removes its result itself.
+        """
+        for task in assembly.tasks:
+            self.spool.samples_path(task.name).unlink(missing_ok=True)
+            (self.spool.pending / f"{task.name}.json").unlink(missing_ok=True)
+            (self.spool.results / f"{task.name}.json").unlink(missing_ok=True)
+
+    def results(self) -> Iterator[tuple[str, dict]]:
+        """
+        Wait for the submitted files, requeueing the chunks of dead workers.
+
+        Yields:
+            tuple[str, dict]: Each file and its stitched whisper-style
+                result, with the first chunk error, as the files complete
+        """
+        while self._assemblies:
+            for batch, assembly in list(self._assemblies.items()):
+                self._stitch(assembly)
+                if assembly.done:
+                    del self._assemblies[batch]
+                    self._clean(assembly)
+                    yield assembly.audio_file, assembly.result()
+            if self._assemblies:
+                self.requeue_expired()
+                time.sleep(self.poll_seconds)
+
+    def stop(self):
+        """Tell the workers to exit once their current chunk is done."""
+        self.spool.stop.touch()
@@ -3,15 +3,22 @@ Logging Config
 
 This module pulls the logging config from the tool.logging section
 of the project's pyproject.toml file.
+
+The file is found relative to this package, not the working directory. An
+installed package has no pyproject.toml, and logs to the console instead.
 """
 
 import logging
 import logging518.config
 from pathlib import Path
 
-CONFIG_FILE = "pyproject.toml"
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+CONFIG_FILE = PROJECT_ROOT / "pyproject.toml"
 LOG_CONFIGURED = False
 
+# Used when there is no project config
+DEFAULT_FORMAT = "{asctime} [{levelname}] {message}"
+
 
 def config_log(debug=False):
     """
@@ -40,7 +47,13 @@ def config_log(debug=False):
         LOG_CONFIGURED = True
 
         # Load the logging config from the project's pyproject.toml file
-        logging518.config.fileConfig(CONFIG_FILE)
+        if CONFIG_FILE.exists():
+            logging518.config.fileConfig(CONFIG_FILE)
+        else:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter(DEFAULT_FORMAT, style="{"))
+            log.addHandler(handler)
+            log.setLevel(logging.INFO)
 
         # Set the log level to debug if requested
         if debug:
@@ -57,7 +70,7 @@ class Formatter(logging.Formatter):
 
     This formatter adds the following attribute to log records:
 
-    relpath: The relative path of file relative to the project root directory.
+    relpath: The path of the file relative to the project root directory.
         This facilitates log file analysis and lets IDE users ctrl+click on the
         path to navigate to the line.
 
@@ -67,6 +80,9 @@ class Formatter(logging.Formatter):
     """
 
     def format(self, record):
-        record.relpath = Path(record.pathname).relative_to(Path.cwd())
+        try:
+            record.relpath = Path(record.pathname).relative_to(PROJECT_ROOT)
+        except ValueError:  # Outside the project, e.g. a library
+            record.relpath = record.pathname
         record.shortlvl = record.levelname[0]
         return super().format(record)
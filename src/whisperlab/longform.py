@@ -0,0 +1,479 @@
+"""
+Long-form Transcription Module
+
+Whisper only looks at 30 seconds of audio at a time. This module transcribes
+audio of any length by splitting a stream of samples into overlapping
+chunks, transcribing each chunk, and stitching the chunk segments back into
+one result with global timestamps.
+
+Chunks are produced from a stream of sample blocks, so only one chunk (plus
+one decoded block) is held in memory, regardless of the input length.
+
+Stitching:
+
+    chunk 0  |=========================|
+    chunk 1                      |=========================|
+                                 |-----| overlap
+                                    ^ boundary
+
+Each chunk owns the segments whose midpoint falls on its side of the
+boundaries in the middle of its overlaps. Words repeated on both sides of a
+boundary are dropped from the later segment, along with their word
+timestamps.
+
+A chunk's lower boundary is the previous chunk's upper boundary, so chunks
+may also arrive at irregular offsets, e.g. from a live stream.
+
+With a speech detector, only the voiced audio is chunked and transcribed.
+The stitched timestamps are then mapped back to times in the source audio.
+
+Checkpoints:
+
+After each chunk, the stitcher's state and the number of chunks done form a
+JSON-serializable checkpoint. A stream resumed from a checkpoint skips the
+chunks already done (their blocks are still decoded, but not transcribed),
+and stitches the rest onto the restored state, so the result is the same as
+an uninterrupted run's.
+"""
+
+import re
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
+
+import numpy as np
+
+import whisperlab.logging
+from whisperlab.audio import SAMPLES_PER_SECOND, SpeechDetector, SpeechGate
+from whisperlab.mel import HOP
+from whisperlab.models import model_lock
+from whisperlab.tracing import span
+
+
+log = whisperlab.logging.config_log()
+
+# Constants ===================================================================
+
+CHUNK_SECONDS = 30  # Whisper's context window
+OVERLAP_SECONDS = 5  # Audio shared by consecutive chunks
+MAX_OVERLAP_WORDS = 32  # Longest run of words checked for duplication
+
+
+# Chunking ====================================================================
+
+
+class Chunk(NamedTuple):
+    """
+    A window of audio taken from a longer stream.
+
+    Args:
+        index (int): The position of the chunk in the stream
+        offset (int): The stream sample where the chunk starts
+        samples (np.ndarray): The chunk samples
+        last (bool): Whether this is the final chunk of the stream
+    """
+
+    index: int
+    offset: int
+    samples: np.ndarray
+    last: bool
+
+    @property
+    def start(self) -> float:
+        """The chunk start time, in seconds."""
+        return self.offset / SAMPLES_PER_SECOND
+
+    @property
+    def end(self) -> float:
+        """The chunk end time, in seconds."""
+        return (self.offset + len(self.samples)) / SAMPLES_PER_SECOND
+
+
+def chunk_audio(
+    blocks: Iterable[np.ndarray],
+    chunk_seconds: float = CHUNK_SECONDS,
+    overlap_seconds: float = OVERLAP_SECONDS,
+    first: int = 0,
+) -> Iterator[Chunk]:
+    """
+    Split a stream of sample blocks into overlapping chunks.
+
+    Example:
+        >>> blocks = [np.zeros(16_000 * 40, np.float32)]
+        >>> [(c.start, c.end, c.last) for c in chunk_audio(blocks)]
+        [(0.0, 30.0, False), (25.0, 40.0, True)]
+
+    Args:
+        blocks (Iterable[np.ndarray]): float32 sample blocks of any size.
+            Chunks may be views of them, so they must not be reused.
+        chunk_seconds (float): The length of each chunk
+        overlap_seconds (float): The audio shared by consecutive chunks
+        first (int): The index of the first chunk to yield, e.g. to resume
+            a stream. The earlier chunks are skipped.
+
+    Yields:
+        Chunk: The chunks, in order. Only the last chunk may be shorter.
+    """
+    chunk_samples = int(chunk_seconds * SAMPLES_PER_SECOND)
+    overlap_samples = int(overlap_seconds * SAMPLES_PER_SECOND)
+    stride = chunk_samples - overlap_samples
+    if stride <= 0:
+        raise ValueError("The overlap must be shorter than the chunk")
+
+    def join(arrays: list[np.ndarray]) -> np.ndarray:
+        # Chunks of a lone block are views of it
+        return arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+
+    pending = []  # The blocks not yet split, joined once per chunk
+    samples = 0  # Their length
+    offset = 0
+    index = 0
+
+    for block in blocks:
+        pending.append(block)
+        samples += len(block)
+
+        # A full chunk is only known not to be last once a later sample exists
+        if samples <= chunk_samples:
+            continue
+        buffer = join(pending)
+        while len(buffer) > chunk_samples:
+            if index >= first:
+                yield Chunk(index, offset, buffer[:chunk_samples], last=False)
+            buffer = buffer[stride:]
+            offset += stride
+            index += 1
+        pending = [buffer]
+        samples = len(buffer)
+
+    if samples and index >= first:
+        yield Chunk(index, offset, join(pending), last=True)
+
+
+# Stitching ===================================================================
+
+
+def normalize_word(word: str) -> str:
+    """Reduce a word to lowercase letters, digits and apostrophes."""
+    return re.sub(r"[^\w']+", "", word.lower())
+
+
+def overlap_length(previous: list[str], new: list[str], limit=MAX_OVERLAP_WORDS):
+    """
+    Find the longest run of words that ends `previous` and starts `new`.
+
+    Example:
+        >>> overlap_length(["the", "quick", "brown"], ["quick", "brown", "fox"])
+        2
+
+    Args:
+        previous (list[str]): The committed words
+        new (list[str]): The words to append
+        limit (int): The longest overlap to consider
+
+    Returns:
+        int: The number of leading words of `new` that repeat `previous`
+    """
+    previous = [normalize_word(word) for word in previous[-limit:]]
+    new = [normalize_word(word) for word in new[:limit]]
+    for length in range(min(len(previous), len(new)), 0, -1):
+        if previous[-length:] == new[:length]:
+            return length
+    return 0
+
+
+def drop_words(words: list[dict], count: int) -> list[dict]:
+    """
+    Drop the word timestamps of a segment's first words.
+
+    Args:
+        words (list[dict]): Whisper word timestamps
+        count (int): The number of leading words of the segment text
+
+    Returns:
+        list[dict]: The word timestamps after them
+    """
+    for index, word in enumerate(words):
+        if count <= 0:
+            return words[index:]
+        count -= len(word["word"].split())
+    return []
+
+
+class Stitcher:
+    """
+    Assemble chunk transcriptions into one transcription.
+
+    Call add() with each chunk and its whisper result, in order, then read
+    result().
+
+    Args:
+        overlap_seconds (float): The audio shared by consecutive chunks
+    """
+
+    def __init__(self, overlap_seconds: float = OVERLAP_SECONDS):
+        self.overlap_seconds = overlap_seconds
+        self.segments = []
+        self.language = None
+        self.duration = 0.0
+        self.boundary = 0.0  # Segments before this time are committed
+        self._words = []  # Recent committed words, for de-duplication
+
+    def add(self, chunk: Chunk, result: dict) -> list[dict]:
+        """
+        Add a chunk's transcription.
+
+        Args:
+            chunk (Chunk): The transcribed chunk
+            result (dict): The whisper result for the chunk, with timestamps
+                relative to the chunk
+
+        Returns:
+            list[dict]: The new segments, with global timestamps. Their
+                words and seek are global too.
+        """
+        self.language = self.language or result.get("language")
+        self.duration = chunk.end
+
+        # The chunk owns the audio between the middles of its overlaps
+        lower = self.boundary if chunk.index else 0.0
+        upper = float("inf") if chunk.last else chunk.end - self.overlap_seconds / 2
+        upper = max(lower, upper)  # A short first chunk owns nothing yet
+        self.boundary = upper
+
+        added = []
+        for segment in result.get("segments", []):
+            start = chunk.start + segment["start"]
+            end = chunk.start + segment["end"]
+            if not lower <= (start + end) / 2 < upper:
+                continue
+
+            # Drop words already committed by the previous chunk
+            words = segment["text"].split()
+            repeated = 0
+            if chunk.index and segment["start"] < self.overlap_seconds:
+                repeated = overlap_length(self._words, words)
+                words = words[repeated:]
+            if not words:
+                continue
+
+            segment = {
+                **segment,
+                "id": len(self.segments),
+                "start": round(start, 3),
+                "end": round(end, 3),
+                "text": " " + " ".join(words),
+            }
+            if "seek" in segment:
+                segment["seek"] += chunk.offset // HOP
+            if "words" in segment:
+                segment["words"] = [
+                    {
+                        **word,
+                        "start": round(chunk.start + word["start"], 3),
+                        "end": round(chunk.start + word["end"], 3),
+                    }
+                    for word in drop_words(segment["words"], repeated)
+                ]
+            if repeated:
+                segment.pop("tokens", None)  # They no longer match the text
+            self.segments.append(segment)
+            self._words = (self._words + words)[-MAX_OVERLAP_WORDS:]
+            added.append(segment)
+
+        return added
+
+    def to_dict(self, first: int = 0) -> dict:
+        """
+        Get the stitcher's state, as a JSON-serializable dict.
+
+        Args:
+            first (int): Leave out the segments before this one, e.g. those
+                of an earlier checkpoint (see merge_checkpoints)
+        """
+        return {
+            "first": first,
+            "segments": self.segments[first:],
+            "language": self.language,
+            "duration": self.duration,
+            "boundary": self.boundary,
+            "words": self._words,
+        }
+
+    @classmethod
+    def from_dict(
+        cls, state: dict, overlap_seconds: float = OVERLAP_SECONDS
+    ) -> "Stitcher":
+        """Restore a stitcher from its full to_dict() state."""
+        if state.get("first", 0):
+            raise ValueError("Cannot restore a stitcher from a partial state")
+        stitcher = cls(overlap_seconds)
+        stitcher.segments = list(state["segments"])
+        stitcher.language = state["language"]
+        stitcher.duration = state["duration"]
+        stitcher.boundary = state["boundary"]
+        stitcher._words = list(state["words"])
+        return stitcher
+
+    def result(self) -> dict:
+        """
+        Get the stitched transcription.
+
+        Returns:
+            dict: A whisper-style result with text, segments, language, and
+                the duration of the transcribed audio in seconds
+        """
+        return {
+            "text": "".join(segment["text"] for segment in self.segments),
+            "segments": self.segments,
+            "language": self.language,
+            "duration": self.duration,
+        }
+
+
+def merge_checkpoints(checkpoint: Optional[dict], update: dict) -> Optional[dict]:
+    """
+    Apply a stream checkpoint to the checkpoints before it.
+
+    Checkpoints hold only the segments added since the one before them, so
+    a ledger of them grows linearly with the length of the stream.
+
+    Args:
+        checkpoint (dict): The checkpoints merged so far, or None
+        update (dict): The next checkpoint
+
+    Returns:
+        dict: The merged checkpoint, or None if a checkpoint before the
+            update is missing
+    """
+    state = update["stitcher"]
+    first = state.get("first", 0)
+    if first:
+        if checkpoint is None or len(checkpoint["stitcher"]["segments"]) < first:
+            return None
+        segments = checkpoint["stitcher"]["segments"][:first] + state["segments"]
+        state = {**state, "first": 0, "segments": segments}
+    return {**update, "stitcher": state}
+
+
+# Use Case ====================================================================
+
+
+def transcribe_chunks(
+    model,
+    chunks: Iterable[Chunk],
+    stitcher: Stitcher,
+    **args,
+) -> Iterator[list[dict]]:
+    """
+    Transcribe chunks one at a time.
+
+    Args:
+        model (whisper.model.Whisper): The model to transcribe with
+        chunks (Iterable[Chunk]): The chunks to transcribe
+        stitcher (Stitcher): Collects the chunk results
+        args: Arguments to pass to whisper
+
+    Yields:
+        list[dict]: The new segments of each chunk, with global timestamps
+    """
+    for chunk in chunks:
+        with span("inference", chunk=chunk.index):
+            with model_lock(model):
+                result = model.transcribe(chunk.samples, fp16=False, **args)
+        with span("stitch"):
+            added = stitcher.add(chunk, result)
+        yield added
+
+
+def source_segments(segments: list[dict], gate: SpeechGate) -> list[dict]:
+    """
+    Map segment and word times from a gate's voiced stream to its source.
+
+    Args:
+        segments (list[dict]): Segments with voiced stream timestamps
+        gate (SpeechGate): The gate the audio passed through
+
+    Returns:
+        list[dict]: The segments, with source stream timestamps
+    """
+
+    def remap(item: dict) -> dict:
+        return {
+            **item,
+            "start": round(gate.to_source(item["start"]), 3),
+            "end": round(gate.to_source(item["end"], end=True), 3),
+        }
+
+    return [
+        (
+            {**remap(segment), "words": [remap(word) for word in segment["words"]]}
+            if "words" in segment
+            else remap(segment)
+        )
+        for segment in segments
+    ]
+
+
+def transcribe_stream(
+    model,
+    blocks: Iterable[np.ndarray],
+    chunk_seconds: float = CHUNK_SECONDS,
+    overlap_seconds: float = OVERLAP_SECONDS,
+    detector: Optional[SpeechDetector] = None,
+    on_segments: Optional[Callable[[list[dict]], None]] = None,
+    checkpoint: Optional[dict] = None,
+    on_checkpoint: Optional[Callable[[dict], None]] = None,
+    **args,
+) -> dict:
+    """
+    Transcribe a stream of audio blocks of any length.
+
+    Args:
+        model (whisper.model.Whisper): The model to transcribe with
+        blocks (Iterable[np.ndarray]): float32 16 kHz sample blocks
+        chunk_seconds (float): The length of each transcribed chunk
+        overlap_seconds (float): The audio shared by consecutive chunks
+        detector (SpeechDetector): If given, only the speech it finds is
+            transcribed
+        on_segments (Callable): Called with the new segments of each chunk,
+            as soon as the chunk is transcribed
+        checkpoint (dict): Resume from this checkpoint of an earlier run
+            over the same blocks, with the same settings
+        on_checkpoint (Callable): Called with a checkpoint after every chunk
+            but the last. Each holds only the segments its chunk added: fold
+            them with merge_checkpoints to resume.
+        args: Arguments to pass to whisper
+
+    Returns:
+        dict: The stitched whisper-style result
+    """
+    gate = None
+    if detector is not None:
+        blocks = gate = SpeechGate(blocks, detector)
+
+    done = 0  # Chunks transcribed
+    stitcher = Stitcher(overlap_seconds)
+    if checkpoint is not None:
+        done = checkpoint["chunks"]
+        stitcher = Stitcher.from_dict(checkpoint["stitcher"], overlap_seconds)
+        log.info("Resuming a stream after %s chunks", done)
+
+    chunks = chunk_audio(blocks, chunk_seconds, overlap_seconds, first=done)
+    for added in transcribe_chunks(model, chunks, stitcher, **args):
+        done += 1
+        if on_segments is not None and added:
+            on_segments(source_segments(added, gate) if gate else added)
+        # The last chunk moves the boundary to infinity
+        if on_checkpoint is not None and stitcher.boundary < float("inf"):
+            first = len(stitcher.segments) - len(added)
+            on_checkpoint({"chunks": done, "stitcher": stitcher.to_dict(first)})
+    result = stitcher.result()
+
+    if gate is not None:
+        result["segments"] = source_segments(result["segments"], gate)
+        result["duration"] = gate.source_seconds
+        log.info(
+            "Speech gate passed %.1f s of %.1f s of audio",
+            gate.voiced_samples / SAMPLES_PER_SECOND,
+            gate.source_seconds,
+        )
+    return result
@@ -0,0 +1,234 @@
+"""
+Job Manifest Module
+
+This module records the progress of bulk transcription runs in a manifest,
+so a run that dies can be restarted without redoing finished work.
+
+A manifest is an append-only JSONL ledger. Each line is an entry for one
+file, keyed by the file's path, size and modification time:
+
+    {"audio_file": "calls/a.mp3", "size": 81920, "mtime_ns": ...,
+     "status": "chunk", "checkpoint": {"chunks": 3, "stitcher": {...}}}
+    {"audio_file": "calls/a.mp3", "size": 81920, "mtime_ns": ...,
+     "status": "done", "record": {"text": ..., ...}}
+
+A "done" entry holds the file's result record, as written by the bulk
+transcriber. A "chunk" entry holds the checkpoint of a long file after one
+of its 30 s chunks (see whisperlab.longform), so a restart resumes the file
+from its last finished chunk. Each checkpoint holds only the segments its
+chunk added, and loading the ledger merges them, so a file's entries grow
+linearly with its length. A "done" entry replaces the checkpoints before
+it, and an edited file, whose size or modification time changed, starts
+over.
+
+Each entry is appended with one write() to a file opened for appending, so
+the workers of one host may append concurrently. A line torn by a crash is
+skipped when the ledger is loaded.
+
+Sharding:
+
+One manifest can be shared by N hosts over a shared directory. Each file
+belongs to one shard, by a hash of its path, and each shard appends to its
+own ledger, <stem>.<shard>-of-<N><suffix>, next to the manifest. Loading a
+manifest reads every ledger, so a restart with another shard count still
+skips the files done by any shard. Paths are recorded as given, so the
+hosts should name the files the same way, e.g. relative to the shared
+directory.
+
+Usage Examples:
+    >>> manifest = Manifest(Path("backfill.jsonl"), shard=2, shards=8)
+    >>> pending = [path for path in paths if manifest.owns(path)]
+    >>> manifest.complete(path, record)
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+import whisperlab.logging
+from whisperlab.longform import merge_checkpoints
+
+
+log = whisperlab.logging.config_log()
+
+# Ledger ======================================================================
+
+
+def file_identity(audio_file: Path) -> dict:
+    """Get the ledger key of a file: its path, size and modification time."""
+    stat = audio_file.stat()
+    return {
+        "audio_file": audio_file.as_posix(),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def identity_key(entry: dict) -> tuple[str, int, int]:
+    """Get the hashable key of a ledger entry or file identity."""
+    return entry["audio_file"], entry["size"], entry["mtime_ns"]
+
+
+def shard_of(audio_file: Path, shards: int) -> int:
+    """
+    Get the shard that owns a file.
+
+    Args:
+        audio_file (Path): The file, as named to the bulk transcriber
+        shards (int): The number of shards
+
+    Returns:
+        int: A shard in [0, shards), stable across hosts and runs
+    """
+    digest = hashlib.sha256(audio_file.as_posix().encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+def append_entry(ledger: Path, entry: dict):
+    """
+    Append one entry to a ledger.
+
+    Args:
+        ledger (Path): The ledger file, created if needed
+        entry (dict): The JSON-serializable entry
+
+    Effects:
+        Writes the entry's line with a single append, so concurrent
+        appenders on one host do not interleave.
+    """
+    line = (json.dumps(entry) + "\n").encode()
+    fd = os.open(ledger, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def save_checkpoint(ledger: Path, audio_file: Path, checkpoint: dict):
+    """
+    Record the checkpoint of a partially transcribed file.
+
+    This runs inside bulk workers, after each chunk of a long file.
+
+    Args:
+        ledger (Path): The ledger of the worker's shard
+        audio_file (Path): The file being transcribed
+        checkpoint (dict): Its checkpoint (see whisperlab.longform)
+    """
+    entry = {**file_identity(audio_file), "status": "chunk", "checkpoint": checkpoint}
+    append_entry(ledger, entry)
+
+
+# Manifest ====================================================================
+
+
+class Manifest:
+    """
+    The progress of a bulk transcription job, shared by its shards.
+
+    Args:
+        path (Path): The manifest file. With several shards, it names the
+            shard ledgers.
+        shard (int): The shard of this host, in [0, shards)
+        shards (int): The number of hosts sharing the manifest
+
+    Raises:
+        ValueError: If the shard is not in [0, shards)
+    """
+
+    def __init__(self, path: Path, shard: int = 0, shards: int = 1):
+        if not 0 <= shard < shards:
+            raise ValueError(f"Shard {shard} is not in [0, {shards})")
+        self.path = Path(path)
+        self.shard = shard
+        self.shards = shards
+        self.ledger = self.path
+        if shards > 1:
+            name = f"{self.path.stem}.{shard}-of-{shards}{self.path.suffix}"
+            self.ledger = self.path.with_name(name)
+
+        self.done = {}  # File key -> result record
+        self.checkpoints = {}  # File key -> checkpoint of an unfinished file
+        self.load()
+
+        # End a line torn by a crash, so the next entry starts a line
+        if self.ledger.exists() and self.ledger.stat().st_size:
+            with open(self.ledger, "rb") as file:
+                file.seek(-1, os.SEEK_END)
+                torn = file.read() != b"\n"
+            if torn:
+                with open(self.ledger, "ab") as file:
+                    file.write(b"\n")
+
+    def ledgers(self) -> list[Path]:
+        """Get the ledger files of every shard, that exist."""
+        pattern = f"{self.path.stem}.*-of-*{self.path.suffix}"
+        shards = sorted(self.path.parent.glob(pattern))
+        return [path for path in [self.path, *shards] if path.is_file()]
+
+    def load(self):
+        """
+        Read the entries of every shard's ledger.
+
+        Effects:
+            Replaces the done records and checkpoints.
+        """
+        self.done = {}
+        self.checkpoints = {}
+        for ledger in self.ledgers():
+            with open(ledger) as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        log.warning("Skipping a torn entry of %s", ledger)
+                        continue
+                    key = identity_key(entry)
+                    if entry["status"] == "done":
+                        self.done[key] = entry["record"]
+                        self.checkpoints.pop(key, None)
+                    elif key not in self.done:
+                        checkpoint = merge_checkpoints(
+                            self.checkpoints.get(key), entry["checkpoint"]
+                        )
+                        if checkpoint is None:
+                            log.warning("%s lost a checkpoint", entry["audio_file"])
+                            self.checkpoints.pop(key, None)
+                        else:
+                            self.checkpoints[key] = checkpoint
+
+        log.info(
+            "Manifest %s: %s files done, %s partially transcribed",
+            self.path,
+            len(self.done),
+            len(self.checkpoints),
+        )
+
+    def owns(self, audio_file: Path) -> bool:
+        """Whether a file belongs to this host's shard."""
+        return shard_of(audio_file, self.shards) == self.shard
+
+    def record(self, audio_file: Path) -> Optional[dict]:
+        """Get the result record of a done file, or None."""
+        return self.done.get(identity_key(file_identity(audio_file)))
+
+    def checkpoint(self, audio_file: Path) -> Optional[dict]:
+        """Get the last checkpoint of a partially transcribed file, or None."""
+        return self.checkpoints.get(identity_key(file_identity(audio_file)))
+
+    def complete(self, audio_file: Path, record: dict):
+        """
+        Record a file as done.
+
+        Args:
+            audio_file (Path): The transcribed file
+            record (dict): Its result record
+        """
+        identity = file_identity(audio_file)
+        append_entry(self.ledger, {**identity, "status": "done", "record": record})
+        self.done[identity_key(identity)] = record
+        self.checkpoints.pop(identity_key(identity), None)
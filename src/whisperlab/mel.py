@@ -0,0 +1,326 @@
+"""
+Incremental Log-Mel Module
+
+This module computes whisper's log-mel spectrogram for a sliding window of
+a live stream, incrementally.
+
+Consecutive windows mostly overlap. Whisper converts each window from raw
+samples to a full, 30 s padded spectrogram, so the overlap is transformed
+again on every hop. A MelFrontend keeps the log-mel frames of the samples
+it has seen, and transforms only each hop's new samples, with a cached
+Hann window and mel filterbank. Front-end work falls in proportion to the
+overlap: a 10 s window with a 2 s hop computes a fifth of the frames.
+
+Each window's spectrogram is assembled from the kept frames, the frames at
+the window's end (which see the zero padding) and the padding frames, then
+normalized as whisper does. It matches whisper's spectrogram of the window,
+except for the first two frames: whisper reflects the audio at the window
+start, while kept frames see the audio before it. (When one of them is the
+loudest frame, the dynamic range floor differs too.)
+
+Engines transcribing the same stream, e.g. the two tiers of a speculative
+transcriber, may share a frontend: a window that ends before the newest
+sample is assembled from the kept frames too.
+
+The assembled spectrogram is passed to whisper's transcribe() in place of
+the audio, as a PaddedMel. whisper cannot take a spectrogram, so its
+log_mel_spectrogram is wrapped only while such transcriptions run.
+
+Batches of 30 second segments, e.g. for batched decoding or alignment, are
+transformed at once by log_mel_batch.
+
+Usage Examples:
+    >>> frontend = MelFrontend(capacity_seconds=20)
+    >>> mel = frontend(window_samples, window_start)    # Stream samples
+    >>> result = transcribe_mel(model, mel, language="en")
+"""
+
+from contextlib import contextmanager
+import importlib
+import threading
+from typing import Sequence
+
+import numpy as np
+import torch
+import whisper.audio
+
+from whisperlab.audio import RingBuffer
+
+# Constants ===================================================================
+
+HOP = whisper.audio.HOP_LENGTH  # Samples between frames
+N_FFT = whisper.audio.N_FFT  # Samples per frame
+N_FRAMES = whisper.audio.N_FRAMES  # Frames of the 30 s padding
+N_SAMPLES = whisper.audio.N_SAMPLES  # Samples of 30 s
+
+LOG_FLOOR = -10.0  # log10 of whisper's power floor, the value of silence
+
+
+# Frontend ====================================================================
+
+
+class MelFrontend:
+    """
+    Compute the log-mel spectrograms of sliding windows incrementally.
+
+    Frames are kept in a 2-D ring buffer of (frames, n_mels) log10 powers,
+    indexed by their stream frame: frame j is centered on stream sample
+    j * HOP.
+
+    Args:
+        n_mels (int): The number of mel bands of the model
+        capacity_seconds (float): The audio whose frames are kept. At least
+            the window.
+    """
+
+    def __init__(self, n_mels: int = 80, capacity_seconds: float = 60):
+        self.n_mels = n_mels
+        self.capacity = int(capacity_seconds * whisper.audio.SAMPLE_RATE) // HOP
+        self.frames = RingBuffer(self.capacity, channels=n_mels)
+        self.computed = 0  # Frames transformed, for accounting
+
+        self._window = torch.hann_window(N_FFT)
+        self._filters = whisper.audio.mel_filters("cpu", n_mels)
+        self._lock = threading.Lock()
+        self.reset(0)
+
+    def reset(self, position: int):
+        """
+        Restart the stream at a sample, forgetting the kept frames.
+
+        Args:
+            position (int): The stream sample, a multiple of HOP
+        """
+        self._base = position // HOP - self.frames.cursor  # Frame of ring 0
+        self.position = position  # The next stream sample
+        # The samples from the next frame's start. The stream before the
+        # position is taken as silence.
+        self._pending = np.zeros(N_FFT // 2, np.float32)
+
+    def _log_mel(self, samples: np.ndarray) -> np.ndarray:
+        """Transform every whole frame of samples to log10 mel powers."""
+        if len(samples) < N_FFT:
+            return np.zeros((0, self.n_mels), np.float32)
+        stft = torch.stft(
+            torch.from_numpy(samples),
+            N_FFT,
+            HOP,
+            window=self._window,
+            center=False,
+            return_complex=True,
+        )
+        power = stft.abs() ** 2
+        mel = torch.clamp(self._filters @ power, min=1e-10).log10()
+        self.computed += mel.shape[1]
+        return mel.T.numpy()
+
+    def update(self, samples: np.ndarray):
+        """
+        Add the next stream samples, transforming the frames they complete.
+
+        Args:
+            samples (np.ndarray): float32 16 kHz samples, from `position`
+        """
+        self.position += len(samples)
+        pending = np.concatenate([self._pending, samples])
+        count = max(0, (len(pending) - N_FFT) // HOP + 1)
+        if count:
+            self.frames.put(self._log_mel(pending[: (count - 1) * HOP + N_FFT]))
+        self._pending = pending[count * HOP :].copy()
+
+    def mel(self, samples: np.ndarray, start: int) -> torch.Tensor:
+        """
+        Assemble the padded, normalized spectrogram of a window.
+
+        The frontend must have been updated up to the window's end, or past
+        it, and still keep the frames of its start.
+
+        Args:
+            samples (np.ndarray): The window's float32 16 kHz samples
+            start (int): The window's first stream sample, a multiple of HOP
+
+        Returns:
+            torch.Tensor: (n_mels, content + N_FRAMES) log-mel spectrogram,
+                as whisper.log_mel_spectrogram(window, padding=N_SAMPLES)
+        """
+        end = start + len(samples)
+        content = len(samples) // HOP
+        mel = np.full((content + N_FRAMES, self.n_mels), LOG_FLOOR, np.float32)
+
+        # The kept frames, whose samples are all before the end
+        first = start // HOP
+        complete = min(self.frames.cursor + self._base, (end - N_FFT // 2) // HOP + 1)
+        kept, _ = self.frames.read(first - self._base)
+        kept = kept[: max(0, complete - first)][: len(mel)]
+        mel[: len(kept)] = kept
+
+        # The frames that reach past the end, into the zero padding
+        offset = (first + len(kept)) * HOP - N_FFT // 2 - start
+        tail = np.concatenate(
+            [
+                np.zeros(max(0, -offset), np.float32),
+                samples[max(0, offset) :],
+                np.zeros(N_FFT, np.float32),
+            ]
+        )
+        tail = self._log_mel(tail)[: len(mel) - len(kept)]
+        mel[len(kept) : len(kept) + len(tail)] = tail
+
+        np.maximum(mel, mel.max() - 8.0, out=mel)
+        mel += 4.0
+        mel /= 4.0
+        return torch.from_numpy(np.ascontiguousarray(mel.T))
+
+    def __call__(self, samples: np.ndarray, start: int) -> torch.Tensor:
+        """
+        Get the spectrogram of a window of the stream.
+
+        Only the samples after the frontend's position are transformed, so
+        windows that end before the position, e.g. of another engine on the
+        same stream, cost only their last few frames. If the window starts
+        after the position, e.g. when inference fell behind, or before the
+        kept frames, the frontend restarts at the window.
+
+        Thread safety: windows may be transformed from several threads.
+
+        Args:
+            samples (np.ndarray): The window's float32 16 kHz samples
+            start (int): The window's first stream sample, a multiple of HOP
+
+        Returns:
+            torch.Tensor: The window's padded log-mel spectrogram
+        """
+        end = start + len(samples)
+        with self._lock:
+            first = start // HOP - self._base  # In the frames ring
+            kept = 0 <= first and self.frames.cursor - first <= self.capacity
+            if not (kept and start <= self.position):
+                self.reset(start)
+            if self.position < end:
+                self.update(samples[self.position - start :])
+            return self.mel(samples, start)
+
+
+# Batches =====================================================================
+
+
+def stack_segments(segments: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Stack audio segments into one zero-padded (N, 30 s) array.
+
+    Args:
+        segments (Sequence[np.ndarray]): float32 segments of up to 30 seconds
+
+    Returns:
+        np.ndarray: The stacked, padded segments
+    """
+    stacked = np.zeros((len(segments), N_SAMPLES), np.float32)
+    for row, segment in zip(stacked, segments):
+        row[: len(segment)] = segment
+    return stacked
+
+
+def log_mel_batch(audio: np.ndarray, n_mels: int = 80, device=None) -> torch.Tensor:
+    """
+    Compute whisper's log-mel spectrogram for a batch of segments at once.
+
+    This matches whisper.log_mel_spectrogram row by row. The dynamic range
+    is clamped per segment, not across the whole batch.
+
+    Args:
+        audio (np.ndarray): (N, samples) float32 audio
+        n_mels (int): The number of mel bands
+        device: The torch device to compute on
+
+    Returns:
+        torch.Tensor: (N, n_mels, frames) log-mel spectrograms
+    """
+    audio = torch.from_numpy(audio).to(device)
+    window = torch.hann_window(N_FFT, device=audio.device)
+    stft = torch.stft(
+        audio,
+        N_FFT,
+        HOP,
+        window=window,
+        return_complex=True,
+    )
+    magnitudes = stft[..., :-1].abs() ** 2
+
+    filters = whisper.audio.mel_filters(audio.device, n_mels)
+    mel_spec = filters @ magnitudes
+
+    log_spec = torch.clamp(mel_spec, min=1e-10).log10()
+    floor = log_spec.amax(dim=(-2, -1), keepdim=True) - 8.0
+    log_spec = torch.maximum(log_spec, floor)
+    return (log_spec + 4.0) / 4.0
+
+
+# Transcription ===============================================================
+
+
+class PaddedMel:
+    """
+    A padded log-mel spectrogram, passed to whisper's transcribe() in place
+    of audio.
+
+    Args:
+        mel (torch.Tensor): (n_mels, frames) log-mel spectrogram, padded
+            with N_FRAMES frames of silence
+    """
+
+    def __init__(self, mel: torch.Tensor):
+        self.mel = mel
+
+
+_patch_lock = threading.Lock()
+_patch_users = 0  # Open padded_mels() contexts
+_whisper_log_mel = whisper.audio.log_mel_spectrogram  # Replaced while patched
+
+
+def log_mel_spectrogram(audio, *args, **kwargs) -> torch.Tensor:
+    """whisper.log_mel_spectrogram, passing a PaddedMel through."""
+    if isinstance(audio, PaddedMel):
+        return audio.mel
+    return _whisper_log_mel(audio, *args, **kwargs)
+
+
+@contextmanager
+def padded_mels():
+    """
+    Let whisper's transcribe() take a PaddedMel, in this context.
+
+    whisper's log_mel_spectrogram is wrapped while any context is open, on
+    any thread, and restored when the last one closes. The wrapper passes
+    audio on to whisper's, so other transcriptions meanwhile are unchanged.
+    """
+    global _patch_users, _whisper_log_mel
+    # The module, which `whisper.transcribe` (the function) shadows
+    module = importlib.import_module("whisper.transcribe")
+    with _patch_lock:
+        if _patch_users == 0:
+            _whisper_log_mel = module.log_mel_spectrogram
+            module.log_mel_spectrogram = log_mel_spectrogram
+        _patch_users += 1
+    try:
+        yield
+    finally:
+        with _patch_lock:
+            _patch_users -= 1
+            if _patch_users == 0:
+                module.log_mel_spectrogram = _whisper_log_mel
+
+
+def transcribe_mel(model, mel: torch.Tensor, **args) -> dict:
+    """
+    Transcribe a padded log-mel spectrogram with whisper's transcribe().
+
+    Args:
+        model (whisper.model.Whisper): The model
+        mel (torch.Tensor): A padded spectrogram, e.g. from a MelFrontend
+        args: Arguments to pass to whisper
+
+    Returns:
+        dict: The whisper result
+    """
+    with padded_mels():
+        return model.transcribe(PaddedMel(mel), **args)
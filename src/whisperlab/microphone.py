@@ -3,8 +3,8 @@ Module: whisperlab.microphone
 
 Plot the live microphone signal(s) with matplotlib.
 
-This module provides functionality to visualize live microphone input using 
-matplotlib and numpy. It includes utilities for audio processing, 
+This module provides functionality to visualize live microphone input using
+matplotlib and numpy. It includes utilities for audio processing,
 frame monitoring, and graphical display.
 
 System Diagram:
@@ -26,16 +26,17 @@ classDiagram
     class View {
       -PlotBuffer model
       -list[Line2d] lines
-      -FuncAnimation animation 
+      -FuncAnimation animation
       +update(frame)
       +start()
       +stop()
     }
 
     class PlotBuffer {
-      -numpy.ndarray buffer
+      -RingBuffer ring
       +get()
       +put(audio_samples)
+      +process(audio_samples)
     }
 
     class RealtimeRecorder {
@@ -58,15 +59,22 @@ classDiagram
 
 import atexit
 import logging
+from typing import Optional
 
 from matplotlib.animation import FuncAnimation
 import matplotlib.pyplot as plt
-import numpy as np
 import sounddevice
 
 import whisperlab.logging
 from whisperlab.time import time_ms
-from whisperlab.audio import roll, SAMPLES_PER_SECOND
+from whisperlab.audio import (
+    ChannelMixer,
+    DEFAULT_MIX,
+    make_mixer,
+    Resampler,
+    SAMPLES_PER_SECOND,
+    WaveBuffer,
+)
 
 
 log = whisperlab.logging.config_log(debug=True)
@@ -79,37 +87,44 @@ MS_PER_SECOND = 1_000
 SECONDS_PER_MS = 0.001
 
 # Audio constants
-CHANNEL = 1  # Input channel to use (assume 1 microphone channel)
-SAMPLES_PER_MS = (
-    16  # Samples per millisecond (in samples/ms) = SAMPLES_PER_SECOND * SECONDS_PER_MS
-)
+# Capture runs at the device's native rate, and is resampled to 16 kHz before
+# it reaches the plot, so every sample count below is at SAMPLES_PER_SECOND
+CHANNELS = 1  # Input channels to capture
+SAMPLES_PER_MS = SAMPLES_PER_SECOND // MS_PER_SECOND  # 16
 
 # Plot constants
 WINDOW_SECONDS = 8  # Width of plot window (in seconds)
 FRAMES_PER_SECOND = 20  # Frame rate of the plot display (in Hz)
 DOWNSAMPLE = 10  # Display every Nth sample
-SAMPLES_PER_WINDOW = 8
-# = int(SAMPLES_PER_SECOND * WINDOW_SECONDS / DOWNSAMPLE)
-MS_PER_FRAME = 50  # Frame rate of the plot display (in ms) = 1000 / FRAMES_PER_SECOND
-PLOT_SAMPLES_PER_MS = 4.41  # = SAMPLES_PER_MS / DOWNSAMPLE
-RAW_SAMPLES_PER_FRAME = 2205  # = int(SAMPLES_PER_MS * MS_PER_FRAME)
+SAMPLES_PER_WINDOW = SAMPLES_PER_SECOND * WINDOW_SECONDS // DOWNSAMPLE  # 12_800
+MS_PER_FRAME = MS_PER_SECOND // FRAMES_PER_SECOND  # 50
+PLOT_SAMPLES_PER_MS = SAMPLES_PER_MS / DOWNSAMPLE  # 1.6
+SAMPLES_PER_FRAME = SAMPLES_PER_MS * MS_PER_FRAME  # 800
 
 
 # Model =======================================================================
 
 
-class PlotBuffer:
-    """A model of the plot signal buffer."""
+class PlotBuffer(WaveBuffer):
+    """
+    A model of the plot signal buffer.
 
-    buffer = np.zeros(SAMPLES_PER_WINDOW)
+    Args:
+        buffer_size (int): The number of plotted samples
+        mixer (ChannelMixer): Mixes the input channels into the plotted one
+    """
 
-    def get(self):
-        return self.buffer
+    def __init__(
+        self,
+        buffer_size=SAMPLES_PER_WINDOW,
+        mixer: Optional[ChannelMixer] = None,
+    ):
+        super().__init__(buffer_size)
+        self.mixer = mixer or make_mixer(DEFAULT_MIX)
 
-    def put(self, audio_samples):
-        """Convert the audio samples to a plot buffer."""
-        plot_samples = audio_samples[::DOWNSAMPLE, CHANNEL - 1]
-        self.buffer = roll(self.buffer, plot_samples)
+    def process(self, audio_samples):
+        """Downsample, then mix the input channels for plotting."""
+        return self.mixer(audio_samples[::DOWNSAMPLE])
 
 
 # View ========================================================================
@@ -129,7 +144,7 @@ def frame_monitor(update_func):
             t1 = time_ms()
             interval_ms = t1 - plot_timer
             plot_timer = t1
-            expected_samples = round(interval_ms * PLOT_SAMPLES_PER_MS)
+            expected_samples = round(interval_ms * SAMPLES_PER_MS)
             discrepancy = frame_sample_counter - expected_samples
             log.debug(
                 "Frame %s: %s ms, %s samples. "
@@ -192,7 +207,9 @@ def callback_monitor(callback):
     def wrapped_callback(self, indata, frames, time, status):
         if log.level == logging.DEBUG:
             global frame_sample_counter
-            frame_sample_counter += len(indata)
+            frame_sample_counter += round(
+                len(indata) * SAMPLES_PER_SECOND / self.samplerate
+            )
             start_time = time_ms()
             log.debug("Starting update")
             log.debug("<-- Roll %s samples", len(indata))
@@ -205,16 +222,48 @@ def callback_monitor(callback):
 
 
 class Recorder:
-    """Listen to the microphone and record samples to a data model."""
+    """
+    Listen to the microphone and record samples to a data model.
+
+    The microphone is opened at its native rate, and its samples are
+    resampled to 16 kHz.
+
+    Args:
+        model (PlotBuffer): Receives the 16 kHz samples
+        blocksize (int): 16 kHz samples per callback. None lets the host
+            choose.
+        channels (int): The number of input channels
+        device: The sounddevice input device. None uses the default.
+        samplerate (int): The capture rate. Defaults to the device's.
+    """
 
     stream: sounddevice.InputStream
     model: PlotBuffer
     blocksize: int | None
+    samplerate: int
+    resampler: Optional[Resampler]
+
+    def __init__(
+        self, model, blocksize=None, channels=CHANNELS, device=None, samplerate=None
+    ):
+        if samplerate is None:
+            info = sounddevice.query_devices(device, "input")
+            samplerate = int(info["default_samplerate"])
+        self.samplerate = samplerate
+        self.resampler = None
+        if samplerate != SAMPLES_PER_SECOND:
+            self.resampler = Resampler(samplerate)
 
-    def __init__(self, model, blocksize=None):
         self.stream = sounddevice.InputStream(
+            device=device,
             callback=self.callback,
-            blocksize=blocksize,
+            blocksize=(
+                None
+                if blocksize is None
+                else round(blocksize * samplerate / SAMPLES_PER_SECOND)
+            ),
+            channels=channels,
+            samplerate=samplerate,
         )
         self.model = model
         self.blocksize = blocksize
@@ -227,11 +276,13 @@ class Recorder:
 
     @callback_monitor
     def callback(self, samples, frames, time, status):
+        if self.resampler is not None:
+            samples = self.resampler(samples)
         self.model.put(samples)
 
 
 def FrameBlockRecorder(model):
-    return Recorder(model, blocksize=RAW_SAMPLES_PER_FRAME)
+    return Recorder(model, blocksize=SAMPLES_PER_FRAME)
 
 
 def FiveSecondBlockRecorder(model):
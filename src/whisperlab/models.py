@@ -0,0 +1,509 @@
+"""
+Model Registry Module
+
+This module keeps loaded Whisper models in memory, so each model is loaded
+once per process instead of once per transcription.
+
+Models are keyed by (name, device, dtype). They are loaded lazily on first
+use, shared between threads, and evicted least-recently-used first when the
+registry exceeds its memory budget.
+
+Inference on a shared model is serialized (see model_lock). Threads that
+need to run inference in parallel, e.g. one per audio channel, each get a
+replica: a separate copy of the model, under its own key.
+
+Precisions:
+    fp32: Whisper's weights as released
+    int8-dynamic: Linear layers with int8 weights, and activations quantized
+        on the fly (CPU only). The converted weights are saved next to
+        whisper's downloads, so each model is converted once.
+    bf16: bf16 weights, with matrix products run in bf16 where the hardware
+        supports it. Layer norms, encoder features and logits stay fp32.
+
+Usage Examples:
+    >>> model = get_model("base")          # Miss: loads the weights
+    >>> model = get_model("base")          # Hit: returns the same object
+    >>> preload("base", device="cpu")      # Warm a model ahead of time
+    >>> get_model("base", dtype="int8-dynamic")  # A quantized variant
+    >>> get_model("base", replica=1)       # A second, unshared copy
+    >>> evict("base")                      # Release a model
+    >>> REGISTRY.stats()                   # Hit / miss / load time counters
+
+The "standin" model is a tiny, randomly initialized model with Whisper's
+architecture. Its output is gibberish, but it runs every inference stage
+offline and in milliseconds, for tests and benchmarks.
+"""
+
+import threading
+from collections import OrderedDict
+import io
+import os
+from pathlib import Path
+import warnings
+import weakref
+from typing import Callable, NamedTuple, Optional
+
+from pydantic import BaseModel
+import torch
+import whisper
+
+import whisperlab.logging
+from whisperlab.cache import atomic_write
+from whisperlab.defaults import DEFAULT_PRECISION, PRECISIONS, STANDIN_MODEL
+from whisperlab.time import time_ms
+
+
+log = whisperlab.logging.config_log()
+
+# Constants ===================================================================
+
+# Supported weight dtypes, by name
+DTYPES = {
+    "fp32": torch.float32,
+    "fp16": torch.float16,
+    "bf16": torch.bfloat16,
+}
+
+DEFAULT_DTYPE = DEFAULT_PRECISION
+
+INT8_DYNAMIC = "int8-dynamic"
+
+# Quantized weights are saved next to whisper's downloaded checkpoints
+QUANTIZED_CACHE_DIR = (
+    Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "whisper"
+)
+
+# A tiny model with whisper's architecture and vocabulary (see STANDIN_MODEL)
+STANDIN_DIMENSIONS = whisper.model.ModelDimensions(
+    n_mels=80,
+    n_audio_ctx=1500,
+    n_audio_state=64,
+    n_audio_head=2,
+    n_audio_layer=1,
+    n_vocab=51865,
+    n_text_ctx=448,
+    n_text_state=64,
+    n_text_head=2,
+    n_text_layer=1,
+)
+
+
+# Models ======================================================================
+
+
+class ModelKey(NamedTuple):
+    """The identity of a loaded model."""
+
+    name: str
+    device: str
+    dtype: str
+    replica: int = 0  # Copies of the same model are numbered from 0
+
+
+class ModelStats(BaseModel):
+    """
+    Registry counters
+
+    Args:
+        hits (int): Lookups served from memory
+        misses (int): Lookups that had to load a model
+        evictions (int): Models released to stay within the memory budget
+        load_time_ms (float): Total time spent loading models
+        loaded (list[str]): The models currently in memory, oldest first
+        memory_bytes (int): The memory used by the models in the registry
+    """
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    load_time_ms: float = 0
+    loaded: list[str] = []
+    memory_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+# Helpers =====================================================================
+
+
+def default_device() -> str:
+    """Get the device whisper would pick for a model."""
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def standin_model(seed: int = 0) -> whisper.model.Whisper:
+    """
+    Build the tiny stand-in model, with reproducible random weights.
+
+    Args:
+        seed (int): The random seed for the weights
+
+    Returns:
+        whisper.model.Whisper: The stand-in model, in eval mode
+    """
+    generator_state = torch.random.get_rng_state()
+    torch.manual_seed(seed)
+    model = whisper.model.Whisper(STANDIN_DIMENSIONS).eval()
+    # Whisper leaves this uninitialized (torch.empty), for checkpoints to fill
+    torch.nn.init.normal_(model.decoder.positional_embedding, std=0.02)
+    torch.random.set_rng_state(generator_state)
+    return model
+
+
+def bf16_supported(device: str) -> bool:
+    """Check whether a device runs bf16 matrix products natively."""
+    if device.startswith("cuda"):
+        return torch.cuda.is_bf16_supported()
+    try:
+        return torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def quantize_int8(model: whisper.model.Whisper) -> whisper.model.Whisper:
+    """
+    Quantize a model's Linear layers to int8 weights, in place.
+
+    Args:
+        model (whisper.model.Whisper): An fp32 model on the CPU
+
+    Returns:
+        whisper.model.Whisper: The quantized model
+    """
+    # Whisper's Linear only adds a dtype cast, which torch's quantizer rejects
+    for module in model.modules():
+        if type(module) is whisper.model.Linear:
+            module.__class__ = torch.nn.Linear
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # Eager mode quantization deprecation
+        return torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+
+
+def to_bf16(model: whisper.model.Whisper) -> whisper.model.Whisper:
+    """
+    Store a model's weights in bf16, and run its forward passes in bf16.
+
+    Whisper's decoding checks that features and logits are fp32, and its
+    layer norms run in fp32, so those stay fp32.
+
+    Args:
+        model (whisper.model.Whisper): The model to convert, in place
+
+    Returns:
+        whisper.model.Whisper: The converted model
+    """
+    model.to(dtype=torch.bfloat16)
+    for module in model.modules():
+        if isinstance(module, torch.nn.LayerNorm):
+            module.float()
+
+    device_type = model.device.type
+    for module in [model.encoder, model.decoder]:
+        forward = module.forward
+
+        def bf16_forward(*args, forward=forward, **kwargs):
+            with torch.autocast(device_type, dtype=torch.bfloat16):
+                return forward(*args, **kwargs).float()
+
+        module.forward = bf16_forward
+    return model
+
+
+def quantized_path(name: str) -> Path:
+    return QUANTIZED_CACHE_DIR / f"{name}-{INT8_DYNAMIC}.pt"
+
+
+def load_quantized_model(name: str) -> whisper.model.Whisper:
+    """
+    Load an int8-dynamic model, quantizing and saving it on first use.
+
+    Args:
+        name (str): The whisper model name. The stand-in model is quantized
+            each time, as it is built in milliseconds.
+
+    Returns:
+        whisper.model.Whisper: The quantized model, on the CPU
+    """
+    if name == STANDIN_MODEL:
+        return quantize_int8(standin_model())
+
+    path = quantized_path(name)
+    if not path.exists():
+        log.info("Quantizing %s to int8, once", name)
+        model = quantize_int8(whisper.load_model(name, device="cpu"))
+        checkpoint = io.BytesIO()
+        torch.save(
+            {"dims": vars(model.dims), "model_state_dict": model.state_dict()},
+            checkpoint,
+        )
+        atomic_write(path, checkpoint.getvalue())
+        return model
+
+    # Quantize an empty model of the same shape, then load the saved weights
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # Packed params use TypedStorage
+        checkpoint = torch.load(path, map_location="cpu", weights_only=True)
+    dims = whisper.model.ModelDimensions(**checkpoint["dims"])
+    model = quantize_int8(whisper.model.Whisper(dims))
+    model.load_state_dict(checkpoint["model_state_dict"])
+    if name in whisper._ALIGNMENT_HEADS:
+        model.set_alignment_heads(whisper._ALIGNMENT_HEADS[name])
+    return model.eval()
+
+
+def load_whisper_model(name: str, device: str, dtype: str):
+    """
+    Load a whisper model from disk (or the network) with the given precision.
+
+    Args:
+        name (str): The whisper model name, e.g. "base", or STANDIN_MODEL
+        device (str): The torch device to load the model on
+        dtype (str): A key of DTYPES, or INT8_DYNAMIC
+
+    Returns:
+        whisper.model.Whisper: The loaded model
+
+    Raises:
+        ValueError: If the precision is unknown, or int8-dynamic is asked
+            for on a GPU
+    """
+    if dtype not in {*DTYPES, *PRECISIONS}:
+        raise ValueError(f"Unknown precision: {dtype}")
+    if dtype == INT8_DYNAMIC:
+        if device != "cpu":
+            raise ValueError(f"{INT8_DYNAMIC} runs on the CPU only, not {device}")
+        return load_quantized_model(name)
+
+    if dtype == "bf16" and not bf16_supported(device):
+        log.warning("bf16 is not supported on %s; using fp32", device)
+        dtype = DEFAULT_DTYPE
+
+    if name == STANDIN_MODEL:
+        model = standin_model().to(device)
+    else:
+        model = whisper.load_model(name, device=device)
+    if dtype == "bf16":
+        model = to_bf16(model)
+    elif dtype != DEFAULT_DTYPE:
+        model = model.to(dtype=DTYPES[dtype])
+    return model
+
+
+def model_bytes(model) -> int:
+    """
+    Estimate the memory held by a model's parameters and buffers.
+
+    Args:
+        model (torch.nn.Module): The model to measure
+
+    Returns:
+        int: The size of the model's tensors in bytes, including the packed
+            weights of quantized layers
+    """
+    tensors = [*model.parameters(), *model.buffers()]
+    for module in model.modules():
+        if isinstance(module, torch.ao.nn.quantized.dynamic.Linear):
+            tensors += [t for t in module._weight_bias() if t is not None]
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+# Inference Locks =============================================================
+
+# Whisper installs its kv-cache hooks on the model itself while decoding, so
+# two threads decoding with one model would corrupt each other's caches.
+_MODEL_LOCKS = weakref.WeakKeyDictionary()
+_MODEL_LOCKS_LOCK = threading.Lock()
+
+
+def model_lock(model) -> threading.Lock:
+    """
+    Get the lock that serializes inference on a shared model.
+
+    Args:
+        model: A loaded model
+
+    Returns:
+        threading.Lock: The model's inference lock
+    """
+    with _MODEL_LOCKS_LOCK:
+        return _MODEL_LOCKS.setdefault(model, threading.Lock())
+
+
+# Registry ====================================================================
+
+
+class ModelRegistry:
+    """
+    A thread-safe, lazily loaded, LRU cache of models.
+
+    Args:
+        loader (Callable): Loads a model given (name, device, dtype). Each
+            replica is loaded separately.
+        memory_budget (int): The maximum bytes of models to keep in memory.
+            None means unlimited. The most recently used model is always
+            kept, even if it alone exceeds the budget.
+    """
+
+    def __init__(
+        self,
+        loader: Callable = load_whisper_model,
+        memory_budget: Optional[int] = None,
+    ):
+        self.loader = loader
+        self.memory_budget = memory_budget
+        self._models = OrderedDict()  # ModelKey -> model, oldest first
+        self._sizes = {}  # ModelKey -> bytes
+        self._lock = threading.Lock()  # Guards the dicts and counters
+        self._load_locks = {}  # ModelKey -> Lock, one load per key at a time
+        self._stats = ModelStats()
+
+    def key(
+        self, name: str, device: str = None, dtype: str = None, replica: int = 0
+    ) -> ModelKey:
+        """
+        Normalize a lookup into a registry key.
+
+        int8-dynamic models run on the CPU only, so they default to it.
+        """
+        dtype = dtype or DEFAULT_DTYPE
+        if device is None:
+            device = "cpu" if dtype == INT8_DYNAMIC else default_device()
+        return ModelKey(name, device, dtype, replica)
+
+    def get(self, name: str, device: str = None, dtype: str = None, replica: int = 0):
+        """
+        Get a model, loading it on first use.
+
+        Args:
+            name (str): The model name
+            device (str): The torch device. Defaults to cuda if available,
+                except for int8-dynamic models, which run on the CPU.
+            dtype (str): The precision, a key of DTYPES or INT8_DYNAMIC.
+                Defaults to fp32.
+            replica (int): Which copy of the model to get. Every replica
+                but 0, the shared one, is a separate model with its own
+                inference lock.
+
+        Returns:
+            The loaded model
+        """
+        key = self.key(name, device, dtype, replica)
+
+        # Fast path: the model is already loaded
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self._stats.hits += 1
+                return self._models[key]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Slow path: only one thread loads a given key, the others wait for it
+        with load_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    self._stats.hits += 1
+                    return self._models[key]
+                self._stats.misses += 1
+
+            start_time = time_ms()
+            model = self.loader(key.name, key.device, key.dtype)
+            load_time = time_ms() - start_time
+            size = model_bytes(model)
+            log.info("Loaded model %s in %s ms (%s bytes)", key, load_time, size)
+
+            with self._lock:
+                self._models[key] = model
+                self._sizes[key] = size
+                self._stats.load_time_ms += load_time
+                self._enforce_budget()
+
+        return model
+
+    def preload(
+        self, name: str, device: str = None, dtype: str = None, replica: int = 0
+    ):
+        """Load a model ahead of its first use."""
+        return self.get(name, device, dtype, replica)
+
+    def evict(
+        self, name: str = None, device: str = None, dtype: str = None, replica: int = 0
+    ):
+        """
+        Release models from the registry.
+
+        Args:
+            name (str): The model to evict. None evicts every model.
+            device (str): The device of the model to evict
+            dtype (str): The dtype of the model to evict
+            replica (int): The replica of the model to evict
+
+        Returns:
+            int: The number of models evicted
+        """
+        with self._lock:
+            if name is None:
+                keys = list(self._models)
+            else:
+                keys = [self.key(name, device, dtype, replica)]
+            evicted = [key for key in keys if key in self._models]
+            for key in evicted:
+                self._remove(key)
+        return len(evicted)
+
+    def stats(self) -> ModelStats:
+        """Get a snapshot of the registry counters."""
+        with self._lock:
+            return self._stats.model_copy(
+                update={
+                    "loaded": [str(key) for key in self._models],
+                    "memory_bytes": sum(self._sizes.values()),
+                }
+            )
+
+    def __contains__(self, key: ModelKey) -> bool:
+        return key in self._models
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    # Internals (call with self._lock held) -----------------------------------
+
+    def _remove(self, key: ModelKey):
+        del self._models[key]
+        del self._sizes[key]
+        self._stats.evictions += 1
+        log.info("Evicted model %s", key)
+
+    def _enforce_budget(self):
+        if self.memory_budget is None:
+            return
+        while len(self._models) > 1 and sum(self._sizes.values()) > self.memory_budget:
+            oldest = next(iter(self._models))
+            self._remove(oldest)
+
+
+# Process-wide Registry =======================================================
+
+
+REGISTRY = ModelRegistry()
+
+
+def get_model(name: str, device: str = None, dtype: str = None, replica: int = 0):
+    """Get a model from the process-wide registry."""
+    return REGISTRY.get(name, device, dtype, replica)
+
+
+def preload(name: str, device: str = None, dtype: str = None, replica: int = 0):
+    """Load a model into the process-wide registry."""
+    return REGISTRY.preload(name, device, dtype, replica)
+
+
+def evict(name: str = None, device: str = None, dtype: str = None, replica: int = 0):
+    """Release models from the process-wide registry."""
+    return REGISTRY.evict(name, device, dtype, replica)
@@ -0,0 +1,165 @@
+"""
+Resource Configuration Module
+
+This module sizes the threads of parallel transcriptions to the cores they
+may use, so workers on a shared CPU host do not oversubscribe it.
+
+By default torch, OpenMP and the BLAS libraries each start one thread per
+core in every process. With several worker processes, the threads contend
+for the same cores and throughput falls as workers are added. A
+ResourceConfig splits the cores between the workers instead:
+
+    cores = workers * threads_per_worker
+
+Each worker process sets its torch, OpenMP, MKL and OpenBLAS thread counts,
+and can be pinned to its own set of cores.
+
+Usage Examples:
+    >>> config = ResourceConfig(cores=32, workers=4)    # 8 threads each
+    >>> config.cpu_set(1)                               # [8, ..., 15]
+    >>> ProcessPoolExecutor(4, **config.pool_initializer())
+"""
+
+import multiprocessing
+import os
+from typing import Optional
+
+from pydantic import BaseModel, Field
+import torch
+
+import whisperlab.logging
+
+
+log = whisperlab.logging.config_log()
+
+# Constants ===================================================================
+
+# Environment variables read by the OpenMP and BLAS runtimes as they start
+THREAD_VARIABLES = [
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+]
+
+
+# Helpers =====================================================================
+
+
+def available_cpus() -> list[int]:
+    """Get the CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+# Models ======================================================================
+
+
+class ResourceConfig(BaseModel):
+    """
+    How the cores of a host are shared between transcription workers
+
+    Args:
+        cores (int): The cores to use. Defaults to the CPUs this process may
+            run on.
+        workers (int): The number of worker processes
+        threads_per_worker (int): The torch and BLAS threads of each worker.
+            Defaults to an even share of the cores.
+        interop_threads (int): Torch's inter-op threads per worker
+        pin (bool): Whether to pin each worker to its own cores (Linux only)
+    """
+
+    cores: int = Field(default_factory=lambda: len(available_cpus()), ge=1)
+    workers: int = Field(default=1, ge=1)
+    threads_per_worker: Optional[int] = Field(default=None, ge=1)
+    interop_threads: int = Field(default=1, ge=1)
+    pin: bool = False
+
+    @property
+    def threads(self) -> int:
+        """The threads of each worker."""
+        return self.threads_per_worker or max(1, self.cores // self.workers)
+
+    @property
+    def oversubscribed(self) -> bool:
+        """Whether the workers run more threads than there are cores."""
+        return self.workers * self.threads > self.cores
+
+    def cpu_set(self, worker: int) -> list[int]:
+        """
+        Get the CPUs a worker is pinned to.
+
+        Workers get consecutive, disjoint sets of `threads` CPUs, wrapping
+        around when the host is oversubscribed.
+
+        Args:
+            worker (int): The worker's index
+
+        Returns:
+            list[int]: The worker's CPUs
+        """
+        cpus = available_cpus()[: self.cores]
+        first = worker * self.threads
+        return sorted({cpus[(first + i) % len(cpus)] for i in range(self.threads)})
+
+    def pool_initializer(self) -> dict:
+        """Get the initializer arguments of a ProcessPoolExecutor."""
+        return {
+            "initializer": init_worker,
+            "initargs": (self, multiprocessing.Value("i", 0)),
+        }
+
+
+# Use Case ====================================================================
+
+
+def apply(config: ResourceConfig, worker: Optional[int] = None):
+    """
+    Configure this process's threads, and optionally its CPU affinity.
+
+    Args:
+        config (ResourceConfig): The resource configuration
+        worker (int): The worker this process runs as. If None, the process
+            uses all the configured cores.
+
+    Effects:
+        Sets the thread environment variables (read by runtimes that start
+        later, and by child processes), torch's thread counts, and the
+        process's CPU affinity.
+    """
+    threads = config.threads if worker is not None else config.cores
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(threads)
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(config.interop_threads)
+    except RuntimeError:
+        # Only possible before the first parallel work, e.g. in a new process
+        log.debug("Torch's inter-op threads are already set")
+
+    if config.pin and hasattr(os, "sched_setaffinity"):
+        if worker is not None:
+            cpus = config.cpu_set(worker)
+        else:
+            cpus = available_cpus()[: config.cores]
+        os.sched_setaffinity(0, cpus)
+    else:
+        cpus = None
+
+    log.debug("Worker %s: %s threads on CPUs %s", worker, threads, cpus or "any")
+
+
+def init_worker(config: ResourceConfig, counter):
+    """
+    Configure a new worker process, claiming the next worker index.
+
+    Args:
+        config (ResourceConfig): The resource configuration
+        counter (multiprocessing.Value): The shared count of started workers
+    """
+    with counter.get_lock():
+        worker = counter.value
+        counter.value += 1
+    apply(config, worker % config.workers)
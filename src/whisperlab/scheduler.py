@@ -0,0 +1,350 @@
+"""
+Task Scheduler Module
+
+This module schedules Tasks on a pool of worker threads that share the warm
+models of the model registry, so the real-time path and bulk jobs can run in
+one process.
+
+Ordering:
+    Tasks run in order of priority (lower first, see whisperlab.tasks), then
+    batch by batch in the order the batches were submitted, then by sequence
+    within a batch. Reserved workers only run real-time tasks, so bulk work
+    never holds every worker while live audio waits.
+
+Failures:
+    A failed task is retried, up to `retries` more times, before its error is
+    delivered. A task can have a timeout, counted from its submission: an
+    expired task fails with TimeoutError. Queued tasks can be cancelled.
+    Python threads cannot be interrupted, so a task that is already running
+    is left to finish, and a late result is discarded.
+
+Delivery:
+    Each task gets a Future. If `on_result` is given, it is called with each
+    finished Future, in sequence order within a batch.
+
+Usage Examples:
+    >>> with Scheduler(workers=2) as scheduler:
+    ...     live = scheduler.submit(live_task, timeout=1.0)
+    ...     results = list(scheduler.map(bulk_tasks))
+"""
+
+from concurrent.futures import Future, InvalidStateError
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Iterable, Iterator, Optional
+from uuid import UUID
+
+import whisperlab.logging
+from whisperlab.models import preload
+from whisperlab.tasks import REALTIME_PRIORITY, Task
+from whisperlab.transcribe import transcribe
+
+
+log = whisperlab.logging.config_log()
+
+# Constants ===================================================================
+
+DEFAULT_WORKERS = 2
+
+DEFAULT_RESERVED_WORKERS = 1  # Workers kept for real-time tasks
+
+DEFAULT_RETRIES = 1
+
+
+# Jobs ========================================================================
+
+
+class Job:
+    """
+    A submitted task, and the state of its attempts.
+
+    Args:
+        task (Task): The task to run
+        count (int): The submission count, which breaks ordering ties
+        timeout (float): Seconds the task may take from submission, or None
+    """
+
+    __slots__ = ("task", "count", "future", "attempts", "deadline", "timer")
+
+    def __init__(self, task: Task, count: int, timeout: Optional[float] = None):
+        self.task = task
+        self.count = count
+        self.future = Future()
+        self.attempts = 0
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.timer = None
+
+    @property
+    def realtime(self) -> bool:
+        return self.task.priority <= REALTIME_PRIORITY
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+
+# Scheduler ===================================================================
+
+
+class Scheduler:
+    """
+    Run Tasks on a pool of worker threads, by priority and batch order.
+
+    Args:
+        handler (Callable): Runs a task and returns its result
+        workers (int): The number of worker threads
+        reserved (int): Workers that only run real-time tasks. Must be less
+            than `workers`.
+        retries (int): How many times a failed task is retried
+        models (Iterable[str]): Models to load before the workers start
+        on_result (Callable): Called with each finished Future, in sequence
+            order within a batch
+
+    Raises:
+        ValueError: If no worker is left for bulk tasks
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Task], dict] = transcribe,
+        workers: int = DEFAULT_WORKERS,
+        reserved: int = DEFAULT_RESERVED_WORKERS,
+        retries: int = DEFAULT_RETRIES,
+        models: Iterable[str] = (),
+        on_result: Optional[Callable[[Future], None]] = None,
+    ):
+        if not 0 <= reserved < workers:
+            raise ValueError(f"Cannot reserve {reserved} of {workers} workers")
+
+        self.handler = handler
+        self.retries = retries
+        self.on_result = on_result
+
+        self._queue = []  # A heap of (order, job)
+        self._condition = threading.Condition()
+        self._counter = itertools.count()
+        self._closed = False
+        self._jobs = {}  # Unfinished jobs, by task id
+        self._batch_ranks = {}  # The submission count of each batch
+        self._undelivered = {}  # A heap of (sequence, count, job) per batch
+        self._state = threading.Lock()  # Guards future transitions
+        self._delivery = threading.Lock()  # Keeps on_result calls in order
+
+        for model in models:
+            preload(model)
+
+        self._workers = [
+            threading.Thread(
+                target=self._work,
+                args=(index < reserved,),
+                name=f"whisperlab-worker-{index}",
+                daemon=True,
+            )
+            for index in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def __enter__(self) -> "Scheduler":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Submission --------------------------------------------------------------
+
+    def submit(self, task: Task, timeout: Optional[float] = None) -> Future:
+        """
+        Queue a task.
+
+        Args:
+            task (Task): The task to run
+            timeout (float): Seconds the task may take from now, or None
+
+        Returns:
+            Future: Resolves to the task's result
+
+        Raises:
+            RuntimeError: If the scheduler is closed
+        """
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The scheduler is closed")
+
+            job = Job(task, next(self._counter), timeout)
+            batch_rank = job.count
+            if task.batch:
+                batch_rank = self._batch_ranks.setdefault(task.batch, job.count)
+                undelivered = self._undelivered.setdefault(task.batch, [])
+                heapq.heappush(undelivered, (task.sequence, job.count, job))
+
+            order = (task.priority, batch_rank, task.sequence, job.count)
+            heapq.heappush(self._queue, (order, job))
+            self._jobs[task.id] = job
+            self._condition.notify_all()
+
+        if job.deadline is not None:
+            job.timer = threading.Timer(timeout, self._expire, (job,))
+            job.timer.daemon = True
+            job.timer.start()
+        return job.future
+
+    def map(self, tasks: Iterable[Task], timeout: Optional[float] = None) -> Iterator:
+        """
+        Run tasks, yielding their results in sequence order.
+
+        Args:
+            tasks (Iterable[Task]): The tasks to run
+            timeout (float): Seconds each task may take, or None
+
+        Yields:
+            dict: Each task's result
+
+        Raises:
+            Exception: The error of the first failed task, when it is reached
+        """
+        tasks = sorted(tasks, key=lambda task: task.sequence)
+        futures = [self.submit(task, timeout) for task in tasks]
+        for future in futures:
+            yield future.result()
+
+    def cancel(self, task_id: UUID) -> bool:
+        """
+        Cancel a queued task.
+
+        Args:
+            task_id (UUID): The task's id
+
+        Returns:
+            bool: True if the task was cancelled, False if it is running or
+                already finished
+        """
+        with self._condition:
+            job = self._jobs.get(task_id)
+        if job is None:
+            return False
+        with self._state:
+            cancelled = job.future.cancel()
+        if cancelled:
+            self._finish(job)
+        return cancelled
+
+    @property
+    def queued(self) -> int:
+        """The number of tasks waiting for a worker."""
+        with self._condition:
+            return len(self._queue)
+
+    def close(self, wait: bool = True):
+        """
+        Stop accepting tasks. The workers finish the queued ones, then exit.
+
+        Args:
+            wait (bool): Whether to wait for the workers to exit
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    # Workers -----------------------------------------------------------------
+
+    def _next(self, reserved: bool) -> Optional[Job]:
+        """Wait for the next job a worker may run. None once closed."""
+        with self._condition:
+            while True:
+                if self._queue and (not reserved or self._queue[0][1].realtime):
+                    return heapq.heappop(self._queue)[1]
+                if self._closed:
+                    return None
+                self._condition.wait()
+
+    def _requeue(self, job: Job):
+        with self._condition:
+            task = job.task
+            batch_rank = self._batch_ranks.get(task.batch, job.count)
+            order = (task.priority, batch_rank, task.sequence, job.count)
+            heapq.heappush(self._queue, (order, job))
+            self._condition.notify_all()
+
+    def _work(self, reserved: bool):
+        while (job := self._next(reserved)) is not None:
+            with self._state:
+                if job.future.done():
+                    continue  # Cancelled or expired while queued
+                if job.attempts == 0 and not job.future.set_running_or_notify_cancel():
+                    continue
+            if job.expired:
+                self._fail(job, TimeoutError(f"Task {job.task.id} timed out"))
+                continue
+
+            try:
+                result = self.handler(job.task)
+            except Exception as e:
+                if job.attempts < self.retries and not job.future.done():
+                    job.attempts += 1
+                    log.warning(
+                        "Retrying task %s (attempt %s): %s",
+                        job.task.id,
+                        job.attempts,
+                        e,
+                    )
+                    self._requeue(job)
+                else:
+                    log.exception("Task %s failed", job.task.id)
+                    self._fail(job, e)
+                continue
+
+            if not job.task.completed:
+                job.task.complete(result)
+            with self._state:
+                try:
+                    job.future.set_result(result)
+                except InvalidStateError:
+                    log.warning("Discarding the late result of task %s", job.task.id)
+            self._finish(job)
+
+    # Results -----------------------------------------------------------------
+
+    def _fail(self, job: Job, error: Exception):
+        with self._state:
+            try:
+                job.future.set_exception(error)
+            except InvalidStateError:
+                pass
+        self._finish(job)
+
+    def _expire(self, job: Job):
+        if not job.future.done():
+            log.warning("Task %s timed out", job.task.id)
+            self._fail(job, TimeoutError(f"Task {job.task.id} timed out"))
+
+    def _finish(self, job: Job):
+        """Forget a finished job, and deliver the results now in order."""
+        if job.timer is not None:
+            job.timer.cancel()
+        with self._condition:
+            if self._jobs.pop(job.task.id, None) is None:
+                return  # Already finished, e.g. expired then completed
+
+        if not job.task.batch:
+            if self.on_result is not None:
+                self.on_result(job.future)
+            return
+
+        with self._delivery:
+            ready = []
+            with self._condition:
+                undelivered = self._undelivered.get(job.task.batch, [])
+                while undelivered and undelivered[0][2].future.done():
+                    ready.append(heapq.heappop(undelivered)[2])
+                if not undelivered:
+                    self._undelivered.pop(job.task.batch, None)
+                    self._batch_ranks.pop(job.task.batch, None)
+            if self.on_result is not None:
+                for ready_job in ready:
+                    self.on_result(ready_job.future)
@@ -0,0 +1,749 @@
+"""
+Transcription Server Module
+
+This module serves transcriptions over HTTP from a long-running process, so
+models stay warm and a short clip is answered without paying for a process
+start, the torch import and a model load.
+
+Requests are TranscribeTasks. They wait in a bounded queue: when it is full
+the server answers 503 at once, instead of letting latency grow without
+limit. A dispatcher takes the queued requests that arrive within a few
+milliseconds of each other, and runs them as one micro-batch:
+
+- Short clips (up to 30 s) with the same settings share batched encoder
+  and decoder passes (see whisperlab.batch). They are decoded greedily,
+  without timestamps, and answered as one segment, so their text can differ
+  from a local transcription.
+- Longer files are transcribed chunk by chunk (see whisperlab.longform),
+  and each chunk's segments are streamed back as soon as they are stitched.
+  At most max_long_jobs of them are in flight; past that, the server
+  answers 503 too.
+
+Both run on a Scheduler (see whisperlab.scheduler): micro-batches as
+real-time tasks, on a worker reserved for them, and long files as bulk
+tasks on the other workers, so short clips never wait behind long files.
+
+Every request is traced, and its stage timings are added to the metrics
+served at /metrics.
+
+API:
+    GET  /health        Status, queue depth and model registry stats (JSON)
+    GET  /metrics       Tracing metrics (Prometheus text)
+    POST /transcribe    JSON {"audio_file": path, "model", "precision",
+                        "args", "vad", "cache"}, or the audio file itself as
+                        the body with the options as JSON in the `options`
+                        query parameter
+
+Only clients on the Unix socket or a loopback address may name a file by
+its path. Remote clients upload the audio, which is streamed to a
+temporary file. Options other than the ones above are rejected.
+
+/transcribe streams newline-delimited JSON events:
+    {"event": "segment", "segment": {...}}  As segments are transcribed
+    {"event": "result", "result": {...}}    The full result, last
+    {"event": "error", "error": "..."}      If the transcription failed
+
+Usage Examples:
+    whisperlab serve                    # On the default Unix socket
+    whisperlab serve --port 8765        # Over TCP
+"""
+
+import asyncio
+from collections import defaultdict
+from contextlib import ExitStack
+import ipaddress
+from itertools import chain
+import json
+import os
+from pathlib import Path
+import socket
+import tempfile
+import threading
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from pydantic import ValidationError
+
+import whisperlab.logging
+from whisperlab.audio import EnergyVAD, stream_audio
+from whisperlab.batch import SEGMENT_SAMPLES, transcribe_samples
+from whisperlab.cache import PCM_CACHE, RESULT_CACHE
+from whisperlab.client import DEFAULT_SOCKET
+from whisperlab.defaults import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_MAX_LONG_JOBS,
+    DEFAULT_MAX_WAIT_MS,
+    DEFAULT_PRECISION,
+    DEFAULT_QUEUE_SIZE,
+    DEFAULT_TRANSCRIPTION_MODEL,
+)
+from whisperlab.longform import transcribe_stream
+from whisperlab.models import get_model, preload, REGISTRY
+from whisperlab.scheduler import Scheduler
+from whisperlab.tasks import REALTIME_PRIORITY, Task
+from whisperlab.tracing import activate, jsonable, METRICS, span, Trace
+from whisperlab.transcribe import (
+    cache_settings,
+    EMPTY_RESULT,
+    EmptyFile,
+    TranscribeTask,
+)
+
+
+log = whisperlab.logging.config_log()
+
+# Constants ===================================================================
+
+MAX_UPLOAD_BYTES = 1024**3  # 1 GiB
+
+MAX_OPTIONS_BYTES = 1024**2  # JSON request bodies
+
+UPLOAD_CHUNK_BYTES = 1024**2  # Read from the connection at a time
+
+MAX_HEADER_LINES = 100
+
+CLIENT_OPTIONS = {"model", "precision", "args", "vad", "cache"}
+
+LONG_WORKERS = 1  # Workers transcribing long files, beside the short clips
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    503: "Service Unavailable",
+}
+
+
+# Requests ====================================================================
+
+
+class BadRequest(Exception):
+    """
+    Raised when a request cannot be parsed
+    """
+
+    status = 400
+
+
+class LengthRequired(BadRequest):
+    """
+    Raised when a request with a body has no Content-Length
+    """
+
+    status = 411
+
+
+class Job:
+    """
+    A queued transcription, and the channel its events are streamed on.
+
+    Args:
+        task (TranscribeTask): The transcription to run
+        loop (asyncio.AbstractEventLoop): The loop the response is written on
+        upload (str): The temporary file of an uploaded body, removed when
+            the job ends
+    """
+
+    def __init__(
+        self,
+        task: TranscribeTask,
+        loop: asyncio.AbstractEventLoop,
+        upload: Optional[str] = None,
+    ):
+        self.task = task
+        self.loop = loop
+        self.upload = upload
+        self.events = asyncio.Queue()
+        self.samples = None  # The decoded audio of a short clip
+        self.blocks = None  # The decoded audio stream of a long file
+        self.stream = None  # The decoder, closed if the long file is rejected
+
+    def publish(self, event: Optional[dict]):
+        """Send an event to the response, from any thread. None ends it."""
+        self.loop.call_soon_threadsafe(self.events.put_nowait, event)
+
+    def close(self, audio_seconds: float = 0.0):
+        """
+        End the job's response.
+
+        Args:
+            audio_seconds (float): The audio transcribed
+
+        Effects:
+            Adds the job's trace to the server metrics, and removes its
+            upload.
+        """
+        trace = self.task.trace
+        if trace is not None:
+            trace.record(audio_seconds=audio_seconds)
+            METRICS.observe(trace.summary())
+        if self.upload is not None:
+            os.unlink(self.upload)
+        self.publish(None)
+
+    @property
+    def key(self) -> tuple:
+        """Jobs with the same key can share a batch."""
+        args = json.dumps(self.task.args, sort_keys=True)
+        return (self.task.model, self.task.precision, self.task.vad, args)
+
+
+class JobsTask(Task):
+    """
+    Scheduled server work: a real-time micro-batch, or one long file.
+
+    Args:
+        jobs (list[Job]): The jobs of the micro-batch, or the long file's
+    """
+
+    jobs: list[Job] = []
+
+
+async def read_request(reader: asyncio.StreamReader) -> tuple[str, str, dict, int]:
+    """
+    Read the head of one HTTP/1.1 request. The body is left on the reader.
+
+    Returns:
+        tuple: The method, target, lowercase headers and body length
+
+    Raises:
+        BadRequest: If the request is malformed or too large
+        LengthRequired: If a POST request has no Content-Length
+    """
+    try:
+        method, target, _ = (await reader.readline()).decode().split()
+    except ValueError:
+        raise BadRequest("Malformed request line")
+
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if "content-length" not in headers:
+        if method == "POST":
+            raise LengthRequired("Content-Length is required")
+        headers["content-length"] = "0"
+    try:
+        length = int(headers["content-length"])
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise BadRequest("Malformed Content-Length")
+    if length > MAX_UPLOAD_BYTES:
+        raise BadRequest(f"Uploads are limited to {MAX_UPLOAD_BYTES} bytes")
+    return method, target, headers, length
+
+
+async def save_body(reader: asyncio.StreamReader, length: int, path: str):
+    """
+    Stream a request body to a file, a chunk at a time.
+
+    Raises:
+        asyncio.IncompleteReadError: If the client disconnects first
+    """
+    with open(path, "wb") as f:
+        while length:
+            chunk = await reader.read(min(length, UPLOAD_CHUNK_BYTES))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b"", length)
+            f.write(chunk)
+            length -= len(chunk)
+
+
+def local_peer(writer: asyncio.StreamWriter) -> bool:
+    """Whether a connection comes from this host: a Unix socket or loopback."""
+    connection = writer.get_extra_info("socket")
+    if connection is not None and connection.family == socket.AF_UNIX:
+        return True
+    peer = writer.get_extra_info("peername")
+    try:
+        return ipaddress.ip_address(peer[0]).is_loopback
+    except (TypeError, ValueError, IndexError):
+        return False
+
+
+def parse_options(options, local: bool) -> dict:
+    """
+    Check the transcription options of a request.
+
+    Args:
+        options: The decoded JSON options
+        local (bool): Whether the client may name a file by its path
+
+    Returns:
+        dict: The options
+
+    Raises:
+        BadRequest: If the options are not an object, or hold a field
+            clients may not set
+    """
+    if not isinstance(options, dict):
+        raise BadRequest("The options must be a JSON object")
+    allowed = CLIENT_OPTIONS | {"audio_file"} if local else CLIENT_OPTIONS
+    unknown = set(options) - allowed
+    if unknown:
+        if "audio_file" in unknown and not local:
+            raise BadRequest("Remote clients must upload the audio")
+        raise BadRequest(f"Unknown options: {', '.join(sorted(unknown))}")
+    return options
+
+
+def write_head(writer: asyncio.StreamWriter, status: int, headers: dict):
+    lines = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+
+
+async def respond(
+    writer: asyncio.StreamWriter,
+    status: int,
+    body: str,
+    content_type: str = "application/json",
+    headers: Optional[dict] = None,
+):
+    """Write a complete response."""
+    data = body.encode()
+    write_head(
+        writer,
+        status,
+        {
+            "Content-Type": content_type,
+            "Content-Length": len(data),
+            "Connection": "close",
+            **(headers or {}),
+        },
+    )
+    writer.write(data)
+    await writer.drain()
+
+
+async def respond_error(writer: asyncio.StreamWriter, status: int, error: str, **kw):
+    await respond(writer, status, json.dumps({"error": error}), **kw)
+
+
+# Server ======================================================================
+
+
+class TranscriptionServer:
+    """
+    Serve transcriptions from warm models, in micro-batches.
+
+    Args:
+        model (str): The default transcription model
+        queue_size (int): Requests that can wait before the server is busy
+        batch_size (int): Segments per batched forward pass, and the most
+            requests in one micro-batch
+        max_wait_ms (float): How long a batch waits for more requests
+        precision (str): The default inference precision
+        long_workers (int): Scheduler workers transcribing long files
+        max_long_jobs (int): Long files that can be in flight before the
+            server is busy for more
+    """
+
+    def __init__(
+        self,
+        model: str = DEFAULT_TRANSCRIPTION_MODEL,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+        precision: str = DEFAULT_PRECISION,
+        long_workers: int = LONG_WORKERS,
+        max_long_jobs: int = DEFAULT_MAX_LONG_JOBS,
+    ):
+        self.model = model
+        self.precision = precision
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.max_wait_ms = max_wait_ms
+        self.long_workers = long_workers
+        self.max_long_jobs = max_long_jobs
+        self.long_jobs = 0  # Long files in flight
+        self.long_lock = threading.Lock()
+        self.scheduler = None  # Created when the server starts
+        self.queue = None  # Created on the server's event loop
+        self.address = None  # Set once the server is listening
+        self.batches = 0
+
+    # Connections -------------------------------------------------------------
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer one request per connection."""
+        try:
+            try:
+                method, target, headers, length = await read_request(reader)
+            except BadRequest as e:
+                return await respond_error(writer, e.status, str(e))
+
+            path = urlsplit(target).path
+            if path == "/health":
+                await respond(writer, 200, json.dumps(self.health()))
+            elif path == "/metrics":
+                await respond(writer, 200, METRICS.prometheus(), "text/plain")
+            elif path != "/transcribe":
+                await respond_error(writer, 404, f"No route: {path}")
+            elif method != "POST":
+                await respond_error(writer, 405, "Use POST")
+            else:
+                await self.transcribe(reader, writer, target, headers, length)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            log.info("Client disconnected")
+        finally:
+            writer.close()
+
+    async def transcribe(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        target: str,
+        headers: dict,
+        length: int,
+    ):
+        """Queue a transcription, then stream its events."""
+        upload = None  # Owned by the job once it is queued
+        try:
+            # Parse the task, saving uploads to a temporary file
+            try:
+                if headers.get("content-type", "").startswith("application/json"):
+                    if length > MAX_OPTIONS_BYTES:
+                        raise BadRequest("The options are too large")
+                    body = await reader.readexactly(length)
+                    options = parse_options(json.loads(body), local_peer(writer))
+                else:
+                    query = parse_qs(urlsplit(target).query)
+                    options = json.loads(query.get("options", ["{}"])[0])
+                    options = parse_options(options, local=False)
+                    descriptor, upload = tempfile.mkstemp(prefix="whisperlab-upload-")
+                    os.close(descriptor)
+                    await save_body(reader, length, upload)
+                    options["audio_file"] = upload
+                options.setdefault("model", self.model)
+                options.setdefault("precision", self.precision)
+                task = TranscribeTask(**options, trace=Trace())
+            except (BadRequest, ValueError, TypeError, ValidationError) as e:
+                return await respond_error(writer, 400, f"Invalid request: {e}")
+
+            # Apply backpressure: reject at once when the queue is full
+            job = Job(task, asyncio.get_running_loop(), upload)
+            try:
+                self.queue.put_nowait(job)
+            except asyncio.QueueFull:
+                return await respond_error(
+                    writer, 503, "Server busy", headers={"Retry-After": "1"}
+                )
+            upload = None
+
+            # The head waits for the first event, so a rejected job is busy
+            event = await job.events.get()
+            if event is not None and event["event"] == "busy":
+                return await respond_error(
+                    writer, 503, event["error"], headers={"Retry-After": "1"}
+                )
+            write_head(
+                writer,
+                200,
+                {
+                    "Content-Type": "application/x-ndjson",
+                    "Transfer-Encoding": "chunked",
+                    "Connection": "close",
+                },
+            )
+            while event is not None:
+                line = (json.dumps(event) + "\n").encode()
+                writer.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                await writer.drain()
+                event = await job.events.get()
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            if upload is not None:
+                os.unlink(upload)
+
+    def health(self) -> dict:
+        return {
+            "status": "ok",
+            "model": self.model,
+            "precision": self.precision,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "queue_size": self.queue_size,
+            "long_jobs": self.long_jobs,
+            "batches": self.batches,
+            "registry": REGISTRY.stats().model_dump(),
+        }
+
+    # Dispatch ----------------------------------------------------------------
+
+    async def dispatch(self):
+        """Run queued jobs in micro-batches, forever."""
+        while True:
+            jobs = [await self.queue.get()]
+            deadline = asyncio.get_running_loop().time() + self.max_wait_ms / 1000
+            while len(jobs) < self.batch_size:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    jobs.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batches += 1
+            batch = JobsTask(jobs=jobs, priority=REALTIME_PRIORITY)
+            await asyncio.wrap_future(self.scheduler.submit(batch))
+
+    def run_task(self, task: JobsTask):
+        """Run a scheduled micro-batch or long file."""
+        if task.priority <= REALTIME_PRIORITY:
+            self.run_batch(task.jobs)
+        else:
+            self.run_long(task.jobs[0])
+        return {}
+
+    def run_batch(self, jobs: list[Job]):
+        """
+        Transcribe a micro-batch, publishing each job's events.
+
+        Args:
+            jobs (list[Job]): The jobs to run
+        """
+        log.info("Transcribing a batch of %s requests", len(jobs))
+        pending = []
+        for job in jobs:
+            try:
+                with activate(job.task.trace):
+                    if self.serve_cached(job):
+                        continue
+                    if EmptyFile(job.task.audio_file):
+                        result = {**EMPTY_RESULT, "segments": [], "duration": 0.0}
+                        self.finish(job, result)
+                        continue
+                    with span("decode"):
+                        self.decode(job)
+                pending.append(job)
+            except Exception as e:
+                self.fail(job, e)
+
+        # Short clips with the same settings share batched passes. Long files
+        # run beside them, up to max_long_jobs at a time.
+        groups = defaultdict(list)
+        for job in pending:
+            if job.samples is not None:
+                groups[job.key].append(job)
+            elif self.admit_long():
+                self.scheduler.submit(JobsTask(jobs=[job]))
+            else:
+                self.reject(job)
+
+        for (model, precision, vad, args), group in groups.items():
+            try:
+                with ExitStack() as spans:
+                    for job in group:
+                        if job.task.trace is not None:
+                            trace = job.task.trace
+                            spans.enter_context(trace.span("batch", jobs=len(group)))
+                    results = transcribe_samples(
+                        get_model(model, dtype=precision),
+                        [job.samples for job in group],
+                        self.batch_size,
+                        detector=EnergyVAD() if vad else None,
+                        **json.loads(args),
+                    )
+            except Exception as e:
+                for job in group:
+                    self.fail(job, e)
+                continue
+            for job, result in zip(group, results):
+                segment = {"start": 0.0, "end": result["duration"]}
+                result = {**result, "segments": [{**segment, "text": result["text"]}]}
+                job.publish({"event": "segment", "segment": result["segments"][0]})
+                self.finish(job, result)
+
+    def decode(self, job: Job):
+        """
+        Decode a short clip, or start decoding a long file.
+
+        Only the first 30 seconds are decoded to tell them apart. A long
+        file keeps its decoded head and the rest of its stream.
+        """
+        pcm_cache = PCM_CACHE if job.task.cache else None
+        blocks = job.stream = stream_audio(job.task.audio_file, cache=pcm_cache)
+        head = []
+        samples = 0
+        for block in blocks:
+            head.append(block)
+            samples += len(block)
+            if samples > SEGMENT_SAMPLES:
+                job.blocks = chain(head, blocks)
+                return
+        job.samples = np.concatenate([np.zeros(0, np.float32), *head])
+
+    def admit_long(self) -> bool:
+        """Count a long file in flight, unless there are max_long_jobs."""
+        with self.long_lock:
+            if self.long_jobs >= self.max_long_jobs:
+                return False
+            self.long_jobs += 1
+            return True
+
+    def reject(self, job: Job):
+        """Turn a long file away, stopping its decoder."""
+        log.warning("Too many long files in flight, rejecting %s", job.task.audio_file)
+        job.stream.close()
+        job.publish({"event": "busy", "error": "Too many long files in flight"})
+        job.close()
+
+    def run_long(self, job: Job):
+        """Transcribe a long file chunk by chunk, streaming its segments."""
+
+        def on_segments(segments: list[dict]):
+            for segment in segments:
+                job.publish({"event": "segment", "segment": segment})
+
+        try:
+            task = job.task
+            with activate(task.trace), span("transcribe"):
+                result = transcribe_stream(
+                    get_model(task.model, dtype=task.precision),
+                    job.blocks,
+                    detector=EnergyVAD() if task.vad else None,
+                    on_segments=on_segments,
+                    **task.args,
+                )
+        except Exception as e:
+            return self.fail(job, e)
+        finally:
+            with self.long_lock:
+                self.long_jobs -= 1
+        self.finish(job, result)
+
+    # Results -----------------------------------------------------------------
+
+    def cache_key(self, job: Job) -> str:
+        task = job.task
+        return RESULT_CACHE.key(task.audio_file, task.model, cache_settings(task))
+
+    def serve_cached(self, job: Job) -> bool:
+        """Answer a job from the result cache, if it is there."""
+        if not job.task.cache or EmptyFile(job.task.audio_file):
+            return False
+        with span("cache_lookup"):
+            result = RESULT_CACHE.get(self.cache_key(job))
+        if result is None:
+            return False
+        for segment in result.get("segments", []):
+            job.publish({"event": "segment", "segment": segment})
+        job.publish({"event": "result", "result": result})
+        job.close(result.get("duration", 0.0))
+        return True
+
+    def finish(self, job: Job, result: dict):
+        result = json.loads(json.dumps(result, default=jsonable))
+        if job.task.cache and not EmptyFile(job.task.audio_file):
+            RESULT_CACHE.put(self.cache_key(job), result)
+        job.task.complete(result)
+        job.publish({"event": "result", "result": result})
+        job.close(result.get("duration", 0.0))
+
+    def fail(self, job: Job, error: Exception):
+        log.exception("Failed to transcribe %s", job.task.audio_file)
+        job.publish({"event": "error", "error": f"{type(error).__name__}: {error}"})
+        job.close()
+
+    # Control -----------------------------------------------------------------
+
+    async def serve(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        socket_path: Optional[Path] = None,
+        ready: Optional[asyncio.Event] = None,
+    ):
+        """
+        Serve until cancelled.
+
+        Args:
+            host (str): The TCP host, when serving over TCP
+            port (int): The TCP port. If None, serve on a Unix socket.
+            socket_path (Path): The Unix socket path
+            ready (asyncio.Event): Set once the server accepts connections
+        """
+        self.queue = asyncio.Queue(self.queue_size)
+        self.scheduler = Scheduler(
+            self.run_task, workers=self.long_workers + 1, reserved=1, retries=0
+        )
+        dispatcher = asyncio.create_task(self.dispatch())
+
+        if port is not None:
+            server = await asyncio.start_server(self.handle, host, port)
+            port = server.sockets[0].getsockname()[1]  # Port 0 picks a free one
+            self.address = f"http://{host}:{port}"
+        else:
+            socket_path = Path(socket_path or DEFAULT_SOCKET)
+            socket_path.unlink(missing_ok=True)  # Left by a crashed server
+            server = await asyncio.start_unix_server(self.handle, socket_path)
+            self.address = f"unix:{socket_path}"
+
+        log.info("Serving transcriptions on %s", self.address)
+        try:
+            async with server:
+                if ready is not None:
+                    ready.set()
+                await server.serve_forever()
+        finally:
+            dispatcher.cancel()
+            self.scheduler.close(wait=False)
+            if socket_path is not None:
+                socket_path.unlink(missing_ok=True)
+
+
+# Use Case ====================================================================
+
+
+def serve(
+    model: str = DEFAULT_TRANSCRIPTION_MODEL,
+    host: str = "127.0.0.1",
+    port: Optional[int] = None,
+    socket_path: Optional[Path] = None,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+    warm: bool = False,
+    precision: str = DEFAULT_PRECISION,
+    max_long_jobs: int = DEFAULT_MAX_LONG_JOBS,
+):
+    """
+    Run a transcription server until interrupted.
+
+    Args:
+        model (str): The default transcription model
+        host (str): The TCP host
+        port (int): The TCP port. If None, serve on a Unix socket.
+        socket_path (Path): The Unix socket path
+        queue_size (int): Requests that can wait before the server is busy
+        batch_size (int): Segments per batched forward pass
+        max_wait_ms (float): How long a batch waits for more requests
+        warm (bool): Load the model before accepting requests
+        precision (str): The default inference precision
+        max_long_jobs (int): Long files that can be in flight before the
+            server is busy for more
+    """
+    if warm:
+        preload(model, dtype=precision)
+    server = TranscriptionServer(
+        model,
+        queue_size,
+        batch_size,
+        max_wait_ms,
+        precision,
+        max_long_jobs=max_long_jobs,
+    )
+    try:
+        asyncio.run(server.serve(host, port, socket_path))
+    except KeyboardInterrupt:
+        log.info("Server stopped")
@@ -0,0 +1,973 @@
+"""
+Streaming Transcription Module
+
+This module transcribes a live audio stream for an unlimited duration.
+
+Capture and inference are decoupled: the audio callback only copies samples
+into a ring buffer, while an inference thread transcribes a sliding window
+of the latest audio every hop. Audio that arrives during inference is kept
+in the ring buffer, so nothing is dropped while the model runs.
+
+Consecutive windows overlap. Their hypotheses are merged with the long-form
+stitcher: a word is committed once its midpoint is older than the middle of
+the overlap with the next window, and committed text never changes. The
+words after that boundary are reported as tentative text.
+
+With a speech detector, windows without speech are not sent to the model.
+
+With an incremental mel frontend, each window's log-mel spectrogram is built
+from the frames of the previous windows, plus the new hop's frames (see
+whisperlab.mel). Windows then start on the frame grid.
+
+Multi-channel capture is either mixed down to one stream (see the channel
+mixers of whisperlab.audio), or transcribed channel by channel: a
+MultiChannelTranscriber captures every channel into one 2-D ring buffer,
+and runs one StreamingTranscriber per channel, each on its own thread. The
+channels only infer in parallel on separate model replicas (see
+whisperlab.models).
+
+Speculative transcription runs two tiers on one stream. A small draft model
+transcribes the uncommitted audio every few hundred milliseconds, and its
+text is shown as tentative. A larger model transcribes the sliding window
+every hop, as a StreamingTranscriber, and its committed text replaces the
+draft's. Both tiers read one ring buffer and share one mel frontend. The
+engine reports the first-token latency, from the capture of audio to the
+first text covering it, and how often the drafts were corrected.
+
+System Diagram:
+
+```mermaid
+classDiagram
+    class MicrophoneSource {
+      -sounddevice.InputStream stream
+      +callback(samples, frames, time, status)
+    }
+
+    class StreamingTranscriber {
+      -RingBuffer ring
+      -Stitcher stitcher
+      +feed(samples)
+      +step(final)
+      +start()
+      +stop()
+      +updates()
+    }
+
+    MicrophoneSource --> StreamingTranscriber: feed()
+    StreamingTranscriber ..> StreamingTranscriber: step() on the inference thread
+```
+
+Usage Examples:
+    >>> engine = StreamingTranscriber(WhisperTranscriber("base"), on_update=print)
+    >>> source = MicrophoneSource(engine)
+    >>> engine.start(); source.start()
+    >>> async for update in engine.updates():
+    ...     print(update.committed, update.tentative)
+
+    >>> engine = SpeculativeTranscriber(
+    ...     WhisperTranscriber("tiny"), WhisperTranscriber("base")
+    ... )
+"""
+
+import asyncio
+from collections import deque
+import queue
+import threading
+from typing import AsyncIterator, Callable, Optional, Sequence, Union
+
+import numpy as np
+from pydantic import BaseModel
+import torch
+
+import whisperlab.logging
+from whisperlab.audio import (
+    ChannelMixer,
+    Resampler,
+    RingBuffer,
+    SAMPLES_PER_SECOND,
+    SelectChannel,
+    SpeechDetector,
+)
+from whisperlab.defaults import DEFAULT_DRAFT_MODEL  # noqa: F401
+from whisperlab.longform import Chunk, normalize_word, Stitcher
+from whisperlab.mel import HOP, MelFrontend, transcribe_mel
+from whisperlab.models import get_model, model_lock
+from whisperlab.textmetrics import word_edits
+from whisperlab.time import time_ms
+from whisperlab.tracing import activate, new_trace, record, span, Trace
+from whisperlab.transcribe import DEFAULT_TRANSCRIPTION_MODEL
+
+
+log = whisperlab.logging.config_log()
+
+# Constants ===================================================================
+
+WINDOW_SECONDS = 10  # Audio transcribed by each inference
+HOP_SECONDS = 2  # Time between inferences
+DRAFT_HOP_SECONDS = 0.5  # Time between drafts of speculative transcription
+LATENCY_HISTORY = 1_000  # Latencies kept for the percentiles
+
+
+# Models ======================================================================
+
+
+class TranscriptUpdate(BaseModel):
+    """
+    The transcript after one inference
+
+    Args:
+        committed (str): Text committed by this inference. It is final.
+        tentative (str): Text after the commit boundary. It may change.
+        window_start (float): The stream time of the window start, in seconds
+        window_end (float): The stream time of the window end, in seconds
+        latency_ms (float): From the capture of the newest sample to the
+            update
+        provisional (bool): Whether a draft model produced the update. Its
+            text is all tentative.
+    """
+
+    committed: str
+    tentative: str
+    window_start: float
+    window_end: float
+    latency_ms: float
+    provisional: bool = False
+
+
+class StreamingStats(BaseModel):
+    """
+    Streaming counters
+
+    Args:
+        windows (int): Windows processed
+        silent_windows (int): Windows without speech, not sent to the model
+        skipped_seconds (float): Audio never transcribed because inference
+            fell more than a window behind
+        overflows (int): Capture callbacks that reported an input overflow
+        latency_p50_ms (float): Median end-to-end latency
+        latency_p95_ms (float): 95th percentile end-to-end latency
+        latency_max_ms (float): Worst end-to-end latency
+    """
+
+    windows: int = 0
+    silent_windows: int = 0
+    skipped_seconds: float = 0
+    overflows: int = 0
+    latency_p50_ms: float = 0
+    latency_p95_ms: float = 0
+    latency_max_ms: float = 0
+
+
+class SpeculativeStats(BaseModel):
+    """
+    Speculative streaming counters
+
+    Args:
+        drafts (int): Windows drafted by the small model
+        confirmations (int): Windows processed by the large model
+        first_token_latency_p50_ms (float): Median time from the capture
+            of audio to the first text covering it
+        first_token_latency_p95_ms (float): 95th percentile first-token
+            latency
+        commit_latency_p50_ms (float): Median end-to-end latency of the
+            large model
+        commit_latency_p95_ms (float): 95th percentile end-to-end latency of
+            the large model
+        committed_words (int): Committed words of audio a draft had covered
+        corrected_words (int): Word edits from the drafts to the committed
+            text
+        correction_rate (float): Corrected words per committed word, i.e.
+            the drafts' word error rate against the committed text
+    """
+
+    drafts: int = 0
+    confirmations: int = 0
+    first_token_latency_p50_ms: float = 0
+    first_token_latency_p95_ms: float = 0
+    commit_latency_p50_ms: float = 0
+    commit_latency_p95_ms: float = 0
+    committed_words: int = 0
+    corrected_words: int = 0
+    correction_rate: float = 0
+
+
+# Transcribers ================================================================
+
+
+def word_segments(result: dict) -> list[dict]:
+    """
+    Flatten a whisper result with word timestamps into one segment per word.
+
+    Segments without word timings are kept whole.
+
+    Args:
+        result (dict): A whisper result
+
+    Returns:
+        list[dict]: Segments with start, end and text
+    """
+    segments = []
+    for segment in result.get("segments", []):
+        words = segment.get("words")
+        if not words:
+            segments.append(segment)
+            continue
+        for word in words:
+            segments.append(
+                {"start": word["start"], "end": word["end"], "text": word["word"]}
+            )
+    return segments
+
+
+class WhisperTranscriber:
+    """
+    Transcribe windows with a whisper model from the model registry.
+
+    Args:
+        model (str): The transcription model to use
+        replica (int): The registry replica of the model. Transcribers on
+            different replicas run inference in parallel.
+        args: Arguments to pass to whisper
+    """
+
+    def __init__(
+        self, model: str = DEFAULT_TRANSCRIPTION_MODEL, replica: int = 0, **args
+    ):
+        self.model = model
+        self.replica = replica
+        self.args = {
+            "word_timestamps": True,
+            "condition_on_previous_text": False,
+            **args,
+        }
+
+    @property
+    def n_mels(self) -> int:
+        """The number of mel bands of the model."""
+        return get_model(self.model, replica=self.replica).dims.n_mels
+
+    def __call__(self, samples: np.ndarray, mel: Optional[torch.Tensor] = None) -> dict:
+        """
+        Transcribe a window.
+
+        Args:
+            samples (np.ndarray): The window's samples
+            mel (torch.Tensor): The window's padded log-mel spectrogram, if
+                already computed
+
+        Returns:
+            dict: The whisper result, with a segment per word
+        """
+        model = get_model(self.model, replica=self.replica)
+        with model_lock(model):
+            if mel is None:
+                result = model.transcribe(samples, fp16=False, **self.args)
+            else:
+                result = transcribe_mel(model, mel, fp16=False, **self.args)
+        return {**result, "segments": word_segments(result)}
+
+
+# Sources =====================================================================
+
+
+class MicrophoneSource:
+    """
+    Capture microphone audio into a streaming transcriber.
+
+    Audio is captured at the device's native rate, and resampled to 16 kHz.
+    The audio callback runs on the sounddevice thread, and only mixes the
+    channels, resamples them and copies the samples into the transcriber's
+    ring buffer.
+
+    Args:
+        engine (StreamingTranscriber | MultiChannelTranscriber): Receives
+            the samples. A MultiChannelTranscriber receives every channel.
+        device: The sounddevice input device. None uses the default.
+        blocksize (int): Samples per callback, at the device rate. 0 lets
+            the host choose.
+        channels (int): The number of input channels to capture
+        samplerate (int): The capture rate. Defaults to the device's.
+        mixer (ChannelMixer): Mixes the channels for a StreamingTranscriber.
+            Defaults to the first channel.
+    """
+
+    def __init__(
+        self,
+        engine,
+        device=None,
+        blocksize: int = 0,
+        channels: int = 1,
+        mixer: Optional[ChannelMixer] = None,
+        samplerate: Optional[int] = None,
+    ):
+        import sounddevice  # Deferred: needs the PortAudio library
+
+        self.engine = engine
+        if isinstance(engine, MultiChannelTranscriber):
+            channels, mixer = engine.channels, None
+        elif mixer is None:
+            mixer = SelectChannel(0)
+        self.mixer = mixer
+
+        if samplerate is None:
+            info = sounddevice.query_devices(device, "input")
+            samplerate = int(info["default_samplerate"])
+        self.resampler = None
+        if samplerate != SAMPLES_PER_SECOND:
+            self.resampler = Resampler(samplerate)
+            log.info(
+                "Resampling %s Hz capture to %s Hz", samplerate, SAMPLES_PER_SECOND
+            )
+
+        self.stream = sounddevice.InputStream(
+            device=device,
+            channels=channels,
+            samplerate=samplerate,
+            blocksize=blocksize,
+            dtype="float32",
+            callback=self.callback,
+        )
+
+    def start(self):
+        self.stream.start()
+
+    def stop(self):
+        self.stream.stop()
+        self.stream.close()
+
+    def callback(self, samples, frames, time, status):
+        if status.input_overflow:
+            self.engine.overflows += 1
+        if self.mixer is not None:
+            samples = self.mixer(samples)
+        if self.resampler is not None:
+            samples = self.resampler(samples)
+        self.engine.feed(samples)
+
+
+# Engine ======================================================================
+
+
+class StreamingTranscriber:
+    """
+    Transcribe a live stream with overlapping windows on an inference thread.
+
+    Feed samples with feed(), from any single producer thread. Read the
+    transcript from the on_update callback, the updates() async iterator,
+    or the text property.
+
+    Args:
+        transcriber (Callable): Maps a window of samples to a whisper-style
+            result, with segment times relative to the window
+        window_seconds (float): Audio transcribed by each inference
+        hop_seconds (float): New audio between inferences
+        on_update (Callable): Called with each TranscriptUpdate
+        detector (SpeechDetector): If given, windows without speech are
+            not transcribed
+        trace (Trace): Times each window's stages. Defaults to a new trace
+            if tracing is enabled.
+        ring (RingBuffer): A multi-channel ring buffer shared with other
+            engines, at least twice the window. Its producer calls notify()
+            instead of feed(). Defaults to a mono ring buffer of its own.
+        channel (int): The channel of the shared ring buffer to transcribe
+        incremental_mel (bool): Compute each window's log-mel spectrogram
+            incrementally, and pass it to the transcriber as `mel`
+        frontend (MelFrontend): The incremental mel frontend, if shared with
+            another engine on the stream. Implies incremental_mel.
+    """
+
+    def __init__(
+        self,
+        transcriber: Callable[[np.ndarray], dict],
+        window_seconds: float = WINDOW_SECONDS,
+        hop_seconds: float = HOP_SECONDS,
+        on_update: Optional[Callable[[TranscriptUpdate], None]] = None,
+        detector: Optional[SpeechDetector] = None,
+        trace: Optional[Trace] = None,
+        ring: Optional[RingBuffer] = None,
+        channel: Optional[int] = None,
+        incremental_mel: bool = False,
+        frontend: Optional[MelFrontend] = None,
+    ):
+        if not 0 < hop_seconds <= window_seconds:
+            raise ValueError("The hop must be positive and at most the window")
+
+        self.transcriber = transcriber
+        self.window_samples = int(window_seconds * SAMPLES_PER_SECOND)
+        self.hop_samples = int(hop_seconds * SAMPLES_PER_SECOND)
+        self.on_update = on_update
+        self.detector = detector
+        self.trace = trace if trace is not None else new_trace()
+        self.overflows = 0
+
+        # Twice the window, so the producer never laps an inference read
+        self.ring = ring if ring is not None else RingBuffer(2 * self.window_samples)
+        self.channel = channel
+        self.frontend = frontend
+        if incremental_mel and frontend is None:
+            self.frontend = MelFrontend(
+                getattr(transcriber, "n_mels", 80), capacity_seconds=2 * window_seconds
+            )
+        self.stitcher = Stitcher(overlap_seconds=window_seconds - hop_seconds)
+
+        self._captured_time = time_ms()  # When the newest sample arrived
+        self._processed = 0  # Ring cursor at the end of the last window
+        self._last = None  # The last window and its result
+        self._windows = 0
+        self._silent_windows = 0
+        self._skipped_seconds = 0.0
+        self._latencies = deque(maxlen=LATENCY_HISTORY)
+
+        self._ready = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._updates = queue.Queue()
+
+    # Capture -----------------------------------------------------------------
+
+    def feed(self, samples: np.ndarray):
+        """
+        Add captured samples. This never blocks on inference.
+
+        Args:
+            samples (np.ndarray): mono 16 kHz float32 samples
+        """
+        self.ring.put(samples)
+        self.notify()
+
+    def notify(self):
+        """Signal that samples were put in the ring buffer."""
+        self._captured_time = time_ms()
+        if self.ring.cursor - self._processed >= self.hop_samples:
+            self._ready.set()
+
+    # Inference ---------------------------------------------------------------
+
+    def step(self, final: bool = False) -> Optional[TranscriptUpdate]:
+        """
+        Transcribe the latest window, if a hop of new audio is available.
+
+        Args:
+            final (bool): Transcribe any remaining audio and commit all text
+
+        Returns:
+            TranscriptUpdate: The update, or None if there was nothing to do
+        """
+        pending = self.ring.cursor - self._processed
+        if final and pending == 0 and self._last is not None:
+            return self._commit_last()
+        if pending == 0 or (pending < self.hop_samples and not final):
+            return None
+
+        with activate(self.trace), span("window", index=self._windows):
+            return self._step(final, pending)
+
+    def _step(self, final: bool, pending: int) -> TranscriptUpdate:
+        # Take the latest window, up to the newest sample
+        samples, end = self.ring.read(
+            max(0, self.ring.cursor - self.window_samples), self.channel
+        )
+        captured_time = self._captured_time
+        samples = samples[-self.window_samples :]
+        if self.frontend is not None:
+            # Start on the frame grid, so the window reuses the kept frames
+            samples = samples[(len(samples) - end) % HOP :]
+        chunk = Chunk(self._windows, end - len(samples), samples, last=final)
+
+        # Detect audio that slid out of the window before it was transcribed
+        if self._windows and chunk.start > self.stitcher.boundary:
+            skipped = chunk.start - self.stitcher.boundary
+            self._skipped_seconds += skipped
+            log.warning("Inference fell behind: skipped %.1f s of audio", skipped)
+
+        # Transcribe and merge with the previous windows
+        with span("vad"):
+            speech = self.detector is None or self.detector(samples)
+        if speech and self.frontend is not None:
+            with span("mel"):
+                mel = self.frontend(samples, chunk.offset)
+            with span("inference"):
+                result = self.transcriber(samples, mel=mel)
+        elif speech:
+            with span("inference"):
+                result = self.transcriber(samples)
+        else:
+            result = {"segments": []}
+            self._silent_windows += 1
+        with span("stitch"):
+            committed = self.stitcher.add(chunk, result)
+        tentative = [
+            segment
+            for segment in result.get("segments", [])
+            if chunk.start + (segment["start"] + segment["end"]) / 2
+            >= self.stitcher.boundary
+        ]
+
+        record(audio_seconds=pending / SAMPLES_PER_SECOND)
+        self._processed = end
+        self._windows += 1
+        self._last = (chunk, result)
+        return self._publish(chunk, committed, tentative, time_ms() - captured_time)
+
+    def _commit_last(self) -> TranscriptUpdate:
+        """Commit the tentative text of the last window, at end of stream."""
+        chunk, result = self._last
+        chunk = chunk._replace(index=self._windows, last=True)
+        committed = self.stitcher.add(chunk, result)
+        self._last = None
+        return self._publish(chunk, committed, [], latency=0)
+
+    def _publish(self, chunk, committed, tentative, latency) -> TranscriptUpdate:
+        self._latencies.append(latency)
+        update = TranscriptUpdate(
+            committed="".join(segment["text"] for segment in committed),
+            tentative="".join(segment["text"] for segment in tentative),
+            window_start=chunk.start,
+            window_end=chunk.end,
+            latency_ms=latency,
+        )
+        if self.on_update is not None:
+            self.on_update(update)
+        self._updates.put(update)
+        return update
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._ready.wait(timeout=0.1)
+            self._ready.clear()
+            try:
+                self.step()
+            except Exception:
+                log.exception("Streaming inference failed")
+        self.step(final=True)
+        self._updates.put(None)  # End of stream
+
+    # Control -----------------------------------------------------------------
+
+    def start(self):
+        """Start the inference thread."""
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="whisperlab-inference", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Transcribe the remaining audio, then stop the inference thread."""
+        self._stopping.set()
+        self._ready.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        log.info("Streaming stats: %s", self.stats())
+
+    # Output ------------------------------------------------------------------
+
+    @property
+    def text(self) -> str:
+        """The committed transcript."""
+        return self.stitcher.result()["text"]
+
+    async def updates(self) -> AsyncIterator[TranscriptUpdate]:
+        """
+        Iterate over transcript updates until the engine stops.
+
+        Yields:
+            TranscriptUpdate: Each update, in order
+        """
+        while (update := await asyncio.to_thread(self._updates.get)) is not None:
+            yield update
+
+    def stats(self) -> StreamingStats:
+        """Get the streaming counters and latency percentiles."""
+        latencies = np.array(self._latencies or [0])
+        return StreamingStats(
+            windows=self._windows,
+            silent_windows=self._silent_windows,
+            skipped_seconds=self._skipped_seconds,
+            overflows=self.overflows,
+            latency_p50_ms=np.percentile(latencies, 50),
+            latency_p95_ms=np.percentile(latencies, 95),
+            latency_max_ms=latencies.max(),
+        )
+
+
+class MultiChannelTranscriber:
+    """
+    Transcribe each channel of a multi-channel stream as its own stream.
+
+    Every channel is captured into one preallocated 2-D ring buffer, so
+    feed() is one copy whatever the channel count. Each channel has its own
+    StreamingTranscriber and inference thread, which reads only its
+    channel.
+
+    Transcribers sharing a model run one at a time (see model_lock), so N
+    channels on one model take N inferences per hop. For parallel
+    inference, give each channel a transcriber on its own model replica,
+    e.g. WhisperTranscriber(model, replica=channel), at the memory cost of
+    N models.
+
+    Args:
+        transcribers (Callable | Sequence[Callable]): One transcriber for
+            every channel, or one per channel
+        channels (int): The number of channels
+        window_seconds (float): Audio transcribed by each inference
+        hop_seconds (float): New audio between inferences
+        on_update (Callable): Called with each channel's index and
+            TranscriptUpdate
+        detector (SpeechDetector): If given, windows without speech are
+            not transcribed
+        incremental_mel (bool): Compute each channel's log-mel spectrograms
+            incrementally
+    """
+
+    def __init__(
+        self,
+        transcribers: Union[Callable, Sequence[Callable]],
+        channels: int,
+        window_seconds: float = WINDOW_SECONDS,
+        hop_seconds: float = HOP_SECONDS,
+        on_update: Optional[Callable[[int, TranscriptUpdate], None]] = None,
+        detector: Optional[SpeechDetector] = None,
+        incremental_mel: bool = False,
+    ):
+        if callable(transcribers):
+            transcribers = [transcribers] * channels
+        if len(transcribers) != channels:
+            raise ValueError(f"Expected {channels} transcribers: {transcribers}")
+
+        self.channels = channels
+        self.overflows = 0
+        window_samples = int(window_seconds * SAMPLES_PER_SECOND)
+        self.ring = RingBuffer(2 * window_samples, channels=channels)
+        self.engines = [
+            StreamingTranscriber(
+                transcriber,
+                window_seconds=window_seconds,
+                hop_seconds=hop_seconds,
+                on_update=(
+                    None
+                    if on_update is None
+                    else lambda update, channel=channel: on_update(channel, update)
+                ),
+                detector=detector,
+                ring=self.ring,
+                channel=channel,
+                incremental_mel=incremental_mel,
+            )
+            for channel, transcriber in enumerate(transcribers)
+        ]
+
+    def feed(self, frames: np.ndarray):
+        """
+        Add captured frames. This never blocks on inference.
+
+        Args:
+            frames (np.ndarray): (samples, channels) 16 kHz float32 frames
+        """
+        self.ring.put(frames)
+        for engine in self.engines:
+            engine.notify()
+
+    def step(self, final: bool = False) -> list[Optional[TranscriptUpdate]]:
+        """Step every channel's engine. See StreamingTranscriber.step()."""
+        return [engine.step(final) for engine in self.engines]
+
+    def start(self):
+        """Start every channel's inference thread."""
+        for engine in self.engines:
+            engine.start()
+
+    def stop(self):
+        """Transcribe the remaining audio, then stop the inference threads."""
+        for engine in self.engines:
+            engine.stop()
+
+    @property
+    def texts(self) -> list[str]:
+        """The committed transcript of each channel."""
+        return [engine.text for engine in self.engines]
+
+
+class SpeculativeTranscriber:
+    """
+    Transcribe a live stream in two tiers: a small draft model shows
+    provisional text every few hundred milliseconds, and a larger model
+    commits text every hop.
+
+    The confirming tier is a StreamingTranscriber. The draft tier
+    transcribes the audio after the confirming tier's commit boundary, up to
+    the newest sample, on an inference thread of its own. Its text is always
+    tentative: the next update of either tier replaces it, and the larger
+    model's committed text is final.
+
+    Both tiers read one ring buffer, and share one mel frontend when their
+    models have the same number of mel bands.
+
+    Args:
+        draft (Callable): The small transcriber, e.g. a "tiny"
+            WhisperTranscriber
+        confirm (Callable): The large transcriber, whose text is committed
+        window_seconds (float): Audio transcribed by each confirmation
+        hop_seconds (float): New audio between confirmations
+        draft_hop_seconds (float): New audio between drafts
+        on_update (Callable): Called with each TranscriptUpdate of either
+            tier
+        detector (SpeechDetector): If given, windows without speech are
+            not transcribed
+        trace (Trace): Times each window's stages, for both tiers
+    """
+
+    def __init__(
+        self,
+        draft: Callable[[np.ndarray], dict],
+        confirm: Callable[[np.ndarray], dict],
+        window_seconds: float = WINDOW_SECONDS,
+        hop_seconds: float = HOP_SECONDS,
+        draft_hop_seconds: float = DRAFT_HOP_SECONDS,
+        on_update: Optional[Callable[[TranscriptUpdate], None]] = None,
+        detector: Optional[SpeechDetector] = None,
+        trace: Optional[Trace] = None,
+    ):
+        if not 0 < draft_hop_seconds <= hop_seconds:
+            raise ValueError("The draft hop must be positive and at most the hop")
+
+        self.draft = draft
+        self.window_samples = int(window_seconds * SAMPLES_PER_SECOND)
+        self.draft_hop_samples = int(draft_hop_seconds * SAMPLES_PER_SECOND)
+        self.on_update = on_update
+        self.detector = detector
+        self.overflows = 0
+
+        # One capture buffer and, where the models agree, one mel frontend
+        self.ring = RingBuffer(2 * self.window_samples)
+        n_mels = getattr(confirm, "n_mels", 80)
+        self.frontend = MelFrontend(n_mels, capacity_seconds=2 * window_seconds)
+        self.draft_frontend = self.frontend
+        if getattr(draft, "n_mels", 80) != n_mels:
+            self.draft_frontend = MelFrontend(
+                getattr(draft, "n_mels", 80), capacity_seconds=2 * window_seconds
+            )
+        self.confirmer = StreamingTranscriber(
+            confirm,
+            window_seconds=window_seconds,
+            hop_seconds=hop_seconds,
+            on_update=self._confirmed,
+            detector=detector,
+            trace=trace,
+            ring=self.ring,
+            frontend=self.frontend,
+        )
+        self.trace = self.confirmer.trace
+
+        self._lock = threading.Lock()  # Orders the updates of both tiers
+        self._captured_time = time_ms()  # When the newest sample arrived
+        self._drafted = 0  # Ring cursor at the end of the last draft
+        self._draft = (0.0, 0.0, [])  # The last draft's start, end and segments
+        self._drafts = 0
+        self._shown = 0.0  # The stream time covered by text so far
+        self._first_latencies = deque(maxlen=LATENCY_HISTORY)
+        self._boundary = 0.0  # The commit boundary the drafts were checked to
+        self._checked = 0  # Committed segments checked against the drafts
+        self._committed_words = 0
+        self._corrected_words = 0
+
+        self._ready = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._updates = queue.Queue()
+
+    # Capture -----------------------------------------------------------------
+
+    def feed(self, samples: np.ndarray):
+        """
+        Add captured samples. This never blocks on inference.
+
+        Args:
+            samples (np.ndarray): mono 16 kHz float32 samples
+        """
+        self.ring.put(samples)
+        self._captured_time = time_ms()
+        self.confirmer.notify()
+        if self.ring.cursor - self._drafted >= self.draft_hop_samples:
+            self._ready.set()
+
+    # Inference ---------------------------------------------------------------
+
+    def step(self, final: bool = False) -> list[TranscriptUpdate]:
+        """
+        Draft, then confirm, the latest audio, where enough is available.
+
+        Args:
+            final (bool): Skip the draft, and confirm all remaining audio
+
+        Returns:
+            list[TranscriptUpdate]: The updates of the tiers that ran
+        """
+        updates = [None if final else self.step_draft(), self.confirmer.step(final)]
+        return [update for update in updates if update is not None]
+
+    def step_draft(self) -> Optional[TranscriptUpdate]:
+        """
+        Draft the uncommitted audio, if a draft hop of new audio is
+        available.
+
+        Returns:
+            TranscriptUpdate: The provisional update, or None if there was
+                nothing to do
+        """
+        if self.ring.cursor - self._drafted < self.draft_hop_samples:
+            return None
+        with activate(self.trace), span("draft", index=self._drafts):
+            return self._step_draft()
+
+    def _step_draft(self) -> Optional[TranscriptUpdate]:
+        # Take the uncommitted audio, up to a window, on the frame grid
+        cursor = self.ring.cursor
+        boundary = min(self.confirmer.stitcher.boundary * SAMPLES_PER_SECOND, cursor)
+        start = max(int(boundary), cursor - self.window_samples, 0)
+        start += -start % HOP
+        if start >= cursor:
+            self._drafted = cursor
+            return None
+        captured_time = self._captured_time
+        samples, end = self.ring.read(start)
+
+        with span("vad"):
+            speech = self.detector is None or self.detector(samples)
+        result = {"segments": []}
+        if speech:
+            with span("mel"):
+                mel = self.draft_frontend(samples, start)
+            with span("inference"):
+                result = self.draft(samples, mel=mel)
+        offset = start / SAMPLES_PER_SECOND
+        segments = [
+            {
+                **segment,
+                "start": offset + segment["start"],
+                "end": offset + segment["end"],
+            }
+            for segment in result.get("segments", [])
+        ]
+
+        with self._lock:
+            self._drafted = end
+            self._drafts += 1
+            self._draft = (offset, end / SAMPLES_PER_SECOND, segments)
+            # Drop the text committed while the draft ran
+            boundary = self.confirmer.stitcher.boundary
+            update = TranscriptUpdate(
+                committed="",
+                tentative="".join(
+                    segment["text"]
+                    for segment in segments
+                    if (segment["start"] + segment["end"]) / 2 >= boundary
+                ),
+                window_start=offset,
+                window_end=end / SAMPLES_PER_SECOND,
+                latency_ms=time_ms() - captured_time,
+                provisional=True,
+            )
+            self._publish(update)
+        return update
+
+    def _confirmed(self, update: TranscriptUpdate):
+        """Publish an update of the confirming tier."""
+        with self._lock:
+            self._check_draft()
+            self._publish(update)
+
+    def _check_draft(self):
+        """Count the words of the last draft that the new commits corrected."""
+        segments = self.confirmer.stitcher.segments
+        committed, self._checked = segments[self._checked :], len(segments)
+        draft_start, draft_end, drafted = self._draft
+        lower = max(self._boundary, draft_start)
+        upper = min(self.confirmer.stitcher.boundary, draft_end)
+        self._boundary = self.confirmer.stitcher.boundary
+
+        def words(segments: list[dict]) -> list[str]:
+            return [
+                normalize_word(word)
+                for segment in segments
+                if lower <= (segment["start"] + segment["end"]) / 2 < upper
+                for word in segment["text"].split()
+            ]
+
+        reference = words(committed)
+        self._committed_words += len(reference)
+        self._corrected_words += word_edits(reference, words(drafted))
+
+    def _publish(self, update: TranscriptUpdate):
+        # The first text that covers new audio
+        if (update.committed or update.tentative) and update.window_end > self._shown:
+            self._first_latencies.append(update.latency_ms)
+            self._shown = update.window_end
+        if self.on_update is not None:
+            self.on_update(update)
+        self._updates.put(update)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._ready.wait(timeout=0.1)
+            self._ready.clear()
+            try:
+                self.step_draft()
+            except Exception:
+                log.exception("Draft inference failed")
+
+    # Control -----------------------------------------------------------------
+
+    def start(self):
+        """Start the draft and confirmation inference threads."""
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="whisperlab-draft", daemon=True
+        )
+        self._thread.start()
+        self.confirmer.start()
+
+    def stop(self):
+        """Stop drafting, confirm the remaining audio, then stop."""
+        self._stopping.set()
+        self._ready.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.confirmer.stop()
+        self._updates.put(None)  # End of stream
+        log.info("Speculative streaming stats: %s", self.stats())
+
+    # Output ------------------------------------------------------------------
+
+    @property
+    def text(self) -> str:
+        """The committed transcript."""
+        return self.confirmer.text
+
+    async def updates(self) -> AsyncIterator[TranscriptUpdate]:
+        """
+        Iterate over the updates of both tiers until the engine stops.
+
+        Yields:
+            TranscriptUpdate: Each update, in order
+        """
+        while (update := await asyncio.to_thread(self._updates.get)) is not None:
+            yield update
+
+    def stats(self) -> SpeculativeStats:
+        """Get the speculative counters and latency percentiles."""
+        first = np.array(self._first_latencies or [0])
+        commits = self.confirmer.stats()
+        return SpeculativeStats(
+            drafts=self._drafts,
+            confirmations=commits.windows,
+            first_token_latency_p50_ms=np.percentile(first, 50),
+            first_token_latency_p95_ms=np.percentile(first, 95),
+            commit_latency_p50_ms=commits.latency_p50_ms,
+            commit_latency_p95_ms=commits.latency_p95_ms,
+            committed_words=self._committed_words,
+            corrected_words=self._corrected_words,
+            correction_rate=self._corrected_words / max(1, self._committed_words),
+        )
@@ -1,15 +1,23 @@
 from typing import Optional
 from uuid import uuid4, UUID
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 from whisperlab.time import time_ms
+from whisperlab.tracing import new_trace, Trace, TraceSummary
+
+# Scheduling priorities: lower values run first
+REALTIME_PRIORITY = 0
+BULK_PRIORITY = 10
 
 
 class Task(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     # Task identification
     id: UUID = Field(default_factory=uuid4)
     batch: str = ""
     sequence: int = 0
+    priority: int = BULK_PRIORITY
 
     # Task status
     completed: bool = False
@@ -17,10 +25,24 @@ class Task(BaseModel):
 
     # Task timing
     created_time: float = Field(default_factory=time_ms)
-    completed_time: float = None
+    completed_time: Optional[float] = None
+
+    # Stage timings, when tracing is enabled
+    trace: Optional[Trace] = Field(default_factory=new_trace, exclude=True, repr=False)
 
     def complete(self, result: dict):
         """Complete the task with the given result."""
         self.completed = True
         self.result = result
         self.completed_time = time_ms()
+
+    @property
+    def latency_ms(self) -> Optional[float]:
+        """The time from creation to completion."""
+        if self.completed_time is None:
+            return None
+        return self.completed_time - self.created_time
+
+    def metrics(self) -> Optional[TraceSummary]:
+        """Get the stage timings, audio duration and bytes processed."""
+        return self.trace.summary() if self.trace is not None else None
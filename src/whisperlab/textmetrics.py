@@ -0,0 +1,36 @@
+"""
+Text Metrics Module
+
+This module scores transcripts against each other, word by word, for the
+benchmarks (see whisperlab.bench) and the correction rate of the
+speculative live mode (see whisperlab.streaming).
+"""
+
+# Metrics =====================================================================
+
+
+def word_edits(reference: list[str], hypothesis: list[str]) -> int:
+    """
+    Count the word substitutions, deletions and insertions between two
+    transcripts.
+
+    Example:
+        >>> word_edits(["the", "cat", "sat"], ["the", "bat", "sat", "down"])
+        2
+
+    Args:
+        reference (list[str]): The correct words
+        hypothesis (list[str]): The words to score
+
+    Returns:
+        int: The Levenshtein distance between the word lists
+    """
+    # One row at a time
+    row = list(range(len(hypothesis) + 1))
+    for i, word in enumerate(reference, 1):
+        previous, row[0] = row[0], i
+        for j, other in enumerate(hypothesis, 1):
+            previous, row[j] = row[j], min(
+                row[j] + 1, row[j - 1] + 1, previous + (word != other)
+            )
+    return row[-1]
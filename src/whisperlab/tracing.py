@@ -0,0 +1,475 @@
+"""
+Tracing Module
+
+This module times the stages of each task, so a slow transcription can be
+blamed on decoding, model loading or inference.
+
+A Trace collects the spans of one task (or of one live stream). Code deep in
+the pipeline opens spans with the module-level span() function, which
+records into the trace activated for the current thread or task:
+
+    >>> trace = Trace()
+    >>> with activate(trace), span("transcribe"):
+    ...     with span("inference", chunk=0):
+    ...         ...
+    >>> trace.summary().stages["transcribe/inference"].total_ms
+
+Spans nest: a stage is named by the path of its open spans. Traces also
+count the audio seconds and bytes processed, for the real-time factor.
+
+Tracing is off unless enabled with enable() or WHISPERLAB_TRACE=1. When no
+trace is active, span() returns a shared no-op span in a fraction of a
+microsecond, so instrumentation can stay in production code.
+
+Exports:
+    Metrics.prometheus(): Prometheus text exposition of the stage times
+    Metrics.snapshot(): The same counters as a JSON-serializable dict
+    ChromeTraceWriter: Streams spans to a Chrome trace-event file, viewable
+        in chrome://tracing or https://ui.perfetto.dev
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import math
+import os
+import threading
+import time
+from typing import Callable, Iterable, Iterator, Optional, TextIO
+
+import numpy as np
+from pydantic import BaseModel
+
+
+# Constants ===================================================================
+
+MAX_SPANS = 100_000  # Spans kept per trace; live streams drop the oldest
+
+# Histogram buckets for the per-task time of each stage, in seconds
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+ENABLED = os.environ.get("WHISPERLAB_TRACE", "") not in ("", "0")
+
+
+def enable(enabled: bool = True):
+    """Turn tracing of new tasks on or off, here and in child processes."""
+    global ENABLED
+    ENABLED = enabled
+    os.environ["WHISPERLAB_TRACE"] = "1" if enabled else "0"
+
+
+# Models ======================================================================
+
+
+class StageStats(BaseModel):
+    """
+    The time spent in one stage of a trace
+
+    Args:
+        count (int): The number of spans of the stage
+        total_ms (float): Their total duration
+        max_ms (float): The longest span
+    """
+
+    count: int = 0
+    total_ms: float = 0
+    max_ms: float = 0
+
+
+class TraceSummary(BaseModel):
+    """
+    The metrics of one trace
+
+    Args:
+        stages (dict[str, StageStats]): The time in each stage, by span path
+        audio_seconds (float): The audio processed
+        bytes_processed (int): The audio bytes processed
+        wall_ms (float): The total duration of the top-level spans
+    """
+
+    stages: dict[str, StageStats] = {}
+    audio_seconds: float = 0
+    bytes_processed: int = 0
+    wall_ms: float = 0
+
+    @property
+    def rtf(self) -> float:
+        """The real-time factor: processing time over audio time."""
+        return self.wall_ms / 1000 / self.audio_seconds if self.audio_seconds else 0.0
+
+
+# Spans =======================================================================
+
+
+class Span:
+    """
+    A timed stage. Use it as a context manager.
+
+    Args:
+        trace (Trace): The trace to record into
+        name (str): The stage name
+        attrs: Attributes to attach, e.g. a chunk index
+    """
+
+    __slots__ = ("trace", "name", "path", "attrs", "thread", "start_ns", "end_ns")
+
+    def __init__(self, trace: "Trace", name: str, **attrs):
+        self.trace = trace
+        self.name = name
+        self.path = name
+        self.attrs = attrs
+        self.thread = 0
+        self.start_ns = 0
+        self.end_ns = 0
+
+    def set(self, **attrs):
+        """Attach attributes to the span."""
+        self.attrs.update(attrs)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def __enter__(self) -> "Span":
+        stack = self.trace._stack()
+        if stack:
+            self.path = f"{stack[-1].path}/{self.name}"
+        stack.append(self)
+        self.thread = threading.get_ident()
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.end_ns = time.perf_counter_ns()
+        self.trace._stack().pop()
+        self.trace._finish(self)
+
+
+class NullSpan:
+    """The span returned when nothing is traced. It does nothing."""
+
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self) -> "NullSpan":
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+# Traces ======================================================================
+
+
+class Trace:
+    """
+    The spans and counters of one task or stream.
+
+    Args:
+        max_spans (int): Spans kept for the summary; the oldest are dropped
+        listeners (list[Callable]): Called with each finished span, e.g. a
+            ChromeTraceWriter
+    """
+
+    def __init__(
+        self,
+        max_spans: int = MAX_SPANS,
+        listeners: Optional[list[Callable[[Span], None]]] = None,
+    ):
+        self.spans = deque(maxlen=max_spans)
+        self.listeners = listeners or []
+        self.counters = {"audio_seconds": 0.0, "bytes_processed": 0}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def span(self, name: str, **attrs) -> Span:
+        """Open a span in this trace, nested in the open spans of the thread."""
+        return Span(self, name, **attrs)
+
+    def record(self, **counters):
+        """Add to the counters, e.g. record(audio_seconds=5, bytes_processed=1)."""
+        with self._lock:
+            for name, value in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> TraceSummary:
+        """Aggregate the spans by stage."""
+        stages = {}
+        wall_ms = 0.0
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+
+        for span in spans:
+            stats = stages.setdefault(span.path, StageStats())
+            duration = span.duration_ms
+            stats.count += 1
+            stats.total_ms += duration
+            stats.max_ms = max(stats.max_ms, duration)
+            if span.path == span.name:
+                wall_ms += duration
+
+        return TraceSummary(
+            stages=stages,
+            audio_seconds=counters["audio_seconds"],
+            bytes_processed=counters["bytes_processed"],
+            wall_ms=wall_ms,
+        )
+
+    def _stack(self) -> list[Span]:
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _finish(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+        for listener in self.listeners:
+            listener(span)
+
+
+def new_trace() -> Optional[Trace]:
+    """Create a trace for a new task, if tracing is enabled."""
+    return Trace() if ENABLED else None
+
+
+# Active Trace ================================================================
+
+
+CURRENT_TRACE: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+@contextmanager
+def activate(trace: Optional[Trace]):
+    """
+    Record the spans opened in this context into a trace.
+
+    Args:
+        trace (Trace): The trace, or None to record nothing
+    """
+    token = CURRENT_TRACE.set(trace)
+    try:
+        yield trace
+    finally:
+        CURRENT_TRACE.reset(token)
+
+
+def span(name: str, **attrs):
+    """
+    Open a span in the active trace.
+
+    Returns:
+        Span: The span, or a shared no-op span if no trace is active
+    """
+    trace = CURRENT_TRACE.get()
+    if trace is None:
+        return NULL_SPAN
+    return Span(trace, name, **attrs)
+
+
+def record(**counters):
+    """Add to the counters of the active trace, if any."""
+    trace = CURRENT_TRACE.get()
+    if trace is not None:
+        trace.record(**counters)
+
+
+def traced(items: Iterable, name: str) -> Iterator:
+    """
+    Time each step of an iterator, e.g. decoding one audio block.
+
+    The bytes of array items are counted as processed.
+
+    Args:
+        items (Iterable): The iterator to time
+        name (str): The span name of each step
+
+    Yields:
+        The items
+    """
+    iterator = iter(items)
+    while True:
+        with span(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        record(bytes_processed=getattr(item, "nbytes", 0))
+        yield item
+
+
+# Metrics =====================================================================
+
+
+class Metrics:
+    """
+    Process-wide counters and stage time histograms, over many traces.
+
+    Each observed trace adds its time per stage to the stage's histogram.
+    """
+
+    def __init__(self, buckets: tuple = STAGE_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.tasks = 0
+            self.audio_seconds = 0.0
+            self.bytes_processed = 0
+            self.wall_seconds = 0.0
+            self.stages = {}  # path -> [bucket counts..., sum, count]
+
+    def observe(self, summary: TraceSummary):
+        """Add a trace's metrics."""
+        with self._lock:
+            self.tasks += 1
+            self.audio_seconds += summary.audio_seconds
+            self.bytes_processed += summary.bytes_processed
+            self.wall_seconds += summary.wall_ms / 1000
+            for path, stats in summary.stages.items():
+                seconds = stats.total_ms / 1000
+                histogram = self.stages.setdefault(
+                    path, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                )
+                for index, bound in enumerate(self.buckets):
+                    histogram["buckets"][index] += seconds <= bound
+                histogram["sum"] += seconds
+                histogram["count"] += 1
+
+    def snapshot(self) -> dict:
+        """
+        Get the metrics as a JSON-serializable dict.
+
+        Returns:
+            dict: Totals, the real-time factor, and each stage's histogram
+        """
+        with self._lock:
+            return {
+                "tasks": self.tasks,
+                "audio_seconds": self.audio_seconds,
+                "bytes_processed": self.bytes_processed,
+                "wall_seconds": self.wall_seconds,
+                "rtf": (
+                    self.wall_seconds / self.audio_seconds
+                    if self.audio_seconds
+                    else 0.0
+                ),
+                "buckets": list(self.buckets),
+                "stages": json.loads(json.dumps(self.stages)),
+            }
+
+    def prometheus(self) -> str:
+        """
+        Get the metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition text
+        """
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP whisperlab_tasks_total Traced tasks",
+            "# TYPE whisperlab_tasks_total counter",
+            f"whisperlab_tasks_total {snapshot['tasks']}",
+            "# HELP whisperlab_audio_seconds_total Audio processed",
+            "# TYPE whisperlab_audio_seconds_total counter",
+            f"whisperlab_audio_seconds_total {snapshot['audio_seconds']}",
+            "# HELP whisperlab_bytes_processed_total Audio bytes processed",
+            "# TYPE whisperlab_bytes_processed_total counter",
+            f"whisperlab_bytes_processed_total {snapshot['bytes_processed']}",
+            "# HELP whisperlab_stage_seconds Time per task in each stage",
+            "# TYPE whisperlab_stage_seconds histogram",
+        ]
+        for path, histogram in snapshot["stages"].items():
+            label = f'stage="{path}"'
+            for bound, count in zip(snapshot["buckets"], histogram["buckets"]):
+                lines.append(
+                    f'whisperlab_stage_seconds_bucket{{{label},le="{bound}"}} {count}'
+                )
+            lines += [
+                f'whisperlab_stage_seconds_bucket{{{label},le="+Inf"}} '
+                f"{histogram['count']}",
+                f"whisperlab_stage_seconds_sum{{{label}}} {histogram['sum']}",
+                f"whisperlab_stage_seconds_count{{{label}}} {histogram['count']}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, output: TextIO, format: str = "prometheus"):
+        """Write the metrics as "prometheus" text or "json"."""
+        if format == "json":
+            json.dump(self.snapshot(), output, indent=2)
+        else:
+            output.write(self.prometheus())
+
+
+# Chrome Traces ===============================================================
+
+
+class ChromeTraceWriter:
+    """
+    Stream spans to a Chrome trace-event file, as they finish.
+
+    The file is a JSON array of complete ("X") events. The closing bracket
+    is optional in the format, so a file cut short by a crash still loads.
+
+    Example:
+        >>> writer = ChromeTraceWriter(open("live.trace.json", "w"))
+        >>> trace = Trace(listeners=[writer])
+
+    Args:
+        output (TextIO): The file to write
+    """
+
+    def __init__(self, output: TextIO):
+        self.output = output
+        self.origin_ns = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._first = True
+        self.output.write("[\n")
+
+    def __call__(self, span: Span):
+        event = {
+            "name": span.name,
+            "cat": span.path,
+            "ph": "X",
+            "ts": (span.start_ns - self.origin_ns) / 1000,
+            "dur": (span.end_ns - span.start_ns) / 1000,
+            "pid": self.pid,
+            "tid": span.thread,
+            "args": {key: jsonable(value) for key, value in span.attrs.items()},
+        }
+        with self._lock:
+            self.output.write(("" if self._first else ",\n") + json.dumps(event))
+            self._first = False
+
+    def close(self):
+        with self._lock:
+            self.output.write("\n]\n")
+            self.output.flush()
+
+
+def jsonable(value):
+    """Convert a value to one JSON can encode, e.g. as the default of dumps."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, (int, str, bool)) or value is None:
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else str(value)
+    return str(value)
+
+
+# Process-wide Metrics ========================================================
+
+
+METRICS = Metrics()
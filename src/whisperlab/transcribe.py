@@ -1,25 +1,40 @@
 """
 Whisper Runner Module
 
-This module can transcribe an audio file using Whisper.
+This module can transcribe audio of any length using Whisper: an audio file,
+or samples already in memory, e.g. captured live.
 """
 
 from pathlib import Path
-from pydantic import FilePath
-import whisper
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import numpy as np
+from pydantic import Field, FilePath, model_validator
 
 import whisperlab.logging
+from .alignment import align_words
+from .audio import (
+    buffer_samples,
+    EnergyVAD,
+    SAMPLES_PER_SECOND,
+    stream_audio,
+)
+from .cache import PCM_CACHE, RESULT_CACHE
+from .defaults import (  # noqa: F401
+    DEFAULT_PRECISION,
+    DEFAULT_TRANSCRIPTION_MODEL,
+    TRANSCRIPTION_MODELS,
+)
+from .longform import transcribe_stream
+from .models import get_model
 from .tasks import Task
+from .tracing import activate, record, span, traced
 
 
 log = whisperlab.logging.config_log()
 
 # Globals =====================================================================
 
-TRANSCRIPTION_MODELS = ["base"]
-
-DEFAULT_TRANSCRIPTION_MODEL = TRANSCRIPTION_MODELS[0]
-
 EMPTY_RESULT = {"text": ""}
 
 
@@ -46,17 +61,78 @@ class TranscribeTask(Task):
     """
     Whisper Request Model
 
+    The audio is either a file or in-memory samples. Samples are neither
+    validated nor copied: they are passed to the model as they are, when
+    they are mono 16 kHz float32 (see buffer_samples).
+
     Args:
         audio_file (Path): Path to the audio file to transcribe
+        samples (np.ndarray | buffer): The samples to transcribe, instead of
+            a file: an array, or an object supporting the buffer protocol.
+            Not serialized.
+        sample_rate (int): The sample rate of the samples
         args (dict): Arguments to pass to whisper
+        model (str): The transcription model to use
+        cache (bool): Whether to reuse and store results in the result cache,
+            and decoded audio in the PCM cache. Only files are cached.
+        vad (bool): Whether to transcribe only the speech found by voice
+            activity detection, skipping silences
+        precision (str): The inference precision, one of PRECISIONS
+        align (bool): Whether to time every word in a batched alignment
+            pass, adding the timings to the result as columns (see
+            whisperlab.alignment.WordTimings)
+        checkpoint (dict): Resume from this checkpoint of a partial
+            transcription of the same audio (see whisperlab.longform). Not
+            serialized.
+        on_checkpoint (Callable): Called with a checkpoint after every 30 s
+            chunk but the last. Not serialized.
 
     Returns:
         dict: The whisper result
     """
 
-    audio_file: FilePath
+    audio_file: Optional[FilePath] = None
+    samples: Any = Field(default=None, exclude=True, repr=False)  # Not copied
+    sample_rate: int = Field(default=SAMPLES_PER_SECOND, gt=0)
     args: dict = {}
     model: str = DEFAULT_TRANSCRIPTION_MODEL
+    cache: bool = False
+    vad: bool = False
+    precision: str = DEFAULT_PRECISION
+    align: bool = False
+    checkpoint: Optional[dict] = Field(default=None, exclude=True, repr=False)
+    on_checkpoint: Optional[Callable[[dict], None]] = Field(
+        default=None, exclude=True, repr=False
+    )
+
+    @model_validator(mode="after")
+    def one_input(self) -> "TranscribeTask":
+        if (self.audio_file is None) == (self.samples is None):
+            raise ValueError("Give either an audio file or samples")
+        return self
+
+    def load_samples(self) -> np.ndarray:
+        """Get the in-memory samples, as mono 16 kHz float32."""
+        return buffer_samples(self.samples, self.sample_rate)
+
+
+def cache_settings(task: TranscribeTask) -> dict:
+    """Get the settings, besides the model, that change a task's result."""
+    settings = dict(task.args)
+    if task.vad:
+        settings["vad"] = True
+    if task.precision != DEFAULT_PRECISION:
+        settings["precision"] = task.precision
+    if task.align:
+        settings["align"] = True
+    return settings
+
+
+def kept(blocks: Iterable[np.ndarray], store: list) -> Iterator[np.ndarray]:
+    """Pass sample blocks through, keeping each one in `store`."""
+    for block in blocks:
+        store.append(block)
+        yield block
 
 
 # Use Case ====================================================================
@@ -66,36 +142,88 @@ def transcribe(
     task: TranscribeTask,
 ):
     """
-    Run trancription on an audio file.
+    Run trancription on an audio file or in-memory samples.
 
     Args:
         task (TranscribeTask): The trascription task to process.
 
     Effects:
-        Logs the result.
+        Logs the result, and times its stages in the task's trace.
 
     Returns:
         task (TranscribeTask): The trascription task with the result.
     """
 
-    # Validate empty audio files
-    if EmptyFile(task.audio_file):
-        return EMPTY_RESULT
-
-    # Load and trim the audio file to 30 seconds
-    audio = whisper.load_audio(str(task.audio_file))
-    audio = whisper.pad_or_trim(audio)
-
-    # Log the audio file
-    log.info("Transcribing %s", task.audio_file)
-
-    # Fetch the model
-    model = whisper.load_model(task.model)
-
-    # Transcribe the audio
-    result = model.transcribe(audio, fp16=False, **task.args)
-
-    # Log the result text
-    log.info("Transcription:\n%s", result["text"])
-
-    return result
+    with activate(task.trace), span("transcribe"):
+
+        # Validate empty inputs
+        samples = None
+        if task.samples is not None:
+            samples = task.load_samples()
+            if not len(samples):
+                return EMPTY_RESULT
+        elif EmptyFile(task.audio_file):
+            return EMPTY_RESULT
+
+        # Serve repeated audio from the result cache, without loading the model
+        use_cache = task.cache and samples is None
+        if use_cache:
+            with span("cache_lookup"):
+                settings = cache_settings(task)
+                cache_key = RESULT_CACHE.key(task.audio_file, task.model, settings)
+                result = RESULT_CACHE.get(cache_key)
+            if result is not None:
+                log.info("Transcription (cached):\n%s", result["text"])
+                record(audio_seconds=result.get("duration", 0.0))
+                return result
+
+        # Log the audio
+        if samples is None:
+            log.info("Transcribing %s", task.audio_file)
+        else:
+            log.info(
+                "Transcribing %.1f s of samples", len(samples) / SAMPLES_PER_SECOND
+            )
+
+        # Fetch the model (loaded once per process, then served from memory)
+        with span("model_load"):
+            model = get_model(task.model, dtype=task.precision)
+
+        # Transcribe the audio in overlapping 30 second chunks, as it is decoded.
+        # Chunks of in-memory samples are views of them. Alignment needs all
+        # of the samples, so it keeps the decoded blocks.
+        decoded = []
+        if samples is None:
+            pcm_cache = PCM_CACHE if task.cache else None
+            blocks = stream_audio(task.audio_file, cache=pcm_cache)
+            audio = traced(blocks, "audio_decode")
+            if task.align:
+                audio = kept(audio, decoded)
+        else:
+            audio = [samples]
+        detector = EnergyVAD() if task.vad else None
+        result = transcribe_stream(
+            model,
+            audio,
+            detector=detector,
+            checkpoint=task.checkpoint,
+            on_checkpoint=task.on_checkpoint,
+            **task.args,
+        )
+        record(audio_seconds=result.get("duration", 0.0))
+
+        # Time the words of every segment, in batches
+        if task.align:
+            with span("align"):
+                if samples is None:
+                    samples = np.concatenate([np.zeros(0, np.float32), *decoded])
+                result["words"] = align_words(model, samples, result).to_dict()
+
+        # Log the result text
+        log.info("Transcription:\n%s", result["text"])
+
+        if use_cache:
+            with span("cache_store"):
+                RESULT_CACHE.put(cache_key, result)
+
+        return result
@@ -1,66 +1,141 @@
-import atexit
-
-import datetime
-import sounddevice
-import numpy as np
+"""
+Real-time Transcription Use Case
 
-from whisperlab.transcribe import transcribe, TranscribeTask
-from whisperlab.logging import config_log
-from whisperlab.time import time_ms, timestamp
-from whisperlab.audio import SAMPLES_PER_SECOND
+Transcribe the microphone until interrupted (ctrl-c), logging committed text
+as soon as it is stable.
 
+Pass a trace file to record every window's stages as Chrome trace events.
 
-log = config_log(debug=True)
+Multi-channel rigs are mixed down to one stream (see MIX_STRATEGIES), or
+transcribed channel by channel, e.g. when each speaker has their own mic.
 
-WINDOW_SECONDS = 5
-SAMPLES_PER_WINDOW = SAMPLES_PER_SECOND * WINDOW_SECONDS
+In speculative mode, a small draft model shows provisional text every few
+hundred milliseconds, until the transcription model commits it.
+"""
 
+import atexit
+import time
+from typing import Optional
 
-def Usecase():
-    # Setup the microphone
-    stream = sounddevice.InputStream(
-        channels=1,
-        blocksize=SAMPLES_PER_WINDOW,
-        samplerate=SAMPLES_PER_SECOND,
-    )
-    stream.start()
+from whisperlab.audio import DEFAULT_MIX, EnergyVAD, make_mixer
+from whisperlab.logging import config_log
+from whisperlab.streaming import (
+    MicrophoneSource,
+    MultiChannelTranscriber,
+    SpeculativeTranscriber,
+    StreamingTranscriber,
+    WhisperTranscriber,
+    DEFAULT_DRAFT_MODEL,
+    DRAFT_HOP_SECONDS,
+    HOP_SECONDS,
+    WINDOW_SECONDS,
+)
+from whisperlab.tracing import ChromeTraceWriter, Trace
+from whisperlab.transcribe import DEFAULT_TRANSCRIPTION_MODEL
 
-    trancription = ""
 
-    # log transcription at exit (ctrl-c)
-    def exit_handler():
-        log.info("Transcription: %s", trancription)
+log = config_log(debug=True)
 
-    atexit.register(exit_handler)
 
-    # Run for 1 minute
-    for frame in range(12):
-        time = time_ms()
-        log.debug("Fetching Samples")
-        samples, overflowed = stream.read(SAMPLES_PER_WINDOW)
-        if overflowed:
-            raise Exception("Unexpected overflow")
-        samples = samples[:, 0]  # Unwrap channel 1
-        log.debug(
-            "Fetched %s samples in %s ms",
-            len(samples),
-            time_ms() - time,
+def log_update(update, channel: Optional[int] = None):
+    prefix = "" if channel is None else f"Channel {channel}: "
+    if update.provisional:
+        prefix += "Draft "
+    log.debug(
+        "%sWindow %.1f-%.1f s in %s ms: %s [%s]",
+        prefix,
+        update.window_start,
+        update.window_end,
+        update.latency_ms,
+        update.committed,
+        update.tentative,
+    )
+    if update.committed:
+        log.info("%sTranscribed: %s", prefix, update.committed)
+
+
+def Usecase(
+    model: str = DEFAULT_TRANSCRIPTION_MODEL,
+    window_seconds: float = WINDOW_SECONDS,
+    hop_seconds: float = HOP_SECONDS,
+    trace_file: Optional[str] = None,
+    channels: int = 1,
+    mix: str = DEFAULT_MIX,
+    per_channel: bool = False,
+    speculative: bool = False,
+    draft_model: str = DEFAULT_DRAFT_MODEL,
+    draft_hop_seconds: float = DRAFT_HOP_SECONDS,
+):
+    # Record Chrome trace events, if asked to
+    writer = None
+    trace = None
+    if trace_file is not None:
+        writer = ChromeTraceWriter(open(trace_file, "w"))
+        trace = Trace(listeners=[writer])
+
+    # Setup the inference engine and the microphone
+    if per_channel:
+        # A model replica per channel, so the channels run in parallel
+        engine = MultiChannelTranscriber(
+            [WhisperTranscriber(model, replica=channel) for channel in range(channels)],
+            channels,
+            window_seconds=window_seconds,
+            hop_seconds=hop_seconds,
+            on_update=lambda channel, update: log_update(update, channel),
+            detector=EnergyVAD(),
+            incremental_mel=True,
         )
-
-        log.info("Transcribing a %s second block", WINDOW_SECONDS)
-
-        task = TranscribeTask(
-            batch=f"Transcribe_RT::{timestamp()}",
-            sequence=frame,
-            samples=samples,
+        source = MicrophoneSource(engine)
+    elif speculative:
+        engine = SpeculativeTranscriber(
+            WhisperTranscriber(draft_model),
+            WhisperTranscriber(model),
+            window_seconds=window_seconds,
+            hop_seconds=hop_seconds,
+            draft_hop_seconds=draft_hop_seconds,
+            on_update=log_update,
+            detector=EnergyVAD(),
+            trace=trace,
+        )
+        source = MicrophoneSource(engine, channels=channels, mixer=make_mixer(mix))
+    else:
+        engine = StreamingTranscriber(
+            WhisperTranscriber(model),
+            window_seconds=window_seconds,
+            hop_seconds=hop_seconds,
+            on_update=log_update,
+            detector=EnergyVAD(),
+            incremental_mel=True,
+            trace=trace,
         )
-        result = transcribe(task)
+        source = MicrophoneSource(engine, channels=channels, mixer=make_mixer(mix))
 
-        log.debug("Transcribed in %s ms", time_ms() - task.creation_time)
+    # log transcription at exit
+    def exit_handler():
+        if per_channel:
+            for channel, text in enumerate(engine.texts):
+                log.info("Channel %s transcription: %s", channel, text)
+        else:
+            log.info("Transcription: %s", engine.text)
+        if not per_channel and engine.trace is not None:
+            log.info("Stage timings: %s", engine.trace.summary())
+        if writer is not None:
+            writer.close()
+            writer.output.close()
 
-        trancription += " " + result["text"]
+    atexit.register(exit_handler)
 
-    log.info("Transcription: %s", trancription)
+    # Run until interrupted
+    engine.start()
+    source.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        log.info("Stopping")
+    finally:
+        source.stop()
+        engine.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,47 @@
+"""
+Stand-ins shared by the tests.
+
+The counting audio holds the value k / 1000 in every sample of second k, so
+a stand-in model can recover each second's global position from any window
+or chunk of it, and transcribe it as " w<k>".
+"""
+
+import numpy as np
+
+from whisperlab.audio import SAMPLES_PER_SECOND
+
+
+def counting_audio(seconds: int) -> np.ndarray:
+    return np.repeat(np.arange(seconds, dtype=np.float32) / 1000, SAMPLES_PER_SECOND)
+
+
+def blocks(audio: np.ndarray, block_seconds: float) -> list[np.ndarray]:
+    block = int(block_seconds * SAMPLES_PER_SECOND)
+    return [audio[i : i + block] for i in range(0, len(audio), block)]
+
+
+def expected_text(seconds: int) -> str:
+    return "".join(f" w{second}" for second in range(seconds))
+
+
+def count_seconds(samples: np.ndarray, word_timestamps: bool = False) -> dict:
+    """Transcribe each second of counting audio as its index."""
+    seconds = np.round(samples[::SAMPLES_PER_SECOND] * 1000).astype(int)
+    segments = [
+        {"seek": 0, "start": i, "end": i + 1, "text": f" w{second}"}
+        for i, second in enumerate(seconds)
+    ]
+    if word_timestamps:
+        for segment in segments:
+            word = {"word": segment["text"], "probability": 1.0}
+            segment["words"] = [
+                {**word, "start": segment["start"], "end": segment["end"]}
+            ]
+    return {"language": "en", "segments": segments}
+
+
+class SecondCounter:
+    """A stand-in whisper model that transcribes counting audio."""
+
+    def transcribe(self, samples, word_timestamps=False, **args):
+        return count_seconds(samples, word_timestamps)
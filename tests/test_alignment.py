@@ -0,0 +1,196 @@
+from io import StringIO
+import json
+from pathlib import Path
+
+import numpy as np
+from pytest import fixture, mark
+import torch
+import whisper
+import whisper.timing
+from whisper.timing import find_alignment, merge_punctuations
+from whisper.tokenizer import get_tokenizer
+
+from whisperlab.alignment import (
+    align_words,
+    alignment_windows,
+    APPEND_PUNCTUATIONS,
+    dtw,
+    PREPEND_PUNCTUATIONS,
+    WordTimings,
+    write_json,
+    write_srt,
+    write_vtt,
+)
+import whisperlab.audio
+from whisperlab.audio import SAMPLES_PER_SECOND, save_audio
+from whisperlab.models import get_model, STANDIN_MODEL
+import whisperlab.transcribe
+from whisperlab.transcribe import transcribe, TranscribeTask
+
+# Fixtures --------------------------------------------------------------------
+
+DEVICES = ["cpu", *(["cuda"] if torch.cuda.is_available() else [])]
+
+
+@fixture
+def model():
+    return get_model(STANDIN_MODEL)
+
+
+@fixture
+def samples() -> np.ndarray:
+    generator = np.random.default_rng(0)
+    return generator.uniform(-0.5, 0.5, 45 * SAMPLES_PER_SECOND).astype(np.float32)
+
+
+@fixture
+def result() -> dict:
+    return {
+        "language": "en",
+        "segments": [
+            {"start": 0.0, "end": 10.0, "text": " Hello, world. This is a test"},
+            {"start": 10.0, "end": 25.0, "text": ' of the "alignment" code.'},
+            {"start": 30.0, "end": 40.0, "text": " Another window (here)."},
+        ],
+    }
+
+
+def whisper_alignment(model, samples: np.ndarray, text: str, start: float):
+    """Align one window with whisper, one segment at a time."""
+    tokenizer = get_tokenizer(
+        model.is_multilingual, num_languages=model.num_languages, language="en"
+    )
+    audio = samples[int(start * SAMPLES_PER_SECOND) :][: whisper.audio.N_SAMPLES]
+    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), model.dims.n_mels)
+    frames = len(audio) // whisper.audio.HOP_LENGTH
+    words = find_alignment(model, tokenizer, tokenizer.encode(text), mel, frames)
+    merge_punctuations(words, PREPEND_PUNCTUATIONS, APPEND_PUNCTUATIONS)
+    return [word for word in words if word.word]
+
+
+@fixture
+def timings() -> WordTimings:
+    return WordTimings(
+        [" One", " two", " three.", " Four"],
+        [0.0, 0.5, 1.0, 3661.5],
+        [0.5, 1.0, 1.5, 3662.25],
+        [0.9, 0.8, 0.7, 0.6],
+        [0, 0, 0, 1],
+    )
+
+
+# Test Alignment --------------------------------------------------------------
+
+
+def test_windows_hold_up_to_30_seconds(result: dict):
+    assert alignment_windows(result["segments"]) == [(0.0, [0, 1]), (30.0, [2])]
+
+
+def test_dtw_matches_whisper():
+    x = np.random.default_rng(0).standard_normal((12, 40))
+    np.testing.assert_array_equal(dtw(x), whisper.timing.dtw_cpu.py_func(x))
+
+
+def test_batched_alignment_matches_whisper(
+    model, samples: np.ndarray, result: dict, monkeypatch
+):
+    # whisper's parallel dtw starts threads that hang later forks
+    monkeypatch.setattr(whisper.timing, "dtw", lambda x: dtw(x.double().numpy()))
+    timings = align_words(model, samples, result)
+    segments = result["segments"]
+    expected = [
+        *whisper_alignment(
+            model, samples, segments[0]["text"] + segments[1]["text"], 0
+        ),
+        *whisper_alignment(model, samples, segments[2]["text"], 30),
+    ]
+    assert timings.words == [word.word for word in expected]
+    offsets = np.array([0.0] * (len(expected) - 3) + [30.0] * 3)
+    np.testing.assert_allclose(
+        timings.start, [word.start for word in expected] + offsets, atol=1e-3
+    )
+    np.testing.assert_allclose(
+        timings.end, [word.end for word in expected] + offsets, atol=1e-3
+    )
+    np.testing.assert_allclose(
+        timings.confidence, [word.probability for word in expected], atol=1e-4
+    )
+    assert timings.segment.tolist() == [0] * 6 + [1] * 4 + [2] * 3
+
+
+def test_batch_size_does_not_change_timings(model, samples: np.ndarray, result: dict):
+    result["segments"].insert(2, {"start": 26.0, "end": 29.0, "text": " More."})
+    batched = align_words(model, samples, result, batch_size=8)
+    single = align_words(model, samples, result, batch_size=1)
+    assert batched.words == single.words
+    np.testing.assert_allclose(batched.start, single.start, atol=1e-3)
+    np.testing.assert_allclose(batched.confidence, single.confidence, atol=1e-4)
+
+
+@mark.parametrize("device", DEVICES)
+def test_alignment_runs_on_the_model_device(
+    device: str, samples: np.ndarray, result: dict
+):
+    timings = align_words(get_model(STANDIN_MODEL, device), samples, result)
+    expected = align_words(get_model(STANDIN_MODEL, "cpu"), samples, result)
+    assert timings.words == expected.words
+    np.testing.assert_allclose(timings.start, expected.start, atol=0.05)
+    np.testing.assert_allclose(timings.confidence, expected.confidence, atol=1e-2)
+
+
+def test_transcribe_adds_word_columns(samples: np.ndarray):
+    task = TranscribeTask(
+        samples=samples[:SAMPLES_PER_SECOND], model=STANDIN_MODEL, align=True
+    )
+    words = transcribe(task)["words"]
+    assert set(words) == {"words", "start", "end", "confidence", "segment"}
+    assert len({len(column) for column in words.values()}) == 1
+
+
+def test_aligned_files_are_decoded_once(
+    samples: np.ndarray, tmp_path: Path, monkeypatch
+):
+    audio_file = tmp_path / "noise.wav"
+    save_audio(samples[: 2 * SAMPLES_PER_SECOND], audio_file)
+    decodes = []
+    decode = whisperlab.audio.stream_audio
+
+    def stream_audio(*args, **kwargs):
+        decodes.append(args)
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(whisperlab.audio, "stream_audio", stream_audio)
+    monkeypatch.setattr(whisperlab.transcribe, "stream_audio", stream_audio)
+    task = TranscribeTask(audio_file=audio_file, model=STANDIN_MODEL, align=True)
+    words = transcribe(task)["words"]
+    assert len(decodes) == 1
+    assert len({len(column) for column in words.values()}) == 1
+
+
+# Test Writers ----------------------------------------------------------------
+
+
+def test_srt_cues_split_at_segments(timings: WordTimings):
+    file = StringIO()
+    write_srt(timings, file)
+    assert file.getvalue() == (
+        "1\n00:00:00,000 --> 00:00:01,500\nOne two three.\n\n"
+        "2\n01:01:01,500 --> 01:01:02,250\nFour\n\n"
+    )
+
+
+def test_vtt(timings: WordTimings):
+    file = StringIO()
+    write_vtt(timings, file)
+    assert file.getvalue().startswith(
+        "WEBVTT\n\n00:00:00.000 --> 00:00:01.500\nOne two three.\n\n"
+    )
+
+
+def test_json_columns_round_trip(timings: WordTimings):
+    file = StringIO()
+    write_json(timings, file)
+    loaded = WordTimings.from_dict(json.loads(file.getvalue()))
+    assert loaded.words == timings.words
+    np.testing.assert_array_equal(loaded.end, timings.end)
+    np.testing.assert_array_equal(loaded.segment, timings.segment)
@@ -0,0 +1,337 @@
+from pathlib import Path
+import subprocess
+import threading
+import wave
+
+import numpy as np
+from pytest import fixture, raises
+
+from whisperlab.audio import (
+    AudioOverflow,
+    buffer_samples,
+    Downmix,
+    EnergyVAD,
+    LoudestChannel,
+    make_mixer,
+    load_audio,
+    open_wav,
+    PCMCache,
+    resample,
+    Resampler,
+    RingBuffer,
+    roll,
+    SAMPLES_PER_SECOND,
+    save_audio,
+    SpeechGate,
+    stream_audio,
+    WaveBuffer,
+)
+from whisperlab.conversion import DEFAULT_CHUNK_SAMPLES, unpack_int24
+
+# Fixtures --------------------------------------------------------------------
+
+
+def tone_between_silences() -> np.ndarray:
+    """1 s of silence, a 1 s 200 Hz tone, then 2 s of silence."""
+    time = np.arange(SAMPLES_PER_SECOND) / SAMPLES_PER_SECOND
+    tone = 0.3 * np.sin(2 * np.pi * 200 * time)
+    silence = np.zeros(SAMPLES_PER_SECOND)
+    return np.concatenate([silence, tone, silence, silence]).astype(np.float32)
+
+
+@fixture
+def hello_world() -> Path:
+    return Path("tests/data/hello_world.mp3")
+
+
+@fixture
+def no_ffmpeg(monkeypatch):
+    def popen(*args, **kwargs):
+        raise AssertionError("ffmpeg was run")
+
+    monkeypatch.setattr(subprocess, "Popen", popen)
+
+
+def write_wav(path: Path, samples: np.ndarray, channels: int, rate: int):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.astype("<i2").tobytes())
+
+
+# Test Ring Buffer ------------------------------------------------------------
+
+
+def test_ring_buffer_matches_roll():
+    generator = np.random.default_rng(0)
+    ring = RingBuffer(100)
+    rolled = np.zeros(100, np.float32)
+
+    for size in generator.integers(1, 150, 50):
+        samples = generator.standard_normal(size).astype(np.float32)
+        ring.put(samples)
+        rolled = roll(rolled, samples)
+        assert np.array_equal(ring.get(), rolled)
+
+
+def test_get_last_and_cursor():
+    ring = RingBuffer(4)
+    ring.put(np.arange(6))
+    assert ring.cursor == 6
+    assert ring.get_last(2).tolist() == [4, 5]
+    assert ring.get_last(0).tolist() == []
+    with raises(ValueError):
+        ring.get_last(5)
+
+
+def test_get_returns_a_copy():
+    ring = RingBuffer(4)
+    ring.put(np.arange(4))
+    samples = ring.get()
+    ring.put(np.arange(4, 8))
+    assert samples.tolist() == [0, 1, 2, 3]
+
+
+def test_read_returns_new_samples():
+    ring = RingBuffer(4)
+    ring.put(np.arange(3))
+    samples, cursor = ring.read(0)
+    assert (samples.tolist(), cursor) == ([0, 1, 2], 3)
+
+    ring.put(np.arange(3, 10))
+    samples, cursor = ring.read(cursor)
+    assert (samples.tolist(), cursor) == ([6, 7, 8, 9], 10)  # Overrun: latest 4
+
+
+def test_one_producer_many_consumers():
+    ring = RingBuffer(1_000, dtype=np.int64)
+    blocks = 500
+    errors = []
+
+    def produce():
+        for block in range(blocks):
+            ring.put(np.arange(block * 100, (block + 1) * 100))
+
+    def consume():
+        cursor = 0
+        while cursor < blocks * 100:
+            samples, cursor = ring.read(cursor)
+            # Every read is a contiguous run ending at the cursor
+            if len(samples) and samples[-1] != cursor - 1:
+                errors.append(cursor)
+            if np.any(np.diff(samples) != 1):
+                errors.append(cursor)
+
+    threads = [threading.Thread(target=consume) for _ in range(3)]
+    threads.append(threading.Thread(target=produce))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_multi_channel_ring_buffer():
+    ring = RingBuffer(4, channels=3)
+    frames = np.arange(18, dtype=np.float32).reshape(6, 3)
+    ring.put(frames[:2])
+    ring.put(frames[2:])
+    assert np.array_equal(ring.get(), frames[2:])
+    samples, cursor = ring.read(cursor=3, channel=1)
+    assert (samples.tolist(), cursor) == ([10.0, 13.0, 16.0], 6)
+
+
+# Test Wave Buffer ------------------------------------------------------------
+
+
+def test_wave_buffer_processes_samples():
+    class Doubler(WaveBuffer):
+        def process(self, audio_samples):
+            return audio_samples * 2
+
+    buffer = Doubler(3)
+    buffer.put(np.array([1.0, 2.0]))
+    assert buffer.get().tolist() == [0, 2, 4]
+
+
+# Test Channel Mixing --------------------------------------------------------
+
+
+def test_mixers():
+    frames = np.random.default_rng(0).normal(size=(1000, 4)).astype(np.float32)
+    assert np.array_equal(make_mixer("channel", 2)(frames), frames[:, 2])
+    assert np.allclose(Downmix()(frames), frames.mean(axis=1), atol=1e-6)
+    with raises(ValueError):
+        make_mixer("median")
+
+
+def test_loudest_channel_holds_until_another_is_clearly_louder():
+    mixer = LoudestChannel(margin_db=3)
+    frames = np.ones((100, 2), np.float32)
+    frames[:, 1] = 2  # 6 dB louder
+    mixer(frames)
+    assert mixer.channel == 1
+    frames[:, 0] = 2.5  # Under 3 dB louder
+    mixer(frames)
+    assert mixer.channel == 1
+
+
+# Test Resampling ------------------------------------------------------------
+
+
+def tone(frequency: float, rate: int, seconds: float = 1.0) -> np.ndarray:
+    time = np.arange(int(rate * seconds)) / rate
+    return (0.5 * np.sin(2 * np.pi * frequency * time)).astype(np.float32)
+
+
+def test_resampling_keeps_speech_and_rejects_aliases():
+    for rate in [8_000, 44_100, 48_000]:
+        resampled = resample(tone(440, rate), rate)
+        assert len(resampled) == SAMPLES_PER_SECOND
+        error = resampled - tone(440, SAMPLES_PER_SECOND)
+        assert np.abs(error[100:-100]).max() < 1e-4
+
+    aliased = resample(tone(10_000, 48_000), 48_000)  # Above 8 kHz
+    assert np.abs(aliased[100:-100]).max() < 1e-4
+
+
+def test_streaming_resampler_matches_one_shot():
+    audio = np.random.default_rng(0).normal(0, 0.1, (44_100, 2)).astype(np.float32)
+    resampler = Resampler(44_100)
+    sizes = np.random.default_rng(1).integers(1, 2_000, 100).cumsum()
+    blocks = [resampler(block) for block in np.split(audio, sizes[sizes < len(audio)])]
+    streamed = np.concatenate([*blocks, resampler.flush()])
+    assert np.allclose(streamed, resample(audio, 44_100), atol=1e-6)
+    assert streamed.shape == (SAMPLES_PER_SECOND, 2)
+
+
+# Test Voice Activity Detection -----------------------------------------------
+
+
+def test_vad_finds_padded_speech():
+    [(start, end)] = EnergyVAD(padding_ms=200)(tone_between_silences())
+    assert abs(start / SAMPLES_PER_SECOND - 0.8) < 0.05
+    assert abs(end / SAMPLES_PER_SECOND - 2.2) < 0.05
+
+
+def test_vad_rejects_silence_and_noise():
+    vad = EnergyVAD()
+    noise = np.random.default_rng(0).standard_normal(SAMPLES_PER_SECOND)
+    assert vad(np.zeros(SAMPLES_PER_SECOND, np.float32)) == []
+    assert vad(0.3 * noise.astype(np.float32)) == []
+    assert vad(np.zeros(10, np.float32)) == []
+
+
+def test_vad_bridges_short_pauses():
+    audio = tone_between_silences()
+    audio[int(1.4 * SAMPLES_PER_SECOND) : int(1.5 * SAMPLES_PER_SECOND)] = 0
+    assert len(EnergyVAD(padding_ms=0)(audio)) == 1
+
+
+def test_speech_gate_maps_times_to_the_source():
+    def detector(block):
+        return [(100, 200), (300, 400)]
+
+    gate = SpeechGate([np.zeros(1000, np.float32)] * 2, detector)
+    voiced = np.concatenate(list(gate))
+    assert len(voiced) == gate.voiced_samples == 400
+    assert gate.source_samples == 2000
+
+    def source_sample(sample, end=False):
+        seconds = gate.to_source(sample / SAMPLES_PER_SECOND, end=end)
+        return round(seconds * SAMPLES_PER_SECOND)
+
+    assert source_sample(0) == 100
+    assert source_sample(150) == 350
+    assert source_sample(100) == 300
+    assert source_sample(100, end=True) == 200
+    assert source_sample(250) == 1150
+    assert source_sample(900) == 1400  # Past the end
+
+
+# Test Decoders ---------------------------------------------------------------
+
+
+def test_wav_is_mapped_without_ffmpeg(tmp_path: Path, no_ffmpeg):
+    audio = tone_between_silences()
+    save_audio(audio, tmp_path / "tone.wav")
+
+    blocks = list(stream_audio(tmp_path / "tone.wav", block_seconds=1))
+    assert [len(block) for block in blocks] == [SAMPLES_PER_SECOND] * 4
+    assert np.abs(np.concatenate(blocks) - audio).max() < 1e-4
+    assert np.abs(load_audio(tmp_path / "tone.wav") - audio).max() < 1e-4
+
+
+def test_stereo_wav_is_mixed_down(tmp_path: Path, no_ffmpeg):
+    samples = np.array([[1000, 3000], [-2000, 0]])
+    write_wav(tmp_path / "stereo.wav", samples, 2, SAMPLES_PER_SECOND)
+    [block] = stream_audio(tmp_path / "stereo.wav")
+    assert block.tolist() == [2000 / 32_768, -1000 / 32_768]
+
+
+def test_other_wavs_are_decoded_by_ffmpeg(tmp_path: Path):
+    write_wav(tmp_path / "8k.wav", np.zeros(8_000), 1, 8_000)
+    assert open_wav(tmp_path / "8k.wav") is None
+    assert len(load_audio(tmp_path / "8k.wav")) == SAMPLES_PER_SECOND
+
+    (tmp_path / "text.wav").write_text("not a wav file")
+    assert open_wav(tmp_path / "text.wav") is None
+
+
+def test_in_memory_buffers():
+    samples = np.arange(4, dtype=np.float32) / 4
+    assert buffer_samples(samples) is samples
+    view = buffer_samples(samples.tobytes())
+    np.testing.assert_array_equal(view, samples)
+    pcm = buffer_samples(memoryview(np.array([[-32768, 0], [16384, 16384]], np.int16)))
+    np.testing.assert_array_equal(pcm, [-0.5, 0.5])
+    assert len(buffer_samples(np.zeros(48_000, np.float32), 48_000)) == 16_000
+
+
+def test_pcm_cache_serves_rereads(tmp_path: Path, hello_world: Path, monkeypatch):
+    cache = PCMCache(tmp_path)
+    decoded = np.concatenate(list(stream_audio(hello_world, cache=cache)))
+    assert isinstance(cache.load(hello_world), np.memmap)
+
+    monkeypatch.setattr(subprocess, "Popen", None)  # Rereads must not decode
+    cached = np.concatenate(list(stream_audio(hello_world, cache=cache)))
+    assert np.array_equal(cached, decoded)
+
+
+def test_abandoned_decode_is_not_cached(tmp_path: Path, hello_world: Path):
+    cache = PCMCache(tmp_path)
+    stream = stream_audio(hello_world, block_seconds=0.5, cache=cache)
+    next(stream)
+    stream.close()
+    assert cache.load(hello_world) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_pcm_cache_size_cap(tmp_path: Path, hello_world: Path):
+    cache = PCMCache(tmp_path, max_bytes=0)
+    list(stream_audio(hello_world, cache=cache))
+    assert cache.load(hello_world) is None
+
+
+def test_save_audio_bit_depths(tmp_path: Path):
+    audio = np.linspace(-1, 1, 100_001, dtype=np.float32)
+    for bits, dtype in [(16, "<i2"), (32, "<i4")]:
+        save_audio(audio, tmp_path / f"{bits}.wav", bits=bits)
+        samples = open_wav(tmp_path / f"{bits}.wav")[:, 0]
+        assert samples.dtype == dtype and len(samples) == len(audio)
+        assert samples[-1] == np.iinfo(dtype).max
+
+    save_audio(audio, tmp_path / "24.wav", bits=24)
+    with wave.open(str(tmp_path / "24.wav")) as f:
+        assert f.getsampwidth() == 3
+        samples = unpack_int24(f.readframes(f.getnframes()))
+    assert (samples[0], samples[-1]) == (-(2**23), 2**23 - 1)
+
+
+def test_save_audio_overflow_writes_nothing(tmp_path: Path):
+    audio = np.zeros(3 * DEFAULT_CHUNK_SAMPLES, np.float32)
+    audio[-1] = 1.5
+    with raises(AudioOverflow):
+        save_audio(audio, tmp_path / "overflow.wav")
+    assert list(tmp_path.iterdir()) == []
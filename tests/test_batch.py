@@ -0,0 +1,115 @@
+from pathlib import Path
+
+import numpy as np
+from pytest import fixture, raises
+import torch
+import whisper
+
+from whisperlab.audio import SAMPLES_PER_SECOND
+import whisperlab.batch
+from whisperlab.batch import (
+    join_texts,
+    log_mel_batch,
+    stack_segments,
+    transcribe_batch,
+    transcribe_samples,
+)
+from whisperlab.cache import ResultCache
+from whisperlab.models import get_model, STANDIN_MODEL
+from whisperlab.transcribe import TranscribeTask
+
+# Fixtures --------------------------------------------------------------------
+
+DECODING = {"language": "en", "sample_len": 4}
+
+
+@fixture
+def model():
+    return get_model(STANDIN_MODEL, device="cpu")
+
+
+@fixture
+def clips() -> list[np.ndarray]:
+    generator = np.random.default_rng(0)
+    return [
+        generator.uniform(-0.5, 0.5, seconds * SAMPLES_PER_SECOND).astype(np.float32)
+        for seconds in [1, 3, 7]
+    ]
+
+
+# Test Spectrograms -----------------------------------------------------------
+
+
+def test_log_mel_batch_matches_whisper(clips):
+    batch = stack_segments(clips)
+    mel = log_mel_batch(batch)
+    assert mel.shape == (3, 80, 3000)
+    for row, clip in zip(mel, clips):
+        expected = whisper.log_mel_spectrogram(whisper.pad_or_trim(clip))
+        assert torch.allclose(row, expected, atol=1e-4)
+
+
+# Test Batched Decoding -------------------------------------------------------
+
+
+def test_batch_matches_one_at_a_time(model, clips):
+    batched = transcribe_samples(model, clips, batch_size=2, **DECODING)
+    single = [transcribe_samples(model, [clip], **DECODING)[0] for clip in clips]
+    assert [r["text"] for r in batched] == [r["text"] for r in single]
+    assert [r["duration"] for r in batched] == [1, 3, 7]
+
+
+def test_long_input_is_split_not_truncated(model):
+    samples = np.zeros(45 * SAMPLES_PER_SECOND, np.float32)
+    (result,) = transcribe_samples(model, [samples], **DECODING)
+    assert result["duration"] == 45
+
+
+def test_join_texts_drops_overlap():
+    assert join_texts([" a b c", " c d", " e"]) == " a b c d e"
+    assert join_texts([]) == ""
+
+
+def test_tasks_are_completed_in_order(clips):
+    files = [
+        Path("tests/data/hello_world.mp3"),
+        Path("tests/data/empty_file.mp3"),
+    ]
+    tasks = [
+        TranscribeTask(audio_file=file, model=STANDIN_MODEL, args=DECODING)
+        for file in files
+    ]
+    results = transcribe_batch([*tasks, clips[0]], model=STANDIN_MODEL, **DECODING)
+
+    assert all(task.completed for task in tasks)
+    assert [task.result for task in tasks] == results[:2]
+    assert results[1]["text"] == ""
+    assert results[2]["duration"] == 1
+
+
+def test_cached_tasks_skip_the_batch(tmp_path: Path, monkeypatch):
+    batches = []
+    transcribe = whisperlab.batch.transcribe_samples
+
+    def transcribe_samples(model, inputs, *args, **kwargs):
+        batches.append(len(inputs))
+        return transcribe(model, inputs, *args, **kwargs)
+
+    monkeypatch.setattr(whisperlab.batch, "RESULT_CACHE", ResultCache(tmp_path))
+    monkeypatch.setattr(whisperlab.batch, "transcribe_samples", transcribe_samples)
+    audio_file = Path("tests/data/hello_world.mp3")
+    task = TranscribeTask(
+        audio_file=audio_file, model=STANDIN_MODEL, args=DECODING, cache=True
+    )
+    first = transcribe_batch([task])
+    second = transcribe_batch([task])
+    assert first == second
+    assert batches == [1]
+
+
+def test_aligned_tasks_are_rejected():
+    task = TranscribeTask(
+        audio_file=Path("tests/data/hello_world.mp3"), model=STANDIN_MODEL, align=True
+    )
+    with raises(ValueError, match="aligned"):
+        transcribe_batch([task])
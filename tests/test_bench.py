@@ -0,0 +1,95 @@
+from pathlib import Path
+
+from pytest import fixture
+
+from whisperlab.bench import (
+    BenchmarkResults,
+    benchmark_conversions,
+    compare,
+    FileBenchmark,
+    format_results,
+    run_benchmark,
+    StageTiming,
+    STAGES,
+    time_stage,
+    word_error_rate,
+)
+
+# Fixtures --------------------------------------------------------------------
+
+
+def make_results(**p50_ms: float) -> BenchmarkResults:
+    stages = {
+        stage: StageTiming(p50_ms=ms, p95_ms=ms, mean_ms=ms)
+        for stage, ms in p50_ms.items()
+    }
+    return BenchmarkResults(
+        version="0",
+        model="standin",
+        device="cpu",
+        repeats=1,
+        files={"a.mp3": FileBenchmark(audio_seconds=1, stages=stages, rtf=0.1)},
+        peak_rss_mb=1,
+        environment={},
+    )
+
+
+@fixture
+def hello_world() -> Path:
+    return Path("tests/data/hello_world.mp3")
+
+
+# Test Timing -----------------------------------------------------------------
+
+
+def test_time_stage_warms_up_then_repeats():
+    calls = []
+    timing = time_stage(lambda: calls.append(1), repeats=3)
+    assert len(calls) == 4
+    assert 0 <= timing.p50_ms <= timing.p95_ms
+
+
+def test_every_stage_is_timed_offline(hello_world: Path):
+    results = run_benchmark([hello_world], repeats=1)
+    benchmark = results.files["hello_world.mp3"]
+    assert list(benchmark.stages) == STAGES
+    assert 2 < benchmark.audio_seconds < 3
+    assert benchmark.rtf > 0
+    assert results.peak_rss_mb > 0
+    assert "hello_world.mp3" in format_results(results)
+
+
+def test_precisions_are_compared_with_fp32(hello_world: Path):
+    results = run_benchmark([hello_world], repeats=1, precisions=["int8-dynamic"])
+    fp32, int8 = results.precisions
+    assert (fp32.precision, fp32.speedup, fp32.wer) == ("fp32", 1, 0)
+    assert int8.precision == "int8-dynamic"
+    assert 0 <= int8.wer <= 1
+    assert "int8-dynamic" in format_results(results)
+
+
+def test_word_error_rate():
+    assert word_error_rate("Hello, world.", "hello world") == 0
+    assert word_error_rate("the cat sat", "the bat sat down") == 2 / 3
+    assert word_error_rate("", "") == 0
+
+
+# Test Regressions ------------------------------------------------------------
+
+
+def test_slow_stages_are_regressions():
+    baseline = make_results(mel=10, encode=10, total=100)
+    results = make_results(mel=11, encode=20, total=101)
+    [regression] = compare(results, baseline, tolerance=0.25)
+    assert (regression.stage, regression.slowdown) == ("encode", 2)
+
+
+def test_noise_below_the_floor_is_not_a_regression():
+    assert compare(make_results(mel=1.5), make_results(mel=0.5)) == []
+    assert compare(make_results(mel=50), make_results(encode=1)) == []
+
+
+def test_conversions_are_timed():
+    conversions = benchmark_conversions(hours=0.001, repeats=1)
+    assert "float32->int16" in {benchmark.conversion for benchmark in conversions}
+    assert all(benchmark.hours_per_second > 0 for benchmark in conversions)
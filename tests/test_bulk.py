@@ -0,0 +1,182 @@
+import json
+from io import StringIO
+from pathlib import Path
+import time
+
+from pytest import fixture, raises
+
+import whisperlab.bulk
+from whisperlab.bulk import (
+    BulkSummary,
+    expand_paths,
+    subtitle_paths,
+    transcribe_bulk,
+)
+from whisperlab.manifest import Manifest, save_checkpoint
+from whisperlab.resources import ResourceConfig
+
+# Fixtures --------------------------------------------------------------------
+
+
+@fixture
+def audio_dir(tmp_path: Path) -> Path:
+    for name in ["a.mp3", "b.wav", "notes.txt", "nested/c.flac", "bad.ogg"]:
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b"")
+    return tmp_path
+
+
+@fixture
+def fake_transcribe(monkeypatch):
+    def transcribe(task):
+        if "bad" in task.audio_file.name:
+            raise ValueError("Undecodable")
+        result = {"text": f" {task.audio_file.stem}", "duration": 2.0}
+        if task.checkpoint is not None:
+            result["text"] += f" resumed after {task.checkpoint['chunks']}"
+        if task.align:
+            result["words"] = {
+                "words": result["text"].split(),
+                "start": [0.0],
+                "end": [2.0],
+                "confidence": [1.0],
+                "segment": [0],
+            }
+        return result
+
+    monkeypatch.setattr(whisperlab.bulk, "transcribe", transcribe)
+
+
+# Test Path Expansion ---------------------------------------------------------
+
+
+def test_expand_directory(audio_dir: Path):
+    files = expand_paths([str(audio_dir)])
+    assert [f.name for f in files] == ["a.mp3", "b.wav", "bad.ogg", "c.flac"]
+
+
+def test_expand_glob_and_file_without_duplicates(audio_dir: Path):
+    files = expand_paths([f"{audio_dir}/*.mp3", str(audio_dir / "a.mp3")])
+    assert files == [audio_dir / "a.mp3"]
+
+
+def test_expand_missing_path(audio_dir: Path):
+    with raises(FileNotFoundError):
+        expand_paths([str(audio_dir / "missing.mp3")])
+
+
+# Test Bulk Transcription -----------------------------------------------------
+
+
+def test_bulk_writes_jsonl_and_summary(audio_dir: Path, fake_transcribe):
+    output = StringIO()
+    files = expand_paths([str(audio_dir)])
+    summary = transcribe_bulk(files, workers=2, output=output)
+
+    records = {
+        r["audio_file"]: r for r in map(json.loads, output.getvalue().splitlines())
+    }
+    assert records[str(audio_dir / "a.mp3")]["text"] == " a"
+    assert records[str(audio_dir / "bad.ogg")]["error"] == "ValueError: Undecodable"
+    assert (summary.files, summary.failed) == (4, 1)
+    assert summary.audio_seconds == 6.0
+    assert summary.throughput > 0
+
+
+def test_bulk_process_pool_handles_empty_files():
+    empty_file = Path("tests/data/empty_file.mp3")
+    output = StringIO()
+    summary = transcribe_bulk(
+        [empty_file] * 2, workers=2, pool="process", output=output
+    )
+    assert summary.files == 2
+    assert summary.failed == 0
+    assert all(
+        json.loads(line)["text"] == "" for line in output.getvalue().splitlines()
+    )
+
+
+def test_bulk_summary_reports_parallel_efficiency(
+    audio_dir: Path, fake_transcribe, monkeypatch
+):
+    monkeypatch.setattr(whisperlab.bulk, "apply", lambda resources: None)
+    files = expand_paths([str(audio_dir)])
+    resources = ResourceConfig(cores=4)
+    summary = transcribe_bulk(files, workers=2, resources=resources)
+    assert (summary.workers, summary.cores, summary.threads_per_worker) == (2, 4, 4)
+    assert 0 <= summary.utilization <= 1
+    assert summary.efficiency is None  # Not calibrated
+    assert summary.throughput_per_core == summary.throughput / 4
+
+
+def test_efficiency_is_the_speedup_per_worker():
+    # Two busy workers, each transcribing at half the speed of one alone
+    summary = BulkSummary(
+        workers=2,
+        audio_seconds=40,
+        wall_seconds=10,
+        busy_seconds=20,
+        reference_throughput=4,
+    )
+    assert summary.utilization == 1.0
+    assert summary.speedup == 1.0
+    assert summary.efficiency == 0.5
+
+
+def test_bulk_calibrates_on_the_first_file(
+    audio_dir: Path, fake_transcribe, monkeypatch
+):
+    transcribe = whisperlab.bulk.transcribe
+
+    def slow_transcribe(task):
+        time.sleep(0.01)
+        return transcribe(task)
+
+    monkeypatch.setattr(whisperlab.bulk, "transcribe", slow_transcribe)
+    files = expand_paths([str(audio_dir)])
+    summary = transcribe_bulk(files, workers=2, calibrate=True)
+    assert (summary.files, summary.failed) == (4, 1)
+    assert summary.reference_throughput > 0  # a.mp3: 2 s of audio
+    assert summary.efficiency > 0
+
+
+def test_bulk_writes_subtitles(audio_dir: Path, fake_transcribe, tmp_path: Path):
+    files = expand_paths([str(audio_dir / "*.mp3")])
+    transcribe_bulk(files, subtitles=tmp_path, subtitle_format="vtt")
+    assert (tmp_path / "a.vtt").read_text() == (
+        "WEBVTT\n\n00:00:00.000 --> 00:00:02.000\na\n\n"
+    )
+
+
+def test_subtitle_paths_are_unique(tmp_path: Path):
+    files = [tmp_path / name for name in ["a/talk.mp3", "b/talk.wav", "b/talk.mp3"]]
+    paths = subtitle_paths(files, "vtt")
+    assert [str(paths[file]) for file in files] == [
+        "a/talk.vtt",
+        "b/talk.vtt",
+        "b/talk-1.vtt",
+    ]
+
+
+def test_bulk_restart_skips_done_files_and_resumes_long_files(
+    audio_dir: Path, fake_transcribe, tmp_path: Path
+):
+    files = expand_paths([str(audio_dir)])
+    manifest_path = tmp_path / "job.jsonl"
+    first = transcribe_bulk(files, manifest=Manifest(manifest_path))
+    assert (first.files, first.failed, first.skipped) == (4, 1, 0)
+
+    # The run was killed during a long file, after its second chunk
+    long_file = audio_dir / "long.wav"
+    long_file.write_bytes(b"")
+    save_checkpoint(manifest_path, long_file, {"chunks": 2, "stitcher": {}})
+
+    output = StringIO()
+    second = transcribe_bulk(
+        [*files, long_file], output=output, manifest=Manifest(manifest_path)
+    )
+    assert (second.files, second.failed, second.skipped) == (2, 1, 3)
+    assert second.resumed == 1
+    texts = [json.loads(line)["text"] for line in output.getvalue().splitlines()]
+    assert sorted(texts) == ["", " a", " b", " c", " long resumed after 2"]
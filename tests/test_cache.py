@@ -0,0 +1,128 @@
+import os
+from pathlib import Path
+import shutil
+
+from pytest import fixture
+
+import whisperlab.cache
+from whisperlab.cache import ResultCache
+import whisperlab.transcribe
+from whisperlab.transcribe import transcribe, TranscribeTask
+
+# Fixtures --------------------------------------------------------------------
+
+
+@fixture
+def cache(tmp_path: Path) -> ResultCache:
+    return ResultCache(tmp_path / "cache")
+
+
+@fixture
+def hello_file() -> Path:
+    return Path("tests/data/hello_world.mp3")
+
+
+@fixture
+def hello_copy(tmp_path: Path, hello_file: Path) -> Path:
+    return Path(shutil.copy(hello_file, tmp_path / "renamed.mp3"))
+
+
+# Test Keys -------------------------------------------------------------------
+
+
+def test_key_is_content_addressed(cache, hello_file, hello_copy):
+    key = cache.key(hello_file, "base", {"language": "en", "task": "transcribe"})
+    assert key == cache.key(
+        hello_copy, "base", {"task": "transcribe", "language": "en"}
+    )
+    assert key != cache.key(
+        hello_file, "tiny", {"language": "en", "task": "transcribe"}
+    )
+    assert key != cache.key(
+        hello_file, "base", {"language": "fr", "task": "transcribe"}
+    )
+
+
+def test_repeated_file_is_not_decoded_again(cache, hello_file, monkeypatch):
+    key = cache.key(hello_file, "base", {})
+
+    def fail(audio_file):
+        raise AssertionError("Decoded a file with a known fingerprint")
+
+    monkeypatch.setattr(whisperlab.cache, "audio_digest", fail)
+    assert cache.key(hello_file, "base", {}) == key
+
+
+# Test Storage ----------------------------------------------------------------
+
+
+def test_get_and_put(cache):
+    assert cache.get("ab12") is None
+    cache.put("ab12", {"text": " Hello world."})
+    assert cache.get("ab12") == {"text": " Hello world."}
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses) == (1, 1)
+    assert not list(cache.directory.rglob(".tmp-*"))
+
+
+def test_least_recently_used_results_are_evicted(cache):
+    cache.max_bytes = 50
+    for key in ["aa", "bb"]:
+        cache.put(key, {"text": "x" * 10})
+    os.utime(cache.path("aa"), (0, 0))
+    os.utime(cache.path("bb"), (1, 1))
+    cache.get("aa")  # "bb" is now least recently used
+    cache.put("cc", {"text": "x" * 10})
+
+    assert cache.get("bb") is None
+    assert cache.get("aa") is not None
+    assert cache.get("cc") is not None
+    assert cache.stats().evictions == 1
+
+
+def test_cache_is_scanned_only_when_over_the_cap(cache, monkeypatch):
+    scans = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda: scans.append(1) or evict())
+    for key in range(50):
+        cache.put(f"{key:02x}", {"text": "x" * 10})
+    assert len(scans) == 1  # The first write measures the cache
+
+    cache.max_bytes = 100
+    cache.put("ff", {"text": "x" * 10})
+    assert len(scans) == 2
+    assert len(list(cache.directory.rglob("*.json"))) == 4
+
+
+def test_audio_hashes_are_evicted(cache, hello_file):
+    cache.key(hello_file, "base", {})
+    cache.max_bytes = 0
+    cache.evict()
+    assert list((cache.directory / "audio").iterdir()) == []
+
+
+# Test Cached Transcription ---------------------------------------------------
+
+
+def test_cached_transcription_skips_the_model(cache, hello_file, monkeypatch):
+    loads = []
+
+    class Model:
+        def transcribe(self, samples, **args):
+            return {"segments": [{"start": 0, "end": 1, "text": " Hello"}]}
+
+    def get_model(name, dtype=None):
+        loads.append(name)
+        return Model()
+
+    monkeypatch.setattr(whisperlab.transcribe, "RESULT_CACHE", cache)
+    monkeypatch.setattr(whisperlab.transcribe, "get_model", get_model)
+
+    task = TranscribeTask(audio_file=hello_file, model="fake", cache=True)
+    first = transcribe(task)
+    second = transcribe(task)
+    uncached = transcribe(task.model_copy(update={"cache": False}))
+
+    assert first == second == uncached
+    assert loads == ["fake", "fake"]
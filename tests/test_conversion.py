@@ -0,0 +1,92 @@
+import tracemalloc
+
+import numpy as np
+from pytest import fixture, mark, raises
+
+from whisperlab.conversion import (
+    AudioOverflow,
+    CLIP,
+    float_to_pcm,
+    in_range,
+    pack_int24,
+    pcm_to_float,
+    SATURATE,
+    sample_range,
+    unpack_int24,
+)
+
+# Fixtures --------------------------------------------------------------------
+
+
+@fixture
+def noise() -> np.ndarray:
+    return np.random.default_rng(0).uniform(-1, 1, 100_000).astype(np.float32)
+
+
+# Test Validation -------------------------------------------------------------
+
+
+def test_sample_range_spans_chunks(noise: np.ndarray):
+    noise[77_777] = -1.0
+    assert sample_range(noise, chunk=1000) == (-1.0, float(noise.max()))
+    assert in_range(noise, chunk=1000)
+
+
+def test_out_of_range_and_nan_samples_are_caught(noise: np.ndarray):
+    overflowing = noise.copy()
+    overflowing[-1] = 1.001
+    noise[50_000] = np.nan
+    assert not in_range(overflowing, chunk=1000)
+    assert not in_range(noise, chunk=1000)
+
+
+def test_validation_does_not_allocate(noise: np.ndarray):
+    tracemalloc.start()
+    in_range(noise)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert peak < noise.nbytes / 10
+
+
+# Test Conversion -------------------------------------------------------------
+
+
+def test_full_scale_saturates_instead_of_overflowing():
+    audio = np.array([-1.0, -0.5, 0.0, 0.5, 1.0], np.float32)
+    pcm = float_to_pcm(audio, "int16")
+    assert pcm.tolist() == [-32768, -16384, 0, 16384, 32767]
+
+
+@mark.parametrize("format, bits", [("int16", 16), ("int24", 24), ("int32", 32)])
+def test_pcm_round_trips(format: str, bits: int):
+    pcm = np.random.default_rng(0).integers(-(2 ** (bits - 1)), 2 ** (bits - 1), 10_000)
+    pcm = pcm.astype(np.int16 if bits == 16 else np.int32)
+    audio = pcm_to_float(pcm, bits)
+    if bits <= 24:  # float32 holds 24 bits exactly
+        assert np.array_equal(float_to_pcm(audio, format, chunk=999), pcm)
+    else:
+        assert np.abs(float_to_pcm(audio, format).astype(np.int64) - pcm).max() < 256
+
+
+def test_overflow_policies():
+    audio = np.array([0.5, 2.0, -3.0, np.nan], np.float32)
+    with raises(AudioOverflow):
+        float_to_pcm(audio)
+    assert float_to_pcm(audio[:3], policy=CLIP).tolist() == [16384, 32767, -32768]
+    assert float_to_pcm(audio, policy=SATURATE).tolist() == [16384, 32767, -32768, 0]
+
+
+def test_output_buffers_are_reused(noise: np.ndarray):
+    out = np.empty(len(noise), np.int16)
+    assert float_to_pcm(noise, out=out) is out
+    floats = np.empty(len(noise), np.float32)
+    assert pcm_to_float(out, out=floats) is floats
+    with raises(ValueError):
+        float_to_pcm(noise, out=np.empty(len(noise), np.int32))
+
+
+def test_int24_packing():
+    pcm = np.array([0, 1, -1, 2**23 - 1, -(2**23)], np.int32)
+    packed = pack_int24(pcm)
+    assert packed[:9].tolist() == [0, 0, 0, 1, 0, 0, 255, 255, 255]
+    assert np.array_equal(unpack_int24(packed.tobytes()), pcm)
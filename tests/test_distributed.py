@@ -0,0 +1,157 @@
+from multiprocessing import Process
+import os
+from pathlib import Path
+import signal
+import time
+
+import numpy as np
+from pytest import fixture
+
+from whisperlab.audio import save_audio
+from whisperlab.distributed import ChunkTask, Coordinator, SpoolWorker
+
+from helpers import count_seconds, counting_audio, expected_text
+
+# Fixtures --------------------------------------------------------------------
+
+
+def count_chunk(task: ChunkTask, samples: np.ndarray) -> dict:
+    """A stand-in transcriber that hears each second of audio as its index."""
+    return count_seconds(samples)
+
+
+def stall(task: ChunkTask, samples: np.ndarray) -> dict:
+    """A stand-in transcriber that hangs, until its worker is killed."""
+    time.sleep(60)
+
+
+def fail(task: ChunkTask, samples: np.ndarray) -> dict:
+    raise ValueError("Out of memory")
+
+
+def run_worker(spool: Path, transcriber=count_chunk):
+    SpoolWorker(spool, transcriber, heartbeat_seconds=0.1, poll_seconds=0.05).run()
+
+
+def start_worker(spool: Path, transcriber=count_chunk) -> Process:
+    process = Process(target=run_worker, args=(spool, transcriber), daemon=True)
+    process.start()
+    return process
+
+
+def counting_file(path: Path, seconds: int) -> Path:
+    save_audio(counting_audio(seconds), path, bits=32)
+    return path
+
+
+@fixture
+def spool(tmp_path: Path) -> Path:
+    return tmp_path / "spool"
+
+
+# Test Distributed Transcription ----------------------------------------------
+
+
+def test_worker_processes_transcribe_files_in_sequence_order(
+    spool: Path, tmp_path: Path
+):
+    streamed = {}
+    coordinator = Coordinator(
+        spool,
+        poll_seconds=0.05,
+        on_segments=lambda file, added: streamed.setdefault(file, []).extend(added),
+    )
+    long_file = counting_file(tmp_path / "long.wav", 95)
+    short_file = counting_file(tmp_path / "short.wav", 20)
+    coordinator.submit(long_file)
+    coordinator.submit(short_file)
+
+    workers = [start_worker(spool) for _ in range(2)]
+    results = dict(coordinator.results())
+    coordinator.stop()
+    for process in workers:
+        process.join(timeout=10)
+        assert process.exitcode == 0
+
+    assert results[str(long_file)]["text"] == expected_text(95)
+    assert results[str(long_file)]["error"] is None
+    assert results[str(short_file)]["text"] == expected_text(20)
+    starts = [segment["start"] for segment in streamed[str(long_file)]]
+    assert starts == list(range(95))
+    assert not any(path.is_file() for path in spool.rglob("*.npy"))
+
+
+def test_chunks_of_a_killed_worker_are_requeued(spool: Path, tmp_path: Path):
+    coordinator = Coordinator(spool, lease_seconds=0.5, poll_seconds=0.05)
+    audio_file = counting_file(tmp_path / "long.wav", 95)
+    coordinator.submit(audio_file)
+
+    # A worker dies mid-chunk
+    stalled = start_worker(spool, stall)
+    while not any((spool / "claimed").iterdir()):
+        time.sleep(0.01)
+    os.kill(stalled.pid, signal.SIGKILL)
+    stalled.join()
+
+    worker = start_worker(spool)
+    results = dict(coordinator.results())
+    coordinator.stop()
+    worker.join(timeout=10)
+
+    assert results[str(audio_file)]["text"] == expected_text(95)
+    assert coordinator.requeued == 1
+
+
+def test_chunks_pending_longer_than_a_lease_are_not_requeued(
+    spool: Path, tmp_path: Path
+):
+    coordinator = Coordinator(spool, lease_seconds=0.5, poll_seconds=0.05)
+    audio_file = counting_file(tmp_path / "long.wav", 95)
+    coordinator.submit(audio_file)
+
+    # The chunks waited in a backlog for longer than a lease
+    stale = time.time() - 60
+    for path in (spool / "pending").iterdir():
+        os.utime(path, (stale, stale))
+
+    worker = start_worker(spool)
+    results = dict(coordinator.results())
+    coordinator.stop()
+    worker.join(timeout=10)
+
+    assert worker.exitcode == 0
+    assert results[str(audio_file)]["text"] == expected_text(95)
+    assert coordinator.requeued == 0
+
+
+def test_late_duplicate_results_are_removed(spool: Path, tmp_path: Path):
+    coordinator = Coordinator(spool, poll_seconds=0.01)
+    coordinator.submit(counting_file(tmp_path / "short.wav", 5))
+    results = []
+
+    def hang_until_done(task: ChunkTask, samples: np.ndarray) -> dict:
+        # The lease expires, and another worker finishes the file
+        (spool / "claimed" / f"{task.name}.json").rename(
+            spool / "pending" / f"{task.name}.json"
+        )
+        other = SpoolWorker(spool, count_chunk)
+        other.process(other.claim())
+        results.extend(coordinator.results())
+        return count_chunk(task, samples)
+
+    worker = SpoolWorker(spool, hang_until_done)
+    worker.process(worker.claim())
+
+    assert results[0][1]["text"] == expected_text(5)
+    assert not any(path.is_file() for path in spool.rglob("*.*"))
+
+
+def test_chunk_errors_are_reported(spool: Path, tmp_path: Path):
+    coordinator = Coordinator(spool, poll_seconds=0.01)
+    coordinator.submit(counting_file(tmp_path / "short.wav", 5))
+
+    worker = SpoolWorker(spool, fail)
+    worker.process(worker.claim())
+    [(_, result)] = coordinator.results()
+    assert result["error"] == "ValueError: Out of memory"
+    assert result["text"] == ""
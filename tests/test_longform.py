@@ -0,0 +1,179 @@
+import json
+from pathlib import Path
+
+import numpy as np
+from pytest import fixture
+
+from whisperlab.audio import SAMPLES_PER_SECOND, stream_audio
+from whisperlab.longform import (
+    chunk_audio,
+    merge_checkpoints,
+    overlap_length,
+    transcribe_stream,
+    Stitcher,
+)
+import whisperlab.transcribe
+from whisperlab.transcribe import transcribe, TranscribeTask
+
+from helpers import blocks, counting_audio, SecondCounter
+
+# Fixtures --------------------------------------------------------------------
+
+
+@fixture
+def poem_file() -> Path:
+    return Path("tests/data/poem_sappho_58_by_Jameson_Fitzpatrick.mp3")
+
+
+# Test Chunking ---------------------------------------------------------------
+
+
+def test_chunks_overlap_and_cover_the_stream():
+    audio = counting_audio(70)
+    chunks = list(chunk_audio(blocks(audio, 7), chunk_seconds=30, overlap_seconds=5))
+
+    assert [(c.start, c.end) for c in chunks] == [(0, 30), (25, 55), (50, 70)]
+    assert [c.last for c in chunks] == [False, False, True]
+    for chunk in chunks:
+        expected = audio[chunk.offset : chunk.offset + len(chunk.samples)]
+        assert np.array_equal(chunk.samples, expected)
+
+
+def test_exact_chunk_length_is_one_chunk():
+    chunks = list(chunk_audio(blocks(counting_audio(30), 4)))
+    assert len(chunks) == 1
+    assert chunks[0].last
+
+
+def test_empty_stream_has_no_chunks():
+    assert list(chunk_audio([])) == []
+
+
+# Test Stitching --------------------------------------------------------------
+
+
+def test_overlap_length():
+    assert overlap_length(["a", "b", "c"], ["b", "c", "d"]) == 2
+    assert overlap_length(["a", "b", "c"], ["B,", "C.", "d"]) == 2
+    assert overlap_length(["a", "b", "c"], ["d", "e"]) == 0
+    assert overlap_length([], ["a"]) == 0
+
+
+def test_stitched_timestamps_are_global_and_unique():
+    result = transcribe_stream(SecondCounter(), blocks(counting_audio(95), 3))
+
+    assert result["text"] == "".join(f" w{second}" for second in range(95))
+    assert [segment["start"] for segment in result["segments"]] == list(range(95))
+    assert result["duration"] == 95
+
+
+def test_duplicate_words_across_boundary_are_dropped():
+    stitcher = Stitcher(overlap_seconds=5)
+    first, second = chunk_audio([counting_audio(40)])
+
+    stitcher.add(first, {"segments": [{"start": 20, "end": 27, "text": " a b c"}]})
+    stitcher.add(second, {"segments": [{"start": 1, "end": 5, "text": " b c d"}]})
+
+    assert stitcher.result()["text"] == " a b c d"
+
+
+def test_word_timestamps_are_global():
+    result = transcribe_stream(
+        SecondCounter(), blocks(counting_audio(95), 3), word_timestamps=True
+    )
+
+    for segment in result["segments"]:
+        assert segment["words"] == [
+            {
+                "word": segment["text"],
+                "probability": 1.0,
+                "start": segment["start"],
+                "end": segment["end"],
+            }
+        ]
+        # Seek is the chunk's first mel frame, 100 per second
+        assert segment["seek"] <= segment["start"] * 100 < segment["seek"] + 3000
+        assert segment["seek"] % 2500 == 0
+
+
+def test_duplicate_words_drop_their_timestamps():
+    stitcher = Stitcher(overlap_seconds=5)
+    first, second = chunk_audio([counting_audio(40)])
+
+    stitcher.add(first, {"segments": [{"start": 20, "end": 27, "text": " a b"}]})
+    words = [
+        {"word": f" {word}", "start": start, "end": start + 1}
+        for start, word in enumerate("bcd", 1)
+    ]
+    segment = {"start": 1, "end": 4, "text": " b c d", "words": words, "tokens": [1]}
+    (added,) = stitcher.add(second, {"segments": [segment]})
+
+    assert added["text"] == " c d"
+    assert [(w["word"], w["start"]) for w in added["words"]] == [(" c", 27), (" d", 28)]
+    assert "tokens" not in added
+
+
+def test_resumed_stream_matches_an_uninterrupted_run():
+    checkpoints = []
+    expected = transcribe_stream(
+        SecondCounter(),
+        blocks(counting_audio(95), 3),
+        on_checkpoint=lambda checkpoint: checkpoints.append(json.dumps(checkpoint)),
+    )
+    checkpoints = [json.loads(checkpoint) for checkpoint in checkpoints]
+    assert [checkpoint["chunks"] for checkpoint in checkpoints] == [1, 2, 3]
+    # Each checkpoint holds only the segments its chunk added
+    assert all(len(c["stitcher"]["segments"]) <= 30 for c in checkpoints)
+
+    class Model(SecondCounter):
+        chunks = 0
+
+        def transcribe(self, samples, **args):
+            self.chunks += 1
+            return super().transcribe(samples, **args)
+
+    model = Model()
+    checkpoint = merge_checkpoints(None, checkpoints[0])
+    checkpoint = merge_checkpoints(checkpoint, checkpoints[1])
+    assert merge_checkpoints(None, checkpoints[1]) is None
+    result = transcribe_stream(
+        model, blocks(counting_audio(95), 3), checkpoint=checkpoint
+    )
+    assert result == expected
+    assert model.chunks == 2
+
+
+# Test Speech Gate ------------------------------------------------------------
+
+
+def test_gated_timestamps_are_source_times():
+    def detector(block):
+        return [(10 * SAMPLES_PER_SECOND, 20 * SAMPLES_PER_SECOND)]
+
+    audio = blocks(counting_audio(120), 60)
+    result = transcribe_stream(SecondCounter(), audio, detector=detector)
+
+    assert result["duration"] == 120
+    assert result["text"].split() == [f"w{i}" for i in (*range(10, 20), *range(70, 80))]
+    for segment in result["segments"]:
+        assert segment["text"] == f" w{int(segment['start'])}"
+        assert segment["end"] == segment["start"] + 1
+
+
+# Test Long Files -------------------------------------------------------------
+
+
+def test_stream_audio_decodes_in_blocks(poem_file: Path):
+    decoded = list(stream_audio(poem_file, block_seconds=10))
+    assert len(decoded) == 8
+    assert all(block.dtype == np.float32 for block in decoded)
+    assert sum(map(len, decoded)) / SAMPLES_PER_SECOND > 70
+
+
+def test_transcribe_is_not_truncated(poem_file: Path, monkeypatch):
+    monkeypatch.setattr(
+        whisperlab.transcribe, "get_model", lambda name, dtype=None: SecondCounter()
+    )
+    result = transcribe(TranscribeTask(audio_file=poem_file))
+    assert result["duration"] > 70
+    assert result["segments"][-1]["end"] > 70
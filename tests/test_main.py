@@ -1,6 +1,12 @@
 from whisperlab import VERSION
 
+import json
 import subprocess
+import sys
+import time
+
+# Startup budget for --help, in seconds. Importing torch alone takes longer.
+STARTUP_BUDGET = 1.0
 
 
 def run_whisperlab(*args):
@@ -20,6 +26,24 @@ def test_help():
     assert result.returncode == 0
 
 
+def test_help_is_fast_and_skips_heavy_imports(tmp_path):
+    # Run outside the repository, so nothing depends on the working directory
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "whisperlab", "--help"], cwd=tmp_path, check=True
+    )
+    assert time.perf_counter() - start < STARTUP_BUDGET
+
+    modules = subprocess.run(
+        [sys.executable, "-c", "import sys, whisperlab.__main__; print(*sys.modules)"],
+        cwd=tmp_path,
+        stdout=subprocess.PIPE,
+        check=True,
+    ).stdout.split()
+    for heavy in [b"torch", b"whisper", b"sounddevice", b"matplotlib"]:
+        assert heavy not in modules
+
+
 def test_version():
     result = run_whisperlab("--version")
     assert result.returncode == 0
@@ -31,3 +55,34 @@ def test_transcribe():
     result = run_whisperlab("transcribe", audio_file)
     assert result.returncode == 0
     assert "Hello world." in result.output
+
+
+def test_transcribe_many_to_jsonl(tmp_path):
+    output = tmp_path / "results.jsonl"
+    empty_file = "tests/data/empty_file.mp3"
+    result = run_whisperlab("transcribe", empty_file, empty_file, "-o", str(output))
+    assert result.returncode == 0
+    assert "audio-seconds per wall-second" in result.output
+    assert len(output.read_text().splitlines()) == 1
+
+
+def test_transcribe_missing_file():
+    result = run_whisperlab("transcribe", "tests/data/missing.mp3")
+    assert result.returncode != 0
+
+
+def test_bench_fails_on_regression(tmp_path):
+    results = tmp_path / "bench.json"
+    audio_file = "tests/data/hello_world.mp3"
+    result = run_whisperlab("bench", audio_file, "-r", "1", "-o", str(results))
+    assert result.returncode == 0
+    assert "RTF" in result.output
+
+    # Pretend every stage used to be instant
+    stored = json.loads(results.read_text())
+    for stage in stored["files"]["hello_world.mp3"]["stages"].values():
+        stage["p50_ms"] = 0.0
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps(stored))
+    result = run_whisperlab("bench", audio_file, "-r", "1", "--baseline", baseline)
+    assert result.returncode != 0
@@ -0,0 +1,101 @@
+import os
+from pathlib import Path
+
+from pytest import fixture, raises
+
+from whisperlab.manifest import Manifest, save_checkpoint, shard_of
+
+# Fixtures --------------------------------------------------------------------
+
+
+@fixture
+def audio_files(tmp_path: Path) -> list[Path]:
+    files = [tmp_path / f"{name}.wav" for name in "abcdefgh"]
+    for path in files:
+        path.write_bytes(b"RIFF")
+    return files
+
+
+@fixture
+def manifest_path(tmp_path: Path) -> Path:
+    return tmp_path / "job.jsonl"
+
+
+def checkpoint(chunks: int, first: int, segments: list[str]) -> dict:
+    """A stream checkpoint, with only the segments its chunk added."""
+    state = {"first": first, "segments": segments, "words": []}
+    return {"chunks": chunks, "stitcher": state}
+
+
+# Test Ledger -----------------------------------------------------------------
+
+
+def test_restart_skips_done_files_and_resumes_checkpoints(
+    audio_files: list[Path], manifest_path: Path
+):
+    manifest = Manifest(manifest_path)
+    manifest.complete(audio_files[0], {"text": " a"})
+    save_checkpoint(manifest.ledger, audio_files[1], checkpoint(1, 0, ["a", "b"]))
+    save_checkpoint(manifest.ledger, audio_files[1], checkpoint(2, 2, ["c"]))
+
+    restarted = Manifest(manifest_path)
+    assert restarted.record(audio_files[0]) == {"text": " a"}
+    assert restarted.checkpoint(audio_files[0]) is None
+    assert restarted.checkpoint(audio_files[1]) == checkpoint(2, 0, ["a", "b", "c"])
+    assert restarted.record(audio_files[1]) is None
+
+    # A run resumed from the checkpoint continues its segments
+    save_checkpoint(manifest.ledger, audio_files[1], checkpoint(3, 3, ["d"]))
+    assert Manifest(manifest_path).checkpoint(audio_files[1])["chunks"] == 3
+
+
+def test_files_with_a_lost_checkpoint_start_over(
+    audio_files: list[Path], manifest_path: Path
+):
+    save_checkpoint(manifest_path, audio_files[0], checkpoint(2, 2, ["c"]))
+    assert Manifest(manifest_path).checkpoint(audio_files[0]) is None
+
+
+def test_edited_files_start_over(audio_files: list[Path], manifest_path: Path):
+    Manifest(manifest_path).complete(audio_files[0], {"text": " a"})
+    audio_files[0].write_bytes(b"RIFF, edited")
+    assert Manifest(manifest_path).record(audio_files[0]) is None
+
+
+def test_torn_entries_are_skipped(audio_files: list[Path], manifest_path: Path):
+    Manifest(manifest_path).complete(audio_files[0], {"text": " a"})
+    with open(manifest_path, "a") as file:
+        file.write('{"audio_file": "torn')  # The run died mid-write
+
+    manifest = Manifest(manifest_path)
+    manifest.complete(audio_files[1], {"text": " b"})
+    restarted = Manifest(manifest_path)
+    assert len(restarted.done) == 2
+
+
+# Test Sharding ---------------------------------------------------------------
+
+
+def test_each_file_belongs_to_one_shard(audio_files: list[Path], manifest_path):
+    shards = [Manifest(manifest_path, shard, shards=3) for shard in range(3)]
+    for path in audio_files:
+        owners = [manifest.shard for manifest in shards if manifest.owns(path)]
+        assert owners == [shard_of(path, 3)]
+
+
+def test_shards_share_their_progress(audio_files: list[Path], manifest_path: Path):
+    for shard in range(2):
+        manifest = Manifest(manifest_path, shard, shards=2)
+        for path in audio_files:
+            if manifest.owns(path):
+                manifest.complete(path, {"text": path.stem})
+    assert len(os.listdir(manifest_path.parent)) == len(audio_files) + 2
+
+    # A restart with another shard count skips every file
+    manifest = Manifest(manifest_path, shard=0, shards=1)
+    assert all(manifest.record(path) is not None for path in audio_files)
+
+
+def test_shard_out_of_range(manifest_path: Path):
+    with raises(ValueError):
+        Manifest(manifest_path, shard=2, shards=2)
@@ -0,0 +1,93 @@
+import importlib
+
+import numpy as np
+from pytest import fixture
+import whisper
+
+from whisperlab.audio import SAMPLES_PER_SECOND
+from whisperlab.mel import HOP, MelFrontend, N_FRAMES, transcribe_mel
+from whisperlab.models import get_model, STANDIN_MODEL
+
+# Fixtures --------------------------------------------------------------------
+
+
+@fixture
+def stream() -> np.ndarray:
+    """20 s of a gliding tone in noise."""
+    rng = np.random.default_rng(0)
+    t = np.arange(20 * SAMPLES_PER_SECOND) / SAMPLES_PER_SECOND
+    tone = 0.3 * np.sin(2 * np.pi * (200 + 20 * t) * t)
+    return (tone + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+def windows(stream: np.ndarray, window_seconds: float = 6, hop_seconds: float = 1):
+    """Yield the (start, samples) windows of a stream, on the frame grid."""
+    window = int(window_seconds * SAMPLES_PER_SECOND)
+    hop = int(hop_seconds * SAMPLES_PER_SECOND)
+    for end in range(hop, len(stream) + 1, hop):
+        start = max(0, end - window)
+        yield start, stream[start:end]
+
+
+# Test Frontend ---------------------------------------------------------------
+
+
+def test_frames_match_whisper(stream: np.ndarray):
+    frontend = MelFrontend(capacity_seconds=12)
+    for start, samples in windows(stream):
+        mel = frontend(samples, start).numpy()
+        expected = whisper.log_mel_spectrogram(
+            samples, padding=whisper.audio.N_SAMPLES
+        ).numpy()
+        assert mel.shape == expected.shape == (80, len(samples) // HOP + N_FRAMES)
+        # The first two frames see the audio before the window
+        np.testing.assert_allclose(mel[:, 2:], expected[:, 2:], atol=0.05)
+
+
+def test_only_new_frames_are_computed(stream: np.ndarray):
+    frontend = MelFrontend(capacity_seconds=12)
+    for start, samples in windows(stream, window_seconds=6, hop_seconds=1):
+        frontend(samples, start)
+    # Each window computes the hop's frames, and the few that reach its end
+    assert frontend.computed < 2 * len(stream) // HOP
+
+
+def test_windows_behind_the_position_reuse_kept_frames(stream: np.ndarray):
+    frontend = MelFrontend(capacity_seconds=12)
+    frontend(stream[: 10 * SAMPLES_PER_SECOND], 0)
+    computed = frontend.computed
+    start, end = 2 * SAMPLES_PER_SECOND, 6 * SAMPLES_PER_SECOND
+    mel = frontend(stream[start:end], start).numpy()
+    expected = whisper.log_mel_spectrogram(
+        stream[start:end], padding=whisper.audio.N_SAMPLES
+    ).numpy()
+    np.testing.assert_allclose(mel[:, 2:], expected[:, 2:], atol=0.05)
+    assert frontend.computed - computed < N_FRAMES // 10
+    assert frontend.position == 10 * SAMPLES_PER_SECOND
+
+
+def test_falling_behind_restarts_the_frontend(stream: np.ndarray):
+    frontend = MelFrontend(capacity_seconds=12)
+    frontend(stream[:SAMPLES_PER_SECOND], 0)
+    start = 10 * SAMPLES_PER_SECOND
+    mel = frontend(stream[start : start + SAMPLES_PER_SECOND], start)
+    assert frontend.position == start + SAMPLES_PER_SECOND
+    assert mel.shape == (80, SAMPLES_PER_SECOND // HOP + N_FRAMES)
+
+
+# Test Transcription ----------------------------------------------------------
+
+
+def test_transcribe_mel():
+    model = get_model(STANDIN_MODEL)
+    frontend = MelFrontend(model.dims.n_mels)
+    mel = frontend(np.zeros(SAMPLES_PER_SECOND, np.float32), 0)
+    result = transcribe_mel(model, mel, language="en", fp16=False)
+    assert {"text", "segments", "language"} <= set(result)
+    # whisper is restored afterwards
+    module = importlib.import_module("whisper.transcribe")
+    assert module.log_mel_spectrogram is whisper.audio.log_mel_spectrogram
+    # Audio still works
+    assert "segments" in model.transcribe(
+        np.zeros(SAMPLES_PER_SECOND, np.float32), fp16=False
+    )
@@ -0,0 +1,156 @@
+import threading
+
+from pytest import fixture, mark, raises
+import torch
+import whisper
+
+import whisperlab.models
+from whisperlab.models import (
+    bf16_supported,
+    load_whisper_model,
+    ModelKey,
+    ModelRegistry,
+    model_bytes,
+    model_lock,
+    standin_model,
+)
+
+# Fixtures --------------------------------------------------------------------
+
+
+@fixture
+def loads() -> list:
+    return []
+
+
+@fixture
+def registry(loads) -> ModelRegistry:
+    def loader(name, device, dtype):
+        loads.append(name)
+        return torch.nn.Linear(10, 10)  # 110 float32 params = 440 bytes
+
+    return ModelRegistry(loader=loader)
+
+
+# Test Caching ----------------------------------------------------------------
+
+
+def test_model_is_loaded_once(registry: ModelRegistry, loads: list):
+    first = registry.get("base", device="cpu")
+    second = registry.get("base", device="cpu")
+    assert first is second
+    assert loads == ["base"]
+
+    stats = registry.stats()
+    assert (stats.hits, stats.misses) == (1, 1)
+    assert stats.hit_rate == 0.5
+
+
+def test_models_are_keyed_by_device_and_dtype(registry: ModelRegistry):
+    cpu = registry.get("base", device="cpu")
+    half = registry.get("base", device="cpu", dtype="fp16")
+    assert cpu is not half
+    assert ModelKey("base", "cpu", "fp32") in registry
+    assert ModelKey("base", "cpu", "fp16") in registry
+
+
+def test_replicas_are_separate_models(registry: ModelRegistry, loads: list):
+    shared = registry.get("base", device="cpu")
+    replica = registry.get("base", device="cpu", replica=1)
+    assert replica is not shared
+    assert registry.get("base", device="cpu", replica=1) is replica
+    assert model_lock(replica) is not model_lock(shared)
+    assert ModelKey("base", "cpu", "fp32", replica=1) in registry
+    assert loads == ["base", "base"]
+
+
+def test_concurrent_lookups_load_once(registry: ModelRegistry, loads: list):
+    threads = [
+        threading.Thread(target=registry.get, args=("base", "cpu")) for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == ["base"]
+    assert registry.stats().hits == 7
+
+
+# Test Eviction ---------------------------------------------------------------
+
+
+def test_preload_and_evict(registry: ModelRegistry, loads: list):
+    registry.preload("base", device="cpu")
+    assert len(registry) == 1
+    assert registry.evict("base", device="cpu") == 1
+    assert len(registry) == 0
+    registry.get("base", device="cpu")
+    assert loads == ["base", "base"]
+
+
+def test_lru_eviction_respects_memory_budget(registry: ModelRegistry):
+    size = model_bytes(torch.nn.Linear(10, 10))
+    registry.memory_budget = 2 * size
+
+    registry.get("a", device="cpu")
+    registry.get("b", device="cpu")
+    registry.get("a", device="cpu")  # "b" is now least recently used
+    registry.get("c", device="cpu")
+
+    stats = registry.stats()
+    assert stats.evictions == 1
+    assert stats.memory_bytes == 2 * size
+    assert ModelKey("b", "cpu", "fp32") not in registry
+    assert ModelKey("a", "cpu", "fp32") in registry
+
+
+# Test Precisions -------------------------------------------------------------
+
+
+@fixture
+def mel() -> torch.Tensor:
+    return torch.randn(1, 80, 3000, generator=torch.Generator().manual_seed(0))
+
+
+def test_int8_is_quantized_once_then_loaded(tmp_path, monkeypatch, mel):
+    downloads = []
+
+    def load_model(name, device=None):
+        downloads.append(name)
+        return standin_model()
+
+    monkeypatch.setattr(whisper, "load_model", load_model)
+    monkeypatch.setattr(whisperlab.models, "QUANTIZED_CACHE_DIR", tmp_path)
+
+    quantized = load_whisper_model("custom", "cpu", "int8-dynamic")
+    reloaded = load_whisper_model("custom", "cpu", "int8-dynamic")
+    assert downloads == ["custom"]
+    assert [path.name for path in tmp_path.iterdir()] == ["custom-int8-dynamic.pt"]
+
+    query = quantized.encoder.blocks[0].attn.query
+    assert isinstance(query, torch.ao.nn.quantized.dynamic.Linear)
+    with torch.no_grad():
+        features = quantized.encoder(mel)
+        assert torch.equal(features, reloaded.encoder(mel))
+        assert torch.allclose(features, standin_model().encoder(mel), atol=0.1)
+
+
+def test_int8_runs_on_the_cpu_only():
+    with raises(ValueError):
+        load_whisper_model("standin", "cuda", "int8-dynamic")
+
+
+def test_int8_defaults_to_the_cpu_on_gpu_hosts(registry, monkeypatch):
+    monkeypatch.setattr(torch.cuda, "is_available", lambda: True)
+    assert registry.key("base", dtype="int8-dynamic").device == "cpu"
+    assert registry.key("base").device == "cuda"
+
+
+@mark.skipif(not bf16_supported("cpu"), reason="No native bf16 on this CPU")
+def test_bf16_halves_weights_and_keeps_fp32_outputs(mel):
+    model = load_whisper_model("standin", "cpu", "bf16")
+    assert model_bytes(model) < 0.6 * model_bytes(standin_model())
+    with torch.no_grad():
+        features = model.encoder(mel)
+        assert features.dtype == torch.float32
+        assert torch.allclose(features, standin_model().encoder(mel), atol=0.1)
@@ -0,0 +1,81 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from pytest import fixture
+import torch
+
+from whisperlab.resources import (
+    apply,
+    available_cpus,
+    ResourceConfig,
+    THREAD_VARIABLES,
+)
+
+# Fixtures --------------------------------------------------------------------
+
+
+@fixture
+def restore_threads(monkeypatch):
+    """Restore the thread settings that `apply` changes."""
+    for variable in THREAD_VARIABLES:
+        monkeypatch.setenv(variable, os.environ.get(variable, ""))
+    threads = torch.get_num_threads()
+    affinity = available_cpus()
+    yield
+    torch.set_num_threads(threads)
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, affinity)
+
+
+def worker_threads() -> tuple[int, str]:
+    return torch.get_num_threads(), os.environ["OMP_NUM_THREADS"]
+
+
+# Test Partitioning -----------------------------------------------------------
+
+
+def test_cores_are_split_between_workers():
+    config = ResourceConfig(cores=32, workers=4)
+    assert config.threads == 8
+    assert not config.oversubscribed
+
+
+def test_explicit_threads_can_oversubscribe():
+    config = ResourceConfig(cores=4, workers=4, threads_per_worker=2)
+    assert config.threads == 2
+    assert config.oversubscribed
+
+
+def test_workers_get_disjoint_cpu_sets():
+    cpus = available_cpus()
+    config = ResourceConfig(cores=len(cpus), workers=len(cpus))
+    sets = [config.cpu_set(worker) for worker in range(len(cpus))]
+    assert sorted(cpu for cpu_set in sets for cpu in cpu_set) == cpus
+
+
+def test_cpu_sets_wrap_around_when_oversubscribed():
+    config = ResourceConfig(cores=1, workers=3)
+    assert [config.cpu_set(worker) for worker in range(3)] == [available_cpus()[:1]] * 3
+
+
+# Test Applying ---------------------------------------------------------------
+
+
+def test_apply_sets_torch_and_blas_threads(restore_threads):
+    apply(ResourceConfig(cores=8, workers=4), worker=0)
+    assert torch.get_num_threads() == 2
+    assert all(os.environ[variable] == "2" for variable in THREAD_VARIABLES)
+
+
+def test_apply_pins_the_process(restore_threads):
+    config = ResourceConfig(cores=1, pin=True)
+    apply(config, worker=0)
+    if hasattr(os, "sched_getaffinity"):
+        assert available_cpus() == config.cpu_set(0)
+
+
+def test_process_pool_workers_are_configured():
+    config = ResourceConfig(cores=4, workers=2)
+    with ProcessPoolExecutor(2, **config.pool_initializer()) as executor:
+        results = [executor.submit(worker_threads).result() for _ in range(2)]
+    assert results == [(2, "2")] * 2
@@ -0,0 +1,151 @@
+from concurrent.futures import CancelledError
+import threading
+import time
+
+from pytest import fixture, raises
+
+from whisperlab.scheduler import Scheduler
+from whisperlab.tasks import BULK_PRIORITY, REALTIME_PRIORITY, Task
+
+# Fixtures --------------------------------------------------------------------
+
+
+class Recorder:
+    """A handler that records the tasks it runs, and can be held."""
+
+    def __init__(self):
+        self.ran = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, task: Task) -> dict:
+        self.release.wait(10)
+        self.ran.append((task.batch, task.sequence))
+        return {"text": f"{task.batch}{task.sequence}"}
+
+
+@fixture
+def recorder() -> Recorder:
+    return Recorder()
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 10
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+# Test Ordering ---------------------------------------------------------------
+
+
+def test_priority_then_batch_then_sequence(recorder: Recorder):
+    recorder.release.clear()
+    with Scheduler(recorder, workers=1, reserved=0) as scheduler:
+        scheduler.submit(Task(batch="hold"))
+        wait_for(lambda: scheduler.queued == 0)
+
+        for batch in ["a", "b"]:
+            for sequence in [2, 0, 1]:
+                scheduler.submit(Task(batch=batch, sequence=sequence))
+        scheduler.submit(Task(batch="live", priority=REALTIME_PRIORITY))
+        recorder.release.set()
+
+    assert recorder.ran == [
+        ("hold", 0),
+        ("live", 0),
+        *[("a", i) for i in range(3)],
+        *[("b", i) for i in range(3)],
+    ]
+
+
+def test_reserved_workers_keep_bulk_from_starving_live_tasks():
+    release = threading.Event()
+
+    def handler(task: Task) -> dict:
+        if task.priority == BULK_PRIORITY:
+            release.wait(10)
+        return {"priority": task.priority}
+
+    with Scheduler(handler, workers=2, reserved=1) as scheduler:
+        bulk = [scheduler.submit(Task(sequence=i)) for i in range(3)]
+        wait_for(lambda: scheduler.queued == 2)  # Bulk holds the other worker
+
+        live = scheduler.submit(Task(priority=REALTIME_PRIORITY))
+        assert live.result(10) == {"priority": REALTIME_PRIORITY}
+        assert not any(future.done() for future in bulk)
+        release.set()
+        assert all(future.result(10) for future in bulk)
+
+
+def test_results_are_delivered_in_sequence_order():
+    def handler(task: Task) -> dict:
+        time.sleep(0.01 * (4 - task.sequence))  # Later tasks finish first
+        return {"sequence": task.sequence}
+
+    delivered = []
+    tasks = [Task(batch="a", sequence=i) for i in range(5)]
+    with Scheduler(
+        handler,
+        workers=5,
+        reserved=0,
+        on_result=lambda future: delivered.append(future.result()["sequence"]),
+    ) as scheduler:
+        results = list(scheduler.map(reversed(tasks)))
+
+    assert [result["sequence"] for result in results] == list(range(5))
+    assert delivered == list(range(5))
+    assert all(task.completed for task in tasks)
+
+
+# Test Failures ---------------------------------------------------------------
+
+
+def test_failures_are_retried():
+    attempts = []
+
+    def flaky(task: Task) -> dict:
+        attempts.append(task.id)
+        if len(attempts) < 2:
+            raise RuntimeError("Out of memory")
+        return {"text": "ok"}
+
+    with Scheduler(flaky, workers=1, reserved=0, retries=1) as scheduler:
+        assert scheduler.submit(Task()).result(10) == {"text": "ok"}
+
+    def broken(task: Task) -> dict:
+        raise RuntimeError("Undecodable")
+
+    with Scheduler(broken, workers=1, reserved=0, retries=2) as scheduler:
+        with raises(RuntimeError, match="Undecodable"):
+            scheduler.submit(Task()).result(10)
+
+
+def test_cancel_queued_task(recorder: Recorder):
+    recorder.release.clear()
+    with Scheduler(recorder, workers=1, reserved=0) as scheduler:
+        running = scheduler.submit(Task(batch="a", sequence=0))
+        queued = Task(batch="a", sequence=1)
+        future = scheduler.submit(queued)
+        wait_for(lambda: scheduler.queued == 1)
+
+        assert scheduler.cancel(queued.id)
+        assert not scheduler.cancel(queued.id)
+        recorder.release.set()
+        assert running.result(10)
+        with raises(CancelledError):
+            future.result(10)
+    assert recorder.ran == [("a", 0)]
+
+
+def test_timeouts(recorder: Recorder):
+    recorder.release.clear()
+    with Scheduler(recorder, workers=1, reserved=0) as scheduler:
+        running = scheduler.submit(Task(batch="a"), timeout=0.05)
+        queued = scheduler.submit(Task(batch="b"), timeout=0.05)
+        with raises(TimeoutError):
+            running.result(10)
+        with raises(TimeoutError):
+            queued.result(10)
+        recorder.release.set()
+    assert recorder.ran == [("a", 0)]  # The expired queued task never ran
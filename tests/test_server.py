@@ -0,0 +1,258 @@
+import asyncio
+from pathlib import Path
+import socket
+import tempfile
+import threading
+
+import numpy as np
+from pytest import fixture, raises
+
+from whisperlab.audio import SAMPLES_PER_SECOND, save_audio
+from whisperlab.client import ServerBusy, TranscriptionClient
+from whisperlab.models import STANDIN_MODEL
+import whisperlab.server
+from whisperlab.server import BadRequest, parse_options, TranscriptionServer
+from whisperlab.tracing import METRICS
+
+from helpers import counting_audio, SecondCounter
+
+# Fixtures --------------------------------------------------------------------
+
+DECODING = {"language": "en", "sample_len": 4}
+
+
+def start(server: TranscriptionServer, **address):
+    """Serve on a background event loop. Returns a function to stop it."""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    async def run():
+        started = asyncio.Event()
+        task = asyncio.create_task(server.serve(ready=started, **address))
+        await started.wait()
+        ready.set()
+        await task
+
+    def main():
+        try:
+            loop.run_until_complete(run())
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=main, daemon=True)
+    thread.start()
+    assert ready.wait(10)
+
+    def stop():
+        for task in asyncio.all_tasks(loop):
+            loop.call_soon_threadsafe(task.cancel)
+        thread.join(10)
+
+    return stop
+
+
+@fixture
+def socket_path(tmp_path: Path) -> Path:
+    return tmp_path / "whisperlab.sock"
+
+
+@fixture
+def client(socket_path: Path):
+    stop = start(TranscriptionServer(STANDIN_MODEL), socket_path=socket_path)
+    yield TranscriptionClient(f"unix:{socket_path}")
+    stop()
+
+
+@fixture
+def hello_world() -> Path:
+    return Path("tests/data/hello_world.mp3")
+
+
+def raw_request(socket_path: Path, request: bytes) -> bytes:
+    """Send a request as is, and get the status line."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(str(socket_path))
+        connection.sendall(request)
+        return connection.makefile("rb").readline()
+
+
+# Test Requests ---------------------------------------------------------------
+
+
+def test_health(client: TranscriptionClient):
+    assert client.available()
+    health = client.health()
+    assert (health["model"], health["queued"]) == (STANDIN_MODEL, 0)
+
+
+def test_no_server_is_unavailable(socket_path: Path):
+    assert not TranscriptionClient(f"unix:{socket_path}").available()
+
+
+def test_short_clips_stream_a_segment_then_the_result(
+    client: TranscriptionClient, hello_world: Path
+):
+    segments = []
+    result = client.transcribe(hello_world, args=DECODING, on_segment=segments.append)
+    assert 2 < result["duration"] < 3
+    assert segments == result["segments"]
+    assert segments[0]["text"] == result["text"]
+
+
+def test_uploads_over_tcp(hello_world: Path, tmp_path: Path, monkeypatch):
+    server = TranscriptionServer(STANDIN_MODEL)
+    stop = start(server, host="127.0.0.1", port=0)
+    monkeypatch.setattr(TranscriptionClient, "local", False)  # As if remote
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    monkeypatch.setattr(whisperlab.server, "UPLOAD_CHUNK_BYTES", 1024)
+    try:
+        result = TranscriptionClient(server.address).transcribe(hello_world)
+    finally:
+        stop()
+    assert 2 < result["duration"] < 3
+    assert list(tmp_path.iterdir()) == []  # The upload was removed
+
+
+def test_malformed_requests(client: TranscriptionClient, socket_path: Path):
+    missing = b"POST /transcribe HTTP/1.1\r\n\r\n"
+    assert raw_request(socket_path, missing).startswith(b"HTTP/1.1 411")
+    malformed = b"POST /transcribe HTTP/1.1\r\nContent-Length: ten\r\n\r\n"
+    assert raw_request(socket_path, malformed).startswith(b"HTTP/1.1 400")
+    assert client.available()
+
+
+def test_only_client_options_are_accepted(
+    client: TranscriptionClient, socket_path: Path, hello_world: Path
+):
+    body = b'{"audio_file": "%s", "priority": 0}' % str(hello_world.resolve()).encode()
+    request = (
+        b"POST /transcribe HTTP/1.1\r\nContent-Type: application/json\r\n"
+        b"Content-Length: %d\r\n\r\n%s" % (len(body), body)
+    )
+    assert raw_request(socket_path, request).startswith(b"HTTP/1.1 400")
+
+
+def test_remote_clients_cannot_name_files(hello_world: Path):
+    options = {"audio_file": str(hello_world), "vad": True}
+    assert parse_options(options, local=True) == options
+    with raises(BadRequest, match="upload"):
+        parse_options(options, local=False)
+    with raises(BadRequest):
+        parse_options(["vad"], local=True)
+
+
+def test_requests_are_added_to_the_metrics(
+    client: TranscriptionClient, hello_world: Path
+):
+    METRICS.reset()
+    client.transcribe(hello_world, args=DECODING)
+    assert METRICS.tasks == 1
+    assert 2 < METRICS.audio_seconds < 3
+    assert "batch" in METRICS.stages
+
+
+def test_long_files_stream_segments_per_chunk(
+    client: TranscriptionClient, tmp_path: Path, monkeypatch
+):
+    monkeypatch.setattr(
+        whisperlab.server, "get_model", lambda name, dtype=None: SecondCounter()
+    )
+    audio_file = tmp_path / "long.wav"
+    save_audio(counting_audio(70), audio_file)
+
+    events = list(client.events(audio_file))
+    segments = [event["segment"] for event in events if event["event"] == "segment"]
+    assert events[-1]["event"] == "result"
+    assert segments == events[-1]["result"]["segments"]
+    assert [segment["text"] for segment in segments] == [f" w{i}" for i in range(70)]
+
+
+def test_long_files_do_not_block_short_clips(
+    client: TranscriptionClient, tmp_path: Path, hello_world: Path, monkeypatch
+):
+    release = threading.Event()
+
+    def transcribe_stream(*args, **kwargs):
+        assert release.wait(10)
+        return {"text": "", "segments": [], "duration": 70.0}
+
+    monkeypatch.setattr(whisperlab.server, "transcribe_stream", transcribe_stream)
+    audio_file = tmp_path / "long.wav"
+    save_audio(np.zeros(70 * SAMPLES_PER_SECOND, np.float32), audio_file)
+    long = threading.Thread(target=lambda: client.transcribe(audio_file))
+    long.start()
+    try:
+        while client.health()["batches"] < 1:
+            release.wait(0.01)
+        result = client.transcribe(hello_world, args=DECODING)
+        assert not release.is_set()
+    finally:
+        release.set()
+        long.join(10)
+    assert 2 < result["duration"] < 3
+
+
+def test_too_many_long_files_are_busy(socket_path: Path, tmp_path: Path, monkeypatch):
+    release = threading.Event()
+
+    def transcribe_stream(*args, **kwargs):
+        assert release.wait(10)
+        return {"text": "", "segments": [], "duration": 70.0}
+
+    monkeypatch.setattr(whisperlab.server, "transcribe_stream", transcribe_stream)
+    audio_file = tmp_path / "long.wav"
+    save_audio(np.zeros(70 * SAMPLES_PER_SECOND, np.float32), audio_file)
+    server = TranscriptionServer(STANDIN_MODEL, max_long_jobs=1)
+    stop = start(server, socket_path=socket_path)
+    client = TranscriptionClient(server.address)
+    long = threading.Thread(target=lambda: client.transcribe(audio_file))
+    long.start()
+    try:
+        while server.long_jobs < 1:
+            release.wait(0.01)
+        with raises(ServerBusy):
+            client.transcribe(audio_file)
+    finally:
+        release.set()
+        long.join(10)
+        stop()
+    assert server.long_jobs == 0
+
+
+def test_full_queue_is_busy(socket_path: Path, hello_world: Path):
+    server = TranscriptionServer(STANDIN_MODEL, queue_size=1)
+    release = threading.Event()
+
+    def run_batch(jobs):
+        assert release.wait(10)
+        for job in jobs:
+            job.close()
+
+    server.run_batch = run_batch
+    stop = start(server, socket_path=socket_path)
+    client = TranscriptionClient(server.address)
+
+    requests = []
+
+    def request():
+        requests.append(
+            threading.Thread(target=lambda: list(client.events(hello_world)))
+        )
+        requests[-1].start()
+
+    def wait_for(condition):
+        while not condition():
+            release.wait(0.01)
+
+    try:
+        request()  # Running
+        wait_for(lambda: server.batches == 1)
+        request()  # Queued
+        wait_for(lambda: server.queue.qsize() == 1)
+        with raises(ServerBusy):
+            list(client.events(hello_world))
+    finally:
+        release.set()
+        for thread in requests:
+            thread.join(10)
+        stop()
@@ -0,0 +1,248 @@
+import asyncio
+import time
+
+import numpy as np
+from pytest import fixture
+
+from whisperlab.audio import SAMPLES_PER_SECOND
+from whisperlab.mel import HOP, N_FRAMES
+from whisperlab.streaming import (
+    MultiChannelTranscriber,
+    SpeculativeTranscriber,
+    StreamingTranscriber,
+    word_segments,
+)
+
+from helpers import blocks, counting_audio, expected_text
+
+# Fixtures --------------------------------------------------------------------
+
+
+def window_counter(samples: np.ndarray) -> dict:
+    """
+    A stand-in transcriber that hears each second of audio as its index.
+
+    Each sample in second k of the test stream holds the value k / 1000.
+    """
+    seconds = np.round(samples * 1000).astype(int)
+    words, starts = np.unique(seconds, return_index=True)
+    ends = len(seconds) - np.unique(seconds[::-1], return_index=True)[1]
+    return {
+        "segments": [
+            {
+                "start": start / SAMPLES_PER_SECOND,
+                "end": end / SAMPLES_PER_SECOND,
+                "text": f" w{word}",
+            }
+            for word, start, end in zip(words, starts, ends)
+        ]
+    }
+
+
+def counting_blocks(seconds: int, block_seconds: float = 0.25):
+    return blocks(counting_audio(seconds), block_seconds)
+
+
+@fixture
+def engine() -> StreamingTranscriber:
+    return StreamingTranscriber(window_counter, window_seconds=6, hop_seconds=1)
+
+
+# Test Merging ----------------------------------------------------------------
+
+
+def test_committed_text_is_stable_and_complete(engine):
+    committed = ""
+    for block in counting_blocks(20):
+        engine.feed(block)
+        if update := engine.step():
+            committed += update.committed
+            # Tentative text continues the committed text
+            assert (committed + update.tentative).endswith(
+                f"w{int(update.window_end) - 1}"
+            )
+    committed += engine.step(final=True).committed
+
+    assert committed == expected_text(20)
+    assert engine.text == expected_text(20)
+    assert engine.stats().windows == 20
+
+
+def test_windows_wait_for_a_hop(engine):
+    engine.feed(np.zeros(SAMPLES_PER_SECOND // 2, np.float32))
+    assert engine.step() is None
+    engine.feed(np.zeros(SAMPLES_PER_SECOND // 2, np.float32))
+    assert engine.step() is not None
+
+
+def test_falling_behind_is_reported(engine):
+    for block in counting_blocks(20):
+        engine.feed(block)
+        if engine.ring.cursor == 2 * SAMPLES_PER_SECOND:
+            engine.step()
+    engine.step(final=True)
+    assert engine.stats().skipped_seconds > 0
+
+
+def test_silent_windows_skip_the_transcriber():
+    def transcriber(samples):
+        raise AssertionError("Silence was transcribed")
+
+    engine = StreamingTranscriber(
+        transcriber, window_seconds=6, hop_seconds=1, detector=lambda _: []
+    )
+    engine.feed(np.zeros(SAMPLES_PER_SECOND, np.float32))
+    update = engine.step(final=True)
+    assert (update.committed, engine.stats().silent_windows) == ("", 1)
+
+
+def test_incremental_mel_windows_start_on_the_frame_grid():
+    mels = []
+
+    def transcriber(samples, mel):
+        mels.append((len(samples), mel.shape))
+        return window_counter(samples)
+
+    engine = StreamingTranscriber(
+        transcriber, window_seconds=6, hop_seconds=1, incremental_mel=True
+    )
+    updates = []
+    for block in counting_blocks(12, block_seconds=0.2505):
+        engine.feed(block)
+        updates.append(engine.step())
+    updates.append(engine.step(final=True))
+
+    assert engine.text == expected_text(12)
+    for update in filter(None, updates):
+        assert round(update.window_start * SAMPLES_PER_SECOND) % HOP == 0
+    assert engine.frontend.computed < sum(length for length, _ in mels) // HOP
+    for length, shape in mels:
+        assert shape == (80, length // HOP + N_FRAMES)
+
+
+# Test Speculative Transcription ----------------------------------------------
+
+
+def mishearing_counter(samples: np.ndarray, mel=None) -> dict:
+    """A stand-in draft transcriber that mishears every fifth second."""
+    result = window_counter(samples)
+    for segment in result["segments"]:
+        if int(segment["text"][2:]) % 5 == 4:
+            segment["text"] = " uh"
+    return result
+
+
+def speculate(draft, seconds: int = 20) -> tuple[SpeculativeTranscriber, list]:
+    engine = SpeculativeTranscriber(
+        draft,
+        lambda samples, mel: window_counter(samples),
+        window_seconds=6,
+        hop_seconds=2,
+        draft_hop_seconds=0.5,
+    )
+    updates = []
+    for block in counting_blocks(seconds):
+        engine.feed(block)
+        updates += engine.step()
+    updates += engine.step(final=True)
+    return engine, updates
+
+
+def test_drafts_precede_and_never_commit_text():
+    engine, updates = speculate(mishearing_counter)
+    assert updates[0].provisional and updates[0].tentative == " w0"
+    assert updates[0].window_end == 0.5
+    assert not any(update.committed for update in updates if update.provisional)
+    assert engine.text == expected_text(20)
+
+    stats = engine.stats()
+    assert stats.drafts == 40 and stats.confirmations == 10
+    assert engine.frontend is engine.draft_frontend is engine.confirmer.frontend
+
+
+def test_correction_rate_counts_misheard_drafts():
+    engine, _ = speculate(lambda samples, mel: window_counter(samples))
+    assert engine.stats().committed_words > 0
+    assert engine.stats().correction_rate == 0
+
+    engine, _ = speculate(mishearing_counter)
+    stats = engine.stats()
+    assert (stats.committed_words, stats.corrected_words) == (20, 4)
+    assert stats.correction_rate == 0.2
+
+
+# Test Inference Thread -------------------------------------------------------
+
+
+def test_inference_thread_transcribes_an_unbounded_stream(engine):
+    updates = []
+    engine.on_update = updates.append
+    engine.start()
+    for block in counting_blocks(40, block_seconds=0.5):
+        engine.feed(block)
+        time.sleep(0.01)
+    engine.stop()
+
+    assert engine.text == expected_text(40)
+    assert engine.stats().skipped_seconds == 0
+    assert all(update.latency_ms >= 0 for update in updates)
+
+
+def test_updates_async_iterator(engine):
+    engine.start()
+    for block in counting_blocks(8):
+        engine.feed(block)
+        time.sleep(0.01)
+    engine.stop()
+
+    async def collect():
+        return [update.committed async for update in engine.updates()]
+
+    assert "".join(asyncio.run(collect())) == expected_text(8)
+
+
+# Test Multi-Channel --------------------------------------------------------
+
+
+def test_each_channel_is_its_own_stream():
+    updates = []
+    engine = MultiChannelTranscriber(
+        window_counter,
+        channels=2,
+        window_seconds=6,
+        hop_seconds=1,
+        on_update=lambda channel, update: updates.append(channel),
+    )
+    engine.start()
+    for block in counting_blocks(12, block_seconds=0.5):
+        engine.feed(np.stack([block, block + 0.5], axis=1))  # w0.., w500..
+        time.sleep(0.01)
+    engine.stop()
+
+    assert engine.ring.cursor == 12 * SAMPLES_PER_SECOND  # One put per block
+    assert engine.texts == [
+        expected_text(12),
+        "".join(f" w{500 + second}" for second in range(12)),
+    ]
+    assert set(updates) == {0, 1}
+
+
+# Test Word Segments ----------------------------------------------------------
+
+
+def test_word_segments():
+    result = {
+        "segments": [
+            {
+                "start": 0,
+                "end": 2,
+                "text": " a b",
+                "words": [
+                    {"start": 0, "end": 1, "word": " a"},
+                    {"start": 1, "end": 2, "word": " b"},
+                ],
+            },
+            {"start": 2, "end": 3, "text": " c"},
+        ]
+    }
+    assert [s["text"] for s in word_segments(result)] == [" a", " b", " c"]
@@ -0,0 +1,10 @@
+from whisperlab.textmetrics import word_edits
+
+# Test Metrics ----------------------------------------------------------------
+
+
+def test_word_edits():
+    assert word_edits(["the", "cat", "sat"], ["the", "bat", "sat", "down"]) == 2
+    assert word_edits([], ["a", "b"]) == 2
+    assert word_edits(["a", "b"], []) == 2
+    assert word_edits(["a", "b"], ["a", "b"]) == 0
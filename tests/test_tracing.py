@@ -0,0 +1,138 @@
+import io
+import json
+from pathlib import Path
+import timeit
+
+import numpy as np
+from pytest import fixture
+
+import whisperlab.tracing
+from whisperlab.tracing import (
+    activate,
+    ChromeTraceWriter,
+    jsonable,
+    Metrics,
+    record,
+    span,
+    Trace,
+    traced,
+)
+import whisperlab.transcribe
+from whisperlab.transcribe import transcribe, TranscribeTask
+
+# Fixtures --------------------------------------------------------------------
+
+
+class Silent:
+    """A stand-in model that hears nothing."""
+
+    def transcribe(self, samples, **args):
+        return {"language": "en", "segments": []}
+
+
+@fixture
+def tracing_enabled(monkeypatch):
+    monkeypatch.setattr(whisperlab.tracing, "ENABLED", True)
+
+
+# Test Spans ------------------------------------------------------------------
+
+
+def test_nested_spans_are_timed_by_path():
+    trace = Trace()
+    with activate(trace), span("task"):
+        for chunk in range(3):
+            with span("inference", chunk=chunk):
+                pass
+        record(audio_seconds=2.0, bytes_processed=10)
+
+    summary = trace.summary()
+    assert set(summary.stages) == {"task", "task/inference"}
+    assert summary.stages["task/inference"].count == 3
+    assert summary.wall_ms == summary.stages["task"].total_ms
+    assert summary.rtf == summary.wall_ms / 2000
+    assert summary.bytes_processed == 10
+
+
+def test_spans_without_a_trace_are_nearly_free():
+    assert span("stage") is span("other")
+    best = min(
+        timeit.repeat("with span('stage'): pass", globals=globals(), number=100_000)
+    )
+    assert best / 100_000 < 1e-6
+
+
+def test_traced_iterators_time_each_step_and_count_bytes():
+    trace = Trace()
+    with activate(trace):
+        blocks = list(traced([np.zeros(4, np.float32)] * 3, "decode"))
+    summary = trace.summary()
+    assert len(blocks) == 3
+    assert summary.stages["decode"].count == 4  # The last step stops
+    assert summary.bytes_processed == 48
+
+
+# Test Tasks ------------------------------------------------------------------
+
+
+def test_tasks_are_traced_only_when_enabled(monkeypatch):
+    audio_file = Path("tests/data/hello_world.mp3")
+    assert TranscribeTask(audio_file=audio_file).metrics() is None
+
+    monkeypatch.setattr(whisperlab.tracing, "ENABLED", True)
+    monkeypatch.setattr(
+        whisperlab.transcribe, "get_model", lambda name, dtype=None: Silent()
+    )
+    task = TranscribeTask(audio_file=audio_file)
+    transcribe(task)
+
+    metrics = task.metrics()
+    assert {"transcribe/model_load", "transcribe/audio_decode"} <= set(metrics.stages)
+    assert metrics.stages["transcribe/inference"].count == 1
+    assert 2 < metrics.audio_seconds < 3
+    assert metrics.bytes_processed == 4 * int(metrics.audio_seconds * 16_000)
+
+
+# Test Exports ----------------------------------------------------------------
+
+
+def test_metrics_export(tracing_enabled):
+    trace = Trace()
+    with activate(trace), span("transcribe"):
+        record(audio_seconds=1.0)
+
+    metrics = Metrics()
+    metrics.observe(trace.summary())
+    metrics.observe(trace.summary())
+
+    snapshot = metrics.snapshot()
+    assert snapshot["tasks"] == 2
+    assert snapshot["stages"]["transcribe"]["count"] == 2
+    json.dumps(snapshot)
+
+    text = metrics.prometheus()
+    assert 'whisperlab_stage_seconds_count{stage="transcribe"} 2' in text
+    assert 'whisperlab_stage_seconds_bucket{stage="transcribe",le="+Inf"} 2' in text
+    assert "whisperlab_audio_seconds_total 2.0" in text
+
+
+def test_chrome_trace_events():
+    output = io.StringIO()
+    writer = ChromeTraceWriter(output)
+    trace = Trace(listeners=[writer])
+    with activate(trace), span("window", index=0):
+        with span("inference"):
+            pass
+    writer.close()
+
+    events = json.loads(output.getvalue())
+    assert [event["name"] for event in events] == ["inference", "window"]
+    assert events[1]["args"] == {"index": 0}
+    assert events[1]["ts"] <= events[0]["ts"]
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+
+
+def test_jsonable_values():
+    values = [np.float32(0.5), np.int64(3), float("inf"), Path("a.wav")]
+    assert json.dumps(values, default=jsonable) == '[0.5, 3, Infinity, "a.wav"]'
+    assert [jsonable(value) for value in values] == [0.5, 3, "inf", "a.wav"]
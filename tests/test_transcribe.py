@@ -1,7 +1,11 @@
 from pathlib import Path
 
-from pytest import fixture
+import numpy as np
+from pydantic import ValidationError
+from pytest import fixture, raises
 
+from whisperlab.audio import load_audio
+from whisperlab.models import STANDIN_MODEL
 from whisperlab.tasks import Task
 from whisperlab.transcribe import (
     transcribe,
@@ -40,6 +44,21 @@ def test_create_simple_request(poem: Task, poem_file: Path):
 # Test Transcribe Task --------------------------------------------------------
 
 
+def test_samples_are_not_copied_or_serialized():
+    samples = np.zeros(16_000, np.float32)
+    task = TranscribeTask(samples=samples)
+    assert task.samples is samples
+    assert task.load_samples() is samples
+    assert "samples" not in task.model_dump()
+
+
+def test_a_task_has_one_input(poem_file: Path):
+    with raises(ValidationError):
+        TranscribeTask()
+    with raises(ValidationError):
+        TranscribeTask(audio_file=poem_file, samples=np.zeros(1, np.float32))
+
+
 def test_transcribe_empty_file_to_empty_text(empty_file: Task):
     result = transcribe(empty_file)
     assert result["text"] == ""
@@ -48,3 +67,16 @@ def test_transcribe_empty_file_to_empty_text(empty_file: Task):
 def test_transcribe_poem(poem):
     result = transcribe(poem)
     assert result["text"]
+
+
+def test_transcribe_samples_as_the_file():
+    hello_file = Path("tests/data/hello_world.mp3")
+    samples = load_audio(hello_file)
+    from_file = transcribe(TranscribeTask(audio_file=hello_file, model=STANDIN_MODEL))
+    from_samples = transcribe(TranscribeTask(samples=samples, model=STANDIN_MODEL))
+    assert from_samples["text"] == from_file["text"]
+
+
+def test_transcribe_empty_samples_to_empty_text():
+    result = transcribe(TranscribeTask(samples=b""))
+    assert result["text"] == ""